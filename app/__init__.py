@@ -55,14 +55,57 @@ def create_app(config_class=Config):
     from app.routes.income import income_bp
     from app.routes.api import api_bp
     from app.routes.market_research import market_research_bp
+    from app.routes.downloads import downloads_bp
+    from app.routes.webhooks import webhooks_bp
 
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(dashboard_bp)
     app.register_blueprint(income_bp, url_prefix='/income')
     app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(market_research_bp, url_prefix='/api')
+    app.register_blueprint(downloads_bp, url_prefix='/downloads')
+    app.register_blueprint(webhooks_bp, url_prefix='/webhooks')
+    csrf.exempt(webhooks_bp)
     app.register_blueprint(root_bp)  # Register root_bp for home page route
     
+    # Initialize background services
+    from app.services.counters import content_counters
+    from app.services.asset_store import asset_store
+    from app.services.webhooks import webhook_inbox
+    from app.services.ledger import ledger
+    from app.services.refunds import refund_processor
+    from app.services.order_analytics import order_analytics
+    from app.services.inventory import inventory
+    from app.services.email_delivery import campaign_sender
+    from app.services.email_events import delivery_tracker
+    from app.services.email_validation import email_validator
+    from app.services.drip_scheduler import drip_scheduler
+    from app.services.sequence_metrics import sequence_metrics
+    from app.services.social_scheduler import social_scheduler
+    from app.services.social_publisher import social_publisher
+    from app.services.hashtag_index import hashtag_index
+    from app.services.engagement_series import engagement_series
+    from app.services.delivery_queue import delivery_queue
+    from app.automation.social import run_scheduled_post_rules
+    content_counters.init_app(app)
+    asset_store.init_app(app)
+    webhook_inbox.init_app(app)
+    ledger.init_app(app)
+    refund_processor.init_app(app)
+    order_analytics.init_app(app)
+    inventory.init_app(app)
+    campaign_sender.init_app(app)
+    delivery_tracker.init_app(app)
+    email_validator.init_app(app)
+    drip_scheduler.init_app(app)
+    sequence_metrics.init_app(app)
+    social_scheduler.init_app(app)
+    social_scheduler.add_listener(run_scheduled_post_rules)
+    social_publisher.init_app(app)
+    hashtag_index.init_app(app)
+    engagement_series.init_app(app)
+    delivery_queue.init_app(app)
+    
     # Error handlers
     @app.errorhandler(404)
     def not_found_error(error):
@@ -1,9 +1,16 @@
-"""Distribution automation module for automated product delivery and channel distribution."""
+"""Distribution automation module for automated product delivery and channel distribution.
 
-from typing import Dict, List, Optional, Any
-from datetime import datetime
+Deliveries are queued in the database and drained by per-channel worker
+pools (``app.services.delivery_queue``), so they survive restarts and
+several processes can share the work.
+"""
+
+from typing import Dict, Iterator, List, Optional, Any
+from datetime import datetime, timezone
 from enum import Enum
 
+from app.services.delivery_queue import delivery_queue
+
 
 class DistributionChannel(Enum):
     """Supported distribution channels."""
@@ -22,6 +29,7 @@ class DeliveryStatus(Enum):
     DELIVERED = "delivered"
     FAILED = "failed"
     CANCELLED = "cancelled"
+    DEAD_LETTER = "dead_letter"
 
 
 class DistributionAutomation:
@@ -31,12 +39,19 @@ class DistributionAutomation:
     automates delivery processes, and tracks distribution status and analytics.
     """
     
-    def __init__(self):
-        """Initialize the distribution automation system."""
+    def __init__(self, queue=None):
+        """Initialize the distribution automation system.
+        
+        Args:
+            queue: Delivery queue to use (defaults to the shared one)
+        """
         self.active_distributions = {}
-        self.delivery_queue = []
-        self.channel_configs = {}
-        self.distribution_history = []
+        self.queue = queue or delivery_queue
+    
+    @property
+    def distribution_history(self) -> List[Dict[str, Any]]:
+        """Most recent delivery outcomes, oldest first (bounded; the full log is ``queue.events``)."""
+        return list(self.queue.history)
     
     def configure_channel(self, channel: DistributionChannel, config: Dict[str, Any]) -> bool:
         """Configure a distribution channel with authentication and settings.
@@ -45,14 +60,20 @@ class DistributionAutomation:
             channel: The distribution channel to configure
             config: Channel-specific configuration settings
             
+        Settings override the app-level defaults (see DISTRIBUTION_* in
+        config.py), e.g. ``{'api_key': ...}`` for the API channel or
+        ``{'secret': ...}`` to sign webhook deliveries. FTP logins go in
+        ``{'credentials': {host: {'username': ..., 'password': ...}}}``,
+        never in recipient URLs.
+        
         Returns:
             bool: True if configuration was successful
+            
+        Raises:
+            ValueError: If the channel has no built-in handler or settings are missing
         """
-        # TODO: Implement channel configuration
-        # - Validate channel credentials
-        # - Store channel settings
-        # - Test channel connectivity
-        pass
+        self.queue.configure(DistributionChannel(channel).value, config)
+        return True
     
     def schedule_delivery(self, product_id: str, recipient: str, 
                          channel: DistributionChannel, delivery_time: Optional[datetime] = None) -> str:
@@ -66,26 +87,24 @@ class DistributionAutomation:
             
         Returns:
             str: Delivery tracking ID
+            
+        Raises:
+            ValueError: For an unknown product, unconfigured channel or invalid recipient
         """
-        # TODO: Implement delivery scheduling
-        # - Validate product exists
-        # - Queue delivery request
-        # - Generate tracking ID
-        # - Set delivery time
-        pass
+        if delivery_time is not None and delivery_time.tzinfo is not None:
+            delivery_time = delivery_time.astimezone(timezone.utc).replace(tzinfo=None)
+        return self.queue.enqueue(product_id, recipient, DistributionChannel(channel).value, delivery_time)
     
     def process_delivery_queue(self) -> List[str]:
         """Process pending deliveries in the queue.
         
+        Background dispatchers normally drain the queue; this runs every
+        channel once on the calling thread.
+        
         Returns:
-            List[str]: List of processed delivery IDs
+            List[str]: List of delivered delivery IDs
         """
-        # TODO: Implement queue processing
-        # - Check scheduled delivery times
-        # - Execute deliveries
-        # - Update delivery status
-        # - Handle delivery failures
-        pass
+        return self.queue.process_pending()
     
     def deliver_product(self, delivery_id: str) -> bool:
         """Execute product delivery for a specific delivery ID.
@@ -93,15 +112,13 @@ class DistributionAutomation:
         Args:
             delivery_id: Unique delivery tracking ID
             
+        Delivers now, even if scheduled for later, unless another worker
+        holds the delivery.
+        
         Returns:
             bool: True if delivery was successful
         """
-        # TODO: Implement product delivery
-        # - Retrieve delivery details
-        # - Execute channel-specific delivery
-        # - Update delivery status
-        # - Log delivery completion
-        pass
+        return self.queue.deliver_now(delivery_id) == DeliveryStatus.DELIVERED.value
     
     def get_delivery_status(self, delivery_id: str) -> Optional[DeliveryStatus]:
         """Get the current status of a delivery.
@@ -112,10 +129,8 @@ class DistributionAutomation:
         Returns:
             Optional[DeliveryStatus]: Current delivery status or None if not found
         """
-        # TODO: Implement status retrieval
-        # - Look up delivery by ID
-        # - Return current status
-        pass
+        delivery = self.queue.get(delivery_id)
+        return DeliveryStatus(delivery['status']) if delivery else None
     
     def cancel_delivery(self, delivery_id: str) -> bool:
         """Cancel a pending delivery.
@@ -126,29 +141,28 @@ class DistributionAutomation:
         Returns:
             bool: True if cancellation was successful
         """
-        # TODO: Implement delivery cancellation
-        # - Check if delivery is cancellable
-        # - Remove from queue if pending
-        # - Update status to cancelled
-        pass
+        return self.queue.cancel(delivery_id)
     
     def bulk_distribute(self, product_id: str, recipients: List[str], 
-                       channel: DistributionChannel) -> List[str]:
+                       channel: DistributionChannel) -> Iterator[str]:
         """Distribute a product to multiple recipients.
         
+        All deliveries are inserted in one batched statement; workers then
+        send them through the channel's batch API (one multi-recipient email
+        per product, one POST per webhook URL, bulk-signed CDN links).
+        
         Args:
             product_id: Unique identifier for the product
-            recipients: List of delivery recipients
+            recipients: List of delivery recipients (duplicates are delivered once)
             channel: Distribution channel to use
             
         Returns:
-            List[str]: List of delivery tracking IDs
+            Iterator[str]: Delivery tracking IDs, in recipient order
+            
+        Raises:
+            ValueError: For an unknown product, unconfigured channel or any invalid recipient
         """
-        # TODO: Implement bulk distribution
-        # - Validate recipients
-        # - Schedule multiple deliveries
-        # - Return tracking IDs
-        pass
+        return self.queue.enqueue_many(product_id, recipients, DistributionChannel(channel).value)
     
     def setup_automatic_distribution(self, product_id: str, trigger_event: str, 
                                    channel: DistributionChannel, recipient_rule: str) -> str:
@@ -190,17 +204,17 @@ class DistributionAutomation:
     def retry_failed_deliveries(self, max_retries: int = 3) -> List[str]:
         """Retry failed deliveries up to maximum retry count.
         
+        Transient failures are already retried automatically with backoff;
+        this restarts deliveries that failed permanently or were
+        dead-lettered. Retries are spread out with jittered backoff.
+        
         Args:
             max_retries: Maximum number of retry attempts
             
         Returns:
             List[str]: List of retry delivery IDs
         """
-        # TODO: Implement delivery retry logic
-        # - Find failed deliveries
-        # - Check retry count
-        # - Reschedule for retry
-        pass
+        return self.queue.retry_failed(max_retries)
     
     def validate_channel_health(self, channel: DistributionChannel) -> Dict[str, Any]:
         """Check the health and availability of a distribution channel.
@@ -1,9 +1,37 @@
 """Marketing automation module for funnel and campaign management.
 
 This module provides automation capabilities for marketing activities including
-upsell sequences and drip campaigns.
+upsell sequences and drip campaigns. Sequences are persisted and run by the
+drip scheduler (``app.services.drip_scheduler``), which hands each due step
+to the campaign email sender. Engagement and revenue per step are
+aggregated by ``app.services.sequence_metrics``.
 """
 
+from app.services.drip_scheduler import drip_scheduler
+from app.services.sequence_metrics import sequence_metrics
+
+
+# Default upsell sequence: a nudge, a comparison, and a last reminder
+UPSELL_STEPS = [
+    {
+        'delay_days': 1,
+        'subject': 'Get more out of your {{ current_tier }} plan',
+        'text_template': 'Hi {{ username }},\n\nCustomers on {{ current_tier }} often move up to '
+                         '{{ offers[0].name }} ({{ offers[0].price }}).\n',
+    },
+    {
+        'delay_days': 3,
+        'subject': 'Compare your options',
+        'text_template': 'Hi {{ username }},\n\n{% for offer in offers %}- {{ offer.name }}: '
+                         '{{ offer.price }}\n{% endfor %}',
+    },
+    {
+        'delay_days': 7,
+        'subject': 'Last chance to upgrade from {{ current_tier }}',
+        'text_template': 'Hi {{ username }},\n\n{{ offers[0].name }} is still waiting for you.\n',
+    },
+]
+
 
 class MarketingAutomation:
     """Manages automated marketing sequences and drip campaigns.
@@ -12,15 +40,23 @@ class MarketingAutomation:
     upsell sequences for existing customers and drip campaigns for lead nurturing.
     """
     
-    def __init__(self):
-        """Initialize the MarketingAutomation system."""
-        self.active_sequences = {}
-        self.campaign_queue = []
-        self.subscribers = {}
+    def __init__(self, scheduler=None, metrics=None):
+        """Initialize the MarketingAutomation system.
+        
+        Args:
+            scheduler: Drip scheduler to use (defaults to the shared one)
+            metrics: Sequence metrics aggregator (defaults to the shared one)
+        """
+        self.scheduler = scheduler or drip_scheduler
+        self.metrics = metrics or sequence_metrics
     
     def run_upsell_sequence(self, customer_id, product_tier):
         """Run an automated upsell sequence for a specific customer.
         
+        Offers the cheapest active products priced above everything in the
+        customer's current tier (product category), in a three-step email
+        sequence shared by all customers of that tier.
+        
         Args:
             customer_id (str): Unique identifier for the customer
             product_tier (str): Current product tier to upsell from
@@ -28,53 +64,106 @@ class MarketingAutomation:
         Returns:
             dict: Sequence configuration and status
         """
-        # TODO: Implement upsell sequence logic
-        # - Analyze customer purchase history
-        # - Determine appropriate upsell products
-        # - Schedule email sequence
-        # - Track engagement and conversions
-        pass
+        from app import db
+        from app.models.order import Order
+        from app.models.product import Product
+        from app.models.user import User
+        
+        user = db.session.get(User, int(customer_id))
+        if user is None:
+            return {'sequence_id': None, 'status': 'skipped', 'reason': 'unknown customer'}
+        
+        tier_ceiling = db.session.query(db.func.max(Product.price)) \
+            .filter(Product.category == product_tier).scalar() or 0
+        offers = Product.query.filter(Product.is_active.is_(True), Product.price > tier_ceiling) \
+            .order_by(Product.price).limit(3).all()
+        if not offers:
+            return {'sequence_id': None, 'status': 'skipped', 'reason': 'no higher tier'}
+        
+        spent = db.session.query(db.func.coalesce(db.func.sum(Order.total_amount), 0)) \
+            .filter(Order.user_id == user.id, Order.payment_status == 'paid').scalar()
+        sequence = self.scheduler.define_sequence(f'upsell:{product_tier}', UPSELL_STEPS, kind='upsell')
+        enrolled = self.scheduler.enroll(sequence, [{
+            'email': user.email,
+            'username': user.username,
+            'current_tier': product_tier,
+            'lifetime_spend': float(spent),
+            'offers': [{'id': p.id, 'name': p.name, 'price': f'{p.price:.2f}'} for p in offers],
+        }])
+        return {
+            'sequence_id': sequence.sequence_key,
+            'status': 'scheduled' if enrolled else 'already_enrolled',
+            'customer_id': customer_id,
+            'offers': [p.id for p in offers],
+            'steps': len(UPSELL_STEPS),
+        }
     
-    def start_drip_campaign(self, campaign_id, subscriber_list):
+    def start_drip_campaign(self, campaign_id, subscriber_list, steps=None):
         """Start a drip campaign for a list of subscribers.
         
         Args:
             campaign_id (str): Unique identifier for the campaign
             subscriber_list (list): List of subscriber IDs to include
+            steps (list, optional): Step definitions (delay, subject,
+                templates); required the first time a campaign is started,
+                and must match the stored steps afterwards
             
         Returns:
             dict: Campaign configuration and status
+            
+        Raises:
+            ValueError: If the campaign was stopped or ``steps`` changed
         """
-        # TODO: Implement drip campaign logic
-        # - Load campaign template and schedule
-        # - Queue emails for each subscriber
-        # - Set up timing and triggers
-        # - Initialize tracking and analytics
-        pass
+        from app import db
+        from app.models.email_subscriber import EmailSubscriber
+        
+        sequence = self.scheduler.define_sequence(campaign_id, steps or [])
+        ids = list(subscriber_list)
+        
+        def recipients():
+            for start in range(0, len(ids), 1000):
+                rows = db.session.query(EmailSubscriber.email, EmailSubscriber.first_name,
+                                        EmailSubscriber.last_name) \
+                    .filter(EmailSubscriber.id.in_(ids[start:start + 1000]),
+                            EmailSubscriber.is_active.is_(True)).all()
+                for row in rows:
+                    yield {'email': row.email, 'first_name': row.first_name or '', 'last_name': row.last_name or ''}
+        
+        enrolled = self.scheduler.enroll(sequence, recipients())
+        return {
+            'campaign_id': campaign_id,
+            'status': sequence.status,
+            'enrolled': enrolled,
+            'requested': len(ids),
+        }
     
     def stop_sequence(self, sequence_id):
         """Stop a running marketing sequence.
         
+        Pending steps are cancelled as they come due, so this is a single
+        update regardless of how many subscribers are enrolled.
+        
         Args:
             sequence_id (str): Unique identifier for the sequence
             
         Returns:
             bool: Success status
         """
-        # TODO: Implement sequence stopping logic
-        pass
+        return self.scheduler.stop(sequence_id)
     
     def get_sequence_metrics(self, sequence_id):
         """Get performance metrics for a marketing sequence.
         
+        Reads the pre-aggregated per-step rows, so the cost depends on the
+        number of steps, not on how many emails or events the sequence
+        produced. Figures lag by up to one aggregation interval.
+        
         Args:
             sequence_id (str): Unique identifier for the sequence
             
         Returns:
-            dict: Performance metrics and analytics
+            dict: Per-step and total sends, deliveries, opens, clicks
+                (with approximate unique counts), rates, attributed
+                conversions and revenue; None for an unknown sequence
         """
-        # TODO: Implement metrics collection
-        # - Open rates, click rates, conversion rates
-        # - Revenue attribution
-        # - Subscriber engagement scores
-        pass
+        return self.metrics.metrics(sequence_id)
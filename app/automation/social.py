@@ -4,14 +4,33 @@ SocialAutomation - Social Media Management and Scheduling Service
 This module provides automation capabilities for social media management,
 including post scheduling, content management, and multi-platform integration.
 
+Scheduled posts are stored and dispatched by the durable post scheduler
+(``app.services.social_scheduler``); posts go out to all their platforms
+concurrently through ``app.services.social_publisher``. Engagement history
+lives in the time-series store of ``app.services.engagement_series``.
+Automation rules are compiled and matched by ``app.services.rule_engine``.
+
 Author: 1K A Day System
 Created: 2025-07-19
 """
 
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Any, Union
 from enum import Enum
+import json
 import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from app.models.settings import Setting
+from app.services.engagement_series import METRICS, engagement_series
+from app.services.hashtag_index import hashtag_index
+from app.services.rule_engine import RuleEngine
+from app.services.social_engagement import engagement_score, social_engagement
+from app.services.social_publisher import social_publisher
+from app.services.social_scheduler import normalize_times, social_scheduler
 
 
 class Platform(Enum):
@@ -27,11 +46,28 @@ class PostStatus(Enum):
     """Status of scheduled posts."""
     DRAFT = "draft"
     SCHEDULED = "scheduled"
+    PUBLISHING = "publishing"
     PUBLISHED = "published"
     FAILED = "failed"
     CANCELLED = "cancelled"
 
 
+# Rule actions may publish, which raises further events; bound the chain
+MAX_RULE_DEPTH = 3
+
+_rule_depth = threading.local()
+
+# Setting holding the active automation rules as JSON, shared by every process
+RULES_KEY = 'social.automation.rules'
+
+
+class _TemplateFields(dict):
+    """Event fields for action templates; unknown names render empty."""
+
+    def __missing__(self, key):
+        return ''
+
+
 class SocialAutomation:
     """
     Social Media Automation Service
@@ -61,17 +97,96 @@ class SocialAutomation:
         )
     """
     
-    def __init__(self, config: Optional[Dict[str, Any]] = None):
+    def __init__(self, config: Optional[Dict[str, Any]] = None, scheduler=None, publisher=None, analytics=None,
+                 rules=None):
         """
         Initialize the SocialAutomation service.
         
         Args:
             config: Configuration dictionary containing API keys and settings
+            scheduler: Post scheduler to use (defaults to the shared one)
+            publisher: Multi-platform publisher to use (defaults to the shared one)
+            analytics: Engagement time-series store to use (defaults to the shared one)
+            rules: Rule engine to use (defaults to a new one owned by this instance);
+                the built-in actions are registered on it
         """
         self.config = config or {}
         self.logger = logging.getLogger(__name__)
-        self.scheduled_posts = []
-        self.analytics_data = {}
+        self.scheduler = scheduler or social_scheduler
+        self.publisher = publisher or social_publisher
+        self.analytics = analytics or engagement_series
+        self.rules = rules or RuleEngine()
+        self.rules.register_action('publish', self._publish_action)
+        self.rules.register_action('schedule', self._schedule_action)
+        self.rules.register_action('cancel_post', self._cancel_action)
+        self.rules.register_action('log', self._log_action)
+        self._stored_rules = None  # RULES_KEY value the engine was last loaded from
+    
+    @staticmethod
+    def _platform_names(platforms: List[Union[Platform, str]]) -> List[str]:
+        """Validate platforms and return their names, de-duplicated in order.
+        
+        Raises:
+            ValueError: If the list is empty or names an unsupported platform
+        """
+        if not platforms:
+            raise ValueError("At least one platform is required")
+        names = []
+        for platform in platforms:
+            name = Platform(platform).value
+            if name not in names:
+                names.append(name)
+        return names
+    
+    @staticmethod
+    def _to_utc(when: datetime) -> datetime:
+        """Normalize to naive UTC; naive datetimes are taken to be UTC already."""
+        if not isinstance(when, datetime):
+            raise ValueError("scheduled_time must be a datetime")
+        if when.tzinfo is not None:
+            when = when.astimezone(timezone.utc).replace(tzinfo=None)
+        return when
+    
+    def _schedule_batch(self, contents: List[str], platform_lists: List[List[Any]], times: np.ndarray,
+                        options: List[Dict[str, Any]], on_conflict: str) -> List[Optional[str]]:
+        """Validate a batch as a whole, check conflicts, then insert it in one statement.
+        
+        Raises:
+            ValueError: Listing every invalid post (nothing is stored), or the
+                conflicting posts when ``on_conflict`` is ``error``
+        """
+        if on_conflict not in ('error', 'skip', 'allow'):
+            raise ValueError("on_conflict must be error, skip or allow")
+        if not contents:
+            return []
+        valid_names = {platform.value for platform in Platform}
+        names = [[Platform(p).value if isinstance(p, Platform) else str(p).lower()
+                  for p in dict.fromkeys([entry] if isinstance(entry, (str, Platform)) else entry or [])]
+                 for entry in platform_lists]
+        problems = pd.Series('', index=range(len(contents)), dtype=object)
+        problems[[not (isinstance(content, str) and content.strip()) for content in contents]] = 'empty content'
+        unknown = [sorted(set(entry) - valid_names) for entry in names]
+        problems[[bool(bad) for bad in unknown]] = [f'unknown platforms {bad}' for bad in unknown if bad]
+        problems[[not entry for entry in names]] = 'no platforms'
+        problems[np.isnat(times)] = 'invalid scheduled_time'
+        invalid = problems[problems != '']
+        if len(invalid):
+            details = '; '.join(f'#{index}: {problem}' for index, problem in invalid.head(10).items())
+            raise ValueError(f"{len(invalid)} invalid posts: {details}")
+        
+        keep = np.ones(len(times), dtype=bool)
+        if on_conflict != 'allow':
+            conflicts = self.scheduler.find_conflicts(names, times)
+            if conflicts.any() and on_conflict == 'error':
+                indexes = np.flatnonzero(conflicts)
+                raise ValueError(f"{len(indexes)} posts are too close to another post "
+                                 f"on the same platform: #{', #'.join(map(str, indexes[:10]))}")
+            keep = ~conflicts
+        
+        selected = np.flatnonzero(keep)
+        keys = iter(self.scheduler.schedule_many([contents[i] for i in selected], [names[i] for i in selected],
+                                                 times[selected], [options[i] for i in selected]))
+        return [next(keys) if kept else None for kept in keep]
         
     def schedule_post(self, content: str, platforms: List[Platform], 
                      scheduled_time: datetime, **kwargs) -> str:
@@ -90,8 +205,11 @@ class SocialAutomation:
         Raises:
             ValueError: If content or platforms are invalid
         """
-        # TODO: Implement post scheduling logic
-        pass
+        if not content or not content.strip():
+            raise ValueError("Post content cannot be empty")
+        post = self.scheduler.schedule(content, self._platform_names(platforms),
+                                       self._to_utc(scheduled_time), options=kwargs)
+        return post.post_key
         
     def cancel_scheduled_post(self, post_id: str) -> bool:
         """
@@ -103,8 +221,7 @@ class SocialAutomation:
         Returns:
             bool: True if successfully cancelled, False otherwise
         """
-        # TODO: Implement post cancellation logic
-        pass
+        return self.scheduler.cancel(post_id)
         
     def publish_immediately(self, content: str, platforms: List[Platform], **kwargs) -> Dict[str, Any]:
         """
@@ -116,10 +233,19 @@ class SocialAutomation:
             **kwargs: Additional options (media, hashtags, etc.)
             
         Returns:
-            Dict: Publishing results for each platform
+            Dict: Publishing results for each platform, plus the stored ``post_id``
+            
+        Raises:
+            ValueError: If content or platforms are invalid
         """
-        # TODO: Implement immediate publishing logic
-        pass
+        if not content or not content.strip():
+            raise ValueError("Post content cannot be empty")
+        names = self._platform_names(platforms)
+        results = self.publisher.publish({'content': content, 'platforms': names, 'options': kwargs})
+        post = self.scheduler.record(content, names, kwargs, results)
+        self.process_event('post_published' if post.status == PostStatus.PUBLISHED.value else 'post_failed',
+                           post_id=post.post_key, content=content, platforms=names, results=results)
+        return {'post_id': post.post_key, 'status': post.status, 'platforms': results}
         
     def get_scheduled_posts(self, platform: Optional[Platform] = None) -> List[Dict[str, Any]]:
         """
@@ -129,10 +255,9 @@ class SocialAutomation:
             platform: Optional platform filter
             
         Returns:
-            List of scheduled post dictionaries
+            List of scheduled post dictionaries, soonest first
         """
-        # TODO: Implement scheduled posts retrieval
-        pass
+        return self.scheduler.list_posts(Platform(platform).value if platform else None)
         
     def update_post_content(self, post_id: str, new_content: str, **kwargs) -> bool:
         """
@@ -157,11 +282,13 @@ class SocialAutomation:
             content: The post content to analyze
             platform: The target platform
             
+        Suggestions come from the local hashtag index built from our own
+        published posts and their engagement; no platform API is called.
+        
         Returns:
-            List of recommended hashtags
+            List of recommended hashtags (with '#'), best first
         """
-        # TODO: Implement hashtag optimization logic
-        pass
+        return hashtag_index.recommend(content, Platform(platform).value)
         
     def analyze_performance(self, post_id: str) -> Dict[str, Any]:
         """
@@ -172,9 +299,42 @@ class SocialAutomation:
             
         Returns:
             Dictionary containing engagement metrics
+            
+        Raises:
+            ValueError: If the post does not exist
         """
-        # TODO: Implement performance analysis logic
-        pass
+        post = self.scheduler.get(post_id)
+        if post is None:
+            raise ValueError(f"Unknown post: {post_id}")
+        
+        platforms = {}
+        for name, counts in post['engagement'].items():
+            platforms[name] = dict(counts, engagement_score=engagement_score(counts),
+                                   engagement_rate=self._engagement_rate(counts))
+        totals = {metric: sum(counts.get(metric, 0) for counts in post['engagement'].values())
+                  for metric in METRICS}
+        
+        history = self.analytics.series(post_id)
+        history['timestamp'] = history['timestamp'].map(lambda when: when.isoformat())
+        return {
+            'post_id': post_id,
+            'status': post['status'],
+            'published_at': post['published_at'],
+            'platforms': platforms,
+            'totals': totals,
+            'engagement_score': post['engagement_score'],
+            'engagement_rate': self._engagement_rate(totals),
+            'history': {
+                name: rows.drop(columns='platform').to_dict(orient='records')
+                for name, rows in history.groupby('platform')
+            },
+        }
+    
+    @staticmethod
+    def _engagement_rate(counts: Dict[str, Any]) -> float:
+        """Weighted interactions per impression."""
+        impressions = counts.get('impressions') or 0
+        return round(engagement_score(counts) / impressions, 4) if impressions else 0.0
         
     def get_trending_topics(self, platform: Platform, location: Optional[str] = None) -> List[str]:
         """
@@ -184,11 +344,33 @@ class SocialAutomation:
             platform: The social media platform
             location: Optional location filter
             
+        Trending means the most recent engagement on our own posts, decayed
+        over SOCIAL_TRENDING_HALF_LIFE_HOURS. Locations match the
+        ``location`` option posts were published with.
+        
         Returns:
             List of trending topic strings
         """
-        # TODO: Implement trending topics retrieval
-        pass
+        return hashtag_index.trending(Platform(platform).value, location)
+    
+    def record_engagement(self, post_id: str, platform: Platform, metrics: Dict[str, int]) -> bool:
+        """
+        Record the latest engagement counts reported by a platform for a post.
+        
+        Args:
+            post_id: The ID of the published post
+            platform: The platform reporting
+            metrics: Cumulative counts (impressions, likes, comments, shares, clicks, saves)
+            
+        Returns:
+            bool: False if the post is unknown
+        """
+        name = Platform(platform).value
+        recorded = social_engagement.record(post_id, name, metrics)
+        if recorded:
+            self.process_event('engagement', post_id=post_id, platform=name, metrics=dict(metrics),
+                               engagement_score=engagement_score(metrics))
+        return recorded
         
     def schedule_content_series(self, content_series: List[str], 
                                platforms: List[Platform],
@@ -205,9 +387,16 @@ class SocialAutomation:
             
         Returns:
             List of post IDs for the scheduled series
-        """
-        # TODO: Implement content series scheduling
-        pass
+            
+        Raises:
+            ValueError: If any post is invalid or clashes with one already scheduled
+        """
+        if not isinstance(interval, timedelta) or interval <= timedelta(0):
+            raise ValueError("interval must be a positive timedelta")
+        start = np.datetime64(self._to_utc(start_time), 'us')
+        times = start + np.arange(len(content_series)) * np.timedelta64(interval // timedelta(microseconds=1), 'us')
+        return self._schedule_batch(list(content_series), [list(platforms)] * len(content_series), times,
+                                    [{}] * len(content_series), on_conflict='error')
         
     def auto_engage(self, keywords: List[str], platforms: List[Platform], 
                    engagement_type: str = "like") -> Dict[str, int]:
@@ -240,18 +429,38 @@ class SocialAutomation:
         # TODO: Implement AI-powered content generation
         pass
         
-    def bulk_schedule(self, posts_data: List[Dict[str, Any]]) -> List[str]:
+    def bulk_schedule(self, posts_data: List[Dict[str, Any]], on_conflict: str = "error") -> List[str]:
         """
         Schedule multiple posts in bulk operation.
         
+        Inputs are validated together and stored with one batched insert;
+        either every post is stored or none is.
+        
         Args:
-            posts_data: List of post dictionaries with content, platforms, timing
+            posts_data: List of post dictionaries with content, platforms,
+                scheduled_time (datetime or ISO string) and an optional
+                timezone (IANA name) for naive times; other keys are
+                publish options
+            on_conflict: What to do with posts scheduled within
+                SOCIAL_MIN_POST_GAP_SECONDS of another post on the same
+                platform: error, skip (their id is None) or allow
             
         Returns:
-            List of post IDs for scheduled posts
-        """
-        # TODO: Implement bulk scheduling logic
-        pass
+            List of post IDs for scheduled posts, in input order
+            
+        Raises:
+            ValueError: If any post is invalid, or conflicts with on_conflict="error"
+        """
+        reserved = ('content', 'platforms', 'scheduled_time', 'timezone')
+        times = normalize_times([post.get('scheduled_time') for post in posts_data],
+                                [post.get('timezone') for post in posts_data])
+        return self._schedule_batch(
+            [post.get('content') for post in posts_data],
+            [post.get('platforms') or [] for post in posts_data],
+            times,
+            [{key: value for key, value in post.items() if key not in reserved} for post in posts_data],
+            on_conflict,
+        )
         
     def get_platform_insights(self, platform: Platform, days: int = 30) -> Dict[str, Any]:
         """
@@ -264,32 +473,154 @@ class SocialAutomation:
         Returns:
             Dictionary containing platform-specific insights
         """
-        # TODO: Implement platform insights retrieval
-        pass
+        name = Platform(platform).value
+        until = datetime.utcnow()
+        since = until - timedelta(days=days)
+        per_post = self.analytics.totals(since, until, platform=name, by='post')
+        daily = self.analytics.totals(since, until, platform=name, by='day')
+        
+        totals = {metric: int(per_post[metric].sum()) for metric in METRICS}
+        scores = pd.Series([engagement_score(row) for row in per_post.to_dict(orient='records')],
+                           index=per_post.index, dtype=float)
+        top = scores[scores > 0].nlargest(5)
+        return {
+            'platform': name,
+            'days': days,
+            'since': since.isoformat(),
+            'until': until.isoformat(),
+            'totals': totals,
+            'engagement_score': engagement_score(totals),
+            'engagement_rate': self._engagement_rate(totals),
+            'active_posts': int((scores > 0).sum()),
+            'top_posts': [{'post_id': post_id, 'engagement_score': score} for post_id, score in top.items()],
+            'daily': [dict({'date': day.date().isoformat()}, **{metric: int(value) for metric, value in row.items()})
+                      for day, row in daily.iterrows()],
+        }
         
     def export_analytics(self, format_type: str = "json", date_range: Optional[tuple] = None) -> str:
         """
         Export analytics data in specified format.
         
+        The engagement history of every post in range is streamed chunk by
+        chunk into a new file under SOCIAL_EXPORT_FOLDER, one row per
+        snapshot with cumulative counts.
+        
         Args:
-            format_type: Export format (json, csv, pdf)
-            date_range: Optional tuple of (start_date, end_date)
+            format_type: Export format (json, csv)
+            date_range: Optional tuple of (start_date, end_date), end exclusive
             
         Returns:
-            File path or data string of exported analytics
+            File path of exported analytics
+            
+        Raises:
+            ValueError: For unsupported formats
         """
-        # TODO: Implement analytics export functionality
-        pass
+        since, until = date_range or (None, None)
+        since = self._to_utc(since) if since is not None else None
+        until = self._to_utc(until) if until is not None else None
+        return self.analytics.write_export(format_type, since, until)
         
     def setup_automation_rules(self, rules: List[Dict[str, Any]]) -> bool:
         """
         Configure automation rules for content publishing and engagement.
         
+        Each rule names a triggering ``event`` (``post_published``,
+        ``post_failed``, ``engagement`` or any type passed to
+        ``process_event``), optional ``conditions`` and a list of
+        ``actions``; see ``app.services.rule_engine`` for the format.
+        Built-in actions are ``publish`` and ``schedule`` (``content``
+        template, ``platforms``, ``delay_minutes``), ``cancel_post`` and
+        ``log``. The rules replace the active set and are stored in the
+        settings table (commits), so every instance and process picks them
+        up on its next event, including the scheduler leader, which runs
+        them for scheduled posts (see ``run_scheduled_post_rules``).
+        
         Args:
             rules: List of automation rule dictionaries
             
         Returns:
             bool: True if rules were successfully configured
+            
+        Raises:
+            ValueError: Listing every invalid rule; the previous rules stay active
         """
-        # TODO: Implement automation rules setup
-        pass
+        self.rules.load(rules)
+        self._stored_rules = json.dumps(rules, default=str)
+        Setting.set_value(RULES_KEY, self._stored_rules)
+        return True
+    
+    def _sync_rules(self):
+        """Reload the engine if the stored rules changed since it was last loaded."""
+        stored = Setting.get_value(RULES_KEY)
+        if stored is None or stored == self._stored_rules:
+            return
+        self._stored_rules = stored
+        try:
+            self.rules.load(json.loads(stored))
+        except ValueError as e:
+            self.logger.error(f"Stored automation rules are invalid; keeping the previous set: {e}")
+    
+    def process_event(self, event_type: str, **fields) -> List[Dict[str, Any]]:
+        """
+        Run the automation rules triggered by an event.
+        
+        Args:
+            event_type: The event type rules are indexed by
+            **fields: Event fields conditions can test
+            
+        Returns:
+            List of ``{'rule_id', 'action', 'result' | 'error'}`` per action run
+        """
+        depth = getattr(_rule_depth, 'value', 0)
+        if depth >= MAX_RULE_DEPTH:
+            self.logger.warning(f"Not running rules for {event_type}: rule chain deeper than {MAX_RULE_DEPTH}")
+            return []
+        _rule_depth.value = depth + 1
+        try:
+            if depth == 0:
+                self._sync_rules()
+            return self.rules.dispatch(dict(fields, type=event_type))
+        finally:
+            _rule_depth.value = depth
+    
+    @staticmethod
+    def _render(template: str, event: Dict[str, Any]) -> str:
+        return template.format_map(_TemplateFields(event))
+    
+    def _action_platforms(self, event: Dict[str, Any], action: Dict[str, Any]) -> List[str]:
+        platforms = action.get('platforms') or event.get('platforms') or [event.get('platform')]
+        return self._platform_names([platform for platform in platforms if platform])
+    
+    def _publish_action(self, event: Dict[str, Any], action: Dict[str, Any]) -> Dict[str, Any]:
+        return self.publish_immediately(self._render(action.get('content', ''), event),
+                                        self._action_platforms(event, action), **action.get('options', {}))
+    
+    def _schedule_action(self, event: Dict[str, Any], action: Dict[str, Any]) -> str:
+        when = datetime.utcnow() + timedelta(minutes=float(action.get('delay_minutes', 0)))
+        return self.schedule_post(self._render(action.get('content', ''), event),
+                                  self._action_platforms(event, action), when, **action.get('options', {}))
+    
+    def _cancel_action(self, event: Dict[str, Any], action: Dict[str, Any]) -> bool:
+        return self.cancel_scheduled_post(action.get('post_id') or event.get('post_id'))
+    
+    def _log_action(self, event: Dict[str, Any], action: Dict[str, Any]) -> str:
+        message = self._render(action.get('message', '{type}'), event)
+        self.logger.info(f"Automation rule: {message}")
+        return message
+
+
+_leader_automation: Optional[SocialAutomation] = None
+_leader_lock = threading.Lock()
+
+
+def run_scheduled_post_rules(event_type: str, **fields):
+    """Scheduler listener running the stored rules for dispatched posts.
+
+    Registered once in create_app. Only the scheduler leader dispatches, so
+    this runs in that process on one instance shared by its events.
+    """
+    global _leader_automation
+    with _leader_lock:
+        if _leader_automation is None:
+            _leader_automation = SocialAutomation()
+    _leader_automation.process_event(event_type, **fields)
@@ -3,5 +3,6 @@
 from app.models.user import User
 from app.models.income import Income
 from app.models.goal import Goal
+from app.models.email_subscriber import EmailSubscriber, SubscriberInterest
 
-__all__ = ['User', 'Income', 'Goal']
+__all__ = ['User', 'Income', 'Goal', 'EmailSubscriber', 'SubscriberInterest']
@@ -5,11 +5,16 @@ including courses, ebooks, templates, and other digital products per the
 business blueprint requirements.
 """
 
+from dataclasses import dataclass, asdict
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, Boolean, ForeignKey, Numeric
-from sqlalchemy.orm import relationship
+from typing import List, Optional, Tuple
+from flask import current_app
+from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, Boolean, ForeignKey, Numeric, Index
+from sqlalchemy.orm import relationship, deferred
 from app import db
 import enum
+import threading
+import time
 
 
 class ContentType(enum.Enum):
@@ -33,6 +38,61 @@ class ContentStatus(enum.Enum):
     DISCONTINUED = "discontinued"
 
 
+@dataclass
+class ContentListing:
+    """Lightweight catalog row for listing pages.
+    
+    Built from a column projection so listings never load ``description``
+    or ``content_body``.
+    """
+    id: int
+    title: str
+    slug: str
+    content_type: Optional[str]
+    category: Optional[str]
+    excerpt: Optional[str]
+    featured_image_url: Optional[str]
+    price: float
+    is_free: bool
+    is_featured: bool
+    is_premium: bool
+    rating_average: Optional[float]
+    view_count: int
+    published_at: Optional[datetime]
+    
+    @classmethod
+    def from_row(cls, row):
+        """Build a listing from a projected result row."""
+        return cls(
+            id=row.id,
+            title=row.title,
+            slug=row.slug,
+            content_type=row.content_type.value if row.content_type else None,
+            category=row.category,
+            excerpt=row.excerpt,
+            featured_image_url=row.featured_image_url,
+            price=float(row.price) if row.price else 0.00,
+            is_free=row.is_free,
+            is_featured=row.is_featured,
+            is_premium=row.is_premium,
+            rating_average=float(row.rating_average) if row.rating_average else None,
+            view_count=row.view_count,
+            published_at=row.published_at
+        )
+    
+    def to_dict(self):
+        """Convert listing to dictionary for JSON serialization."""
+        data = asdict(self)
+        data['published_at'] = self.published_at.isoformat() if self.published_at else None
+        return data
+
+
+# Per-process cache of the featured listing; invalidated on publish/archive
+# and bounded by CATALOG_FEATURED_CACHE_TTL for changes made by other workers.
+_featured_cache = {'items': None, 'expires_at': 0.0}
+_featured_cache_lock = threading.Lock()
+
+
 class Content(db.Model):
     """Model for digital product content management.
     
@@ -42,6 +102,11 @@ class Content(db.Model):
     """
     
     __tablename__ = 'contents'
+    __table_args__ = (
+        # Keyset pagination for catalog listings (newest first)
+        Index('ix_contents_status_id', 'status', 'id'),
+        Index('ix_contents_type_status_id', 'content_type', 'status', 'id'),
+    )
     
     # Primary identification
     id = Column(Integer, primary_key=True)
@@ -54,8 +119,8 @@ class Content(db.Model):
     tags = Column(Text, nullable=True)  # JSON or comma-separated tags
     
     # Content details
-    description = Column(Text, nullable=True)
-    content_body = Column(Text, nullable=True)  # Main content or summary
+    description = deferred(Column(Text, nullable=True))  # Loaded on access; listings use excerpt
+    content_body = deferred(Column(Text, nullable=True))  # Main content or summary; loaded on access
     excerpt = Column(Text, nullable=True)  # Short description for listings
     
     # Media and assets
@@ -64,6 +129,7 @@ class Content(db.Model):
     preview_url = Column(String(500), nullable=True)  # For previews/demos
     file_size = Column(Integer, nullable=True)  # File size in bytes
     file_format = Column(String(50), nullable=True)  # PDF, MP4, ZIP, etc.
+    asset_digest = Column(String(64), nullable=True, index=True)  # sha256 key in the asset store
     
     # Pricing and commerce
     price = Column(Numeric(10, 2), nullable=True, default=0.00)
@@ -93,8 +159,8 @@ class Content(db.Model):
     access_level = Column(String(50), nullable=True)  # public, member, premium, etc.
     
     # Relationships
-    created_by_id = Column(Integer, ForeignKey('users.id'), nullable=True)
-    updated_by_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    created_by_id = Column(Integer, ForeignKey('user.id'), nullable=True)
+    updated_by_id = Column(Integer, ForeignKey('user.id'), nullable=True)
     
     # Timestamps
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -109,6 +175,12 @@ class Content(db.Model):
         """String representation of Content instance."""
         return f'<Content {self.id}: {self.title} ({self.content_type.value})>'
     
+    def requires_purchase(self):
+        """Whether downloading needs a paid order (anything not free or public)."""
+        if self.is_free or self.access_level == 'public':
+            return False
+        return bool(self.price and self.price > 0) or self.is_premium or self.requires_subscription
+    
     def to_dict(self):
         """Convert Content instance to dictionary for JSON serialization."""
         return {
@@ -148,23 +220,126 @@ class Content(db.Model):
         """Get featured content."""
         return cls.query.filter_by(is_featured=True, status=ContentStatus.PUBLISHED).all()
     
-    def increment_view_count(self):
-        """Increment the view count for analytics."""
-        self.view_count += 1
-        db.session.commit()
+    @classmethod
+    def listing_columns(cls):
+        """Columns projected for catalog listings."""
+        return (
+            cls.id, cls.title, cls.slug, cls.content_type, cls.category, cls.excerpt,
+            cls.featured_image_url, cls.price, cls.is_free, cls.is_featured,
+            cls.is_premium, cls.rating_average, cls.view_count, cls.published_at
+        )
+    
+    @classmethod
+    def list_page(cls, limit=20, after=None, content_type=None, category=None,
+                  featured=None, status=ContentStatus.PUBLISHED) -> Tuple[List[ContentListing], Optional[int]]:
+        """Get one page of catalog listings using keyset pagination.
+        
+        Args:
+            limit (int): Page size
+            after (int, optional): Cursor returned by the previous page
+            content_type (ContentType or str, optional): Filter by type
+            category (str, optional): Filter by category
+            featured (bool, optional): Filter by featured flag
+            status (ContentStatus): Status to list (default: published)
+            
+        Returns:
+            tuple: (list of ContentListing, next cursor or None)
+        """
+        query = db.session.query(*cls.listing_columns()).filter(cls.status == status)
+        if content_type is not None:
+            if not isinstance(content_type, ContentType):
+                content_type = ContentType(content_type)
+            query = query.filter(cls.content_type == content_type)
+        if category is not None:
+            query = query.filter(cls.category == category)
+        if featured is not None:
+            query = query.filter(cls.is_featured == featured)
+        if after is not None:
+            query = query.filter(cls.id < after)
+        
+        rows = query.order_by(cls.id.desc()).limit(limit + 1).all()
+        items = [ContentListing.from_row(row) for row in rows[:limit]]
+        next_cursor = items[-1].id if len(rows) > limit else None
+        return items, next_cursor
+    
+    @classmethod
+    def list_published(cls, limit=20, after=None):
+        """Get a page of published listings. See list_page."""
+        return cls.list_page(limit=limit, after=after)
+    
+    @classmethod
+    def list_by_type(cls, content_type, limit=20, after=None):
+        """Get a page of published listings of one type. See list_page."""
+        return cls.list_page(limit=limit, after=after, content_type=content_type)
+    
+    @classmethod
+    def get_featured_listings(cls):
+        """Get featured published listings, served from a short-lived cache."""
+        now = time.monotonic()
+        items = _featured_cache['items']
+        if items is not None and now < _featured_cache['expires_at']:
+            return items
+        
+        with _featured_cache_lock:
+            if _featured_cache['items'] is not None and now < _featured_cache['expires_at']:
+                return _featured_cache['items']
+            rows = db.session.query(*cls.listing_columns()).filter(
+                cls.status == ContentStatus.PUBLISHED,
+                cls.is_featured.is_(True)
+            ).order_by(cls.id.desc()).all()
+            items = [ContentListing.from_row(row) for row in rows]
+            ttl = current_app.config.get('CATALOG_FEATURED_CACHE_TTL', 300)
+            _featured_cache['items'] = items
+            _featured_cache['expires_at'] = now + ttl
+        return items
     
-    def increment_download_count(self):
-        """Increment the download count for analytics."""
-        self.download_count += 1
+    @staticmethod
+    def invalidate_featured_cache():
+        """Drop the cached featured listing."""
+        with _featured_cache_lock:
+            _featured_cache['items'] = None
+            _featured_cache['expires_at'] = 0.0
+    
+    def attach_asset(self, digest, size, file_format=None):
+        """Point this content at a blob in the asset store.
+        
+        Args:
+            digest (str): sha256 digest returned by AssetStore.put
+            size (int): File size in bytes
+            file_format (str, optional): File format such as PDF or MP4
+        """
+        from flask import url_for
+        self.asset_digest = digest
+        self.file_size = size
+        if file_format:
+            self.file_format = file_format.upper()
+        self.download_url = url_for('downloads.download_content', slug=self.slug)
         db.session.commit()
     
+    def increment_view_count(self, amount=1):
+        """Record a view for analytics.
+        
+        The increment is buffered by the counter service and written later
+        as an atomic aggregated UPDATE, so ``view_count`` on this instance
+        is not changed immediately.
+        """
+        from app.services.counters import content_counters
+        content_counters.record_view(self.id, amount)
+    
+    def increment_download_count(self, amount=1):
+        """Record a download for analytics (buffered, see increment_view_count)."""
+        from app.services.counters import content_counters
+        content_counters.record_download(self.id, amount)
+    
     def publish(self):
         """Publish the content."""
         self.status = ContentStatus.PUBLISHED
         self.published_at = datetime.utcnow()
         db.session.commit()
+        self.invalidate_featured_cache()
     
     def archive(self):
         """Archive the content."""
         self.status = ContentStatus.ARCHIVED
         db.session.commit()
+        self.invalidate_featured_cache()
@@ -0,0 +1,95 @@
+"""Product delivery queue and delivery history models."""
+
+import json
+
+from app import db
+from datetime import datetime
+
+
+class Delivery(db.Model):
+    """One product delivery to one recipient through one channel.
+
+    The row is the queue entry: workers claim ``pending`` rows whose
+    ``next_attempt_at`` has passed from the ``(channel, status,
+    next_attempt_at)`` index. A claim pushes ``next_attempt_at`` out by the
+    visibility timeout, so a delivery whose worker died becomes claimable
+    again once it expires.
+    """
+
+    __tablename__ = 'deliveries'
+    __table_args__ = (
+        db.Index('ix_deliveries_channel_status_next_attempt', 'channel', 'status', 'next_attempt_at'),
+        db.Index('ix_deliveries_status_retries', 'status', 'retries'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    tracking_id = db.Column(db.String(32), unique=True, nullable=False)
+    product_id = db.Column(db.String(100), nullable=False, index=True)
+    recipient = db.Column(db.String(500), nullable=False)
+    channel = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, processing, delivered, failed, cancelled, dead_letter
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # in the current round
+    retries = db.Column(db.Integer, nullable=False, default=0)  # rounds restarted by retry_failed/requeue
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    result = db.Column(db.Text)  # JSON: channel-specific outcome (message id, signed URL, ...)
+    claim_token = db.Column(db.String(32), index=True)
+    claimed_at = db.Column(db.DateTime)
+    delivered_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Delivery {self.tracking_id} {self.channel} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'delivery_id': self.tracking_id,
+            'product_id': self.product_id,
+            'recipient': self.recipient,
+            'channel': self.channel,
+            'status': self.status,
+            'attempts': self.attempts,
+            'retries': self.retries,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.status == 'pending' else None,
+            'error': self.last_error,
+            'result': json.loads(self.result) if self.result else None,
+            'delivered_at': self.delivered_at.isoformat() if self.delivered_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+class DeliveryEvent(db.Model):
+    """One entry in a delivery's append-only history: an attempt's outcome or a requeue.
+
+    Rows are only ever inserted; the queue keeps the most recent ones in a
+    bounded in-memory buffer as well.
+    """
+
+    __tablename__ = 'delivery_events'
+    __table_args__ = (
+        db.Index('ix_delivery_events_tracking_created', 'tracking_id', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    tracking_id = db.Column(db.String(32), nullable=False)
+    channel = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # delivered, pending (will retry), failed, dead_letter, requeued
+    attempt = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    next_attempt_at = db.Column(db.DateTime)  # when a retry is due
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<DeliveryEvent {self.tracking_id} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'delivery_id': self.tracking_id,
+            'channel': self.channel,
+            'status': self.status,
+            'attempt': self.attempt,
+            'error': self.error,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'created_at': self.created_at.isoformat(),
+        }
@@ -0,0 +1,56 @@
+"""Drip sequence and scheduled step models."""
+
+from app import db
+from datetime import datetime
+
+
+class DripSequence(db.Model):
+    """A multi-step email sequence (drip campaign or upsell).
+
+    Steps are stored as JSON; each step has a delay (relative to the
+    previous step) and the subject/template fields of a campaign email.
+    Stopping a sequence flips its status only; pending steps are dropped
+    when they come due.
+    """
+
+    __tablename__ = 'drip_sequences'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sequence_key = db.Column(db.String(100), unique=True, nullable=False)  # Caller's campaign/sequence id
+    kind = db.Column(db.String(20), nullable=False, default='drip')  # drip, upsell
+    steps = db.Column(db.Text, nullable=False)  # JSON list of step definitions
+    status = db.Column(db.String(20), nullable=False, default='active')  # active, stopped
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    stopped_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<DripSequence {self.sequence_key} {self.status}>'
+
+
+class DripScheduledStep(db.Model):
+    """One subscriber's next step in a sequence, due at ``scheduled_at``.
+
+    Only the next step of each enrollment exists at a time; sending it
+    schedules the following one.
+    """
+
+    __tablename__ = 'drip_scheduled_steps'
+    __table_args__ = (
+        db.UniqueConstraint('sequence_id', 'recipient', 'step_index', name='uq_drip_steps_sequence_recipient_step'),
+        db.Index('ix_drip_steps_status_scheduled', 'status', 'scheduled_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sequence_id = db.Column(db.Integer, db.ForeignKey('drip_sequences.id'), nullable=False, index=True)
+    recipient = db.Column(db.String(255), nullable=False)
+    context = db.Column(db.Text)  # JSON: per-recipient template variables
+    step_index = db.Column(db.Integer, nullable=False, default=0)
+    scheduled_at = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, processing, sent, cancelled
+    claim_token = db.Column(db.String(32))
+    claimed_at = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DripScheduledStep {self.sequence_id}:{self.step_index} {self.recipient} {self.status}>'
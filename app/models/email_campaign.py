@@ -0,0 +1,77 @@
+"""Email campaign and durable send queue models."""
+
+from app import db
+from datetime import datetime
+
+
+class EmailCampaign(db.Model):
+    """A bulk email send: templates compiled once, rendered per recipient.
+
+    Templates are Jinja source stored with the campaign so queued messages
+    can be rendered by any worker, including after a restart.
+    """
+
+    __tablename__ = 'email_campaigns'
+
+    id = db.Column(db.Integer, primary_key=True)
+    campaign_key = db.Column(db.String(100), unique=True, nullable=False)  # Caller's campaign_id
+    subject = db.Column(db.String(255), nullable=False)
+    html_template = db.Column(db.Text)
+    text_template = db.Column(db.Text)
+    template_data = db.Column(db.Text)  # JSON: context shared by all recipients
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, sending, completed
+    total_recipients = db.Column(db.Integer, nullable=False, default=0)
+    sent_count = db.Column(db.Integer, nullable=False, default=0)
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+    suppressed_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<EmailCampaign {self.campaign_key} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'campaign_id': self.campaign_key,
+            'status': self.status,
+            'total_recipients': self.total_recipients,
+            'sent': self.sent_count,
+            'failed': self.failed_count,
+            'suppressed': self.suppressed_count,
+            'pending': self.total_recipients - self.sent_count - self.failed_count - self.suppressed_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+        }
+
+
+class EmailQueueItem(db.Model):
+    """One message waiting for, or done with, SMTP delivery."""
+
+    __tablename__ = 'email_queue'
+    __table_args__ = (
+        db.UniqueConstraint('campaign_id', 'recipient', name='uq_email_queue_campaign_recipient'),
+        db.Index('ix_email_queue_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    campaign_id = db.Column(db.Integer, db.ForeignKey('email_campaigns.id'), index=True)
+    recipient = db.Column(db.String(255), nullable=False)
+    recipient_domain = db.Column(db.String(255), nullable=False)
+    context = db.Column(db.Text)  # JSON: per-recipient template variables
+    message_id = db.Column(db.String(255), unique=True, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed, suppressed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    claim_token = db.Column(db.String(32), index=True)
+    claimed_at = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime)
+    delivery_status = db.Column(db.String(20))  # delivered, deferred, bounced, complained (from delivery events)
+    bounce_reason = db.Column(db.Text)
+    delivered_at = db.Column(db.DateTime)
+    opened_at = db.Column(db.DateTime)  # First open
+    clicked_at = db.Column(db.DateTime)  # First click
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<EmailQueueItem {self.message_id} {self.recipient} {self.status}>'
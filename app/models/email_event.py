@@ -0,0 +1,57 @@
+"""Email delivery event and suppression list models."""
+
+from app import db
+from datetime import datetime
+
+
+class EmailDeliveryEvent(db.Model):
+    """A delivery, bounce, open, click, complaint or unsubscribe for a sent message.
+
+    Events arrive through the webhook inbox (provider webhooks, parsed
+    DSNs), which already drops duplicates by event id.
+    """
+
+    __tablename__ = 'email_delivery_events'
+    __table_args__ = (
+        db.Index('ix_email_delivery_events_message_occurred', 'message_id', 'occurred_at'),
+        db.Index('ix_email_delivery_events_recipient_occurred', 'recipient', 'occurred_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(20), nullable=False)  # webhook, dsn, smtp
+    event_id = db.Column(db.String(255), nullable=False)
+    event_type = db.Column(db.String(20), nullable=False)  # delivered, deferred, bounce, open, click, complaint, unsubscribe
+    message_id = db.Column(db.String(255))
+    recipient = db.Column(db.String(255))
+    bounce_type = db.Column(db.String(10))  # hard, soft
+    reason = db.Column(db.Text)
+    url = db.Column(db.Text)  # Clicked link
+    occurred_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<EmailDeliveryEvent {self.event_type} {self.message_id}>'
+
+    def to_dict(self):
+        return {
+            'type': self.event_type,
+            'recipient': self.recipient,
+            'bounce_type': self.bounce_type,
+            'reason': self.reason,
+            'url': self.url,
+            'occurred_at': self.occurred_at.isoformat(),
+        }
+
+
+class EmailSuppression(db.Model):
+    """Addresses that must not be mailed again (hard bounces, complaints, unsubscribes)."""
+
+    __tablename__ = 'email_suppressions'
+
+    email = db.Column(db.String(255), primary_key=True)
+    reason = db.Column(db.String(20), nullable=False)  # hard_bounce, complaint, unsubscribe
+    detail = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<EmailSuppression {self.email} {self.reason}>'
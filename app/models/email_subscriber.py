@@ -1,9 +1,16 @@
 """Email subscriber model for newsletter and marketing management."""
 
+import json
+
 from app import db
 from datetime import datetime
 
 
+def normalize_interest(name):
+    """Canonical form of an interest tag."""
+    return str(name).strip().lower()
+
+
 class EmailSubscriber(db.Model):
     """Email subscriber model for managing newsletter subscriptions.
     
@@ -30,8 +37,47 @@ class EmailSubscriber(db.Model):
         self.is_active = False
         self.unsubscribed_at = datetime.utcnow()
     
+    def get_interests(self):
+        """Get the subscriber's interests as a list."""
+        if not self.interests:
+            return []
+        data = json.loads(self.interests)
+        return list(data) if isinstance(data, (list, dict)) else [data]
+    
+    def set_interests(self, interests):
+        """Set interests, keeping the JSON column and the tag table in sync.
+        
+        Args:
+            interests (list): Interest names; normalized to lower case
+        """
+        names = sorted({normalize_interest(name) for name in interests if normalize_interest(name)})
+        self.interests = json.dumps(names)
+        if self.id is None:
+            db.session.add(self)
+            db.session.flush()
+        SubscriberInterest.query.filter_by(subscriber_id=self.id).delete(synchronize_session=False)
+        db.session.add_all(SubscriberInterest(subscriber_id=self.id, interest=name) for name in names)
+    
     def get_full_name(self):
         """Get subscriber's full name."""
         if self.first_name and self.last_name:
             return f'{self.first_name} {self.last_name}'
         return self.first_name or self.email
+
+
+class SubscriberInterest(db.Model):
+    """Normalized interest tags, one row per (interest, subscriber).
+    
+    The primary key leads with ``interest`` so each tag's subscriber ids
+    are one index range; segment queries combine those ranges as set
+    operations instead of parsing the ``interests`` JSON of every row.
+    """
+    
+    __tablename__ = 'subscriber_interests'
+    
+    interest = db.Column(db.String(100), primary_key=True)
+    subscriber_id = db.Column(db.Integer, db.ForeignKey('email_subscriber.id', ondelete='CASCADE'),
+                              primary_key=True, index=True)
+    
+    def __repr__(self):
+        return f'<SubscriberInterest {self.interest} {self.subscriber_id}>'
@@ -0,0 +1,46 @@
+"""Engagement time-series chunks for social posts."""
+
+from app import db
+from datetime import datetime
+
+
+class EngagementChunk(db.Model):
+    """Engagement snapshots of one post on one platform within one bucket.
+
+    ``data`` is a compressed int64 array (see
+    ``app.services.engagement_series``): row 0 holds the cumulative counts
+    before the chunk, each further row the seconds since the previous
+    point and the change of every metric. The metric columns sum those
+    changes, so ranges covering whole chunks aggregate in SQL without
+    decoding.
+
+    Raw chunks cover one day. Old chunks are downsampled in place to
+    ``hour`` resolution, then merged into one ``day`` resolution chunk per
+    month (``bucket`` is the first of the month).
+    """
+
+    __tablename__ = 'engagement_chunks'
+    __table_args__ = (
+        db.UniqueConstraint('post_key', 'platform', 'bucket', name='uq_engagement_chunks_post_bucket'),
+        db.Index('ix_engagement_chunks_platform_bucket', 'platform', 'bucket'),
+        db.Index('ix_engagement_chunks_resolution_bucket', 'resolution', 'bucket'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    post_key = db.Column(db.String(32), nullable=False)
+    platform = db.Column(db.String(20), nullable=False)
+    resolution = db.Column(db.String(8), nullable=False, default='raw')  # raw, hour, day
+    bucket = db.Column(db.DateTime, nullable=False)
+    last_at = db.Column(db.DateTime, nullable=False)
+    points = db.Column(db.Integer, nullable=False, default=0)
+    data = db.Column(db.LargeBinary, nullable=False)
+    impressions = db.Column(db.BigInteger, nullable=False, default=0)
+    likes = db.Column(db.BigInteger, nullable=False, default=0)
+    comments = db.Column(db.BigInteger, nullable=False, default=0)
+    shares = db.Column(db.BigInteger, nullable=False, default=0)
+    clicks = db.Column(db.BigInteger, nullable=False, default=0)
+    saves = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<EngagementChunk {self.post_key} {self.platform} {self.bucket:%Y-%m-%d} {self.resolution}>'
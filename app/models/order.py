@@ -11,15 +11,23 @@ class Order(db.Model):
     and customer order history.
     """
     
+    __table_args__ = (
+        db.Index('ix_order_user_created', 'user_id', 'created_at'),
+        db.Index('ix_order_status_created', 'status', 'created_at'),
+        db.Index('ix_order_updated_at', 'updated_at'),  # Watermark scans for daily aggregates
+        db.Index('ix_order_user_content', 'user_id', 'content_id'),  # Download entitlement checks
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     order_number = db.Column(db.String(50), unique=True, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    total_amount = db.Column(db.Decimal(10, 2), nullable=False)
+    content_id = db.Column(db.Integer, db.ForeignKey('contents.id'))  # Digital content bought, if any; from the intent's metadata
+    total_amount = db.Column(db.Numeric(10, 2), nullable=False)
     status = db.Column(db.String(20), default='pending')
     payment_status = db.Column(db.String(20), default='unpaid')
     shipping_address = db.Column(db.Text)
     billing_address = db.Column(db.Text)
-    stripe_payment_intent_id = db.Column(db.String(255))
+    stripe_payment_intent_id = db.Column(db.String(255), index=True)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,43 @@
+"""Materialized daily order aggregates for revenue and funnel reporting.
+
+Rows are maintained by ``app.services.order_analytics`` and bucket orders
+by the UTC day they were created.
+"""
+
+from app import db
+from datetime import datetime
+
+
+class DailyOrderAggregate(db.Model):
+    """Per-day order totals.
+
+    ``gross_revenue`` covers every order that was paid, including ones
+    refunded later; ``net_revenue`` only orders still paid.
+    """
+
+    __tablename__ = 'daily_order_aggregates'
+
+    day = db.Column(db.Date, primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    paid_count = db.Column(db.Integer, nullable=False, default=0)  # Paid and not refunded
+    refunded_count = db.Column(db.Integer, nullable=False, default=0)
+    gross_revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    refunded_amount = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    net_revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    refreshed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DailyOrderAggregate {self.day} orders={self.order_count}>'
+
+
+class DailyOrderStatusCount(db.Model):
+    """Per-day order count for each fulfilment status (the order funnel)."""
+
+    __tablename__ = 'daily_order_status_counts'
+
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailyOrderStatusCount {self.day} {self.status}={self.order_count}>'
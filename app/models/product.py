@@ -11,10 +11,14 @@ class Product(db.Model):
     metadata for the e-commerce system.
     """
     
+    __table_args__ = (
+        db.CheckConstraint('stock_quantity >= 0', name='ck_product_stock_nonnegative'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
-    price = db.Column(db.Decimal(10, 2), nullable=False)
+    price = db.Column(db.Numeric(10, 2), nullable=False)
     category = db.Column(db.String(100))
     sku = db.Column(db.String(50), unique=True)
     is_active = db.Column(db.Boolean, default=True)
@@ -30,8 +34,34 @@ class Product(db.Model):
         return self.stock_quantity > 0
     
     def reduce_stock(self, quantity):
-        """Reduce stock quantity by specified amount."""
-        if self.stock_quantity >= quantity:
-            self.stock_quantity -= quantity
-            return True
-        return False
+        """Reduce stock quantity by specified amount.
+        
+        Runs as one conditional UPDATE so concurrent checkouts cannot
+        oversell and no row lock is held across a read. The change is
+        flushed in the current transaction; the caller commits.
+        
+        Returns:
+            bool: True if enough stock was available and it was taken
+        """
+        if quantity <= 0:
+            raise ValueError('quantity must be positive')
+        table = Product.__table__
+        result = db.session.execute(
+            table.update()
+            .where(table.c.id == self.id, table.c.stock_quantity >= quantity)
+            .values(stock_quantity=table.c.stock_quantity - quantity, updated_at=datetime.utcnow())
+        )
+        if result.rowcount != 1:
+            return False
+        db.session.refresh(self, ['stock_quantity'])
+        return True
+    
+    def restock(self, quantity):
+        """Atomically add stock (returns, cancelled reservations)."""
+        table = Product.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.id == self.id)
+            .values(stock_quantity=table.c.stock_quantity + quantity, updated_at=datetime.utcnow())
+        )
+        db.session.refresh(self, ['stock_quantity'])
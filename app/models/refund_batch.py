@@ -0,0 +1,77 @@
+"""Bulk refund batch models.
+
+A batch is created in one request and worked off in the background; every
+item carries its own status and idempotency key so a crashed or restarted
+worker resumes where it stopped without refunding anything twice.
+"""
+
+from app import db
+from datetime import datetime
+
+
+class RefundBatch(db.Model):
+    """A bulk refund request and its aggregate progress."""
+
+    __tablename__ = 'refund_batches'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, completed, cancelled
+    reason = db.Column(db.String(50))  # Stripe refund reason
+    amount = db.Column(db.Integer)  # Per-payment amount in cents; None refunds in full
+    total_items = db.Column(db.Integer, nullable=False, default=0)
+    succeeded_count = db.Column(db.Integer, nullable=False, default=0)
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+    refunded_amount = db.Column(db.Integer, nullable=False, default=0)  # Cents
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+
+    items = db.relationship('RefundBatchItem', backref='batch', lazy='dynamic')
+
+    def __repr__(self):
+        return f'<RefundBatch {self.id} {self.status} {self.succeeded_count + self.failed_count}/{self.total_items}>'
+
+    def to_dict(self):
+        done = self.succeeded_count + self.failed_count
+        return {
+            'id': self.id,
+            'status': self.status,
+            'reason': self.reason,
+            'amount': self.amount,
+            'total_items': self.total_items,
+            'succeeded': self.succeeded_count,
+            'failed': self.failed_count,
+            'remaining': self.total_items - done,
+            'percent_complete': round(100.0 * done / self.total_items, 1) if self.total_items else 100.0,
+            'refunded_amount': self.refunded_amount,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+        }
+
+
+class RefundBatchItem(db.Model):
+    """One payment to refund within a batch."""
+
+    __tablename__ = 'refund_batch_items'
+    __table_args__ = (
+        db.UniqueConstraint('batch_id', 'payment_intent_id', name='uq_refund_batch_items_batch_payment'),
+        db.Index('ix_refund_batch_items_status_id', 'status', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('refund_batches.id'), nullable=False, index=True)
+    payment_intent_id = db.Column(db.String(255), nullable=False)
+    idempotency_key = db.Column(db.String(64), nullable=False, unique=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, processing, succeeded, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    refund_id = db.Column(db.String(255))
+    refunded_amount = db.Column(db.Integer)
+    last_error = db.Column(db.Text)
+    claim_token = db.Column(db.String(32), index=True)
+    claimed_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<RefundBatchItem {self.batch_id}:{self.payment_intent_id} {self.status}>'
@@ -0,0 +1,54 @@
+"""Per-step drip sequence counters and order attributions.
+
+Rows are maintained incrementally by ``app.services.sequence_metrics``
+from email delivery events and paid orders.
+"""
+
+from app import db
+from datetime import datetime
+
+
+class SequenceStepMetric(db.Model):
+    """Engagement and revenue counters for one step of a sequence.
+
+    Sends are not counted here; they live on the step's ``EmailCampaign``.
+    Unique opens and clicks are HyperLogLog sketches of the recipients
+    (see ``app.utils.hll``), so they merge across steps.
+    """
+
+    __tablename__ = 'sequence_step_metrics'
+
+    sequence_id = db.Column(db.Integer, db.ForeignKey('drip_sequences.id'), primary_key=True)
+    step_index = db.Column(db.Integer, primary_key=True)
+    delivered = db.Column(db.Integer, nullable=False, default=0)
+    bounced = db.Column(db.Integer, nullable=False, default=0)
+    complaints = db.Column(db.Integer, nullable=False, default=0)
+    unsubscribes = db.Column(db.Integer, nullable=False, default=0)
+    opens = db.Column(db.Integer, nullable=False, default=0)
+    clicks = db.Column(db.Integer, nullable=False, default=0)
+    open_sketch = db.Column(db.LargeBinary)
+    click_sketch = db.Column(db.LargeBinary)
+    conversions = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SequenceStepMetric {self.sequence_id}:{self.step_index}>'
+
+
+class SequenceAttribution(db.Model):
+    """A paid order credited to the sequence step its buyer last engaged with."""
+
+    __tablename__ = 'sequence_attributions'
+
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), primary_key=True)
+    sequence_id = db.Column(db.Integer, db.ForeignKey('drip_sequences.id'), nullable=False, index=True)
+    step_index = db.Column(db.Integer, nullable=False)
+    touch_type = db.Column(db.String(10), nullable=False)  # open, click
+    touched_at = db.Column(db.DateTime, nullable=False)
+    ordered_at = db.Column(db.DateTime, nullable=False)
+    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SequenceAttribution order={self.order_id} {self.sequence_id}:{self.step_index}>'
@@ -5,7 +5,7 @@ for global application configuration settings.
 """
 
 from sqlalchemy import Column, Integer, String, Text
-from app.database import db
+from app import db
 
 
 class Setting(db.Model):
@@ -0,0 +1,60 @@
+"""Scheduled social media post model."""
+
+import json
+
+from app import db
+from datetime import datetime
+
+
+class SocialPost(db.Model):
+    """A post to publish on one or more platforms at ``scheduled_time`` (UTC).
+
+    Rows are looked up by ``post_key``, the public id handed to callers,
+    and dispatched from the ``(status, scheduled_time)`` index.
+    """
+
+    __tablename__ = 'social_posts'
+    __table_args__ = (
+        db.Index('ix_social_posts_status_scheduled', 'status', 'scheduled_time'),
+        db.Index('ix_social_posts_published_at', 'published_at'),
+        db.Index('ix_social_posts_engagement_updated', 'engagement_updated_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    post_key = db.Column(db.String(32), unique=True, nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    platforms = db.Column(db.Text, nullable=False)  # JSON list of platform names
+    options = db.Column(db.Text)  # JSON: media, hashtags and other publish options
+    scheduled_time = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='scheduled')  # draft, scheduled, publishing, published, failed, cancelled
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    results = db.Column(db.Text)  # JSON: per-platform publish results
+    last_error = db.Column(db.Text)
+    claim_token = db.Column(db.String(32), index=True)
+    claimed_at = db.Column(db.DateTime)
+    published_at = db.Column(db.DateTime)
+    engagement = db.Column(db.Text)  # JSON: latest engagement counts per platform
+    engagement_score = db.Column(db.Float, nullable=False, default=0.0)  # Weighted total over platforms
+    engagement_updated_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SocialPost {self.post_key} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'post_id': self.post_key,
+            'content': self.content,
+            'platforms': json.loads(self.platforms),
+            'options': json.loads(self.options) if self.options else {},
+            'scheduled_time': self.scheduled_time.isoformat(),
+            'status': self.status,
+            'attempts': self.attempts,
+            'results': json.loads(self.results) if self.results else None,
+            'error': self.last_error,
+            'published_at': self.published_at.isoformat() if self.published_at else None,
+            'engagement': json.loads(self.engagement) if self.engagement else {},
+            'engagement_score': self.engagement_score,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
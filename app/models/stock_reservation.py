@@ -0,0 +1,31 @@
+"""Time-bounded stock reservations held during checkout."""
+
+from app import db
+from datetime import datetime
+
+
+class StockReservation(db.Model):
+    """Stock taken from a product and held for one checkout.
+
+    Stock is decremented when the reservation is made. Committing keeps it
+    sold; releasing it or letting it expire puts the quantity back. All
+    items of one cart share a ``token``.
+    """
+
+    __tablename__ = 'stock_reservations'
+    __table_args__ = (
+        db.Index('ix_stock_reservations_status_expires', 'status', 'expires_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(32), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='held')  # held, committed, released, expired
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'))
+    claim_token = db.Column(db.String(32), index=True)  # Set by the transition that returns stock
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StockReservation {self.token} product={self.product_id} x{self.quantity} {self.status}>'
@@ -0,0 +1,29 @@
+"""Cached daily subscription revenue snapshots."""
+
+from app import db
+from datetime import datetime
+
+
+class SubscriptionMetricSnapshot(db.Model):
+    """MRR movements and totals for one closed UTC day.
+
+    Written by ``app.services.subscription_metrics`` from the transactions
+    ledger. Monetary values are in currency units, not cents.
+    """
+
+    __tablename__ = 'subscription_metric_snapshots'
+
+    day = db.Column(db.Date, primary_key=True)
+    mrr = db.Column(db.Float, nullable=False, default=0.0)  # End of day
+    arr = db.Column(db.Float, nullable=False, default=0.0)
+    new_mrr = db.Column(db.Float, nullable=False, default=0.0)
+    expansion_mrr = db.Column(db.Float, nullable=False, default=0.0)
+    contraction_mrr = db.Column(db.Float, nullable=False, default=0.0)
+    churned_mrr = db.Column(db.Float, nullable=False, default=0.0)
+    net_new_mrr = db.Column(db.Float, nullable=False, default=0.0)
+    active_subscriptions = db.Column(db.Integer, nullable=False, default=0)
+    refunded = db.Column(db.Float, nullable=False, default=0.0)  # All refunds issued that day
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SubscriptionMetricSnapshot {self.day} mrr={self.mrr}>'
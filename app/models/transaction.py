@@ -0,0 +1,62 @@
+"""Local ledger of payment provider transactions.
+
+Rows are written from webhook events, API responses and the reconciliation
+job, so customer history is served from this table instead of the
+provider's rate-limited API.
+"""
+
+from app import db
+from datetime import datetime
+
+
+class PaymentTransaction(db.Model):
+    """One payment, refund or subscription change seen at a payment provider.
+
+    Payments and refunds are keyed by the provider's object id and updated
+    in place as their status changes. Subscription rows are keyed by the
+    event that produced them, so the table keeps the full timeline of
+    starts, plan changes and cancellations.
+    """
+
+    __tablename__ = 'transactions'
+    __table_args__ = (
+        db.UniqueConstraint('provider', 'external_id', name='uq_transactions_provider_external'),
+        db.Index('ix_transactions_customer_created', 'customer_id', 'created_at', 'id'),
+        db.Index('ix_transactions_kind_created', 'kind', 'created_at'),
+    )
+
+    KINDS = ('payment', 'refund', 'subscription')
+
+    id = db.Column(db.Integer, primary_key=True)
+    provider = db.Column(db.String(20), nullable=False, default='stripe')
+    external_id = db.Column(db.String(255), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # payment, refund, subscription
+    status = db.Column(db.String(50), nullable=False)
+    customer_id = db.Column(db.String(255))
+    subscription_id = db.Column(db.String(255), index=True)
+    payment_intent_id = db.Column(db.String(255), index=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'))
+    amount = db.Column(db.Integer, nullable=False, default=0)  # Smallest currency unit (cents)
+    currency = db.Column(db.String(3), default='usd')
+    billing_interval = db.Column(db.String(10))  # month, year (subscriptions only)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Provider timestamp
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<PaymentTransaction {self.provider}:{self.external_id} {self.kind} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'id': self.external_id,
+            'provider': self.provider,
+            'kind': self.kind,
+            'status': self.status,
+            'customer_id': self.customer_id,
+            'subscription_id': self.subscription_id,
+            'payment_intent_id': self.payment_intent_id,
+            'order_id': self.order_id,
+            'amount': self.amount,
+            'currency': self.currency,
+            'billing_interval': self.billing_interval,
+            'created': self.created_at.isoformat() if self.created_at else None,
+        }
@@ -0,0 +1,34 @@
+"""Webhook inbox model for durable, idempotent payment event processing."""
+
+from app import db
+from datetime import datetime
+
+
+class WebhookEvent(db.Model):
+    """Raw webhook event persisted on receipt and processed asynchronously.
+
+    The (provider, event_id) unique constraint makes provider retries
+    idempotent: a redelivered event is dropped at insert time.
+    """
+
+    __tablename__ = 'webhook_events'
+    __table_args__ = (
+        db.UniqueConstraint('provider', 'event_id', name='uq_webhook_events_provider_event'),
+        db.Index('ix_webhook_events_status_id', 'status', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    provider = db.Column(db.String(20), nullable=False, default='stripe')
+    event_id = db.Column(db.String(255), nullable=False)
+    event_type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # Raw JSON body as received
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, processing, processed, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    claim_token = db.Column(db.String(32), index=True)
+    claimed_at = db.Column(db.DateTime)
+    received_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<WebhookEvent {self.provider}:{self.event_id} {self.event_type}>'
@@ -0,0 +1,22 @@
+"""Leader lease model for background jobs that must run in one process only."""
+
+from app import db
+from datetime import datetime
+
+
+class WorkerLease(db.Model):
+    """Named lease held by one process until ``expires_at``.
+
+    Holders renew well before expiry; a lease that is not renewed can be
+    taken over by any other process once it expires.
+    """
+
+    __tablename__ = 'worker_leases'
+
+    name = db.Column(db.String(100), primary_key=True)
+    holder = db.Column(db.String(100), nullable=False)  # host:pid:nonce of the owning process
+    acquired_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<WorkerLease {self.name} {self.holder} until {self.expires_at}>'
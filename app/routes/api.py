@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, abort
+from flask import Blueprint, request, jsonify, abort, current_app, url_for
 from flask_login import login_required, current_user
 from datetime import datetime
 import logging
@@ -178,6 +178,126 @@ def generate_product():
             'details': str(exc)
         }), 500
 
+# ============================================================================
+# CONTENT ENDPOINTS
+# ============================================================================
+from app.models.content import Content
+from app.services.asset_store import asset_store
+from app.services.counters import content_counters
+
+@api_bp.route('/content', methods=['GET'])
+def list_content():
+    """Published content listing with keyset pagination.
+    
+    Query params: type, category, cursor (from the previous page), limit.
+    """
+    default_limit = current_app.config.get('PAGINATION_PER_PAGE', 20)
+    limit = max(1, min(request.args.get('limit', default_limit, type=int), 100))
+    try:
+        items, next_cursor = Content.list_page(
+            limit=limit,
+            after=request.args.get('cursor', type=int),
+            content_type=request.args.get('type') or None,
+            category=request.args.get('category') or None
+        )
+    except ValueError as exc:
+        return jsonify({'success': False, 'error': str(exc)}), 400
+    return jsonify({
+        'success': True,
+        'items': [item.to_dict() for item in items],
+        'next_cursor': next_cursor
+    })
+
+@api_bp.route('/content/featured', methods=['GET'])
+def featured_content():
+    """Featured content listing (cached)."""
+    items = Content.get_featured_listings()
+    return jsonify({'success': True, 'items': [item.to_dict() for item in items]})
+
+@api_bp.route('/content/hot', methods=['GET'])
+def hot_content():
+    """Hot content leaderboard served from the counter accumulator (no DB hit)."""
+    field = request.args.get('by', 'view_count')
+    limit = min(request.args.get('limit', 10, type=int), 100)
+    try:
+        leaderboard = content_counters.hot_content(limit=limit, field=field)
+    except ValueError as exc:
+        return jsonify({'success': False, 'error': str(exc)}), 400
+    return jsonify({'success': True, 'by': field, 'items': leaderboard})
+
+@api_bp.route('/content/<int:content_id>/asset', methods=['POST'])
+@login_required
+def upload_content_asset(content_id):
+    """Upload the downloadable file for a content item into the asset store (author or admin only)."""
+    content = Content.query.get_or_404(content_id)
+    if content.created_by_id != current_user.id and not current_user.is_admin:
+        return jsonify({'success': False, 'error': 'Not allowed to modify this content'}), 403
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({'success': False, 'error': 'Missing file upload'}), 400
+    try:
+        digest, size = asset_store.put(upload.stream)
+        file_format = upload.filename.rsplit('.', 1)[-1] if '.' in upload.filename else None
+        content.attach_asset(digest, size, file_format=file_format)
+    except Exception as exc:
+        logging.error(f"Asset upload failed for content {content_id}: {exc}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to store asset',
+            'details': str(exc)
+        }), 500
+    return jsonify({
+        'success': True,
+        'content_id': content.id,
+        'asset_digest': digest,
+        'file_size': size,
+        'download_url': content.download_url
+    }), 201
+
+# ============================================================================
+# REFUND BATCH ENDPOINTS
+# ============================================================================
+from app.models.refund_batch import RefundBatch
+from app.services.refunds import refund_processor
+
+@api_bp.route('/refunds/batches', methods=['POST'])
+@login_required
+def create_refund_batch():
+    """Queue a bulk refund (admin only); returns 202 immediately with a progress URL.
+    
+    JSON body: payment_intent_ids (list), amount (cents per payment, optional),
+    reason (optional Stripe refund reason).
+    """
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'error': 'Only admins can issue refunds'}), 403
+    data = request.get_json() or {}
+    payment_ids = data.get('payment_intent_ids')
+    if not isinstance(payment_ids, list):
+        return jsonify({'success': False, 'error': 'payment_intent_ids must be a list'}), 400
+    try:
+        amount = int(data['amount']) if data.get('amount') is not None else None
+        batch = refund_processor.create_batch(
+            payment_ids,
+            amount=amount,
+            reason=data.get('reason'),
+            user_id=current_user.id
+        )
+    except (TypeError, ValueError) as exc:
+        return jsonify({'success': False, 'error': str(exc)}), 400
+    status_url = url_for('api.refund_batch_status', batch_id=batch.id)
+    return jsonify({
+        'success': True,
+        'batch': batch.to_dict(),
+        'status_url': status_url
+    }), 202, {'Location': status_url}
+
+@api_bp.route('/refunds/batches/<int:batch_id>', methods=['GET'])
+@login_required
+def refund_batch_status(batch_id):
+    """Aggregate progress of a refund batch."""
+    batch = RefundBatch.query.filter_by(id=batch_id, user_id=current_user.id).first_or_404()
+    return jsonify({'success': True, 'batch': refund_processor.progress(batch)})
+
 # ============================================================================
 # ERROR HANDLERS
 # ============================================================================
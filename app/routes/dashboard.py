@@ -1,6 +1,10 @@
 # app/routes/dashboard.py
 from flask import Blueprint, render_template, request, jsonify
 from flask_login import login_required, current_user
+from datetime import datetime, timedelta
+
+from app.services.order_analytics import order_analytics
+from app.services.subscription_metrics import subscription_metrics
 
 # Create dashboard blueprint
 dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/dashboard')
@@ -25,6 +29,19 @@ def analytics_summary():
         'daily_progress': 0,
         'completion_percentage': 0
     }
+    
+    # Store revenue and order funnel from the daily order aggregates
+    days = request.args.get('days', 30, type=int)
+    end_date = datetime.utcnow().date()
+    orders = order_analytics.summary(end_date - timedelta(days=max(days, 1) - 1), end_date)
+    analytics_data['revenue'] = {
+        key: orders[key] for key in ('net_revenue', 'gross_revenue', 'refunded_amount',
+                                     'average_order_value', 'refund_rate', 'payment_conversion_rate')
+    }
+    analytics_data['order_funnel'] = orders['funnel']
+    analytics_data['daily_orders'] = orders['daily']
+    analytics_data['subscriptions'] = subscription_metrics.summary(
+        end_date - timedelta(days=max(days, 1) - 1), end_date)
     return render_template('dashboard/analytics_summary.html', analytics=analytics_data)
 
 @dashboard_bp.route('/quick-links')
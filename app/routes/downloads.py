@@ -0,0 +1,64 @@
+# app/routes/downloads.py
+import mimetypes
+
+from flask import Blueprint, abort, current_app, request, send_file
+from flask_login import current_user, login_required
+
+from app import db
+from app.models.content import Content, ContentStatus
+from app.models.order import Order
+from app.services.asset_store import asset_store
+from app.services.counters import content_counters
+
+# Create downloads blueprint
+downloads_bp = Blueprint('downloads', __name__)
+
+
+def can_download(content, user):
+    """Free/public content, its author, admins, or a user with a paid order for it."""
+    if not content.requires_purchase() or content.created_by_id == user.id or user.is_admin:
+        return True
+    paid = Order.query.filter_by(user_id=user.id, content_id=content.id, payment_status='paid')
+    return db.session.query(paid.exists()).scalar()
+
+
+@downloads_bp.route('/<slug>')
+@login_required
+def download_content(slug):
+    """Stream a content asset from the blob store.
+
+    send_file(conditional=True) handles Range, If-Range and If-None-Match,
+    and hands full-file responses to the server's wsgi.file_wrapper
+    (sendfile under gunicorn), or to the front proxy when USE_X_SENDFILE
+    is enabled. The sha256 digest is used as a strong ETag. Paid content
+    is only served to users who bought it (see ``can_download``), and
+    responses are marked private so shared caches do not keep them.
+    """
+    content = Content.query.filter_by(slug=slug, status=ContentStatus.PUBLISHED).first_or_404()
+    if not can_download(content, current_user):
+        abort(403)
+    if not content.asset_digest or not asset_store.exists(content.asset_digest):
+        abort(404)
+
+    extension = (content.file_format or '').lower()
+    download_name = f'{content.slug}.{extension}' if extension else content.slug
+    mimetype = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+
+    response = send_file(
+        asset_store.path_for(content.asset_digest),
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=download_name,
+        conditional=True,
+        etag=content.asset_digest,
+        max_age=current_app.config.get('ASSET_CACHE_MAX_AGE', 86400)
+    )
+    # Downloads are gated by login and purchase: only the browser may cache them, never a shared cache
+    response.cache_control.public = False
+    response.cache_control.private = True
+
+    # Count a download once per client fetch, not once per resumed range
+    range_header = request.headers.get('Range', '')
+    if response.status_code == 200 or (response.status_code == 206 and range_header.startswith('bytes=0-')):
+        content_counters.record_download(content.id)
+    return response
@@ -0,0 +1,46 @@
+# app/routes/webhooks.py
+import logging
+
+from flask import Blueprint, current_app, jsonify, request
+
+from app.services.email_events import delivery_tracker
+from app.services.payment_service import PaymentService
+from app.services.webhooks import WebhookValidationError
+
+# Create webhooks blueprint (CSRF-exempt; requests are authenticated by signature)
+webhooks_bp = Blueprint('webhooks', __name__)
+
+@webhooks_bp.route('/stripe', methods=['POST'])
+def stripe_webhook():
+    """Receive a Stripe event: verify, store in the inbox, acknowledge.
+
+    Processing happens in the webhook inbox worker, so this endpoint does a
+    constant amount of work per event and answers before Stripe times out.
+    Duplicate deliveries are acknowledged with 200 so Stripe stops retrying.
+    """
+    service = PaymentService(
+        webhook_secret=current_app.config.get('STRIPE_WEBHOOK_SECRET'),
+        webhook_tolerance=current_app.config.get('STRIPE_WEBHOOK_TOLERANCE', 300)
+    )
+    try:
+        result = service.process_webhook(request.get_data(), request.headers.get('Stripe-Signature', ''))
+    except WebhookValidationError as exc:
+        logging.warning(f"Rejected Stripe webhook: {exc}")
+        return jsonify({'received': False, 'error': str(exc)}), 400
+    return jsonify({'received': True, 'duplicate': result['duplicate']}), 200
+
+
+@webhooks_bp.route('/email', methods=['POST'])
+def email_webhook():
+    """Receive mail provider delivery events.
+
+    Events are verified for EMAIL_WEBHOOK_PROVIDER and queued in the webhook inbox; bounces, opens
+    and clicks are applied to messages and subscribers in batches by the
+    inbox worker.
+    """
+    try:
+        result = delivery_tracker.ingest_webhook(request.get_data(), request.headers)
+    except WebhookValidationError as exc:
+        logging.warning(f"Rejected email webhook: {exc}")
+        return jsonify({'received': False, 'error': str(exc)}), 400
+    return jsonify({'received': result['received'], 'queued': result['queued']}), 200
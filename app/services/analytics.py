@@ -115,18 +115,43 @@ class AnalyticsService:
                            end_date: datetime) -> Dict[str, float]:
         """Get revenue-related KPIs.
         
+        Order figures come from the materialized daily order aggregates and
+        subscription figures (MRR/ARR and MRR movements) from the cached
+        daily subscription snapshots, so the cost does not grow with the
+        length of the period or the history.
+        
         Args:
             start_date: Start date for revenue period
-            end_date: End date for revenue period
+            end_date: End date for revenue period (inclusive)
             
         Returns:
-            Dict containing revenue metrics (MRR, ARR, etc.)
+            Dict containing revenue metrics (MRR, ARR, net/gross revenue, AOV, refund rate, etc.)
         """
-        # TODO: Implement revenue metrics calculation
-        # - Query transaction data
-        # - Calculate revenue KPIs
-        # - Return formatted metrics
-        pass
+        from app.services.order_analytics import order_analytics
+        from app.services.subscription_metrics import subscription_metrics
+        
+        summary = order_analytics.summary(start_date, end_date)
+        subscriptions = subscription_metrics.summary(start_date, end_date)
+        return {
+            'mrr': subscriptions['mrr'],
+            'arr': subscriptions['arr'],
+            'new_mrr': subscriptions['new_mrr'],
+            'expansion_mrr': subscriptions['expansion_mrr'],
+            'contraction_mrr': subscriptions['contraction_mrr'],
+            'churned_mrr': subscriptions['churned_mrr'],
+            'net_new_mrr': subscriptions['net_new_mrr'],
+            'mrr_churn_rate': subscriptions['mrr_churn_rate'],
+            'active_subscriptions': subscriptions['active_subscriptions'],
+            'payment_refunds': subscriptions['refunded'],
+            'net_revenue': summary['net_revenue'],
+            'gross_revenue': summary['gross_revenue'],
+            'refunded_amount': summary['refunded_amount'],
+            'orders': summary['orders'],
+            'paid_orders': summary['paid_orders'],
+            'average_order_value': summary['average_order_value'],
+            'refund_rate': summary['refund_rate'],
+            'payment_conversion_rate': summary['payment_conversion_rate'],
+        }
     
     def generate_report(self, report_type: str, 
                        parameters: Dict[str, Any]) -> Dict[str, Any]:
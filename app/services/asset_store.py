@@ -0,0 +1,116 @@
+"""Content-addressed blob store for downloadable product files.
+
+Files are stored on local disk under their sha256 digest, fanned out into
+two directory levels (``ab/cd/abcd...``) to keep directories small. Writing
+the same bytes twice stores them once. Because the name is the hash, a
+stored blob never changes, so the digest doubles as a strong ETag.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import uuid
+from typing import BinaryIO, Optional, Tuple
+
+
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+CHUNK_SIZE = 1024 * 1024
+
+
+class AssetStore:
+    """Local sha256-keyed, deduplicating blob store.
+
+    Attributes:
+        root (str): Absolute directory holding the blobs
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        """Initialize the store.
+
+        Args:
+            root: Directory for blob storage; set later by init_app if omitted
+        """
+        self.root = os.path.abspath(root) if root else None
+        self.logger = logging.getLogger(__name__)
+
+    def init_app(self, app):
+        """Configure the storage directory from ASSET_STORE_FOLDER.
+
+        Args:
+            app: Flask application instance
+        """
+        self.root = os.path.abspath(app.config['ASSET_STORE_FOLDER'])
+        os.makedirs(os.path.join(self.root, 'tmp'), exist_ok=True)
+
+    def path_for(self, digest: str) -> str:
+        """Return the on-disk path for a digest.
+
+        Raises:
+            ValueError: If the digest is not a lowercase sha256 hex string
+        """
+        if not DIGEST_PATTERN.match(digest or ''):
+            raise ValueError(f'Invalid asset digest: {digest!r}')
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest: str) -> bool:
+        """Check if a blob is stored."""
+        try:
+            return os.path.isfile(self.path_for(digest))
+        except ValueError:
+            return False
+
+    def size(self, digest: str) -> int:
+        """Size of a stored blob in bytes."""
+        return os.path.getsize(self.path_for(digest))
+
+    def put(self, stream: BinaryIO) -> Tuple[str, int]:
+        """Store the contents of a binary stream.
+
+        The stream is copied in chunks to a temporary file while hashing, then
+        atomically renamed into place, so the whole file is never held in
+        memory and readers never see a partial blob.
+
+        Args:
+            stream: Readable binary file-like object
+
+        Returns:
+            tuple: (sha256 hex digest, size in bytes)
+        """
+        tmp_path = os.path.join(self.root, 'tmp', uuid.uuid4().hex)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as tmp:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+
+            digest = hasher.hexdigest()
+            final_path = self.path_for(digest)
+            if os.path.exists(final_path):
+                self.logger.info(f"Asset {digest} already stored, deduplicated")
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(tmp_path, final_path)
+            return digest, size
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def put_file(self, path: str) -> Tuple[str, int]:
+        """Store a file from the local filesystem. See put."""
+        with open(path, 'rb') as source:
+            return self.put(source)
+
+
+# Shared instance, configured in create_app()
+asset_store = AssetStore()
@@ -0,0 +1,334 @@
+"""Buffered counters for Content view and download statistics.
+
+Views and downloads are accumulated in memory (or in Redis when configured)
+and flushed to the database on an interval as aggregated atomic
+``UPDATE contents SET view_count = view_count + :n`` statements. This avoids
+a write transaction per page view and the lost updates caused by the
+read-modify-write in the ORM. The accumulator also keeps a decaying "hot
+content" score so leaderboards can be served without touching the database.
+"""
+
+import heapq
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from sqlalchemy import bindparam
+
+from app import db
+from app.utils.background import PeriodicWorker
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
+
+COUNTER_FIELDS = ('view_count', 'download_count')
+
+Deltas = Dict[str, Dict[int, int]]
+
+# KEYS: pending hash, this drain's key, index of unacknowledged drains.
+# ARGV: now, cutoff. Moves pending deltas into the drain key, adopts drains
+# whose flush never acknowledged them before the cutoff, and returns them.
+_DRAIN_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('RENAME', KEYS[1], KEYS[2])
+end
+for _, key in ipairs(redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[2])) do
+    local raw = redis.call('HGETALL', key)
+    for i = 1, #raw, 2 do
+        redis.call('HINCRBY', KEYS[2], raw[i], raw[i + 1])
+    end
+    redis.call('DEL', key)
+    redis.call('ZREM', KEYS[3], key)
+end
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    return {}
+end
+redis.call('ZADD', KEYS[3], ARGV[1], KEYS[2])
+return redis.call('HGETALL', KEYS[2])
+"""
+
+# KEYS: pending hash, drain key, drain index. Puts a drain's deltas back.
+_RESTORE_SCRIPT = """
+local raw = redis.call('HGETALL', KEYS[2])
+for i = 1, #raw, 2 do
+    redis.call('HINCRBY', KEYS[1], raw[i], raw[i + 1])
+end
+redis.call('DEL', KEYS[2])
+redis.call('ZREM', KEYS[3], KEYS[2])
+return #raw / 2
+"""
+
+
+class MemoryCounterBackend:
+    """Process-local counter accumulator.
+
+    Pending deltas are kept per field and drained atomically on flush. Hot
+    scores are kept separately and decayed on every flush so recent activity
+    dominates the leaderboard.
+    """
+
+    def __init__(self):
+        """Initialize empty pending and hot counters."""
+        self._lock = threading.Lock()
+        self._pending = {field: Counter() for field in COUNTER_FIELDS}
+        self._hot = {field: Counter() for field in COUNTER_FIELDS}
+
+    def incr(self, field: str, content_id: int, amount: int = 1):
+        """Add a delta to the pending and hot counters."""
+        with self._lock:
+            self._pending[field][content_id] += amount
+            self._hot[field][content_id] += amount
+
+    def drain(self) -> Tuple[Deltas, None]:
+        """Return and reset all pending deltas."""
+        with self._lock:
+            pending = self._pending
+            self._pending = {field: Counter() for field in COUNTER_FIELDS}
+        return {field: dict(counts) for field, counts in pending.items() if counts}, None
+
+    def ack(self, receipt: None):
+        """Nothing to release: drained deltas only live in the flushing thread."""
+
+    def restore(self, deltas: Deltas, receipt: None):
+        """Put back deltas that could not be flushed."""
+        with self._lock:
+            for field, counts in deltas.items():
+                self._pending[field].update(counts)
+
+    def decay(self, factor: float):
+        """Scale hot scores down and drop the ones that fell below one."""
+        with self._lock:
+            for field, scores in self._hot.items():
+                self._hot[field] = Counter({
+                    content_id: score * factor
+                    for content_id, score in scores.items()
+                    if score * factor >= 1
+                })
+
+    def top(self, field: str, limit: int) -> List[Tuple[int, float]]:
+        """Return the highest scoring content ids for a field."""
+        with self._lock:
+            scores = list(self._hot[field].items())
+        return heapq.nlargest(limit, scores, key=lambda item: item[1])
+
+
+class RedisCounterBackend:
+    """Redis-backed counter accumulator shared by all gunicorn workers.
+
+    Pending deltas live in one hash per field. A drain atomically renames
+    the hash to a key of its own (a Lua script), so increments that arrive
+    during a flush land in a fresh key and concurrent drains never collide.
+    The drained key is only deleted once the flush has committed; drains
+    left unacknowledged by a crashed worker are adopted by the next drain
+    after ``stale_after`` seconds. Hot scores live in sorted sets and are
+    decayed at most once per ``decay_interval`` across all workers.
+    """
+
+    def __init__(self, url: str, prefix: str = 'content_counters', decay_interval: float = 10,
+                 stale_after: float = 300):
+        """Connect to Redis.
+
+        Args:
+            url: Redis connection URL
+            prefix: Key prefix for all counter keys
+            decay_interval: Minimum seconds between hot score decays
+            stale_after: Seconds after which an unacknowledged drain is flushed again
+        """
+        if redis is None:
+            raise RuntimeError("The 'redis' package is required for the Redis counter backend")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.decay_interval = decay_interval
+        self.stale_after = stale_after
+        self._drain_script = self.client.register_script(_DRAIN_SCRIPT)
+        self._restore_script = self.client.register_script(_RESTORE_SCRIPT)
+
+    def _key(self, kind: str, field: str) -> str:
+        return f'{self.prefix}:{kind}:{field}'
+
+    def incr(self, field: str, content_id: int, amount: int = 1):
+        """Add a delta to the pending hash and hot sorted set."""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hincrby(self._key('pending', field), content_id, amount)
+        pipe.zincrby(self._key('hot', field), amount, content_id)
+        pipe.execute()
+
+    def drain(self) -> Tuple[Deltas, Dict[str, str]]:
+        """Atomically take all pending deltas.
+
+        Returns:
+            tuple: The deltas and a receipt to ``ack`` after flushing them
+                (or pass to ``restore`` if the flush failed)
+        """
+        deltas, receipt = {}, {}
+        now = time.time()
+        drain_id = uuid.uuid4().hex
+        for field in COUNTER_FIELDS:
+            draining_key = f"{self._key('draining', field)}:{drain_id}"
+            raw = self._drain_script(keys=[self._key('pending', field), draining_key, self._key('drains', field)],
+                                     args=[now, now - self.stale_after])
+            if not raw:
+                continue
+            receipt[field] = draining_key
+            pairs = zip(raw[::2], raw[1::2])
+            counts = {int(content_id): int(delta) for content_id, delta in pairs if int(delta)}
+            if counts:
+                deltas[field] = counts
+        return deltas, receipt
+
+    def ack(self, receipt: Dict[str, str]):
+        """Forget drained deltas once they are in the database."""
+        if not receipt:
+            return
+        pipe = self.client.pipeline(transaction=True)
+        for field, draining_key in receipt.items():
+            pipe.delete(draining_key)
+            pipe.zrem(self._key('drains', field), draining_key)
+        pipe.execute()
+
+    def restore(self, deltas: Deltas, receipt: Dict[str, str]):
+        """Put back deltas that could not be flushed."""
+        for field, draining_key in receipt.items():
+            self._restore_script(keys=[self._key('pending', field), draining_key, self._key('drains', field)])
+
+    def decay(self, factor: float):
+        """Scale hot scores down and drop the ones that fell below one.
+
+        Every worker calls this after its flush; a ``SET NX`` guard that
+        expires after ``decay_interval`` lets only the first one per
+        interval apply it.
+        """
+        guard = self._key('decay', 'guard')
+        if not self.client.set(guard, f'{os.getpid()}', nx=True, px=max(1, int(self.decay_interval * 1000))):
+            return
+        for field in COUNTER_FIELDS:
+            key = self._key('hot', field)
+            self.client.zunionstore(key, {key: factor})
+            self.client.zremrangebyscore(key, '-inf', '(1')
+
+    def top(self, field: str, limit: int) -> List[Tuple[int, float]]:
+        """Return the highest scoring content ids for a field."""
+        rows = self.client.zrevrange(self._key('hot', field), 0, limit - 1, withscores=True)
+        return [(int(content_id), score) for content_id, score in rows]
+
+
+class ContentCounterService:
+    """Accumulates Content view/download counts and flushes them in aggregate.
+
+    Usage:
+        content_counters.record_view(content.id)
+        content_counters.hot_content(limit=10)
+    """
+
+    def __init__(self, backend=None):
+        """Initialize the service.
+
+        Args:
+            backend: Counter backend; defaults to an in-memory accumulator
+        """
+        self.backend = backend or MemoryCounterBackend()
+        self.hot_decay = 0.9
+        self.logger = logging.getLogger(__name__)
+        self.worker = PeriodicWorker('content-counter-flush', self.flush)
+
+    def init_app(self, app):
+        """Configure the backend and flush interval from app config.
+
+        Args:
+            app: Flask application instance
+        """
+        interval = app.config.get('COUNTER_FLUSH_INTERVAL', 10)
+        backend_name = app.config.get('COUNTER_BACKEND', 'memory')
+        if backend_name == 'redis':
+            self.backend = RedisCounterBackend(app.config['REDIS_URL'], decay_interval=interval,
+                                               stale_after=max(60, interval * 30))
+        self.hot_decay = app.config.get('COUNTER_HOT_DECAY', self.hot_decay)
+        self.worker.init_app(app, interval=interval)
+
+    def record_view(self, content_id: int, amount: int = 1):
+        """Record views for a content item."""
+        self._record('view_count', content_id, amount)
+
+    def record_download(self, content_id: int, amount: int = 1):
+        """Record downloads for a content item."""
+        self._record('download_count', content_id, amount)
+
+    def _record(self, field: str, content_id: int, amount: int):
+        if content_id is None or amount <= 0:
+            return
+        self.backend.incr(field, content_id, amount)
+        self.worker.ensure_started()
+
+    def hot_content(self, limit: int = 10, field: str = 'view_count') -> List[Dict[str, float]]:
+        """Return the hottest content ids from the accumulator.
+
+        Args:
+            limit: Maximum number of entries
+            field: Counter to rank by ('view_count' or 'download_count')
+
+        Returns:
+            List of dicts with content_id and score, highest first
+        """
+        if field not in COUNTER_FIELDS:
+            raise ValueError(f'Unknown counter field: {field}')
+        return [
+            {'content_id': content_id, 'score': round(score, 2)}
+            for content_id, score in self.backend.top(field, limit)
+        ]
+
+    def flush(self) -> int:
+        """Write pending deltas to the database.
+
+        Each field is written as a single executemany of atomic increments,
+        ordered by id so concurrent flushes from several workers lock rows
+        in the same order. Deltas are put back if the write fails, and only
+        released from the backend once the write has committed.
+
+        Returns:
+            int: Number of content rows updated
+        """
+        from app.models.content import Content
+
+        deltas, receipt = self.backend.drain()
+        if not deltas:
+            self.backend.ack(receipt)
+            self.backend.decay(self.hot_decay)
+            return 0
+
+        table = Content.__table__
+        updated = 0
+        try:
+            for field, counts in deltas.items():
+                column = table.c[field]
+                stmt = (
+                    table.update()
+                    .where(table.c.id == bindparam('b_content_id'))
+                    .values({field: column + bindparam('b_delta')})
+                )
+                params = [
+                    {'b_content_id': content_id, 'b_delta': counts[content_id]}
+                    for content_id in sorted(counts)
+                ]
+                db.session.execute(stmt, params)
+                updated += len(params)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.backend.restore(deltas, receipt)
+            self.logger.error(f"Counter flush failed, deltas restored: {str(e)}")
+            return 0
+
+        self.backend.ack(receipt)
+        self.backend.decay(self.hot_decay)
+        return updated
+
+
+# Shared instance, configured in create_app()
+content_counters = ContentCounterService()
@@ -0,0 +1,384 @@
+"""Channel handlers for product deliveries.
+
+A handler delivers one claimed delivery job (a plain dict; handlers never
+touch the database) and returns a JSON-serializable result, or raises
+``DeliveryError``. Jobs carry ``tracking_id``, ``recipient``, ``attempts``,
+``product`` (id, title, asset digest, file format, download URL) and
+``download_url``, the link the recipient should use.
+
+Workers hand a handler the jobs it claimed together: ``batches`` groups them
+(by default one job per batch) and ``deliver_batch`` delivers one group,
+returning a result or a ``DeliveryError`` per job, so channels with batch
+APIs can send many deliveries in one round trip.
+"""
+
+import ftplib
+import hashlib
+import hmac
+import json
+import logging
+import smtplib
+import time
+from abc import ABC, abstractmethod
+from email.header import Header
+from email.mime.text import MIMEText
+from email.utils import formatdate, make_msgid
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+from urllib.parse import quote, unquote, urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.services.asset_store import asset_store
+from app.services.email_validation import is_valid_syntax
+
+Job = Dict[str, Any]
+Result = Union[Dict[str, Any], 'DeliveryError']
+
+CHANNELS = ('email', 'api', 'webhook', 'ftp', 'cdn', 'marketplace')
+
+
+class DeliveryError(Exception):
+    """A channel failed to deliver.
+
+    Attributes:
+        retryable (bool): Whether trying again may succeed (timeouts, 429, 5xx)
+        retry_after (float): Seconds the receiver asked us to wait, if it said
+    """
+
+    def __init__(self, message: str, retryable: bool = True, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def sign_url(base_url: str, path: str, key: str, expires: int) -> str:
+    """Build a signed URL a CDN edge can verify without calling back.
+
+    The signature is HMAC-SHA256 over ``path:expires`` with the shared key.
+    """
+    path = quote(path.lstrip('/'))
+    signature = hmac.new(key.encode('utf-8'), f'{path}:{expires}'.encode('utf-8'), hashlib.sha256).hexdigest()
+    return f"{base_url.rstrip('/')}/{path}?{urlencode({'expires': expires, 'signature': signature})}"
+
+
+def group_jobs(jobs: Iterable[Job], key: Callable[[Job], Hashable], size: int) -> List[List[Job]]:
+    """Group jobs by ``key`` into batches of at most ``size``, keeping claim order within a group."""
+    groups: Dict[Hashable, List[Job]] = {}
+    for job in jobs:
+        groups.setdefault(key(job), []).append(job)
+    size = max(1, size)
+    return [group[i:i + size] for group in groups.values() for i in range(0, len(group), size)]
+
+
+class ChannelHandler(ABC):
+    """Delivers jobs for one channel; subclasses implement :meth:`deliver`.
+
+    Attributes:
+        channel (str): Channel name
+        config (dict): Channel settings from ``configure_channel`` and app config
+    """
+
+    channel = ''
+    required = ()
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """Store and validate the channel settings.
+
+        Raises:
+            ValueError: If a required setting is missing
+        """
+        self.config = dict(config or {})
+        self.logger = logging.getLogger(__name__)
+        missing = [key for key in self.required if not self.config.get(key)]
+        if missing:
+            raise ValueError(f"Channel {self.channel} needs {', '.join(missing)}")
+
+    def validate_recipient(self, recipient: str) -> bool:
+        """Whether ``recipient`` is a usable address for this channel."""
+        return bool(recipient and recipient.strip())
+
+    @abstractmethod
+    def deliver(self, job: Job) -> Dict[str, Any]:
+        """Deliver one job (runs on a worker thread).
+
+        Raises:
+            DeliveryError: If the delivery failed
+        """
+
+    def batches(self, jobs: List[Job]) -> List[List[Job]]:
+        """Split claimed jobs into the groups ``deliver_batch`` sends together."""
+        return [[job] for job in jobs]
+
+    def deliver_batch(self, jobs: List[Job]) -> List[Result]:
+        """Deliver one group (runs on a worker thread).
+
+        Returns:
+            list: A result dict or ``DeliveryError`` per job, in order
+        """
+        results: List[Result] = []
+        for job in jobs:
+            try:
+                results.append(self.deliver(job))
+            except DeliveryError as e:
+                results.append(e)
+        return results
+
+    def close(self):
+        """Release connections held by the handler."""
+
+
+class EmailChannel(ChannelHandler):
+    """Emails the download link over the shared SMTP pool.
+
+    Recipients of the same product share one message sent in a single SMTP
+    transaction (one RCPT TO each, up to ``max_recipients``); the message is
+    addressed to ``undisclosed-recipients`` so nobody sees the others.
+    """
+
+    channel = 'email'
+    required = ('pool', 'sender')
+
+    def validate_recipient(self, recipient: str) -> bool:
+        return is_valid_syntax((recipient or '').strip())
+
+    def deliver(self, job: Job) -> Dict[str, Any]:
+        if not job.get('download_url'):
+            raise DeliveryError(f"Product {job['product']['id']} has no download link", retryable=False)
+        message = self.render(job)
+        try:
+            with self.config['pool'].connection() as conn:
+                conn.sendmail(self.config['sender'], [job['recipient']], message.as_bytes())
+        except Exception as e:
+            code = getattr(e, 'smtp_code', None)
+            raise DeliveryError(f'SMTP delivery failed: {e}', retryable=code is None or code < 500)
+        return {'message_id': message['Message-ID']}
+
+    def batches(self, jobs: List[Job]) -> List[List[Job]]:
+        return group_jobs(jobs, lambda job: (job['product'] or {}).get('id'),
+                          int(self.config.get('max_recipients', 50)))
+
+    def deliver_batch(self, jobs: List[Job]) -> List[Result]:
+        if len(jobs) == 1 or not jobs[0].get('download_url'):
+            return super().deliver_batch(jobs)
+        message = self.render(jobs[0], to='undisclosed-recipients:;')
+        recipients = [job['recipient'] for job in jobs]
+        try:
+            with self.config['pool'].connection() as conn:
+                refused = conn.sendmail(self.config['sender'], recipients, message.as_bytes())
+        except smtplib.SMTPRecipientsRefused as e:
+            refused = e.recipients
+        except Exception as e:
+            code = getattr(e, 'smtp_code', None)
+            error = DeliveryError(f'SMTP delivery failed: {e}', retryable=code is None or code < 500)
+            return [error] * len(jobs)
+        results: List[Result] = []
+        for recipient in recipients:
+            if recipient in refused:
+                code, reason = refused[recipient]
+                reason = reason.decode('utf-8', 'replace') if isinstance(reason, bytes) else reason
+                results.append(DeliveryError(f'Recipient refused: {code} {reason}', retryable=code < 500))
+            else:
+                results.append({'message_id': message['Message-ID']})
+        return results
+
+    def render(self, job: Job, to: Optional[str] = None) -> MIMEText:
+        title = job['product']['title']
+        body = self.config.get('body', 'Thank you! Download {title} here:\n\n{url}\n').format(
+            title=title, url=job['download_url'])
+        message = MIMEText(body, 'plain', 'utf-8')
+        message['From'] = self.config['sender']
+        message['To'] = to or job['recipient']
+        message['Subject'] = Header(self.config.get('subject', 'Your download: {title}').format(title=title), 'utf-8')
+        message['Message-ID'] = make_msgid(domain=self.config['sender'].rpartition('@')[2].strip('> ') or None)
+        message['Date'] = formatdate(localtime=False)
+        return message
+
+
+class WebhookChannel(ChannelHandler):
+    """POSTs a JSON delivery notice to the recipient URL over pooled keep-alive connections.
+
+    Each delivery is its own ``product.delivered`` POST unless the channel
+    is configured with a ``batch_size`` above 1. Then every POST is a
+    ``product.delivered.batch`` envelope, even for a single delivery. Its
+    ``deliveries`` list holds up to ``batch_size`` single-delivery payloads
+    claimed together for the same URL. Receivers therefore always get the
+    shape they opted into.
+    """
+
+    channel = 'webhook'
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        super().__init__(config)
+        self.timeout = float(self.config.get('timeout', 10))
+        self.batch_size = max(1, int(self.config.get('batch_size') or 1))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=int(self.config.get('pool_size', 16)))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def validate_recipient(self, recipient: str) -> bool:
+        parts = urlsplit((recipient or '').strip())
+        return parts.scheme in ('http', 'https') and bool(parts.netloc)
+
+    def headers(self, body: bytes) -> Dict[str, str]:
+        headers = {'Content-Type': 'application/json'}
+        secret = self.config.get('secret')
+        if secret:
+            timestamp = str(int(time.time()))
+            digest = hmac.new(secret.encode('utf-8'), timestamp.encode('ascii') + b'.' + body,
+                              hashlib.sha256).hexdigest()
+            headers['X-Delivery-Signature'] = f't={timestamp},v1={digest}'
+        return headers
+
+    def payload(self, job: Job) -> Dict[str, Any]:
+        return {
+            'event': 'product.delivered',
+            'delivery_id': job['tracking_id'],
+            'product': job['product'],
+            'download_url': job.get('download_url'),
+        }
+
+    def post(self, url: str, payload: Any) -> requests.Response:
+        """POST JSON and map failures onto ``DeliveryError``."""
+        body = json.dumps(payload, default=str).encode('utf-8')
+        try:
+            response = self.session.post(url, data=body, headers=self.headers(body), timeout=self.timeout)
+        except requests.RequestException as e:
+            raise DeliveryError(f'Request failed: {e}')
+        if response.status_code >= 400:
+            retryable = response.status_code == 429 or response.status_code >= 500
+            try:
+                retry_after = float(response.headers['Retry-After'])
+            except (KeyError, ValueError):
+                retry_after = None
+            raise DeliveryError(f'HTTP {response.status_code}: {response.text[:200]}', retryable=retryable,
+                                retry_after=retry_after)
+        return response
+
+    def deliver(self, job: Job) -> Dict[str, Any]:
+        response = self.post(job['recipient'], self.payload(job))
+        return {'status_code': response.status_code}
+
+    def batches(self, jobs: List[Job]) -> List[List[Job]]:
+        if self.batch_size == 1:
+            return super().batches(jobs)
+        return group_jobs(jobs, lambda job: job['recipient'], self.batch_size)
+
+    def deliver_batch(self, jobs: List[Job]) -> List[Result]:
+        if self.batch_size == 1:
+            return super().deliver_batch(jobs)
+        try:
+            response = self.post(jobs[0]['recipient'], {'event': 'product.delivered.batch',
+                                                        'deliveries': [self.payload(job) for job in jobs]})
+        except DeliveryError as e:
+            return [e] * len(jobs)
+        return [{'status_code': response.status_code, 'batch_size': len(jobs)}] * len(jobs)
+
+    def close(self):
+        self.session.close()
+
+
+class ApiChannel(WebhookChannel):
+    """Like the webhook channel, authenticated with a bearer API key."""
+
+    channel = 'api'
+    required = ('api_key',)
+
+    def headers(self, body: bytes) -> Dict[str, str]:
+        headers = super().headers(body)
+        headers['Authorization'] = f"Bearer {self.config['api_key']}"
+        return headers
+
+
+class CdnChannel(ChannelHandler):
+    """Issues an expiring signed CDN URL for the product's asset."""
+
+    channel = 'cdn'
+    required = ('base_url', 'signing_key')
+
+    def sign(self, product: Dict[str, Any], expires: Optional[int] = None) -> Optional[str]:
+        """Signed URL for a product's asset, or None if it has no stored file."""
+        if not product.get('asset_digest'):
+            return None
+        path = product['asset_digest']
+        if product.get('file_format'):
+            path = f"{path}.{product['file_format'].lower()}"
+        if expires is None:
+            expires = int(time.time()) + int(self.config.get('link_ttl', 86400))
+        return sign_url(self.config['base_url'], path, self.config['signing_key'], expires)
+
+    def sign_many(self, products: Iterable[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        """Signed URLs for many products by id, sharing one expiry."""
+        expires = int(time.time()) + int(self.config.get('link_ttl', 86400))
+        return {product['id']: self.sign(product, expires) for product in products}
+
+    def deliver(self, job: Job) -> Dict[str, Any]:
+        url = job.get('download_url') or self.sign(job['product'])
+        if not url:
+            raise DeliveryError(f"Product {job['product']['id']} has no asset to link to", retryable=False)
+        return {'url': url}
+
+    def batches(self, jobs: List[Job]) -> List[List[Job]]:
+        # Signing is local work: one batch per claim
+        return [jobs] if jobs else []
+
+
+class FtpChannel(ChannelHandler):
+    """Uploads the product file to ``ftp[s]://[user@]host[:port]/directory``.
+
+    Recipients are stored and returned with deliveries, so they must not
+    carry a password. Logins come from the channel config instead:
+    ``credentials`` maps ``host`` or ``host:port`` to ``{'username',
+    'password'}``, and ``username``/``password`` apply to other hosts. A
+    user name in the recipient URL overrides the configured one.
+    """
+
+    channel = 'ftp'
+
+    def validate_recipient(self, recipient: str) -> bool:
+        parts = urlsplit((recipient or '').strip())
+        return parts.scheme in ('ftp', 'ftps') and bool(parts.hostname) and parts.password is None
+
+    def login(self, target) -> Tuple[str, str]:
+        """``(username, password)`` for a parsed recipient URL."""
+        hosts = self.config.get('credentials') or {}
+        found = hosts.get(f'{target.hostname}:{target.port}') if target.port else None
+        found = found or hosts.get(target.hostname) or self.config
+        username = unquote(target.username) if target.username else found.get('username') or 'anonymous'
+        return username, found.get('password') or ''
+
+    def deliver(self, job: Job) -> Dict[str, Any]:
+        product = job['product']
+        digest = product.get('asset_digest')
+        if not digest:
+            raise DeliveryError(f"Product {product['id']} has no file to upload", retryable=False)
+        if not asset_store.exists(digest):
+            raise DeliveryError(f'Asset {digest} is missing from the store', retryable=False)
+
+        target = urlsplit(job['recipient'])
+        name = f"{product['id']}.{product['file_format'].lower()}" if product.get('file_format') else product['id']
+        ftp = ftplib.FTP_TLS() if target.scheme == 'ftps' else ftplib.FTP()
+        try:
+            ftp.connect(target.hostname, target.port or 21, timeout=float(self.config.get('timeout', 30)))
+            ftp.login(*self.login(target))
+            if target.scheme == 'ftps':
+                ftp.prot_p()
+            if target.path.strip('/'):
+                ftp.cwd(unquote(target.path))
+            with open(asset_store.path_for(digest), 'rb') as handle:
+                ftp.storbinary(f'STOR {name}', handle)
+        except ftplib.error_perm as e:
+            raise DeliveryError(f'FTP rejected the upload: {e}', retryable=False)
+        except (ftplib.Error, OSError) as e:
+            raise DeliveryError(f'FTP upload failed: {e}')
+        finally:
+            try:
+                ftp.quit()
+            except (ftplib.Error, OSError):
+                ftp.close()
+        return {'path': f"{target.path.rstrip('/')}/{name}"}
+
+
+CHANNEL_HANDLERS = {handler.channel: handler for handler in (EmailChannel, WebhookChannel, ApiChannel,
+                                                              CdnChannel, FtpChannel)}
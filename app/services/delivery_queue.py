@@ -0,0 +1,519 @@
+"""Durable product delivery queue.
+
+Scheduling a delivery inserts one ``deliveries`` row. Each channel has its
+own dispatcher (a ``PeriodicWorker`` started on the first request of every
+process, so a restart picks up whatever was left) that claims due rows in
+batches with ``claim_batch`` (FOR UPDATE SKIP LOCKED on PostgreSQL/MySQL,
+a conditional UPDATE on SQLite), lets the channel group the batch for its
+batch API (one multi-recipient email per product, one POST per webhook
+URL, ...), runs the groups on the channel's thread pool and writes all
+outcomes back in one executemany. A slow channel therefore
+never holds up another, and several processes can drain one channel.
+
+Claiming counts an attempt and pushes ``next_attempt_at`` out by the
+visibility timeout; if the worker dies the delivery becomes claimable
+again when it expires. Outcomes are only written by the holder of the
+claim. Retryable failures are retried with jittered exponential backoff
+(DISTRIBUTION_RETRY_DELAY doubled per attempt, capped at
+DISTRIBUTION_RETRY_MAX_DELAY, or the receiver's Retry-After), so a channel
+outage does not come back as a thundering herd. A delivery that has used up
+DISTRIBUTION_MAX_ATTEMPTS attempts, by failing or by its claims expiring, is
+dead-lettered; permanent failures are marked ``failed``. ``retry_failed``
+gives either kind a fresh round of attempts, spread out the same way.
+
+Every outcome is appended to the ``delivery_events`` table in the same
+transaction, and the latest DISTRIBUTION_HISTORY_SIZE are also kept in
+memory in a ring buffer.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import and_, bindparam, or_
+
+from app import db
+from app.models.content import Content, ContentStatus
+from app.models.delivery import Delivery, DeliveryEvent
+from app.models.product import Product
+from app.services.delivery_channels import (CHANNEL_HANDLERS, CHANNELS, ChannelHandler, DeliveryError,
+                                            Job)
+from app.services.email_delivery import campaign_sender
+from app.utils.background import PeriodicWorker
+from app.utils.rate_limit import parse_rates
+from app.utils.sql import claim_batch
+
+
+class DeliveryQueue:
+    """Queues product deliveries and drains them with per-channel worker pools."""
+
+    def __init__(self):
+        """Initialize with default limits; ``init_app`` applies configuration."""
+        self.batch_size = 200
+        self.visibility_timeout = 300
+        self.retry_delay = 60
+        self.retry_max_delay = 3600
+        self.max_attempts = 5
+        self.default_workers = 4
+        self.workers: Dict[str, int] = {}
+        self.handlers: Dict[str, ChannelHandler] = {}
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=1000)
+        self.logger = logging.getLogger(__name__)
+        self._defaults: Dict[str, Dict[str, Any]] = {}
+        self._dispatchers = {
+            channel: PeriodicWorker(f'delivery-{channel}', lambda channel=channel: self.process_channel(channel),
+                                    interval=2)
+            for channel in CHANNELS
+        }
+        self._pools: Dict[str, ThreadPoolExecutor] = {}
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Configure limits, the built-in channel handlers and the dispatchers.
+
+        Args:
+            app: Flask application instance
+        """
+        config = app.config
+        self.batch_size = config.get('DISTRIBUTION_BATCH_SIZE', self.batch_size)
+        self.visibility_timeout = config.get('DISTRIBUTION_VISIBILITY_TIMEOUT', self.visibility_timeout)
+        self.retry_delay = config.get('DISTRIBUTION_RETRY_DELAY', self.retry_delay)
+        self.retry_max_delay = config.get('DISTRIBUTION_RETRY_MAX_DELAY', self.retry_max_delay)
+        self.history = deque(self.history, maxlen=config.get('DISTRIBUTION_HISTORY_SIZE', self.history.maxlen))
+        self.max_attempts = config.get('DISTRIBUTION_MAX_ATTEMPTS', self.max_attempts)
+        self.default_workers = config.get('DISTRIBUTION_DEFAULT_WORKERS', self.default_workers)
+        self.workers = {channel: int(count) for channel, count in
+                        parse_rates(config.get('DISTRIBUTION_WORKERS')).items()}
+
+        self._defaults = {
+            'email': {'pool': campaign_sender.pool, 'sender': campaign_sender.sender,
+                      'max_recipients': config.get('DISTRIBUTION_EMAIL_RECIPIENTS', 50)},
+            'webhook': {'timeout': config.get('DISTRIBUTION_WEBHOOK_TIMEOUT', 10),
+                        'batch_size': config.get('DISTRIBUTION_WEBHOOK_BATCH', 1),
+                        'pool_size': self.pool_size('webhook')},
+            'api': {'timeout': config.get('DISTRIBUTION_WEBHOOK_TIMEOUT', 10),
+                    'batch_size': config.get('DISTRIBUTION_WEBHOOK_BATCH', 1), 'pool_size': self.pool_size('api')},
+            'cdn': {'base_url': config.get('DISTRIBUTION_CDN_BASE_URL'),
+                    'signing_key': config.get('DISTRIBUTION_SIGNING_KEY') or config.get('SECRET_KEY'),
+                    'link_ttl': config.get('DISTRIBUTION_LINK_TTL', 86400)},
+            'ftp': {},
+        }
+        for channel in ('email', 'webhook', 'ftp', 'cdn'):
+            try:
+                self.configure(channel, {})
+            except ValueError as e:
+                self.logger.info(f'Delivery channel {channel} not available: {e}')
+
+        for dispatcher in self._dispatchers.values():
+            dispatcher.init_app(app, interval=config.get('DISTRIBUTION_POLL_INTERVAL', 2), autostart=True)
+
+    def pool_size(self, channel: str) -> int:
+        """Concurrent deliveries per process for a channel."""
+        return self.workers.get(channel, self.default_workers)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Seconds to wait after failed attempt ``attempt`` (full jitter)."""
+        if retry_after is not None:
+            return min(retry_after, self.retry_max_delay)
+        return random.uniform(0, min(self.retry_max_delay, self.retry_delay * 2 ** (attempt - 1)))
+
+    # Channels -----------------------------------------------------------------
+
+    def configure(self, channel: str, settings: Dict[str, Any]) -> ChannelHandler:
+        """Create the channel's built-in handler from ``settings`` over the app defaults.
+
+        Raises:
+            ValueError: For unknown channels or missing settings
+        """
+        handler_class = CHANNEL_HANDLERS.get(channel)
+        if handler_class is None:
+            raise ValueError(f"Channel {channel} has no built-in handler; register one instead")
+        return self.register(handler_class(dict(self._defaults.get(channel, {}), **settings)))
+
+    def register(self, handler: ChannelHandler) -> ChannelHandler:
+        """Use ``handler`` for its channel, replacing any previous one."""
+        if handler.channel not in CHANNELS:
+            raise ValueError(f"Unknown delivery channel: {handler.channel}")
+        previous = self.handlers.get(handler.channel)
+        self.handlers[handler.channel] = handler
+        if previous is not None and previous is not handler:
+            previous.close()
+        return handler
+
+    def _pool(self, channel: str) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool_pid != os.getpid():
+                # Executor threads do not survive a fork
+                self._pools = {}
+                self._pool_pid = os.getpid()
+            pool = self._pools.get(channel)
+            if pool is None:
+                pool = self._pools[channel] = ThreadPoolExecutor(max_workers=self.pool_size(channel),
+                                                                 thread_name_prefix=f'delivery-{channel}')
+            return pool
+
+    # Queueing -----------------------------------------------------------------
+
+    def products(self, product_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Resolve product ids (published content slugs, else product SKUs) to delivery snapshots."""
+        wanted = set(product_ids)
+        found = {}
+        for content in Content.query.filter(Content.slug.in_(wanted), Content.status == ContentStatus.PUBLISHED):
+            found[content.slug] = {'id': content.slug, 'title': content.title, 'asset_digest': content.asset_digest,
+                                   'file_format': content.file_format, 'download_url': content.download_url}
+        missing = wanted - set(found)
+        if missing:
+            for product in Product.query.filter(Product.sku.in_(missing), Product.is_active.is_(True)):
+                found[product.sku] = {'id': product.sku, 'title': product.name, 'asset_digest': None,
+                                      'file_format': None, 'download_url': None}
+        return found
+
+    def enqueue(self, product_id: str, recipient: str, channel: str,
+                deliver_at: Optional[datetime] = None) -> str:
+        """Queue one delivery.
+
+        Args:
+            deliver_at: When to deliver (naive UTC); None for now
+
+        Returns:
+            str: Tracking id
+
+        Raises:
+            ValueError: For an unknown product, unconfigured channel or invalid recipient
+        """
+        handler = self.handlers.get(channel)
+        if handler is None:
+            raise ValueError(f"Delivery channel {channel} is not configured")
+        recipient = (recipient or '').strip()
+        if not handler.validate_recipient(recipient):
+            raise ValueError(f"Invalid {channel} recipient: {recipient!r}")
+        if product_id not in self.products([product_id]):
+            raise ValueError(f"Unknown product: {product_id}")
+
+        now = datetime.utcnow()
+        delivery = Delivery(tracking_id=uuid.uuid4().hex, product_id=product_id, recipient=recipient,
+                            channel=channel, status='pending', attempts=0, next_attempt_at=deliver_at or now)
+        db.session.add(delivery)
+        db.session.commit()
+        if delivery.next_attempt_at <= now:
+            self.wake(channel)
+        return delivery.tracking_id
+
+    def enqueue_many(self, product_id: str, recipients: Iterable[str], channel: str,
+                     deliver_at: Optional[datetime] = None) -> Iterator[str]:
+        """Queue one product for many recipients with a single batched INSERT.
+
+        Recipients are validated up front, so either every delivery is
+        queued or none is; duplicates are queued once. Workers claim the rows
+        in batches and the channel groups them for its batch API.
+
+        Args:
+            deliver_at: When to deliver (naive UTC); None for now
+
+        Returns:
+            Iterator[str]: Tracking ids, in recipient order
+
+        Raises:
+            ValueError: For an unknown product, unconfigured channel or invalid recipients
+        """
+        handler = self.handlers.get(channel)
+        if handler is None:
+            raise ValueError(f"Delivery channel {channel} is not configured")
+        unique = list(dict.fromkeys((recipient or '').strip() for recipient in recipients))
+        invalid = [recipient for recipient in unique if not handler.validate_recipient(recipient)]
+        if invalid:
+            shown = ', '.join(repr(recipient) for recipient in invalid[:5])
+            more = f' and {len(invalid) - 5} more' if len(invalid) > 5 else ''
+            raise ValueError(f"Invalid {channel} recipients: {shown}{more}")
+        if product_id not in self.products([product_id]):
+            raise ValueError(f"Unknown product: {product_id}")
+        if not unique:
+            return iter(())
+
+        now = datetime.utcnow()
+        rows = [{'tracking_id': uuid.uuid4().hex, 'product_id': product_id, 'recipient': recipient,
+                 'channel': channel, 'status': 'pending', 'attempts': 0, 'next_attempt_at': deliver_at or now,
+                 'created_at': now, 'updated_at': now} for recipient in unique]
+        db.session.execute(Delivery.__table__.insert(), rows)
+        db.session.commit()
+        if (deliver_at or now) <= now:
+            self.wake(channel)
+        return (row['tracking_id'] for row in rows)
+
+    def wake(self, channel: str):
+        """Start the channel's dispatcher in this process if needed and run it now."""
+        dispatcher = self._dispatchers[channel]
+        dispatcher.ensure_started()
+        dispatcher.wake()
+
+    def get(self, tracking_id: str) -> Optional[Dict[str, Any]]:
+        delivery = Delivery.query.filter_by(tracking_id=tracking_id).first()
+        return delivery.to_dict() if delivery else None
+
+    def cancel(self, tracking_id: str) -> bool:
+        """Cancel a delivery that no worker has claimed yet."""
+        table = Delivery.__table__
+        result = db.session.execute(table.update().where(
+            table.c.tracking_id == tracking_id, table.c.status == 'pending'
+        ).values(status='cancelled', updated_at=datetime.utcnow()))
+        db.session.commit()
+        return result.rowcount == 1
+
+    def dead_letters(self, channel: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Dead-lettered deliveries, most recent first."""
+        query = Delivery.query.filter(Delivery.status == 'dead_letter')
+        if channel:
+            query = query.filter(Delivery.channel == channel)
+        return [delivery.to_dict() for delivery in query.order_by(Delivery.updated_at.desc()).limit(limit)]
+
+    def requeue_dead_letters(self, tracking_ids: Optional[List[str]] = None,
+                             channel: Optional[str] = None) -> int:
+        """Give dead-lettered deliveries a fresh set of attempts, due now.
+
+        Returns:
+            int: Number of deliveries requeued
+        """
+        conditions = [Delivery.status == 'dead_letter']
+        if tracking_ids is not None:
+            conditions.append(Delivery.tracking_id.in_(tracking_ids))
+        if channel:
+            conditions.append(Delivery.channel == channel)
+        return len(self._requeue(and_(*conditions), spread=False))
+
+    def retry_failed(self, max_retries: int = 3, channel: Optional[str] = None) -> List[str]:
+        """Give failed and dead-lettered deliveries a fresh round of attempts.
+
+        Each delivery gets at most ``max_retries`` extra rounds. Requeued
+        deliveries become due after a jittered backoff on the round number,
+        so the dispatchers pick them up gradually rather than all at once.
+
+        Returns:
+            list: Tracking ids requeued
+        """
+        conditions = [Delivery.status.in_(('failed', 'dead_letter')), Delivery.retries < max_retries]
+        if channel:
+            conditions.append(Delivery.channel == channel)
+        return self._requeue(and_(*conditions), spread=True)
+
+    def _requeue(self, condition, spread: bool) -> List[str]:
+        rows = db.session.query(Delivery.id, Delivery.tracking_id, Delivery.channel, Delivery.retries,
+                                Delivery.status).filter(condition).order_by(Delivery.id).all()
+        if not rows:
+            return []
+        now = datetime.utcnow()
+        params = [{
+            'b_id': row.id,
+            'b_status': row.status,
+            'b_next_attempt_at': now + timedelta(seconds=self.backoff(row.retries + 1)) if spread else now,
+        } for row in rows]
+        table = Delivery.__table__
+        db.session.execute(
+            table.update().where(table.c.id == bindparam('b_id'), table.c.status == bindparam('b_status'))
+            .values(status='pending', attempts=0, retries=table.c.retries + 1, claim_token=None,
+                    next_attempt_at=bindparam('b_next_attempt_at'), last_error=None, updated_at=now),
+            params)
+        self._log([{'tracking_id': row.tracking_id, 'channel': row.channel, 'status': 'requeued', 'attempt': 0,
+                    'error': None, 'next_attempt_at': param['b_next_attempt_at']}
+                   for row, param in zip(rows, params)])
+        db.session.commit()
+        for name in {row.channel for row in rows}:
+            self.wake(name)
+        return [row.tracking_id for row in rows]
+
+    def events(self, tracking_id: str) -> List[Dict[str, Any]]:
+        """A delivery's full history from the event table, oldest first."""
+        query = DeliveryEvent.query.filter_by(tracking_id=tracking_id)
+        return [event.to_dict() for event in query.order_by(DeliveryEvent.created_at, DeliveryEvent.id)]
+
+    def _log(self, events: List[Dict[str, Any]]):
+        """Append events to the history table (in the caller's transaction) and the ring buffer."""
+        if not events:
+            return
+        now = datetime.utcnow()
+        for event in events:
+            event['created_at'] = now
+        db.session.execute(DeliveryEvent.__table__.insert(), events)
+        self.history.extend(events)
+
+    # Delivery -----------------------------------------------------------------
+
+    def process_pending(self) -> List[str]:
+        """Drain every configured channel once; returns delivered tracking ids."""
+        delivered = []
+        for channel in list(self.handlers):
+            delivered.extend(self.process_channel(channel))
+        return delivered
+
+    def process_channel(self, channel: str) -> List[str]:
+        """Deliver a channel's due deliveries batch by batch until none are due.
+
+        Returns:
+            list: Tracking ids delivered
+        """
+        handler = self.handlers.get(channel)
+        if handler is None:
+            return []
+        self._dead_letter_expired(channel)
+        delivered = []
+        while True:
+            items = self._claim(self._claimable(channel))
+            if not items:
+                break
+            outcomes = self._run(handler, items)
+            self._record(outcomes)
+            delivered.extend(o['tracking_id'] for o in outcomes if o['status'] == 'delivered')
+            if len(items) < self.batch_size:
+                break
+        return delivered
+
+    def deliver_now(self, tracking_id: str) -> Optional[str]:
+        """Deliver one delivery on the calling thread if it is claimable.
+
+        Returns:
+            str: The delivery's status afterwards, or None if it does not exist
+        """
+        delivery = Delivery.query.filter_by(tracking_id=tracking_id).first()
+        if delivery is None:
+            return None
+        handler = self.handlers.get(delivery.channel)
+        if handler is not None:
+            claimable = and_(Delivery.tracking_id == tracking_id, self._claimable(delivery.channel, due_only=False))
+            items = self._claim(claimable)
+            if items:
+                outcome = self._run(handler, items)[0]
+                self._record([outcome])
+                return outcome['status']
+        db.session.refresh(delivery)
+        return delivery.status
+
+    def _claimable(self, channel: str, due_only: bool = True):
+        now = datetime.utcnow()
+        pending = Delivery.status == 'pending'
+        if due_only:
+            pending = and_(pending, Delivery.next_attempt_at <= now)
+        return and_(Delivery.channel == channel, or_(
+            pending,
+            # Claim expired: the worker died or overran the visibility timeout
+            and_(Delivery.status == 'processing', Delivery.next_attempt_at <= now,
+                 Delivery.attempts < self.max_attempts),
+        ))
+
+    def _claim(self, claimable) -> List[Delivery]:
+        table = Delivery.__table__
+        return claim_batch(Delivery, claimable, Delivery.next_attempt_at, self.batch_size, {
+            'status': 'processing',
+            'attempts': table.c.attempts + 1,
+            'next_attempt_at': datetime.utcnow() + timedelta(seconds=self.visibility_timeout),
+        })
+
+    def _dead_letter_expired(self, channel: str) -> int:
+        """Dead-letter deliveries whose last allowed attempt never reported back."""
+        now = datetime.utcnow()
+        expired = db.session.query(Delivery.id, Delivery.tracking_id, Delivery.attempts).filter(
+            Delivery.channel == channel, Delivery.status == 'processing', Delivery.next_attempt_at <= now,
+            Delivery.attempts >= self.max_attempts,
+        ).all()
+        if not expired:
+            return 0
+        error = f'Visibility timeout expired on attempt {self.max_attempts}'
+        table = Delivery.__table__
+        result = db.session.execute(table.update().where(
+            table.c.id.in_([row.id for row in expired]), table.c.status == 'processing',
+            table.c.next_attempt_at <= now,
+        ).values(status='dead_letter', claim_token=None, updated_at=now, last_error=error))
+        self._log([{'tracking_id': row.tracking_id, 'channel': channel, 'status': 'dead_letter',
+                    'attempt': row.attempts, 'error': error, 'next_attempt_at': None} for row in expired])
+        db.session.commit()
+        self.logger.warning(f'Dead-lettered {result.rowcount} expired {channel} deliveries')
+        return result.rowcount
+
+    def _jobs(self, items: List[Delivery]) -> List[Job]:
+        products = self.products({item.product_id for item in items})
+        cdn = self.handlers.get('cdn')
+        signed = cdn.sign_many(products.values()) if cdn is not None else {}
+        jobs = []
+        for item in items:
+            product = products.get(item.product_id)
+            download_url = None
+            if product is not None:
+                download_url = signed.get(product['id']) or product['download_url']
+            jobs.append({'id': item.id, 'tracking_id': item.tracking_id, 'claim_token': item.claim_token,
+                         'channel': item.channel,
+                         'recipient': item.recipient, 'attempts': item.attempts, 'product': product,
+                         'download_url': download_url})
+        return jobs
+
+    def _run(self, handler: ChannelHandler, items: List[Delivery]) -> List[Dict[str, Any]]:
+        jobs = self._jobs(items)
+        outcomes = [self._outcome(job, DeliveryError('Product no longer exists', retryable=False))
+                    for job in jobs if job['product'] is None]
+        batches = handler.batches([job for job in jobs if job['product'] is not None])
+        for batch_outcomes in self._pool(handler.channel).map(lambda batch: self._execute(handler, batch), batches):
+            outcomes.extend(batch_outcomes)
+        return outcomes
+
+    def _execute(self, handler: ChannelHandler, jobs: List[Job]) -> List[Dict[str, Any]]:
+        """Deliver one batch and turn the results into outcomes (runs on a pool thread)."""
+        try:
+            results = handler.deliver_batch(jobs)
+        except Exception as e:
+            self.logger.exception(f"{handler.channel} batch of {len(jobs)} deliveries raised")
+            results = [DeliveryError(f'{type(e).__name__}: {e}')] * len(jobs)
+        return [self._outcome(job, result) for job, result in zip(jobs, results)]
+
+    def _outcome(self, job: Job, result) -> Dict[str, Any]:
+        outcome = {'id': job['id'], 'tracking_id': job['tracking_id'], 'claim_token': job['claim_token'],
+                   'channel': job['channel'], 'attempts': job['attempts'], 'result': None, 'error': None, 'next_attempt_at': None}
+        if not isinstance(result, DeliveryError):
+            outcome['result'] = result
+            outcome['status'] = 'delivered'
+            return outcome
+        outcome['error'] = str(result)[:1000]
+        if not result.retryable:
+            outcome['status'] = 'failed'
+        elif job['attempts'] >= self.max_attempts:
+            outcome['status'] = 'dead_letter'
+        else:
+            outcome['status'] = 'pending'
+            outcome['next_attempt_at'] = datetime.utcnow() + timedelta(
+                seconds=self.backoff(job['attempts'], result.retry_after))
+        return outcome
+
+    def _record(self, outcomes: List[Dict[str, Any]]):
+        """Write outcomes in one statement and log them; claims taken over by another worker are left alone."""
+        if not outcomes:
+            return
+        now = datetime.utcnow()
+        table = Delivery.__table__
+        db.session.execute(
+            table.update().where(table.c.id == bindparam('b_id'), table.c.claim_token == bindparam('b_token'))
+            .values(status=bindparam('b_status'), last_error=bindparam('b_error'), result=bindparam('b_result'),
+                    next_attempt_at=bindparam('b_next_attempt_at'), delivered_at=bindparam('b_delivered_at'),
+                    claim_token=None, updated_at=now),
+            [{
+                'b_id': o['id'],
+                'b_token': o['claim_token'],
+                'b_status': o['status'],
+                'b_error': o['error'],
+                'b_result': json.dumps(o['result'], default=str) if o['result'] is not None else None,
+                'b_next_attempt_at': o['next_attempt_at'] or now,
+                'b_delivered_at': now if o['status'] == 'delivered' else None,
+            } for o in outcomes]
+        )
+        # Every attempt is history, including one whose claim another worker has since taken over
+        self._log([{'tracking_id': o['tracking_id'], 'channel': o['channel'], 'status': o['status'],
+                    'attempt': o['attempts'], 'error': o['error'], 'next_attempt_at': o['next_attempt_at']}
+                   for o in outcomes])
+        db.session.commit()
+
+
+# Shared instance, configured in create_app()
+delivery_queue = DeliveryQueue()
@@ -0,0 +1,351 @@
+"""Persistent drip sequence scheduler.
+
+Every enrollment has exactly one pending row in ``drip_scheduled_steps``:
+its next step and when it is due. The scheduler keeps the steps due in the
+next few minutes in an in-memory heap ordered by ``scheduled_at``, refilled
+from the ``(status, scheduled_at)`` index with keyset pagination, so each
+tick only touches rows that are about to fire no matter how many millions
+are pending further out.
+
+Due steps are popped in batches, claimed with a conditional UPDATE (safe
+with several workers), handed to the campaign sender as one campaign per
+sequence step, and replaced by the enrollment's following step.
+
+Stopping a sequence is a single-row status change. Its pending steps are
+not touched; they are cancelled when they come due.
+"""
+
+import heapq
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import and_, or_
+
+from app import db
+from app.models.drip import DripScheduledStep, DripSequence
+from app.utils.background import PeriodicWorker
+from app.utils.sql import insert_ignore
+
+
+Recipient = Union[str, Dict[str, Any]]
+
+STEP_CAMPAIGN_KEY = re.compile(r'^(?P<sequence>.+):step(?P<step>\d+)$')
+
+
+def step_delay(step: Dict[str, Any]) -> timedelta:
+    """Delay of a step relative to the previous one (or to enrollment)."""
+    return timedelta(seconds=step.get('delay_seconds', 0), minutes=step.get('delay_minutes', 0),
+                     hours=step.get('delay_hours', 0), days=step.get('delay_days', 0))
+
+
+def step_campaign_key(sequence_key: str, step_index: int) -> str:
+    """Key of the campaign that carries one step of a sequence."""
+    return f'{sequence_key}:step{step_index}'
+
+
+def parse_step_campaign_key(campaign_key: str) -> Optional[Tuple[str, int]]:
+    """Inverse of :func:`step_campaign_key`; None for other campaigns."""
+    match = STEP_CAMPAIGN_KEY.match(campaign_key or '')
+    if match is None:
+        return None
+    return match.group('sequence'), int(match.group('step'))
+
+
+class DripScheduler:
+    """Time-ordered scheduler for drip and upsell sequence steps."""
+
+    def __init__(self):
+        """Initialize an empty heap with default limits."""
+        self.batch_size = 1000
+        self.horizon = 300
+        self.max_loaded = 50000
+        self.claim_timeout = 600
+        self.resync_interval = 300
+        self.logger = logging.getLogger(__name__)
+        self.worker = PeriodicWorker('drip-scheduler', self.run_due, interval=5)
+        self._heap: List[Tuple[datetime, int]] = []  # (scheduled_at, step id)
+        self._loaded = set()  # Step ids currently in the heap
+        self._loaded_until: Optional[Tuple[datetime, int]] = None  # Keyset position of the last row loaded
+        self._last_resync = 0.0
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        """Configure batch size, look-ahead horizon and polling from app config.
+
+        Args:
+            app: Flask application instance
+        """
+        self.batch_size = app.config.get('DRIP_BATCH_SIZE', self.batch_size)
+        self.horizon = app.config.get('DRIP_HORIZON_SECONDS', self.horizon)
+        self.max_loaded = app.config.get('DRIP_MAX_LOADED', self.max_loaded)
+        self.worker.init_app(app, interval=app.config.get('DRIP_POLL_INTERVAL', 5), autostart=True)
+
+    # Sequences and enrollment -------------------------------------------------
+
+    def define_sequence(self, sequence_key: str, steps: List[Dict[str, Any]], kind: str = 'drip') -> DripSequence:
+        """Get or create a sequence.
+
+        An existing sequence is returned as stored: its steps cannot be
+        changed, and a stopped sequence cannot take new enrollments (its
+        steps would be cancelled as they come due).
+
+        Args:
+            sequence_key: Caller's identifier for the sequence
+            steps: Step definitions: ``delay_seconds``/``delay_minutes``/
+                ``delay_hours``/``delay_days``, ``subject``, ``html_template``
+                and/or ``text_template``; other keys are template variables.
+                May be empty for an existing sequence.
+            kind: drip or upsell
+
+        Raises:
+            ValueError: If a new sequence has no steps or a step lacks a subject,
+                the sequence is stopped, or ``steps`` differ from the stored ones
+        """
+        sequence = DripSequence.query.filter_by(sequence_key=sequence_key).first()
+        if sequence is not None:
+            if sequence.status != 'active':
+                raise ValueError(f"Sequence {sequence_key} is {sequence.status}; start a new one instead")
+            if steps and json.dumps(steps, sort_keys=True, default=str) != \
+                    json.dumps(json.loads(sequence.steps), sort_keys=True, default=str):
+                raise ValueError(f"Sequence {sequence_key} already exists with different steps")
+            return sequence
+        if not steps:
+            raise ValueError('A sequence needs at least one step')
+        for index, step in enumerate(steps):
+            if not step.get('subject') or not (step.get('html_template') or step.get('text_template')):
+                raise ValueError(f'Step {index} needs a subject and a template')
+        sequence = DripSequence(sequence_key=sequence_key, kind=kind, steps=json.dumps(steps))
+        db.session.add(sequence)
+        db.session.commit()
+        return sequence
+
+    def enroll(self, sequence: DripSequence, recipients: Iterable[Recipient],
+               start_at: Optional[datetime] = None, chunk_size: int = 1000) -> int:
+        """Schedule the first step of a sequence for each recipient.
+
+        Recipients already enrolled are skipped.
+
+        Returns:
+            int: Number of new enrollments
+        """
+        steps = json.loads(sequence.steps)
+        first_due = (start_at or datetime.utcnow()) + step_delay(steps[0])
+        enrolled = 0
+        chunk = []
+        for recipient in recipients:
+            if isinstance(recipient, dict):
+                email = recipient.get('email')
+                extra = {key: value for key, value in recipient.items() if key != 'email'}
+            else:
+                email, extra = recipient, {}
+            if not email:
+                continue
+            chunk.append({
+                'sequence_id': sequence.id,
+                'recipient': email.strip(),
+                'context': json.dumps(extra, default=str) if extra else None,
+                'step_index': 0,
+                'scheduled_at': first_due,
+                'status': 'pending',
+                'created_at': datetime.utcnow(),
+            })
+            if len(chunk) >= chunk_size:
+                enrolled += insert_ignore(DripScheduledStep, chunk, ['sequence_id', 'recipient', 'step_index'])
+                db.session.commit()
+                chunk = []
+        if chunk:
+            enrolled += insert_ignore(DripScheduledStep, chunk, ['sequence_id', 'recipient', 'step_index'])
+            db.session.commit()
+        if enrolled:
+            self._scheduled(first_due)
+        return enrolled
+
+    def stop(self, sequence_key: str) -> bool:
+        """Stop a sequence in O(1): one indexed status update.
+
+        Returns:
+            bool: True if an active sequence was stopped
+        """
+        table = DripSequence.__table__
+        result = db.session.execute(
+            table.update().where(table.c.sequence_key == sequence_key, table.c.status == 'active')
+            .values(status='stopped', stopped_at=datetime.utcnow())
+        )
+        db.session.commit()
+        return bool(result.rowcount)
+
+    # Heap maintenance ---------------------------------------------------------
+
+    def _scheduled(self, due: datetime):
+        """Make sure steps just scheduled at ``due`` are picked up by the heap."""
+        with self._lock:
+            if self._loaded_until is not None and due <= self._loaded_until[0]:
+                # Rewind the watermark; rows already in the heap are skipped on reload
+                self._loaded_until = (due - timedelta(microseconds=1), 0)
+
+    def _refill(self, now: datetime):
+        """Load pending steps due before ``now + horizon`` that are not yet in the heap."""
+        with self._lock:
+            if time.monotonic() - self._last_resync > self.resync_interval:
+                # Pick up steps scheduled by other processes and reclaim abandoned claims
+                self._release_stale(now)
+                self._loaded_until = None
+                self._last_resync = time.monotonic()
+            room = self.max_loaded - len(self._heap)
+            if room <= 0:
+                return
+            horizon_end = now + timedelta(seconds=self.horizon)
+            query = db.session.query(DripScheduledStep.id, DripScheduledStep.scheduled_at) \
+                .filter(DripScheduledStep.status == 'pending', DripScheduledStep.scheduled_at <= horizon_end)
+            if self._loaded_until is not None:
+                after_at, after_id = self._loaded_until
+                query = query.filter(or_(DripScheduledStep.scheduled_at > after_at,
+                                         and_(DripScheduledStep.scheduled_at == after_at,
+                                              DripScheduledStep.id > after_id)))
+            rows = query.order_by(DripScheduledStep.scheduled_at, DripScheduledStep.id).limit(room).all()
+            for step_id, scheduled_at in rows:
+                if step_id not in self._loaded:
+                    self._loaded.add(step_id)
+                    heapq.heappush(self._heap, (scheduled_at, step_id))
+            if len(rows) == room:
+                self._loaded_until = (rows[-1].scheduled_at, rows[-1].id)
+            else:
+                self._loaded_until = (horizon_end, 0)
+
+    def _release_stale(self, now: datetime):
+        table = DripScheduledStep.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.status == 'processing',
+                   table.c.claimed_at < now - timedelta(seconds=self.claim_timeout))
+            .values(status='pending', claim_token=None)
+        )
+        db.session.commit()
+
+    def _pop_due(self, now: datetime) -> List[int]:
+        """Pop up to ``batch_size`` due step ids."""
+        ids = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(ids) < self.batch_size:
+                _, step_id = heapq.heappop(self._heap)
+                self._loaded.discard(step_id)
+                ids.append(step_id)
+        return ids
+
+    # Processing ---------------------------------------------------------------
+
+    def run_due(self) -> int:
+        """Send every due step, a batch at a time.
+
+        Returns:
+            int: Number of steps handed to the campaign sender
+        """
+        sent = 0
+        now = datetime.utcnow()
+        self._refill(now)
+        while True:
+            ids = self._pop_due(now)
+            if not ids:
+                break
+            sent += self._process(ids, now)
+            if not self._heap:
+                self._refill(now)
+        return sent
+
+    def _process(self, ids: List[int], now: datetime) -> int:
+        from app.services.email_delivery import campaign_sender
+
+        table = DripScheduledStep.__table__
+        token = uuid.uuid4().hex
+        db.session.execute(
+            table.update().where(table.c.id.in_(ids), table.c.status == 'pending')
+            .values(status='processing', claim_token=token, claimed_at=now)
+        )
+        db.session.commit()
+        rows = db.session.query(table).filter(table.c.claim_token == token).all()
+        if not rows:
+            return 0
+
+        sequences = {sequence.id: sequence for sequence in
+                     DripSequence.query.filter(DripSequence.id.in_({row.sequence_id for row in rows}))}
+        cancelled, groups = [], defaultdict(list)
+        for row in rows:
+            sequence = sequences.get(row.sequence_id)
+            if sequence is None or sequence.status != 'active':
+                cancelled.append(row.id)
+            else:
+                groups[(row.sequence_id, row.step_index)].append(row)
+
+        sent = 0
+        next_rows = []
+        for (sequence_id, step_index), group in groups.items():
+            sequence = sequences[sequence_id]
+            steps = json.loads(sequence.steps)
+            step = dict(steps[step_index])
+            subject = step.pop('subject')
+            html_template = step.pop('html_template', None)
+            text_template = step.pop('text_template', None)
+            template_data = {key: value for key, value in step.items() if not key.startswith('delay_')}
+            campaign = campaign_sender.create_campaign(step_campaign_key(sequence.sequence_key, step_index), subject,
+                                                       html_template, text_template, template_data)
+            campaign_sender.enqueue(campaign, (
+                dict(json.loads(row.context or '{}'), email=row.recipient,
+                     sequence_id=sequence.sequence_key, step=step_index)
+                for row in group
+            ))
+            sent += len(group)
+            if step_index + 1 < len(steps):
+                due = now + step_delay(steps[step_index + 1])
+                next_rows.extend({
+                    'sequence_id': sequence_id,
+                    'recipient': row.recipient,
+                    'context': row.context,
+                    'step_index': step_index + 1,
+                    'scheduled_at': due,
+                    'status': 'pending',
+                    'created_at': now,
+                } for row in group)
+
+        if next_rows:
+            insert_ignore(DripScheduledStep, next_rows, ['sequence_id', 'recipient', 'step_index'])
+        db.session.execute(
+            table.update().where(table.c.claim_token == token)
+            .values(status='sent', sent_at=now, claim_token=None)
+        )
+        if cancelled:
+            db.session.execute(table.update().where(table.c.id.in_(cancelled)).values(status='cancelled'))
+        db.session.commit()
+        if next_rows:
+            self._scheduled(min(row['scheduled_at'] for row in next_rows))
+        return sent
+
+    # Reads --------------------------------------------------------------------
+
+    def sequence_status(self, sequence_key: str) -> Optional[Dict[str, Any]]:
+        """Sequence state with step counts by status."""
+        sequence = DripSequence.query.filter_by(sequence_key=sequence_key).first()
+        if sequence is None:
+            return None
+        counts = dict(db.session.query(DripScheduledStep.status, db.func.count())
+                      .filter(DripScheduledStep.sequence_id == sequence.id)
+                      .group_by(DripScheduledStep.status).all())
+        return {
+            'sequence_id': sequence.sequence_key,
+            'kind': sequence.kind,
+            'status': sequence.status,
+            'steps': len(json.loads(sequence.steps)),
+            'scheduled': counts,
+            'created_at': sequence.created_at.isoformat(),
+            'stopped_at': sequence.stopped_at.isoformat() if sequence.stopped_at else None,
+        }
+
+
+# Shared instance, configured in create_app()
+drip_scheduler = DripScheduler()
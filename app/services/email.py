@@ -5,7 +5,7 @@ including welcome emails and marketing campaigns. It abstracts email provider
 specific implementations and provides logging and error handling.
 """
 
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterable, List, Optional, Any, Union
 import logging
 
 
@@ -53,33 +53,43 @@ class EmailService:
         }
         
     def send_campaign_email(self, 
-                           recipient_list: List[str], 
+                           recipient_list: Iterable[Union[str, Dict[str, Any]]], 
                            campaign_id: str,
                            subject: str,
                            template_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Send marketing campaign email to multiple recipients.
+        """Queue a marketing campaign email for multiple recipients.
+        
+        Messages are written to the durable send queue and delivered in the
+        background over pooled SMTP connections (see
+        ``app.services.email_delivery``). Calling this again with the same
+        campaign_id only queues recipients not already queued.
         
         Args:
-            recipient_list: List of recipient email addresses
+            recipient_list: Recipient addresses, or dicts with an ``email`` key
+                plus per-recipient template variables
             campaign_id: Unique identifier for campaign tracking
-            subject: Email subject line
-            template_data: Data for email template rendering
+            subject: Email subject line (Jinja template)
+            template_data: ``html_template`` and/or ``text_template`` Jinja
+                sources; all other keys are shared template variables
             
         Returns:
             Dict containing campaign delivery summary
         """
-        # TODO: Implement batch email sending
-        # TODO: Add unsubscribe link handling
-        # TODO: Implement campaign tracking and analytics
-        # TODO: Add rate limiting for bulk sends
-        # TODO: Handle bounces and delivery failures
+        from app.services.email_delivery import campaign_sender
+        
+        template_data = dict(template_data or {})
+        html_template = template_data.pop('html_template', None)
+        text_template = template_data.pop('text_template', None)
+        campaign = campaign_sender.create_campaign(campaign_id, subject, html_template, text_template, template_data)
+        queued = campaign_sender.enqueue(campaign, recipient_list)
         
-        self.logger.info(f"Sending campaign {campaign_id} to {len(recipient_list)} recipients")
+        self.logger.info(f"Queued campaign {campaign_id} for {queued} new recipients")
         
         return {
             "status": "queued",
             "campaign_id": campaign_id,
-            "total_recipients": len(recipient_list),
+            "queued": queued,
+            "total_recipients": campaign.total_recipients,
             "estimated_delivery": "pending"
         }
         
@@ -92,27 +102,42 @@ class EmailService:
         Returns:
             Dict containing delivery status information
         """
-        # TODO: Implement status tracking with email provider
-        # TODO: Add webhook handling for delivery events
+        from app.services.email_events import delivery_tracker
         
-        return {
-            "message_id": message_id,
-            "status": "unknown",
-            "delivered_at": None,
-            "bounce_reason": None
-        }
+        return delivery_tracker.status(message_id)
         
     def validate_email(self, email: str) -> bool:
-        """Validate email address format.
+        """Validate email address format and domain.
         
         Args:
             email: Email address to validate
             
         Returns:
-            True if email format is valid, False otherwise
+            True if the address is well-formed and its domain can receive
+            mail (or could not be checked), False otherwise
+        """
+        from app.services.email_validation import email_validator
+        
+        return email_validator.validate(email)['valid']
+        
+    def validate_email_list(self, emails: List[str]) -> Dict[str, Any]:
+        """Validate a whole list of addresses, e.g. an import.
+        
+        Each distinct domain is checked once (and cached), so large lists
+        cost one DNS lookup per domain rather than per address.
+        
+        Args:
+            emails: Email addresses to validate
+            
+        Returns:
+            Dict with per-address results and counts by reason
         """
-        # TODO: Implement email validation logic
-        # TODO: Add domain validation
-        # TODO: Check against bounce/block lists
+        from app.services.email_validation import email_validator
         
-        return "@" in email and "." in email.split("@")[1]
+        frame = email_validator.validate_frame(emails)
+        return {
+            "total": len(frame),
+            "valid": int(frame['valid'].sum()),
+            "reasons": {reason: int(count) for reason, count in frame['reason'].value_counts().items()},
+            "results": email_validator.to_records(frame)
+        }
@@ -0,0 +1,441 @@
+"""Campaign email delivery engine.
+
+Campaign sends are written to the durable ``email_queue`` table and
+delivered by a background worker:
+
+- queue rows are claimed in batches (SKIP LOCKED where available), so
+  several processes can share one queue;
+- each campaign's subject/HTML/text templates are compiled once per
+  process and rendered per recipient;
+- messages go out over a pool of persistent SMTP connections, with each
+  sender thread streaming a slice of the batch down one connection;
+- per-domain token buckets keep each receiving provider under its rate
+  limit; throttled messages are deferred rather than blocking a thread;
+- temporary failures (4xx, dropped connections) are retried with
+  exponential backoff, permanent ones (5xx) fail the message;
+- suppressed addresses (hard bounces, complaints, unsubscribes) are
+  dropped at enqueue time and checked again before sending.
+"""
+
+import json
+import logging
+import smtplib
+import threading
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.header import Header
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formatdate
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from jinja2 import Environment, StrictUndefined
+from sqlalchemy import and_, bindparam, or_
+
+from app import db
+from app.models.email_campaign import EmailCampaign, EmailQueueItem
+from app.models.email_subscriber import EmailSubscriber
+from app.services.email_events import suppress, suppressed_among
+from app.services.email_validation import is_valid_syntax
+from app.services.smtp_pool import SMTPConnectionPool
+from app.utils.background import PeriodicWorker
+from app.utils.rate_limit import TokenBucket, parse_rates
+from app.utils.sql import claim_batch, insert_ignore
+
+
+Recipient = Union[str, Dict[str, Any]]
+
+# RCPT TO replies meaning the mailbox does not exist or cannot be routed to
+HARD_BOUNCE_CODES = (550, 551, 553)
+
+
+class CampaignSender:
+    """Queues campaign messages and delivers them over pooled SMTP connections."""
+
+    def __init__(self):
+        """Initialize with default limits; ``init_app`` applies configuration."""
+        self.batch_size = 500
+        self.enqueue_chunk_size = 1000
+        self.max_attempts = 5
+        self.retry_base = 60
+        self.claim_timeout = 600
+        self.domain_rate = 50.0
+        self.domain_rates: Dict[str, float] = {}
+        self.sender = None
+        self.postmark_metadata = False  # Tag messages so Postmark events carry our Message-ID
+        self.pool: Optional[SMTPConnectionPool] = None
+        self.logger = logging.getLogger(__name__)
+        self.worker = PeriodicWorker('email-sender', self.process_pending, interval=2)
+        self._html_env = Environment(autoescape=True, undefined=StrictUndefined)
+        self._text_env = Environment(autoescape=False, undefined=StrictUndefined)
+        self._templates: Dict[int, Tuple] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Configure SMTP pool, rate limits and the sender worker from app config.
+
+        Args:
+            app: Flask application instance
+        """
+        config = app.config
+        self.pool = SMTPConnectionPool(
+            config.get('MAIL_SERVER'), config.get('MAIL_PORT'),
+            use_tls=config.get('MAIL_USE_TLS', False),
+            use_ssl=config.get('MAIL_USE_SSL', False),
+            username=config.get('MAIL_USERNAME'),
+            password=config.get('MAIL_PASSWORD'),
+            size=config.get('EMAIL_SMTP_POOL_SIZE', 8)
+        )
+        self.sender = config.get('MAIL_DEFAULT_SENDER') or 'no-reply@localhost'
+        self.postmark_metadata = config.get('EMAIL_WEBHOOK_PROVIDER') == 'postmark'
+        self.batch_size = config.get('EMAIL_SEND_BATCH_SIZE', self.batch_size)
+        self.max_attempts = config.get('EMAIL_MAX_ATTEMPTS', self.max_attempts)
+        self.retry_base = config.get('EMAIL_RETRY_BASE_SECONDS', self.retry_base)
+        self.domain_rate = config.get('EMAIL_DOMAIN_RATE', self.domain_rate)
+        self.domain_rates = parse_rates(config.get('EMAIL_DOMAIN_RATES'))
+        self._buckets = {}
+        self.worker.init_app(app, interval=config.get('EMAIL_SENDER_POLL_INTERVAL', 2), autostart=True)
+
+    # Queueing -----------------------------------------------------------------
+
+    def create_campaign(self, campaign_key: str, subject: str, html_template: Optional[str] = None,
+                        text_template: Optional[str] = None,
+                        template_data: Optional[Dict[str, Any]] = None) -> EmailCampaign:
+        """Get or create a campaign; templates are validated by compiling them.
+
+        Raises:
+            jinja2.TemplateSyntaxError: If a template does not compile
+            ValueError: If neither an HTML nor a text template is given
+        """
+        campaign = EmailCampaign.query.filter_by(campaign_key=campaign_key).first()
+        if campaign is not None:
+            return campaign
+        if not html_template and not text_template:
+            raise ValueError('A campaign needs an HTML or text template')
+        self._text_env.from_string(subject)
+        if html_template:
+            self._html_env.from_string(html_template)
+        if text_template:
+            self._text_env.from_string(text_template)
+        campaign = EmailCampaign(campaign_key=campaign_key, subject=subject, html_template=html_template,
+                                 text_template=text_template, template_data=json.dumps(template_data or {}))
+        db.session.add(campaign)
+        db.session.commit()
+        return campaign
+
+    def enqueue(self, campaign: EmailCampaign, recipients: Iterable[Recipient]) -> int:
+        """Queue a campaign for recipients, streaming them in chunks.
+
+        Recipients may be addresses or dicts with an ``email`` key plus
+        per-recipient template variables. Addresses already queued for the
+        campaign are skipped, so re-running an enqueue is safe.
+
+        Args:
+            campaign: Campaign to send
+            recipients: Any iterable, including generators
+
+        Returns:
+            int: Number of messages newly queued
+        """
+        queued = 0
+        chunk: List[Dict[str, Any]] = []
+        for recipient in recipients:
+            row = self._queue_row(campaign.id, recipient)
+            if row is not None:
+                chunk.append(row)
+            if len(chunk) >= self.enqueue_chunk_size:
+                queued += self._insert_chunk(campaign, chunk)
+                chunk = []
+        queued += self._insert_chunk(campaign, chunk)
+        if queued:
+            self.worker.ensure_started()
+            self.worker.wake()
+        return queued
+
+    def _queue_row(self, campaign_id: int, recipient: Recipient) -> Optional[Dict[str, Any]]:
+        context = None
+        if isinstance(recipient, dict):
+            email = recipient.get('email')
+            extra = {key: value for key, value in recipient.items() if key != 'email'}
+            context = json.dumps(extra, default=str) if extra else None
+        else:
+            email = recipient
+        email = (email or '').strip()
+        if not is_valid_syntax(email):
+            return None
+        local, _, domain = email.rpartition('@')
+        domain = domain.lower()
+        return {
+            'campaign_id': campaign_id,
+            'recipient': f'{local}@{domain}',
+            'recipient_domain': domain,
+            'context': context,
+            'message_id': self._message_id(),
+            'status': 'pending',
+            'attempts': 0,
+            'next_attempt_at': datetime.utcnow(),
+            'created_at': datetime.utcnow(),
+        }
+
+    def _insert_chunk(self, campaign: EmailCampaign, rows: List[Dict[str, Any]]) -> int:
+        suppressed = suppressed_among(row['recipient'] for row in rows)
+        rows = [row for row in rows if row['recipient'].lower() not in suppressed]
+        if not rows:
+            return 0
+        inserted = insert_ignore(EmailQueueItem, rows, conflict_columns=['campaign_id', 'recipient'])
+        table = EmailCampaign.__table__
+        db.session.execute(table.update().where(table.c.id == campaign.id).values(
+            total_recipients=table.c.total_recipients + inserted, status='queued', completed_at=None))
+        db.session.commit()
+        return inserted
+
+    def _message_id(self) -> str:
+        domain = (self.sender or 'localhost').rpartition('@')[2].strip('> ') or 'localhost'
+        return f'<{uuid.uuid4().hex}@{domain}>'
+
+    # Delivery -----------------------------------------------------------------
+
+    def process_pending(self) -> int:
+        """Deliver due queue items batch by batch until none are due.
+
+        Returns:
+            int: Number of messages sent
+        """
+        if self.pool is None:
+            return 0
+        sent = 0
+        while True:
+            items = self._claim()
+            if not items:
+                break
+            outcomes = self._deliver_batch(items)
+            self._record(outcomes)
+            sent += sum(1 for outcome in outcomes if outcome['status'] == 'sent')
+            if len(items) < self.batch_size:
+                break
+        self._complete_campaigns()
+        return sent
+
+    def _claim(self) -> List[EmailQueueItem]:
+        now = datetime.utcnow()
+        claimable = or_(
+            and_(EmailQueueItem.status == 'pending', EmailQueueItem.next_attempt_at <= now),
+            and_(EmailQueueItem.status == 'sending',
+                 EmailQueueItem.claimed_at < now - timedelta(seconds=self.claim_timeout))
+        )
+        return claim_batch(EmailQueueItem, claimable, EmailQueueItem.next_attempt_at, self.batch_size,
+                           {'status': 'sending'})
+
+    def _bucket(self, domain: str) -> TokenBucket:
+        bucket = self._buckets.get(domain)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(domain)
+                if bucket is None:
+                    bucket = self._buckets[domain] = TokenBucket(self.domain_rates.get(domain, self.domain_rate))
+        return bucket
+
+    def _compiled(self, campaign: EmailCampaign) -> Tuple:
+        """Compiled (subject, html, text) templates and shared context, cached per campaign."""
+        cached = self._templates.get(campaign.id)
+        if cached is None:
+            if len(self._templates) > 256:
+                self._templates.clear()
+            cached = (
+                self._text_env.from_string(campaign.subject),
+                self._html_env.from_string(campaign.html_template) if campaign.html_template else None,
+                self._text_env.from_string(campaign.text_template) if campaign.text_template else None,
+                json.loads(campaign.template_data or '{}'),
+            )
+            self._templates[campaign.id] = cached
+        return cached
+
+    def _deliver_batch(self, items: List[EmailQueueItem]) -> List[Dict[str, Any]]:
+        """Rate-limit, render and send one claimed batch; returns per-item outcomes."""
+        campaigns = {campaign.id: campaign for campaign in
+                     EmailCampaign.query.filter(EmailCampaign.id.in_({item.campaign_id for item in items}))}
+        suppressed = suppressed_among(item.recipient for item in items)
+        now = datetime.utcnow()
+        outcomes = []
+        jobs = []
+        for item in items:
+            if item.recipient.lower() in suppressed:
+                # Bounced or unsubscribed since it was queued
+                outcomes.append({'id': item.id, 'campaign_id': item.campaign_id, 'recipient': item.recipient,
+                                 'status': 'suppressed', 'attempts': item.attempts, 'error': None,
+                                 'next_attempt_at': None})
+                continue
+            wait = self._bucket(item.recipient_domain).try_acquire()
+            if wait:
+                # Domain is at its limit: put the message back without spending an attempt
+                outcomes.append({'id': item.id, 'campaign_id': item.campaign_id, 'recipient': item.recipient,
+                                 'status': 'pending',
+                                 'attempts': item.attempts, 'error': None,
+                                 'next_attempt_at': now + timedelta(seconds=wait)})
+                continue
+            subject, html, text, shared = self._compiled(campaigns[item.campaign_id])
+            context = dict(shared, **json.loads(item.context or '{}'), email=item.recipient)
+            jobs.append({'id': item.id, 'campaign_id': item.campaign_id, 'attempts': item.attempts,
+                         'recipient': item.recipient, 'message_id': item.message_id,
+                         'templates': (subject, html, text), 'context': context})
+        if not jobs:
+            return outcomes
+
+        # One slice per pooled connection; each slice streams down a single connection
+        slices = [jobs[i::self.pool.size] for i in range(min(self.pool.size, len(jobs)))]
+        with ThreadPoolExecutor(max_workers=len(slices), thread_name_prefix='email-sender') as executor:
+            for result in executor.map(self._send_slice, slices):
+                outcomes.extend(result)
+        return outcomes
+
+    def _send_slice(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Send jobs sequentially over pooled connections (runs on a sender thread)."""
+        outcomes = []
+        remaining = list(jobs)
+        reconnects = 0
+        while remaining:
+            try:
+                with self.pool.connection() as conn:
+                    while remaining:
+                        job = remaining[0]
+                        outcomes.append(self._send_one(conn, job))
+                        remaining.pop(0)
+            except (smtplib.SMTPServerDisconnected, OSError) as e:
+                # The in-flight message failed with the connection; retry it on a fresh one once
+                reconnects += 1
+                if reconnects > 1:
+                    outcomes.extend(self._failure(job, e, permanent=False) for job in remaining)
+                    break
+        return outcomes
+
+    def _send_one(self, conn: smtplib.SMTP, job: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            message = self._render(job)
+            conn.sendmail(self.sender, [job['recipient']], message)
+            conn.sent_messages = getattr(conn, 'sent_messages', 0) + 1
+        except smtplib.SMTPRecipientsRefused as e:
+            code = next(iter(e.recipients.values()))[0]
+            outcome = self._failure(job, e, permanent=code >= 500)
+            # Mailbox unknown/unroutable: a hard bounce, so stop mailing the address
+            outcome['hard_bounce'] = code in HARD_BOUNCE_CODES
+            return outcome
+        except smtplib.SMTPResponseException as e:
+            return self._failure(job, e, permanent=e.smtp_code >= 500)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            raise
+        except Exception as e:
+            # Rendering errors and the like will not fix themselves
+            return self._failure(job, e, permanent=True)
+        return {'id': job['id'], 'campaign_id': job['campaign_id'], 'recipient': job['recipient'], 'status': 'sent',
+                'attempts': job['attempts'] + 1, 'error': None, 'next_attempt_at': None}
+
+    def _render(self, job: Dict[str, Any]) -> bytes:
+        """Render one message. Uses the compat32 MIME classes, which build
+        messages several times faster than ``EmailMessage``."""
+        subject, html, text = job['templates']
+        context = job['context']
+        parts = []
+        if text is not None:
+            parts.append(MIMEText(text.render(context), 'plain', 'utf-8'))
+        if html is not None:
+            parts.append(MIMEText(html.render(context), 'html', 'utf-8'))
+        if len(parts) == 1:
+            message = parts[0]
+        else:
+            message = MIMEMultipart('alternative')
+            for part in parts:
+                message.attach(part)
+        message['From'] = self.sender
+        message['To'] = job['recipient']
+        message['Subject'] = Header(subject.render(context), 'utf-8')
+        message['Message-ID'] = job['message_id']
+        message['Date'] = formatdate(localtime=False)
+        if self.postmark_metadata:
+            # Postmark events report their own MessageID; metadata echoes ours back
+            message['X-PM-Metadata-message_id'] = job['message_id']
+        if context.get('unsubscribe_url'):
+            message['List-Unsubscribe'] = f"<{context['unsubscribe_url']}>"
+        return message.as_bytes()
+
+    def _failure(self, job: Dict[str, Any], error: Exception, permanent: bool) -> Dict[str, Any]:
+        attempts = job['attempts'] + 1
+        final = permanent or attempts >= self.max_attempts
+        return {
+            'id': job['id'],
+            'campaign_id': job['campaign_id'],
+            'recipient': job['recipient'],
+            'status': 'failed' if final else 'pending',
+            'attempts': attempts,
+            'error': str(error)[:1000],
+            'next_attempt_at': None if final else datetime.utcnow() + timedelta(
+                seconds=self.retry_base * 2 ** (attempts - 1)),
+        }
+
+    def _record(self, outcomes: List[Dict[str, Any]]):
+        """Write outcomes and campaign counters in one transaction."""
+        if not outcomes:
+            return
+        now = datetime.utcnow()
+        items = EmailQueueItem.__table__
+        db.session.execute(
+            items.update().where(items.c.id == bindparam('b_id')).values(
+                status=bindparam('b_status'),
+                attempts=bindparam('b_attempts'),
+                last_error=bindparam('b_error'),
+                next_attempt_at=bindparam('b_next_attempt_at'),
+                sent_at=bindparam('b_sent_at'),
+                delivery_status=bindparam('b_delivery_status'),
+                claim_token=None
+            ),
+            [{
+                'b_id': o['id'],
+                'b_status': o['status'],
+                'b_attempts': o['attempts'],
+                'b_error': o['error'],
+                'b_next_attempt_at': o['next_attempt_at'] or now,
+                'b_sent_at': now if o['status'] == 'sent' else None,
+                'b_delivery_status': 'bounced' if o.get('hard_bounce') else None,
+            } for o in outcomes]
+        )
+
+        sent_to = [o['recipient'] for o in outcomes if o['status'] == 'sent']
+        if sent_to:
+            subscribers = EmailSubscriber.__table__
+            db.session.execute(subscribers.update().where(subscribers.c.email.in_(sent_to))
+                               .values(last_email_sent=now))
+        suppress((o['recipient'], 'hard_bounce', o['error']) for o in outcomes if o.get('hard_bounce'))
+
+        totals = defaultdict(lambda: {'sent': 0, 'failed': 0, 'suppressed': 0})
+        for o in outcomes:
+            if o['status'] in ('sent', 'failed', 'suppressed') and o['campaign_id'] is not None:
+                totals[o['campaign_id']][o['status']] += 1
+        if totals:
+            campaigns = EmailCampaign.__table__
+            db.session.execute(
+                campaigns.update().where(campaigns.c.id == bindparam('b_id')).values(
+                    sent_count=campaigns.c.sent_count + bindparam('b_sent'),
+                    failed_count=campaigns.c.failed_count + bindparam('b_failed'),
+                    suppressed_count=campaigns.c.suppressed_count + bindparam('b_suppressed'),
+                    status='sending'
+                ),
+                [{'b_id': campaign_id, 'b_sent': t['sent'], 'b_failed': t['failed'], 'b_suppressed': t['suppressed']}
+                 for campaign_id, t in sorted(totals.items())]
+            )
+        db.session.commit()
+
+    def _complete_campaigns(self):
+        table = EmailCampaign.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.status != 'completed',
+                   table.c.sent_count + table.c.failed_count + table.c.suppressed_count >= table.c.total_recipients)
+            .values(status='completed', completed_at=datetime.utcnow())
+        )
+        db.session.commit()
+
+
+# Shared instance, configured in create_app()
+campaign_sender = CampaignSender()
@@ -0,0 +1,430 @@
+"""Email delivery event tracking and suppression.
+
+Delivery events (delivered, bounce, open, click, complaint, unsubscribe)
+reach us from the mail provider's event webhook or as DSN bounce messages
+in a local maildir. Both are normalized and written to the webhook inbox,
+whose worker hands them back here in batches:
+
+- events are stored in ``email_delivery_events``;
+- per-message state (delivery status, first open/click) is written onto
+  the ``email_queue`` rows with one executemany UPDATE per event type;
+- hard bounces, complaints and unsubscribes add the address to the
+  suppression list and deactivate the subscriber, so the next send skips
+  it before it is rendered.
+"""
+
+import json
+import logging
+import mailbox
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from email.parser import HeaderParser
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+from sqlalchemy import and_, bindparam, or_
+
+from app import db
+from app.models.email_campaign import EmailQueueItem
+from app.models.email_event import EmailDeliveryEvent, EmailSuppression
+from app.models.email_subscriber import EmailSubscriber
+from app.services import email_providers
+from app.services.webhooks import WebhookValidationError, webhook_inbox
+from app.utils.background import PeriodicWorker
+from app.utils.sql import insert_ignore
+
+logger = logging.getLogger(__name__)
+
+
+# Provider event names mapped to ours (generic names plus SendGrid/Mailgun style)
+EVENT_TYPES = {
+    'delivered': 'delivered',
+    'delivery': 'delivered',
+    'deferred': 'deferred',
+    'delayed': 'deferred',
+    'bounce': 'bounce',
+    'bounced': 'bounce',
+    'failed': 'bounce',
+    'dropped': 'bounce',
+    'open': 'open',
+    'opened': 'open',
+    'click': 'click',
+    'clicked': 'click',
+    'complaint': 'complaint',
+    'complained': 'complaint',
+    'spamreport': 'complaint',
+    'unsubscribe': 'unsubscribe',
+    'unsubscribed': 'unsubscribe',
+    'group_unsubscribe': 'unsubscribe',
+}
+
+# Queue row delivery_status set by each event type, and the statuses it may replace
+STATUS_TRANSITIONS = {
+    'deferred': ('deferred', (None,)),
+    'delivered': ('delivered', (None, 'deferred')),
+    'bounce': ('bounced', (None, 'deferred', 'delivered')),
+    'complaint': ('complained', (None, 'deferred', 'delivered', 'bounced')),
+}
+
+SUPPRESSION_REASONS = {'complaint': 'complaint', 'unsubscribe': 'unsubscribe'}
+
+
+def normalize_message_id(value: Optional[str]) -> Optional[str]:
+    """Message ids are stored with angle brackets, as in the header."""
+    if not value:
+        return None
+    value = value.strip().strip('<>')
+    return f'<{value}>' if value else None
+
+
+def _occurred_at(value: Union[int, float, str, None]) -> float:
+    """Unix time of a provider timestamp; the receive time if it is missing or unparseable."""
+    if value in (None, ''):
+        return time.time()
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        logger.warning(f'Unparseable email event timestamp {value!r}; using the receive time')
+        return time.time()
+    return (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def normalize_event(raw: Dict[str, Any], source: str = 'webhook') -> Optional[Dict[str, Any]]:
+    """Convert a provider event to the inbox format; None for unknown types.
+
+    Returns:
+        dict: id, type, source, message_id, recipient, bounce_type, reason, url
+        and created (unix time), ready for ``webhook_inbox.enqueue_many``
+    """
+    name = str(raw.get('event') or raw.get('type') or '').lower()
+    event_type = EVENT_TYPES.get(name)
+    event_id = raw.get('id') or raw.get('event_id') or raw.get('sg_event_id')
+    if event_type is None or not event_id:
+        return None
+    bounce_type = None
+    if event_type == 'bounce':
+        bounce_type = raw.get('bounce_type') or ('soft' if raw.get('type') == 'blocked' else 'hard')
+    recipient = raw.get('email') or raw.get('recipient')
+    return {
+        'id': f'{source}:{event_id}',
+        'type': event_type,
+        'source': source,
+        'message_id': normalize_message_id(raw.get('message_id') or raw.get('smtp-id')),
+        'recipient': recipient.strip().lower() if recipient else None,
+        'bounce_type': bounce_type,
+        'reason': raw.get('reason') or raw.get('response'),
+        'url': raw.get('url'),
+        'created': _occurred_at(raw.get('timestamp') or raw.get('created')),
+    }
+
+
+def parse_dsn(message) -> List[Dict[str, Any]]:
+    """Extract delivery events from an RFC 3464 delivery status notification.
+
+    Args:
+        message: ``email.message.Message`` (e.g. a maildir message)
+
+    Returns:
+        list: Normalized events, one per recipient block; empty if the
+        message is not a DSN
+    """
+    if message.get_content_type() != 'multipart/report' or \
+            (message.get_param('report-type') or '').lower() != 'delivery-status':
+        return []
+    dsn_id = normalize_message_id(message.get('Message-ID'))
+    original_id = None
+    blocks = []
+    for part in message.walk():
+        content_type = part.get_content_type()
+        if content_type == 'message/delivery-status':
+            # The parser splits the status part into per-message and per-recipient field blocks
+            blocks = [block for block in part.get_payload() if block.get('Action')]
+        elif content_type == 'message/rfc822':
+            payload = part.get_payload()
+            original = payload[0] if isinstance(payload, list) else payload
+            original_id = original_id or original.get('Message-ID')
+        elif content_type == 'text/rfc822-headers':
+            headers = HeaderParser().parsestr(part.get_payload(decode=True).decode('utf-8', 'replace'))
+            original_id = original_id or headers.get('Message-ID')
+    events = []
+    for index, block in enumerate(blocks):
+        action = block.get('Action', '').strip().lower()
+        status = block.get('Status', '').strip()
+        recipient = (block.get('Final-Recipient') or block.get('Original-Recipient') or '').partition(';')[2]
+        event = normalize_event({
+            'id': f'{dsn_id or original_id}:{index}',
+            'event': action,
+            'message_id': original_id,
+            'email': recipient.strip(),
+            'bounce_type': 'hard' if status.startswith('5') else 'soft',
+            'reason': ' '.join(filter(None, [status, block.get('Diagnostic-Code')])),
+            'timestamp': None,
+        }, source='dsn')
+        if event is not None:
+            events.append(event)
+    return events
+
+
+def suppress(entries: Iterable[Tuple[str, str, Optional[str]]]) -> int:
+    """Add addresses to the suppression list and deactivate their subscriptions.
+
+    Runs in the caller's transaction.
+
+    Args:
+        entries: (email, reason, detail) tuples
+
+    Returns:
+        int: Number of addresses newly suppressed
+    """
+    now = datetime.utcnow()
+    entries = [(email.strip(), reason, detail) for email, reason, detail in entries if email]
+    rows = {email.lower(): {'email': email.lower(), 'reason': reason, 'detail': detail, 'created_at': now}
+            for email, reason, detail in entries}
+    if not rows:
+        return 0
+    inserted = insert_ignore(EmailSuppression, list(rows.values()), conflict_columns=['email'])
+    # Match the address as given and lower-cased so the unique index on email is used
+    addresses = list(set(rows) | {email for email, _, _ in entries})
+    table = EmailSubscriber.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.email.in_(addresses), or_(table.c.is_active.is_(True), table.c.is_active.is_(None)))
+        .values(is_active=False, unsubscribed_at=now)
+    )
+    return inserted
+
+
+def suppressed_among(emails: Iterable[str]) -> set:
+    """The subset of addresses on the suppression list (one indexed query)."""
+    emails = {email.lower() for email in emails if email}
+    if not emails:
+        return set()
+    rows = db.session.query(EmailSuppression.email).filter(EmailSuppression.email.in_(emails)).all()
+    return {row.email for row in rows}
+
+
+class DeliveryTracker:
+    """Ingests delivery events and answers per-message status lookups."""
+
+    def __init__(self):
+        """Initialize with no DSN maildir configured."""
+        self.webhook_provider = 'relay'
+        self.webhook_secret = None
+        self.webhook_tolerance = 300
+        self.maildir = None
+        self.ingest_batch_size = 500
+        self.logger = logging.getLogger(__name__)
+        self.worker = PeriodicWorker('email-dsn', self.ingest_maildir, interval=60)
+
+    def init_app(self, app):
+        """Register the inbox handler and, if configured, the DSN maildir poller.
+
+        Args:
+            app: Flask application instance
+        """
+        self.webhook_provider = app.config.get('EMAIL_WEBHOOK_PROVIDER', self.webhook_provider)
+        if self.webhook_provider not in email_providers.PROVIDERS:
+            raise ValueError(f'Unknown EMAIL_WEBHOOK_PROVIDER: {self.webhook_provider}')
+        self.webhook_secret = app.config.get('EMAIL_WEBHOOK_SECRET')
+        self.webhook_tolerance = app.config.get('EMAIL_WEBHOOK_TOLERANCE', self.webhook_tolerance)
+        self.maildir = app.config.get('EMAIL_DSN_MAILDIR')
+        if self.record_webhook_batch not in webhook_inbox.batch_handlers:
+            webhook_inbox.register_batch_handler(self.record_webhook_batch)
+        self.worker.init_app(app, interval=app.config.get('EMAIL_DSN_POLL_INTERVAL', 60),
+                             autostart=bool(self.maildir))
+
+    # Ingestion ----------------------------------------------------------------
+
+    def ingest(self, events: List[Dict[str, Any]]) -> int:
+        """Queue normalized events in the webhook inbox; duplicates are dropped.
+
+        Returns:
+            int: Number of new events
+        """
+        queued = 0
+        for start in range(0, len(events), self.ingest_batch_size):
+            queued += webhook_inbox.enqueue_many('email', events[start:start + self.ingest_batch_size])
+        return queued
+
+    def ingest_webhook(self, payload: Union[str, bytes], headers: Mapping[str, str]) -> Dict[str, int]:
+        """Verify and queue a provider event webhook.
+
+        The request is authenticated the way EMAIL_WEBHOOK_PROVIDER signs
+        its webhooks (see ``app.services.email_providers``).
+
+        Args:
+            payload: Raw request body
+            headers: Request headers
+
+        Raises:
+            WebhookValidationError: If the signature or payload is invalid
+        """
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        try:
+            body = json.loads(payload)
+        except ValueError:
+            raise WebhookValidationError('Malformed JSON payload')
+        if not email_providers.verify(self.webhook_provider, payload, headers, body, self.webhook_secret,
+                                      tolerance=self.webhook_tolerance):
+            raise WebhookValidationError('Invalid email webhook signature')
+        if self.webhook_provider == 'ses' and body.get('Type') == 'SubscriptionConfirmation':
+            email_providers.confirm_sns_subscription(body)
+            return {'received': 0, 'queued': 0}
+        raw_events = email_providers.raw_events(self.webhook_provider, body)
+        events = [event for event in map(normalize_event, raw_events) if event is not None]
+        return {'received': len(raw_events), 'queued': self.ingest(events)}
+
+    def ingest_maildir(self, path: Optional[str] = None) -> int:
+        """Parse DSN bounce messages from a maildir and queue their events.
+
+        DSNs are removed once queued; other messages are marked seen and
+        left in place.
+
+        Returns:
+            int: Number of new events
+        """
+        path = path or self.maildir
+        if not path:
+            return 0
+        box = mailbox.Maildir(path, factory=None, create=False)
+        events = []
+        processed = []
+        for key in list(box.keys()):
+            message = box.get_message(key)
+            if 'S' in message.get_flags():
+                continue
+            parsed = parse_dsn(message)
+            if parsed:
+                events.extend(parsed)
+                processed.append(key)
+            else:
+                message.set_subdir('cur')
+                message.add_flag('S')
+                box[key] = message
+        queued = self.ingest(events)
+        for key in processed:
+            box.discard(key)
+        return queued
+
+    def record_webhook_batch(self, events: List[Tuple[Any, Dict[str, Any]]]):
+        """Webhook inbox batch handler; runs in the inbox's transaction."""
+        events = sorted((event for stored, event in events if stored.provider == 'email'),
+                        key=lambda event: event.get('created') or 0)
+        if not events:
+            return
+        now = datetime.utcnow()
+        for event in events:
+            event['occurred_at'] = datetime.utcfromtimestamp(event.get('created') or now.timestamp())
+
+        db.session.execute(EmailDeliveryEvent.__table__.insert(), [{
+            'source': event.get('source') or 'webhook',
+            'event_id': event['id'],
+            'event_type': event['type'],
+            'message_id': event.get('message_id'),
+            'recipient': event.get('recipient'),
+            'bounce_type': event.get('bounce_type'),
+            'reason': event.get('reason'),
+            'url': event.get('url'),
+            'occurred_at': event['occurred_at'],
+            'created_at': now,
+        } for event in events])
+
+        self._update_messages(events)
+
+        entries = []
+        for event in events:
+            reason = SUPPRESSION_REASONS.get(event['type'])
+            if event['type'] == 'bounce' and event.get('bounce_type') == 'hard':
+                reason = 'hard_bounce'
+            if reason and event.get('recipient'):
+                entries.append((event['recipient'], reason, event.get('reason')))
+        suppress(entries)
+
+    def _update_messages(self, events: List[Dict[str, Any]]):
+        """Fold events into per-message state on the queue rows, one UPDATE per type."""
+        table = EmailQueueItem.__table__
+        latest = defaultdict(dict)  # status type -> message_id -> event (last wins)
+        first = defaultdict(dict)  # open/click -> message_id -> event (first wins)
+        for event in events:
+            if not event.get('message_id'):
+                continue
+            if event['type'] in STATUS_TRANSITIONS:
+                latest[event['type']][event['message_id']] = event
+            elif event['type'] in ('open', 'click'):
+                first[event['type']].setdefault(event['message_id'], event)
+
+        # Apply in lifecycle order so a batch holding delivered + bounce ends bounced
+        for event_type in ('deferred', 'delivered', 'bounce', 'complaint'):
+            by_message = latest.get(event_type)
+            if not by_message:
+                continue
+            status, replaces = STATUS_TRANSITIONS[event_type]
+            allowed = [value for value in replaces if value is not None]
+            values = {'delivery_status': status}
+            if event_type == 'delivered':
+                values['delivered_at'] = bindparam('b_at')
+            if event_type == 'bounce':
+                values['bounce_reason'] = bindparam('b_reason')
+            db.session.execute(
+                table.update()
+                .where(table.c.message_id == bindparam('b_message_id'),
+                       or_(table.c.delivery_status.is_(None), table.c.delivery_status.in_(allowed)))
+                .values(**values),
+                [{'b_message_id': message_id, 'b_at': event['occurred_at'], 'b_reason': event.get('reason')}
+                 for message_id, event in by_message.items()]
+            )
+
+        for event_type, column in (('open', 'opened_at'), ('click', 'clicked_at')):
+            by_message = first.get(event_type)
+            if not by_message:
+                continue
+            db.session.execute(
+                table.update()
+                .where(and_(table.c.message_id == bindparam('b_message_id'), table.c[column].is_(None)))
+                .values(**{column: bindparam('b_at')}),
+                [{'b_message_id': message_id, 'b_at': event['occurred_at']}
+                 for message_id, event in by_message.items()]
+            )
+
+    # Reads --------------------------------------------------------------------
+
+    def status(self, message_id: str, include_events: bool = True) -> Dict[str, Any]:
+        """Delivery status of one message, from indexed lookups only.
+
+        Args:
+            message_id: Message-ID header value, with or without angle brackets
+            include_events: Also return the message's event history
+
+        Returns:
+            Dict containing delivery status information
+        """
+        message_id = normalize_message_id(message_id)
+        item = EmailQueueItem.query.filter_by(message_id=message_id).first()
+        if item is None:
+            return {'message_id': message_id, 'status': 'unknown', 'delivered_at': None, 'bounce_reason': None}
+        result = {
+            'message_id': message_id,
+            'recipient': item.recipient,
+            'status': item.delivery_status or item.status,
+            'queue_status': item.status,
+            'attempts': item.attempts,
+            'sent_at': item.sent_at.isoformat() if item.sent_at else None,
+            'delivered_at': item.delivered_at.isoformat() if item.delivered_at else None,
+            'opened_at': item.opened_at.isoformat() if item.opened_at else None,
+            'clicked_at': item.clicked_at.isoformat() if item.clicked_at else None,
+            'bounce_reason': item.bounce_reason or (item.last_error if item.status == 'failed' else None),
+        }
+        if include_events:
+            result['events'] = [event.to_dict() for event in EmailDeliveryEvent.query
+                                .filter_by(message_id=message_id)
+                                .order_by(EmailDeliveryEvent.occurred_at, EmailDeliveryEvent.id)]
+        return result
+
+
+# Shared instance, configured in create_app()
+delivery_tracker = DeliveryTracker()
@@ -0,0 +1,249 @@
+"""Mail provider event webhooks: signature verification and payload unpacking.
+
+Each provider authenticates its event webhook differently, and
+EMAIL_WEBHOOK_SECRET holds whatever that provider's check needs:
+
+- ``relay`` (default): our own ``t=...,v1=...`` HMAC in ``X-Webhook-Signature``,
+  for an internal relay that re-signs events; the secret is the shared key.
+- ``mailgun``: HMAC-SHA256 of ``timestamp + token`` in the body's
+  ``signature`` block; the secret is the HTTP webhook signing key.
+- ``sendgrid``: ECDSA signature of ``timestamp + body`` in the
+  ``X-Twilio-Email-Event-Webhook-*`` headers; the secret is the
+  verification public key (base64 DER, as shown in the SendGrid console).
+- ``postmark``: HTTP basic auth on the webhook URL; the secret is ``user:password``.
+  Outgoing mail carries our Message-ID as ``message_id`` metadata, which
+  Postmark echoes in its events (its own ``MessageID`` is a different id).
+- ``ses``: SNS message signature checked against the signing certificate
+  from ``*.amazonaws.com``; the secret is the SNS topic ARN. Subscription
+  confirmations are confirmed automatically.
+
+SendGrid and SES need the optional ``cryptography`` package.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Union
+from urllib.parse import urlsplit
+
+import requests
+
+from app.services.webhooks import verify_stripe_signature
+
+try:
+    from cryptography import x509
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, padding
+except ImportError:  # pragma: no cover - optional dependency
+    x509 = None
+
+PROVIDERS = ('relay', 'mailgun', 'sendgrid', 'postmark', 'ses')
+
+_SNS_CERT_HOST = re.compile(r'^sns\.[a-z0-9-]+\.amazonaws\.com(\.cn)?$')
+_SNS_SIGNED_FIELDS = {
+    'Notification': ('Message', 'MessageId', 'Subject', 'Timestamp', 'TopicArn', 'Type'),
+    'SubscriptionConfirmation': ('Message', 'MessageId', 'SubscribeURL', 'Timestamp', 'Token', 'TopicArn', 'Type'),
+    'UnsubscribeConfirmation': ('Message', 'MessageId', 'SubscribeURL', 'Timestamp', 'Token', 'TopicArn', 'Type'),
+}
+_sns_certificates: Dict[str, Any] = {}
+_sns_lock = threading.Lock()
+
+
+def _require_cryptography(provider: str):
+    if x509 is None:
+        raise RuntimeError(f"The 'cryptography' package is required to verify {provider} webhooks")
+
+
+def _fresh(timestamp: Any, tolerance: int) -> bool:
+    try:
+        signed_at = int(float(timestamp))
+    except (TypeError, ValueError):
+        return False
+    return not tolerance or abs(time.time() - signed_at) <= tolerance
+
+
+def verify_mailgun(body: Any, secret: str, tolerance: int = 300) -> bool:
+    """Check the ``signature`` block Mailgun puts in every event body."""
+    signature = body.get('signature') if isinstance(body, dict) else None
+    if not secret or not isinstance(signature, dict):
+        return False
+    timestamp, token = str(signature.get('timestamp', '')), str(signature.get('token', ''))
+    expected = hmac.new(secret.encode('utf-8'), f'{timestamp}{token}'.encode('utf-8'), hashlib.sha256).hexdigest()
+    return _fresh(timestamp, tolerance) and hmac.compare_digest(expected, str(signature.get('signature', '')))
+
+
+def verify_sendgrid(payload: bytes, headers: Mapping[str, str], public_key: str, tolerance: int = 300) -> bool:
+    """Check SendGrid's signed event webhook (ECDSA P-256 over ``timestamp + body``)."""
+    _require_cryptography('SendGrid')
+    signature = headers.get('X-Twilio-Email-Event-Webhook-Signature')
+    timestamp = headers.get('X-Twilio-Email-Event-Webhook-Timestamp')
+    if not public_key or not signature or not timestamp or not _fresh(timestamp, tolerance):
+        return False
+    try:
+        key = serialization.load_der_public_key(base64.b64decode(public_key))
+        key.verify(base64.b64decode(signature), timestamp.encode('utf-8') + payload, ec.ECDSA(hashes.SHA256()))
+    except (InvalidSignature, ValueError):
+        return False
+    return True
+
+
+def verify_postmark(headers: Mapping[str, str], credentials: str) -> bool:
+    """Check the basic-auth credentials configured on the Postmark webhook URL."""
+    scheme, _, value = (headers.get('Authorization') or '').partition(' ')
+    if not credentials or scheme.lower() != 'basic':
+        return False
+    expected = base64.b64encode(credentials.encode('utf-8')).decode('ascii')
+    return hmac.compare_digest(expected, value.strip())
+
+
+def _sns_certificate(url: str):
+    parts = urlsplit(url or '')
+    if parts.scheme != 'https' or not _SNS_CERT_HOST.match(parts.hostname or '') or not parts.path.endswith('.pem'):
+        return None
+    with _sns_lock:
+        certificate = _sns_certificates.get(url)
+    if certificate is None:
+        response = requests.get(url, timeout=10)
+        response.raise_for_status()
+        certificate = x509.load_pem_x509_certificate(response.content)
+        with _sns_lock:
+            _sns_certificates[url] = certificate
+    return certificate
+
+
+def verify_sns(message: Any, topic_arn: str) -> bool:
+    """Check an SNS message signature and that it comes from the configured topic."""
+    _require_cryptography('SES')
+    if not topic_arn or not isinstance(message, dict) or message.get('TopicArn') != topic_arn:
+        return False
+    fields = _SNS_SIGNED_FIELDS.get(message.get('Type'))
+    if fields is None:
+        return False
+    signed = ''.join(f'{field}\n{message[field]}\n' for field in fields if field in message).encode('utf-8')
+    algorithm = hashes.SHA256() if str(message.get('SignatureVersion')) == '2' else hashes.SHA1()
+    try:
+        certificate = _sns_certificate(message.get('SigningCertURL'))
+        if certificate is None:
+            return False
+        certificate.public_key().verify(base64.b64decode(message.get('Signature', '')), signed,
+                                        padding.PKCS1v15(), algorithm)
+    except (InvalidSignature, ValueError, requests.RequestException):
+        return False
+    return True
+
+
+def verify(provider: str, payload: bytes, headers: Mapping[str, str], body: Any, secret: str,
+           tolerance: int = 300) -> bool:
+    """Whether a webhook request really comes from ``provider``.
+
+    Args:
+        payload: Raw request body
+        headers: Request headers
+        body: The parsed JSON body
+        secret: EMAIL_WEBHOOK_SECRET (see the module docstring)
+        tolerance: Maximum signature age in seconds, where the provider signs a timestamp
+    """
+    if provider == 'relay':
+        return verify_stripe_signature(payload, headers.get('X-Webhook-Signature', ''), secret, tolerance=tolerance)
+    if provider == 'mailgun':
+        return verify_mailgun(body, secret, tolerance)
+    if provider == 'sendgrid':
+        return verify_sendgrid(payload, headers, secret, tolerance)
+    if provider == 'postmark':
+        return verify_postmark(headers, secret)
+    if provider == 'ses':
+        return verify_sns(body, secret)
+    raise ValueError(f'Unknown email webhook provider: {provider}')
+
+
+def confirm_sns_subscription(message: Dict[str, Any]):
+    """Confirm a verified SNS subscription by visiting its SubscribeURL."""
+    requests.get(message['SubscribeURL'], timeout=10).raise_for_status()
+
+
+# Payloads --------------------------------------------------------------------
+
+def _mailgun_events(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    data = body.get('event-data') or {}
+    event = data.get('event')
+    if event == 'failed' and data.get('severity') == 'temporary':
+        event = 'deferred'
+    status = data.get('delivery-status') or {}
+    headers = (data.get('message') or {}).get('headers') or {}
+    return [{
+        'id': data.get('id'),
+        'event': event,
+        'email': data.get('recipient'),
+        'message_id': headers.get('message-id'),
+        'bounce_type': 'hard' if data.get('severity') == 'permanent' else None,
+        'reason': status.get('description') or status.get('message'),
+        'url': data.get('url'),
+        'timestamp': data.get('timestamp'),
+    }]
+
+
+_POSTMARK_EVENTS = {'Delivery': 'delivered', 'Bounce': 'bounce', 'SpamComplaint': 'complaint', 'Open': 'open',
+                    'Click': 'click', 'SubscriptionChange': 'unsubscribe'}
+
+
+def _postmark_events(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    record_type = body.get('RecordType')
+    if record_type == 'SubscriptionChange' and not body.get('SuppressSending'):
+        return []
+    occurred = body.get('BouncedAt') or body.get('DeliveredAt') or body.get('ReceivedAt') or body.get('ChangedAt')
+    return [{
+        'id': body.get('ID') or f"{body.get('MessageID')}:{record_type}:{occurred}",
+        'event': _POSTMARK_EVENTS.get(record_type),
+        'email': body.get('Email') or body.get('Recipient'),
+        'message_id': (body.get('Metadata') or {}).get('message_id'),
+        'bounce_type': 'hard' if body.get('Type') == 'HardBounce' else 'soft',
+        'reason': body.get('Description') or body.get('Details'),
+        'url': body.get('OriginalLink'),
+        'timestamp': occurred,
+    }]
+
+
+_SES_RECIPIENTS = {
+    'bounce': lambda n: [r.get('emailAddress') for r in (n.get('bounce') or {}).get('bouncedRecipients', [])],
+    'complaint': lambda n: [r.get('emailAddress') for r in (n.get('complaint') or {}).get('complainedRecipients', [])],
+    'delivery': lambda n: (n.get('delivery') or {}).get('recipients', []),
+}
+
+
+def _ses_events(message: Dict[str, Any]) -> List[Dict[str, Any]]:
+    try:
+        notification = json.loads(message.get('Message') or '{}')
+    except ValueError:
+        return []
+    kind = str(notification.get('eventType') or notification.get('notificationType') or '').lower()
+    mail = notification.get('mail') or {}
+    recipients = _SES_RECIPIENTS.get(kind, lambda n: mail.get('destination', []))(notification)
+    detail = notification.get(kind) or {}
+    bounce_type = 'hard' if detail.get('bounceType') == 'Permanent' else 'soft'
+    return [{
+        'id': f"{message.get('MessageId')}:{index}",
+        'event': kind,
+        'email': recipient,
+        'message_id': (mail.get('commonHeaders') or {}).get('messageId'),
+        'bounce_type': bounce_type if kind == 'bounce' else None,
+        'reason': detail.get('bounceSubType') or detail.get('complaintFeedbackType'),
+        'url': detail.get('link'),
+        'timestamp': detail.get('timestamp') or mail.get('timestamp'),
+    } for index, recipient in enumerate(recipients)]
+
+
+def raw_events(provider: str, body: Union[Dict[str, Any], List[Any]]) -> List[Dict[str, Any]]:
+    """Unpack a verified webhook body into events ``normalize_event`` understands."""
+    if provider == 'mailgun':
+        return _mailgun_events(body) if isinstance(body, dict) else []
+    if provider == 'postmark':
+        return _postmark_events(body) if isinstance(body, dict) else []
+    if provider == 'ses':
+        return _ses_events(body) if isinstance(body, dict) and body.get('Type') == 'Notification' else []
+    events = body if isinstance(body, list) else [body]
+    return [event for event in events if isinstance(event, dict)]
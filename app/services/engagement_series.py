@@ -0,0 +1,409 @@
+"""Compact engagement time series for social posts.
+
+Every engagement report (see ``app.services.social_engagement``) becomes a
+point in the series of its post and platform. Points are stored in
+``EngagementChunk`` rows, one per post, platform and day, as column arrays
+of delta-encoded timestamps and metric changes, compressed together. A
+chunk of a post polled every 15 minutes is a few hundred bytes instead of
+96 ORM rows.
+
+Range queries sum the per-chunk metric columns in SQL for chunks entirely
+inside the range and decode only the chunks at its edges. A periodic
+compaction downsamples chunks older than SOCIAL_ENGAGEMENT_RAW_DAYS to one
+point per hour and merges chunks older than SOCIAL_ENGAGEMENT_HOURLY_DAYS
+into one chunk per month with one point per day.
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, not_, or_
+
+from app import db
+from app.models.engagement_series import EngagementChunk
+from app.utils.background import PeriodicWorker
+from app.utils.sql import insert_ignore
+
+
+METRICS = ('impressions', 'likes', 'comments', 'shares', 'clicks', 'saves')
+
+RESOLUTION_SECONDS = {'raw': 1, 'hour': 3600, 'day': 86400}
+
+# (post id, platform, time, counts before, counts now)
+Point = Tuple[str, str, datetime, Dict[str, Any], Dict[str, Any]]
+
+
+def encode_chunk(base: np.ndarray, offsets: np.ndarray, deltas: np.ndarray) -> bytes:
+    """Pack a chunk's base counts, point offsets and metric changes.
+
+    Args:
+        base: Cumulative counts before the chunk, one per metric
+        offsets: Seconds since the chunk's bucket, ascending
+        deltas: Metric changes, one row per point
+
+    Returns:
+        bytes: zlib-compressed int64 columns (time deltas, then each metric)
+    """
+    columns = np.empty((1 + len(METRICS), len(offsets) + 1), dtype=np.int64)
+    columns[0, 0] = 0
+    columns[1:, 0] = base
+    columns[0, 1:] = np.diff(offsets, prepend=0)
+    columns[1:, 1:] = deltas.T
+    return zlib.compress(columns.tobytes(), 6)
+
+
+def decode_chunk(data: bytes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Inverse of ``encode_chunk``: ``(base, offsets, deltas)``."""
+    columns = np.frombuffer(zlib.decompress(data), dtype=np.int64).reshape(1 + len(METRICS), -1)
+    return columns[1:, 0].copy(), np.cumsum(columns[0, 1:]), columns[1:, 1:].T.copy()
+
+
+def downsample(offsets: np.ndarray, deltas: np.ndarray, step: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Collapse points to one per ``step`` seconds.
+
+    Each remaining point keeps the time of the last point in its step and
+    the sum of their changes, so cumulative values at those times are
+    unchanged.
+    """
+    if not len(offsets):
+        return offsets, deltas
+    steps = offsets // step
+    last = np.flatnonzero(np.diff(steps, append=steps[-1] + 1))
+    first = np.concatenate(([0], last[:-1] + 1))
+    return offsets[last], np.add.reduceat(deltas, first, axis=0)
+
+
+def _day(when: datetime) -> datetime:
+    return when.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _month(when: datetime) -> datetime:
+    return _day(when).replace(day=1)
+
+
+def _next_month(month: datetime) -> datetime:
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def _ceil(when: datetime, floor) -> datetime:
+    start = floor(when)
+    if start == when:
+        return start
+    return start + timedelta(days=1) if floor is _day else _next_month(start)
+
+
+class EngagementSeries:
+    """Stores, queries, exports and compacts engagement time series."""
+
+    def __init__(self):
+        """Initialize with default retention settings."""
+        self.raw_retention = timedelta(days=7)
+        self.hourly_retention = timedelta(days=90)
+        self.batch_size = 500
+        self.export_folder = 'exports'
+        self.logger = logging.getLogger(__name__)
+        self.worker = PeriodicWorker('engagement-compactor', self.compact, interval=3600)
+
+    def init_app(self, app):
+        """Configure retention, the export folder and the compaction interval.
+
+        Args:
+            app: Flask application instance
+        """
+        self.raw_retention = timedelta(days=app.config.get('SOCIAL_ENGAGEMENT_RAW_DAYS', 7))
+        self.hourly_retention = timedelta(days=app.config.get('SOCIAL_ENGAGEMENT_HOURLY_DAYS', 90))
+        self.export_folder = app.config.get('SOCIAL_EXPORT_FOLDER', self.export_folder)
+        self.worker.init_app(app, interval=app.config.get('SOCIAL_ENGAGEMENT_COMPACT_INTERVAL', 3600),
+                             autostart=True)
+
+    # Writes -------------------------------------------------------------------
+
+    def append(self, points: Sequence[Point]):
+        """Add points to today's chunks (does not commit).
+
+        Missing chunks are created empty first and all of them are then read
+        with ``FOR UPDATE``, so concurrent writers to the same chunk take
+        turns instead of overwriting each other's points.
+
+        Args:
+            points: ``(post id, platform, at, counts before, counts now)``;
+                the counts before seed the base of a new chunk
+        """
+        grouped: Dict[Tuple[str, str, datetime], List[Point]] = defaultdict(list)
+        for point in points:
+            grouped[(point[0], point[1], _day(point[2]))].append(point)
+        if not grouped:
+            return
+
+        empty = np.zeros(0, dtype=np.int64), np.zeros((0, len(METRICS)), dtype=np.int64)
+        insert_ignore(EngagementChunk, [{
+            'post_key': post_key, 'platform': platform, 'bucket': bucket, 'resolution': 'raw',
+            'last_at': bucket, 'points': 0,
+            'data': encode_chunk(np.array([int(group[0][3].get(metric) or 0) for metric in METRICS],
+                                          dtype=np.int64), *empty),
+            **{metric: 0 for metric in METRICS},
+        } for (post_key, platform, bucket), group in grouped.items()], ['post_key', 'platform', 'bucket'])
+        chunks = {
+            (chunk.post_key, chunk.platform, chunk.bucket): chunk
+            for chunk in EngagementChunk.query.filter(
+                EngagementChunk.post_key.in_({key[0] for key in grouped}),
+                EngagementChunk.bucket.in_({key[2] for key in grouped}),
+            ).order_by(EngagementChunk.id).with_for_update().populate_existing()
+        }
+        for key, group in grouped.items():
+            chunk = chunks[key]
+            base, offsets, deltas = decode_chunk(chunk.data)
+            floor = int(offsets[-1]) if len(offsets) else 0
+            new_offsets = np.array([max(int((at - key[2]).total_seconds()), floor)
+                                    for _, _, at, _, _ in group], dtype=np.int64)
+            new_deltas = np.array([[int(now.get(metric) or 0) - int(before.get(metric) or 0) for metric in METRICS]
+                                   for _, _, _, before, now in group], dtype=np.int64).reshape(-1, len(METRICS))
+            offsets = np.concatenate((offsets, np.maximum.accumulate(new_offsets)))
+            deltas = np.concatenate((deltas, new_deltas))
+            self._store(chunk, base, offsets, deltas)
+
+    @staticmethod
+    def _store(chunk: EngagementChunk, base: np.ndarray, offsets: np.ndarray, deltas: np.ndarray):
+        chunk.data = encode_chunk(base, offsets, deltas)
+        chunk.points = len(offsets)
+        chunk.last_at = chunk.bucket + timedelta(seconds=int(offsets[-1]) if len(offsets) else 0)
+        for metric, total in zip(METRICS, deltas.sum(axis=0)):
+            setattr(chunk, metric, int(total))
+
+    # Queries ------------------------------------------------------------------
+
+    def totals(self, since: datetime, until: datetime, platform: Optional[str] = None,
+               by: str = 'post') -> pd.DataFrame:
+        """Engagement gained in ``[since, until)``, grouped.
+
+        Args:
+            since: Start of the range (UTC)
+            until: End of the range (UTC, exclusive)
+            platform: Optional platform to restrict to
+            by: ``post``, ``platform`` or ``day``
+
+        Returns:
+            DataFrame: One column per metric, indexed by the group
+        """
+        if by not in ('post', 'platform', 'day'):
+            raise ValueError(f"Unsupported grouping: {by}")
+        sums: Dict[Any, np.ndarray] = defaultdict(lambda: np.zeros(len(METRICS), dtype=np.int64))
+
+        # Chunks entirely inside the range: sum their metric columns in SQL
+        whole_days = and_(EngagementChunk.resolution != 'day',
+                          EngagementChunk.bucket >= _ceil(since, _day),
+                          EngagementChunk.bucket < _day(until))
+        whole_months = and_(EngagementChunk.resolution == 'day',
+                            EngagementChunk.bucket >= _ceil(since, _month),
+                            EngagementChunk.bucket < _month(until))
+        # Daily groups need the points of month chunks, which are never summed whole
+        inside = whole_days if by == 'day' else or_(whole_days, whole_months)
+        group = {'post': EngagementChunk.post_key, 'platform': EngagementChunk.platform,
+                 'day': EngagementChunk.bucket}[by]
+        query = db.session.query(group, *(db.func.sum(getattr(EngagementChunk, m)) for m in METRICS)) \
+            .filter(inside)
+        if platform:
+            query = query.filter(EngagementChunk.platform == platform)
+        for row in query.group_by(group):
+            sums[row[0]] += np.array([value or 0 for value in row[1:]], dtype=np.int64)
+
+        # Chunks at the edges: decode and filter their points
+        edges = EngagementChunk.query.filter(EngagementChunk.bucket < until, EngagementChunk.last_at >= since,
+                                             not_(inside))
+        if platform:
+            edges = edges.filter(EngagementChunk.platform == platform)
+        for chunk in edges.yield_per(self.batch_size):
+            _, offsets, deltas = decode_chunk(chunk.data)
+            times = np.datetime64(chunk.bucket, 's') + offsets.astype('timedelta64[s]')
+            # Stored times are whole seconds; compare against the exact bounds
+            mask = (times >= np.datetime64(since, 'us')) & (times < np.datetime64(until, 'us'))
+            if not mask.any():
+                continue
+            if by == 'day':
+                days = times[mask].astype('datetime64[D]')
+                for day in np.unique(days):
+                    sums[pd.Timestamp(day).to_pydatetime()] += deltas[mask][days == day].sum(axis=0)
+            else:
+                sums[chunk.post_key if by == 'post' else chunk.platform] += deltas[mask].sum(axis=0)
+
+        frame = pd.DataFrame.from_dict(dict(sums), orient='index', columns=list(METRICS))
+        frame.index.name = by
+        return frame.astype(np.int64).sort_index()
+
+    def series(self, post_key: str, platform: Optional[str] = None, since: Optional[datetime] = None,
+               until: Optional[datetime] = None) -> pd.DataFrame:
+        """Cumulative counts of one post over time.
+
+        Returns:
+            DataFrame: ``platform``, ``timestamp`` and one column per metric
+        """
+        query = EngagementChunk.query.filter(EngagementChunk.post_key == post_key)
+        if platform:
+            query = query.filter(EngagementChunk.platform == platform)
+        frames = [self._frame(chunk, since, until)
+                  for chunk in query.order_by(EngagementChunk.platform, EngagementChunk.bucket)]
+        frames = [frame for frame in frames if len(frame)]
+        if not frames:
+            return pd.DataFrame(columns=['platform', 'timestamp', *METRICS])
+        return pd.concat(frames, ignore_index=True)
+
+    @staticmethod
+    def _frame(chunk: EngagementChunk, since: Optional[datetime], until: Optional[datetime]) -> pd.DataFrame:
+        base, offsets, deltas = decode_chunk(chunk.data)
+        values = base + np.cumsum(deltas, axis=0)
+        times = pd.Timestamp(chunk.bucket) + pd.to_timedelta(offsets, unit='s')
+        mask = np.ones(len(offsets), dtype=bool)
+        if since is not None:
+            mask &= times >= pd.Timestamp(since)
+        if until is not None:
+            mask &= times < pd.Timestamp(until)
+        frame = pd.DataFrame(values[mask], columns=list(METRICS))
+        frame.insert(0, 'timestamp', times[mask])
+        frame.insert(0, 'platform', chunk.platform)
+        return frame
+
+    def iter_points(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    platform: Optional[str] = None) -> Iterator[pd.DataFrame]:
+        """Yield ``post_id``, ``platform``, ``timestamp`` and cumulative counts, one chunk at a time."""
+        query = EngagementChunk.query
+        if since is not None:
+            query = query.filter(EngagementChunk.last_at >= since)
+        if until is not None:
+            query = query.filter(EngagementChunk.bucket < until)
+        if platform:
+            query = query.filter(EngagementChunk.platform == platform)
+        query = query.order_by(EngagementChunk.post_key, EngagementChunk.platform, EngagementChunk.bucket)
+        for chunk in query.yield_per(self.batch_size):
+            frame = self._frame(chunk, since, until)
+            if len(frame):
+                frame.insert(0, 'post_id', chunk.post_key)
+                yield frame
+
+    def export(self, format_type: str = 'json', since: Optional[datetime] = None,
+               until: Optional[datetime] = None, platform: Optional[str] = None) -> Iterator[str]:
+        """Stream all points in range as CSV or as a JSON array, piece by piece.
+
+        Raises:
+            ValueError: For formats other than ``csv`` and ``json``
+        """
+        if format_type not in ('csv', 'json'):
+            raise ValueError(f"Unsupported export format: {format_type}")
+        columns = ['post_id', 'platform', 'timestamp', *METRICS]
+        if format_type == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            for frame in self.iter_points(since, until, platform):
+                frame['timestamp'] = frame['timestamp'].dt.strftime('%Y-%m-%dT%H:%M:%S')
+                writer.writerows(frame.itertuples(index=False))
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+            return
+
+        separator = '[\n'
+        for frame in self.iter_points(since, until, platform):
+            for row in frame.itertuples(index=False):
+                record = {'post_id': row[0], 'platform': row[1], 'timestamp': row[2].isoformat()}
+                record.update(zip(METRICS, map(int, row[3:])))
+                yield separator + json.dumps(record)
+                separator = ',\n'
+        yield '[]' if separator == '[\n' else '\n]'
+
+    def write_export(self, format_type: str = 'json', since: Optional[datetime] = None,
+                     until: Optional[datetime] = None, platform: Optional[str] = None) -> str:
+        """Write ``export`` to a new file in the export folder and return its path."""
+        pieces = self.export(format_type, since, until, platform)
+        os.makedirs(self.export_folder, exist_ok=True)
+        path = os.path.join(self.export_folder,
+                            f"engagement-{datetime.utcnow():%Y%m%d-%H%M%S-%f}.{format_type}")
+        with open(path, 'w', newline='', encoding='utf-8') as handle:
+            for piece in pieces:
+                handle.write(piece)
+        return path
+
+    # Compaction ---------------------------------------------------------------
+
+    def compact(self) -> Dict[str, int]:
+        """Downsample old raw chunks to hours, then merge old months into daily chunks.
+
+        Returns:
+            dict: Chunks downsampled and months merged
+        """
+        now = datetime.utcnow()
+        result = {'downsampled': 0, 'merged': 0}
+        while True:
+            done = self._downsample_days(_day(now - self.raw_retention))
+            result['downsampled'] += done
+            if done < self.batch_size:
+                break
+        while True:
+            done = self._merge_months(_month(now - self.hourly_retention))
+            result['merged'] += done
+            if not done:
+                break
+        return result
+
+    def _downsample_days(self, cutoff: datetime) -> int:
+        chunks = EngagementChunk.query.filter(EngagementChunk.resolution == 'raw',
+                                              EngagementChunk.bucket < cutoff) \
+            .order_by(EngagementChunk.id).limit(self.batch_size).all()
+        for chunk in chunks:
+            base, offsets, deltas = decode_chunk(chunk.data)
+            offsets, deltas = downsample(offsets, deltas, RESOLUTION_SECONDS['hour'])
+            self._store(chunk, base, offsets, deltas)
+            chunk.resolution = 'hour'
+        db.session.commit()
+        return len(chunks)
+
+    def _merge_months(self, cutoff: datetime) -> int:
+        pairs = db.session.query(EngagementChunk.post_key, EngagementChunk.platform) \
+            .filter(EngagementChunk.resolution != 'day', EngagementChunk.bucket < cutoff) \
+            .distinct().limit(self.batch_size).all()
+        if not pairs:
+            return 0
+        wanted = set(pairs)
+        months: Dict[Tuple[str, str, datetime], List[EngagementChunk]] = defaultdict(list)
+        for chunk in EngagementChunk.query.filter(
+                EngagementChunk.post_key.in_({post_key for post_key, _ in pairs}),
+                EngagementChunk.resolution != 'day', EngagementChunk.bucket < cutoff) \
+                .order_by(EngagementChunk.bucket):
+            if (chunk.post_key, chunk.platform) in wanted:
+                months[(chunk.post_key, chunk.platform, _month(chunk.bucket))].append(chunk)
+
+        for (post_key, platform, month), chunks in months.items():
+            base = decode_chunk(chunks[0].data)[0]
+            offsets, deltas = [], []
+            for chunk in chunks:
+                _, chunk_offsets, chunk_deltas = decode_chunk(chunk.data)
+                offsets.append(chunk_offsets + int((chunk.bucket - month).total_seconds()))
+                deltas.append(chunk_deltas)
+            offsets, deltas = downsample(np.concatenate(offsets), np.concatenate(deltas),
+                                         RESOLUTION_SECONDS['day'])
+            # Reuse the first-of-month chunk if there is one: inserts flush before deletes
+            target = next((chunk for chunk in chunks if chunk.bucket == month), None)
+            for chunk in chunks:
+                if chunk is not target:
+                    db.session.delete(chunk)
+            if target is None:
+                target = EngagementChunk(post_key=post_key, platform=platform, bucket=month)
+                db.session.add(target)
+            target.resolution = 'day'
+            self._store(target, base, offsets, deltas)
+        db.session.commit()
+        return len(months)
+
+
+# Shared instance, configured in create_app()
+engagement_series = EngagementSeries()
@@ -0,0 +1,240 @@
+"""In-memory hashtag index over our own published posts.
+
+Built from ``social_posts`` and kept current incrementally: each read
+first applies posts published, and engagement reported, since the last
+sync (two indexed watermark scans, throttled to one every few seconds).
+The index holds:
+
+* an inverted index hashtag -> post ids;
+* pairwise co-occurrence counts between hashtags used on the same post;
+* per (platform, hashtag) engagement totals, read as a smoothed average
+  engagement per post so rarely used tags cannot top the list by luck;
+* per (platform, hashtag) trending scores: engagement with exponential
+  time decay, stored pre-scaled so updates are O(1) and ranking needs no
+  rescan.
+
+Recommendations and trending topics are top-k lookups over these maps,
+with no call to a platform API on the request path.
+"""
+
+import heapq
+import json
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app import db
+from app.models.social_post import SocialPost
+from app.services.social_engagement import engagement_score
+
+
+HASHTAG_RE = re.compile(r'#(\w+)', re.UNICODE)
+WORD_RE = re.compile(r'\w{3,}', re.UNICODE)
+
+# Hashtags to suggest per platform (what tends to perform, not the platform maximum)
+RECOMMENDED_COUNTS = {'twitter': 2, 'facebook': 2, 'instagram': 10, 'linkedin': 3, 'tiktok': 4}
+
+SMOOTHING_POSTS = 3  # Pseudo-posts at the platform mean blended into each tag's average
+
+
+def extract_hashtags(content: str, options: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Lowercased hashtags from the text and the ``hashtags`` option, without '#', in order."""
+    tags = [tag.lower() for tag in HASHTAG_RE.findall(content or '')]
+    tags.extend(str(tag).lstrip('#').lower() for tag in (options or {}).get('hashtags') or [])
+    return list(dict.fromkeys(tag for tag in tags if tag))
+
+
+class HashtagIndex:
+    """Hashtag statistics and recommendations from published posts."""
+
+    def __init__(self):
+        """Initialize an empty index with default settings."""
+        self.sync_interval = 5.0
+        self.half_life = timedelta(hours=24)
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._posts: Dict[str, Set[str]] = defaultdict(set)  # tag -> post ids
+        self._cooccurrence: Dict[str, Counter] = defaultdict(Counter)
+        self._indexed: Dict[str, Tuple[List[str], List[str], str]] = {}  # post id -> (platforms, tags, location)
+        self._post_scores: Dict[str, Dict[str, float]] = {}  # post id -> platform -> score
+        self._totals: Dict[str, Dict[str, List[float]]] = defaultdict(dict)  # platform -> tag -> [score sum, posts]
+        self._platform_totals: Dict[str, List[float]] = defaultdict(lambda: [0.0, 0])
+        self._trending: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(dict)  # (platform, location) -> tag -> scaled
+        self._epoch = datetime.utcnow()
+        self._published_until: Optional[datetime] = None
+        self._engagement_until: Optional[datetime] = None
+        self._last_sync = 0.0
+
+    def init_app(self, app):
+        """Configure sync throttling and the trending half-life.
+
+        Args:
+            app: Flask application instance
+        """
+        self.sync_interval = app.config.get('SOCIAL_HASHTAG_SYNC_SECONDS', self.sync_interval)
+        self.half_life = timedelta(hours=app.config.get('SOCIAL_TRENDING_HALF_LIFE_HOURS', 24))
+
+    # Maintenance --------------------------------------------------------------
+
+    def sync(self, force: bool = False) -> int:
+        """Apply posts published and engagement reported since the last sync.
+
+        Returns:
+            int: Number of posts added or updated
+        """
+        with self._lock:
+            if not force and time.monotonic() - self._last_sync < self.sync_interval:
+                return 0
+            self._last_sync = time.monotonic()
+            changed = 0
+
+            query = db.session.query(SocialPost).filter(SocialPost.status == 'published')
+            if self._published_until is not None:
+                query = query.filter(SocialPost.published_at > self._published_until - timedelta(seconds=5))
+            for post in query.order_by(SocialPost.published_at).yield_per(1000):
+                if post.post_key not in self._indexed:
+                    self._add(post)
+                    changed += 1
+                if post.published_at and (self._published_until is None or post.published_at > self._published_until):
+                    self._published_until = post.published_at
+
+            if self._engagement_until is not None:
+                rows = (db.session.query(SocialPost.post_key, SocialPost.engagement, SocialPost.engagement_updated_at)
+                        .filter(SocialPost.engagement_updated_at > self._engagement_until - timedelta(seconds=5))
+                        .order_by(SocialPost.engagement_updated_at).all())
+                for post_key, engagement, updated_at in rows:
+                    if post_key in self._indexed:
+                        changed += self._apply_engagement(post_key, json.loads(engagement or '{}'), updated_at)
+                    self._engagement_until = max(self._engagement_until, updated_at)
+            else:
+                # Posts added above already carry their latest engagement
+                self._engagement_until = (db.session.query(db.func.max(SocialPost.engagement_updated_at)).scalar()
+                                          or datetime(1970, 1, 1))
+            return changed
+
+    def rebuild(self) -> int:
+        """Drop the index and rebuild it from the table."""
+        with self._lock:
+            self._reset()
+            return self.sync(force=True)
+
+    def _add(self, post: SocialPost):
+        options = json.loads(post.options) if post.options else {}
+        tags = extract_hashtags(post.content, options)
+        platforms = json.loads(post.platforms)
+        location = str(options.get('location') or '').lower()
+        self._indexed[post.post_key] = (platforms, tags, location)
+        self._post_scores[post.post_key] = {}
+        for tag in tags:
+            self._posts[tag].add(post.post_key)
+            for other in tags:
+                if other != tag:
+                    self._cooccurrence[tag][other] += 1
+            for platform in platforms:
+                totals = self._totals[platform].setdefault(tag, [0.0, 0])
+                totals[1] += 1
+        for platform in platforms:
+            self._platform_totals[platform][1] += 1
+        self._apply_engagement(post.post_key, json.loads(post.engagement or '{}'),
+                               post.engagement_updated_at or post.published_at or datetime.utcnow())
+
+    def _scaled(self, amount: float, at: datetime) -> float:
+        """Decayed weight of ``amount`` observed at ``at``, scaled to the index epoch."""
+        exponent = (at - self._epoch) / self.half_life
+        if exponent > 500:
+            # Rebase before the scale factor overflows; ratios between tags are preserved
+            shift = 2.0 ** -exponent
+            for scores in self._trending.values():
+                for tag in scores:
+                    scores[tag] *= shift
+            self._epoch = at
+            exponent = 0.0
+        return amount * 2.0 ** exponent
+
+    def _apply_engagement(self, post_key: str, engagement: Dict[str, Dict[str, Any]], at: datetime) -> int:
+        platforms, tags, location = self._indexed[post_key]
+        previous = self._post_scores[post_key]
+        changed = 0
+        for platform, counts in engagement.items():
+            delta = engagement_score(counts) - previous.get(platform, 0.0)
+            if not delta or platform not in platforms:
+                continue
+            previous[platform] = previous.get(platform, 0.0) + delta
+            self._platform_totals[platform][0] += delta
+            scaled = self._scaled(delta, at)
+            for tag in tags:
+                self._totals[platform][tag][0] += delta
+                for key in {(platform, ''), (platform, location)}:
+                    trending = self._trending[key]
+                    trending[tag] = trending.get(tag, 0.0) + scaled
+            changed = 1
+        return changed
+
+    # Lookups ------------------------------------------------------------------
+
+    def tag_score(self, platform: str, tag: str) -> float:
+        """Smoothed average engagement per post using ``tag`` on ``platform``."""
+        total, posts = self._platform_totals.get(platform, (0.0, 0))
+        mean = total / posts if posts else 0.0
+        tag_total, tag_posts = self._totals.get(platform, {}).get(tag, (0.0, 0))
+        return (tag_total + SMOOTHING_POSTS * mean) / (tag_posts + SMOOTHING_POSTS)
+
+    def posts_with(self, tag: str) -> Set[str]:
+        """Ids of published posts that used ``tag``."""
+        self.sync()
+        return set(self._posts.get(tag.lstrip('#').lower(), ()))
+
+    def recommend(self, content: str, platform: str, count: Optional[int] = None) -> List[str]:
+        """Hashtags to add to ``content`` for ``platform``, best first.
+
+        Candidates are tags that co-occur with the content's own hashtags
+        (weighted by how often, relative to the own tag's use) and known
+        tags matching words of the content; each is scaled by its smoothed
+        engagement on the platform. Remaining slots go to the platform's
+        best performing tags.
+        """
+        self.sync()
+        count = count or RECOMMENDED_COUNTS.get(platform, 3)
+        own = set(extract_hashtags(content))
+        with self._lock:
+            relevance: Counter = Counter()
+            for tag in own:
+                uses = len(self._posts.get(tag, ()))
+                for other, together in self._cooccurrence.get(tag, {}).items():
+                    relevance[other] += together / uses
+            for word in {word.lower() for word in WORD_RE.findall(HASHTAG_RE.sub(' ', content or ''))}:
+                if word in self._posts:
+                    relevance[word] += 1.0
+            for tag in own:
+                relevance.pop(tag, None)
+
+            def weight(item):
+                tag, score = item
+                return score * (1.0 + math.log1p(max(self.tag_score(platform, tag), 0.0)))
+
+            picks = [tag for tag, _ in heapq.nlargest(count, relevance.items(), key=weight)]
+            if len(picks) < count:
+                best = heapq.nlargest(count + len(own) + len(picks), self._totals.get(platform, {}),
+                                      key=lambda tag: self.tag_score(platform, tag))
+                picks.extend(tag for tag in best if tag not in own and tag not in picks)
+        return [f'#{tag}' for tag in picks[:count]]
+
+    def trending(self, platform: str, location: Optional[str] = None, count: int = 10) -> List[str]:
+        """Tags with the most recent engagement on ``platform`` (optionally in one location)."""
+        self.sync()
+        with self._lock:
+            scores = self._trending.get((platform, (location or '').lower()), {})
+            return [f'#{tag}' for tag, score in heapq.nlargest(count, scores.items(), key=lambda item: item[1])
+                    if score > 0]
+
+
+# Shared instance, configured in create_app()
+hashtag_index = HashtagIndex()
@@ -0,0 +1,207 @@
+"""Inventory reservations.
+
+Stock is taken with conditional UPDATEs (``WHERE stock_quantity >= :q``),
+so the database arbitrates concurrent checkouts without SELECT ... FOR
+UPDATE and a product can never go below zero. A cart reserves all its
+lines in one transaction, in product id order so concurrent carts lock
+rows in the same order; if any line is short the whole cart is rolled
+back.
+
+Every reservation leaves ``held`` through exactly one conditional UPDATE
+(commit, release or expiry), so stock is returned at most once even when
+the sweeper and a late checkout race.
+"""
+
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import bindparam, func, select
+
+from app import db
+from app.models.product import Product
+from app.models.stock_reservation import StockReservation
+from app.utils.background import PeriodicWorker
+
+
+class InsufficientStockError(Exception):
+    """Raised when a product does not have enough stock for a reservation."""
+
+    def __init__(self, product_id: int, requested: int):
+        super().__init__(f'Insufficient stock for product {product_id} (requested {requested})')
+        self.product_id = product_id
+        self.requested = requested
+
+
+class ReservationError(Exception):
+    """Raised when a reservation is unknown, expired or already settled."""
+
+
+CartItems = Union[Dict[int, int], Iterable[Tuple[int, int]]]
+
+
+class InventoryService:
+    """Reserve, commit and release product stock."""
+
+    def __init__(self):
+        """Initialize with default reservation lifetime and sweep settings."""
+        self.reservation_ttl = 900
+        self.sweep_batch_size = 500
+        self.logger = logging.getLogger(__name__)
+        self.worker = PeriodicWorker('inventory-sweeper', self.expire_stale, interval=30)
+
+    def init_app(self, app):
+        """Configure reservation lifetime and the expiry sweeper.
+
+        Args:
+            app: Flask application instance
+        """
+        self.reservation_ttl = app.config.get('INVENTORY_RESERVATION_TTL', self.reservation_ttl)
+        self.worker.init_app(app, interval=app.config.get('INVENTORY_SWEEP_INTERVAL', 30), autostart=True)
+
+    def reserve(self, items: CartItems, ttl: Optional[int] = None) -> str:
+        """Reserve stock for every line of a cart, all or nothing.
+
+        Args:
+            items: ``{product_id: quantity}`` or ``(product_id, quantity)`` pairs
+            ttl: Seconds the hold lasts (defaults to INVENTORY_RESERVATION_TTL)
+
+        Returns:
+            str: Reservation token for :meth:`commit` / :meth:`release`
+
+        Raises:
+            InsufficientStockError: If any line cannot be reserved
+            ValueError: If the cart is empty or a quantity is not positive
+        """
+        lines = defaultdict(int)
+        for product_id, quantity in (items.items() if isinstance(items, dict) else items):
+            if quantity <= 0:
+                raise ValueError('quantities must be positive')
+            lines[int(product_id)] += int(quantity)
+        if not lines:
+            raise ValueError('cart is empty')
+
+        table = Product.__table__
+        now = datetime.utcnow()
+        take = (table.update()
+                .where(table.c.id == bindparam('b_id'), table.c.stock_quantity >= bindparam('b_quantity'))
+                .values(stock_quantity=table.c.stock_quantity - bindparam('b_quantity'), updated_at=now))
+        try:
+            for product_id in sorted(lines):
+                result = db.session.execute(take, {'b_id': product_id, 'b_quantity': lines[product_id]})
+                if result.rowcount != 1:
+                    raise InsufficientStockError(product_id, lines[product_id])
+            token = uuid.uuid4().hex
+            expires_at = now + timedelta(seconds=ttl if ttl is not None else self.reservation_ttl)
+            db.session.execute(StockReservation.__table__.insert(), [{
+                'token': token,
+                'product_id': product_id,
+                'quantity': quantity,
+                'status': 'held',
+                'expires_at': expires_at,
+                'created_at': now,
+            } for product_id, quantity in sorted(lines.items())])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self.worker.ensure_started()
+        return token
+
+    def commit(self, token: str, order_id: Optional[int] = None) -> int:
+        """Turn a held reservation into a sale.
+
+        Args:
+            token: Token returned by :meth:`reserve`
+            order_id: Order the stock was sold to
+
+        Returns:
+            int: Number of reservation lines committed
+
+        Raises:
+            ReservationError: If nothing is held under the token (expired,
+                released or already committed)
+        """
+        table = StockReservation.__table__
+        result = db.session.execute(
+            table.update()
+            .where(table.c.token == token, table.c.status == 'held', table.c.expires_at > datetime.utcnow())
+            .values(status='committed', order_id=order_id)
+        )
+        if not result.rowcount:
+            db.session.rollback()
+            raise ReservationError(f'No active reservation {token}')
+        db.session.commit()
+        return result.rowcount
+
+    def release(self, token: str) -> int:
+        """Cancel a held reservation and return its stock.
+
+        Returns:
+            int: Total quantity returned to stock (0 if nothing was held)
+        """
+        table = StockReservation.__table__
+        returned = self._return_stock(
+            (table.c.token == token) & (table.c.status == 'held'), 'released')
+        db.session.commit()
+        return returned
+
+    def expire_stale(self) -> int:
+        """Return stock from reservations whose hold has lapsed.
+
+        Returns:
+            int: Total quantity returned to stock
+        """
+        table = StockReservation.__table__
+        total = 0
+        while True:
+            stale_ids = (select(table.c.id)
+                         .where(table.c.status == 'held', table.c.expires_at <= datetime.utcnow())
+                         .order_by(table.c.expires_at)
+                         .limit(self.sweep_batch_size))
+            ids = db.session.execute(stale_ids).scalars().all()
+            if not ids:
+                break
+            total += self._return_stock(table.c.id.in_(ids) & (table.c.status == 'held'), 'expired')
+            db.session.commit()
+            if len(ids) < self.sweep_batch_size:
+                break
+        if total:
+            self.logger.info(f"Returned {total} units of stock from expired reservations")
+        return total
+
+    def _return_stock(self, condition, new_status: str) -> int:
+        """Move held reservations matching ``condition`` to ``new_status`` and restock.
+
+        The status flip is the guard: only rows this call flipped (marked
+        with a fresh claim token) give their quantity back. Does not commit.
+        """
+        reservations = StockReservation.__table__
+        claim = uuid.uuid4().hex
+        flipped = db.session.execute(
+            reservations.update().where(condition).values(status=new_status, claim_token=claim)
+        ).rowcount
+        if not flipped:
+            return 0
+
+        quantities: List[Tuple[int, int]] = db.session.execute(
+            select(reservations.c.product_id, func.sum(reservations.c.quantity))
+            .where(reservations.c.claim_token == claim)
+            .group_by(reservations.c.product_id)
+            .order_by(reservations.c.product_id)
+        ).all()
+        products = Product.__table__
+        db.session.execute(
+            products.update().where(products.c.id == bindparam('b_id')).values(
+                stock_quantity=products.c.stock_quantity + bindparam('b_quantity'),
+                updated_at=datetime.utcnow()
+            ),
+            [{'b_id': product_id, 'b_quantity': int(quantity)} for product_id, quantity in quantities]
+        )
+        return sum(int(quantity) for _, quantity in quantities)
+
+
+# Shared instance, configured in create_app()
+inventory = InventoryService()
@@ -0,0 +1,322 @@
+"""Payment transaction ledger.
+
+Keeps the local ``transactions`` table in step with the payment provider:
+
+- webhook batches are folded into the ledger by a handler registered on the
+  webhook inbox,
+- API responses (payment intents, refunds) are recorded as they come back,
+- a reconciliation job pulls provider events newer than a stored cursor and
+  feeds them through the inbox, so missed webhooks are repaired without
+  refetching history.
+
+History is read back with keyset pagination on (created_at, id).
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+from app import db
+from app.models.order import Order
+from app.models.settings import Setting
+from app.models.transaction import PaymentTransaction
+from app.utils.background import PeriodicWorker
+from app.utils.sql import upsert
+
+
+EPOCH = datetime(1970, 1, 1)
+
+# Columns refreshed when a known payment or refund changes status
+UPDATE_COLUMNS = ('status', 'customer_id', 'subscription_id', 'payment_intent_id', 'amount',
+                  'currency', 'billing_interval', 'updated_at')
+
+# Links that later events may omit (refund.updated has no customer); a NULL
+# in the incoming row keeps the stored value
+KEEP_EXISTING_COLUMNS = ('customer_id', 'subscription_id', 'payment_intent_id', 'billing_interval', 'order_id')
+
+# Payment and refund statuses Stripe never leaves for a non-final one; a
+# late event or stale API object cannot move a row back out of them
+FINAL_STATUSES = ('succeeded', 'canceled', 'failed')
+
+
+def _not_regressing(incoming, current):
+    """Upsert guard: a row in a final status only takes another final status."""
+    return or_(current['status'].notin_(FINAL_STATUSES), incoming['status'].in_(FINAL_STATUSES))
+
+
+# Stripe event types that change the ledger; also what reconciliation asks for.
+# payment_intent.created is left out so a late delivery cannot roll a
+# settled payment back to an earlier status.
+LEDGER_EVENT_TYPES = [
+    'payment_intent.succeeded',
+    'payment_intent.payment_failed',
+    'payment_intent.canceled',
+    'charge.refunded',
+    'refund.created',
+    'refund.updated',
+    'customer.subscription.created',
+    'customer.subscription.updated',
+    'customer.subscription.deleted',
+]
+
+
+def _from_timestamp(value) -> datetime:
+    return datetime.utcfromtimestamp(int(value)) if value else datetime.utcnow()
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque keyset cursor for the row a page ended on."""
+    return f'{(created_at - EPOCH) // timedelta(microseconds=1)}.{row_id}'
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of :func:`encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    micros, _, row_id = cursor.partition('.')
+    return EPOCH + timedelta(microseconds=int(micros)), int(row_id)
+
+
+def _subscription_price(subscription: Dict[str, Any]) -> Tuple[int, Optional[str]]:
+    """Recurring amount per billing interval and the interval, from subscription items."""
+    amount = 0
+    interval = None
+    for item in (subscription.get('items') or {}).get('data') or []:
+        price = item.get('price') or item.get('plan') or {}
+        amount += int(price.get('unit_amount') or price.get('amount') or 0) * int(item.get('quantity') or 1)
+        recurring = price.get('recurring') or {}
+        interval = interval or recurring.get('interval') or price.get('interval')
+    return amount, interval
+
+
+def stripe_rows(obj: Dict[str, Any], event: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Normalize a Stripe object into ledger rows.
+
+    Args:
+        obj: Payment intent, refund, charge or subscription object
+        event: Event the object came from; required for subscriptions,
+            whose rows are keyed by event id
+
+    Returns:
+        list: Column dictionaries for :class:`PaymentTransaction`
+    """
+    now = datetime.utcnow()
+    kind = obj.get('object')
+    base = {'provider': 'stripe', 'customer_id': obj.get('customer'), 'subscription_id': None,
+            'billing_interval': None, 'order_id': None, 'updated_at': now}
+
+    if kind == 'payment_intent':
+        return [dict(base, external_id=obj['id'], kind='payment', status=obj.get('status') or 'unknown',
+                     payment_intent_id=obj['id'], amount=int(obj.get('amount') or 0),
+                     currency=obj.get('currency') or 'usd', subscription_id=obj.get('subscription'),
+                     created_at=_from_timestamp(obj.get('created')))]
+
+    if kind == 'refund':
+        return [dict(base, external_id=obj['id'], kind='refund', status=obj.get('status') or 'unknown',
+                     payment_intent_id=obj.get('payment_intent'), amount=int(obj.get('amount') or 0),
+                     currency=obj.get('currency') or 'usd', created_at=_from_timestamp(obj.get('created')))]
+
+    if kind == 'charge':
+        # charge.refunded carries the refunds it triggered; each is its own row
+        refunds = (obj.get('refunds') or {}).get('data') or []
+        rows = []
+        for refund in refunds:
+            for row in stripe_rows(dict(refund, object='refund')):
+                row['customer_id'] = row['customer_id'] or obj.get('customer')
+                row['payment_intent_id'] = row['payment_intent_id'] or obj.get('payment_intent')
+                rows.append(row)
+        return rows
+
+    if kind == 'subscription' and event is not None:
+        amount, interval = _subscription_price(obj)
+        return [dict(base, external_id=event['id'], kind='subscription', status=obj.get('status') or 'unknown',
+                     subscription_id=obj['id'], payment_intent_id=None, amount=amount,
+                     currency=obj.get('currency') or 'usd', billing_interval=interval,
+                     created_at=_from_timestamp(event.get('created')))]
+
+    return []
+
+
+class Ledger:
+    """Writes and queries the local transaction ledger."""
+
+    def __init__(self):
+        """Initialize the ledger with its reconciliation worker."""
+        self.page_size = 100
+        self.lookback_days = 30
+        self.api_key = None
+        self.api_base = None
+        self.logger = logging.getLogger(__name__)
+        self.worker = PeriodicWorker('ledger-reconcile', self.reconcile, interval=900)
+
+    def init_app(self, app):
+        """Register the webhook handler and configure reconciliation.
+
+        Args:
+            app: Flask application instance
+        """
+        from app.services.webhooks import webhook_inbox
+
+        if self.record_webhook_batch not in webhook_inbox.batch_handlers:
+            webhook_inbox.register_batch_handler(self.record_webhook_batch)
+        self.api_key = app.config.get('STRIPE_SECRET_KEY')
+        self.api_base = app.config.get('STRIPE_API_BASE')
+        self.lookback_days = app.config.get('LEDGER_RECONCILE_LOOKBACK_DAYS', self.lookback_days)
+        # Reconciliation only makes sense with provider credentials
+        self.worker.init_app(app, interval=app.config.get('LEDGER_RECONCILE_INTERVAL', 900),
+                             autostart=bool(self.api_key))
+
+    # Writes -------------------------------------------------------------------
+
+    def record(self, rows: List[Dict[str, Any]]) -> int:
+        """Upsert normalized rows and link payments to orders.
+
+        Must run inside the caller's transaction; does not commit.
+
+        Returns:
+            int: Number of rows written
+        """
+        if not rows:
+            return 0
+        # Last write per key wins within a batch (callers pass rows in event order),
+        # except that a final status is never replaced by a non-final one
+        latest = {}
+        for row in rows:
+            key = (row['provider'], row['external_id'])
+            previous = latest.get(key)
+            if previous is None or previous['status'] not in FINAL_STATUSES or row['status'] in FINAL_STATUSES:
+                latest[key] = row
+        rows = list(latest.values())
+        self._attach_orders(rows)
+        return upsert(PaymentTransaction, rows, conflict_columns=['provider', 'external_id'],
+                      update_columns=UPDATE_COLUMNS + ('order_id',), keep_existing=KEEP_EXISTING_COLUMNS,
+                      only_if=_not_regressing)
+
+    def record_stripe_objects(self, objects: Iterable[Dict[str, Any]], commit: bool = True) -> int:
+        """Record objects returned by the Stripe API (payment intents, refunds).
+
+        Args:
+            objects: Stripe objects as dictionaries
+            commit: Commit the session afterwards
+
+        Returns:
+            int: Number of rows written
+        """
+        rows = [row for obj in objects for row in stripe_rows(obj)]
+        written = self.record(rows)
+        if commit and written:
+            db.session.commit()
+        return written
+
+    def record_webhook_batch(self, events: List[Tuple[Any, Dict[str, Any]]]):
+        """Webhook inbox batch handler; runs in the inbox's transaction."""
+        rows = []
+        for stored, event in sorted(events, key=lambda item: item[1].get('created') or 0):
+            if stored.provider != 'stripe' or event.get('type') not in LEDGER_EVENT_TYPES:
+                continue
+            obj = (event.get('data') or {}).get('object') or {}
+            rows.extend(stripe_rows(obj, event))
+        self.record(rows)
+
+    def _attach_orders(self, rows: List[Dict[str, Any]]):
+        """Fill order_id for rows whose payment intent belongs to an order, in one query."""
+        intent_ids = {row['payment_intent_id'] for row in rows if row.get('payment_intent_id')}
+        if not intent_ids:
+            return
+        order_ids = dict(db.session.query(Order.stripe_payment_intent_id, Order.id)
+                         .filter(Order.stripe_payment_intent_id.in_(intent_ids)).all())
+        for row in rows:
+            row['order_id'] = order_ids.get(row.get('payment_intent_id'))
+
+    # Reads --------------------------------------------------------------------
+
+    def history(self, customer_id: str, provider: Optional[str] = None, kind: Optional[str] = None,
+                limit: int = 20, cursor: Optional[str] = None) -> Tuple[List[PaymentTransaction], Optional[str]]:
+        """One page of a customer's transactions, newest first.
+
+        Served by the (customer_id, created_at, id) index; each page seeks
+        past the previous page's last row instead of using OFFSET.
+
+        Args:
+            customer_id: Provider customer id
+            provider: Optional provider filter
+            kind: Optional kind filter (payment, refund, subscription)
+            limit: Page size
+            cursor: ``next_cursor`` from the previous page
+
+        Returns:
+            tuple: (list of PaymentTransaction, next cursor or None)
+        """
+        query = PaymentTransaction.query.filter(PaymentTransaction.customer_id == customer_id)
+        if provider:
+            query = query.filter(PaymentTransaction.provider == provider)
+        if kind:
+            query = query.filter(PaymentTransaction.kind == kind)
+        if cursor:
+            created_at, row_id = decode_cursor(cursor)
+            query = query.filter(or_(
+                PaymentTransaction.created_at < created_at,
+                and_(PaymentTransaction.created_at == created_at, PaymentTransaction.id < row_id)
+            ))
+        rows = (query.order_by(PaymentTransaction.created_at.desc(), PaymentTransaction.id.desc())
+                .limit(limit + 1).all())
+        items = rows[:limit]
+        next_cursor = encode_cursor(items[-1].created_at, items[-1].id) if len(rows) > limit else None
+        return items, next_cursor
+
+    # Reconciliation -----------------------------------------------------------
+
+    def cursor_key(self, provider: str) -> str:
+        return f'ledger.{provider}.events_cursor'
+
+    def reconcile(self) -> int:
+        """Pull Stripe events created since the stored cursor into the webhook inbox.
+
+        Events go through the same inbox as webhooks, so duplicates of
+        already-delivered events are dropped by its unique key and missed
+        ones update both orders and the ledger. The cursor is the newest
+        event timestamp seen; the next run re-reads that second, which the
+        inbox deduplicates.
+
+        Returns:
+            int: Number of events that had not been seen before
+        """
+        if not self.api_key:
+            return 0
+        import stripe
+        from app.services.webhooks import webhook_inbox
+
+        stripe.api_key = self.api_key
+        if self.api_base:
+            stripe.api_base = self.api_base
+
+        key = self.cursor_key('stripe')
+        stored = Setting.get_value(key)
+        since = int(stored) if stored else int(
+            (datetime.utcnow() - timedelta(days=self.lookback_days) - EPOCH).total_seconds())
+
+        newest = since
+        batch = []
+        queued = 0
+        events = stripe.Event.list(created={'gte': since}, types=LEDGER_EVENT_TYPES, limit=self.page_size)
+        for event in events.auto_paging_iter():
+            event = event.to_dict()
+            newest = max(newest, int(event.get('created') or 0))
+            batch.append(event)
+            if len(batch) >= self.page_size:
+                queued += webhook_inbox.enqueue_many('stripe', batch)
+                batch = []
+        queued += webhook_inbox.enqueue_many('stripe', batch)
+
+        Setting.set_value(key, str(newest))
+        if queued:
+            self.logger.info(f"Ledger reconciliation queued {queued} missed Stripe events")
+        return queued
+
+
+# Shared instance, configured in create_app()
+ledger = Ledger()
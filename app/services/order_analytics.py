@@ -0,0 +1,256 @@
+"""Daily order aggregates: incremental refresh and reporting queries.
+
+Orders change after they are created (paid, shipped, refunded), so the
+refresh does not apply deltas. It uses the ``updated_at`` index to find
+the creation days touched since the last watermark, recomputes those days
+in full with one grouped scan over ``created_at`` and replaces their
+aggregate rows. Reports then read a few hundred pre-aggregated rows
+instead of scanning orders.
+
+Orders changed by bulk UPDATEs must also set ``updated_at`` to be picked
+up; hard-deleted orders are only reflected by :meth:`rebuild`.
+
+Refreshes run in one process at a time, the holder of a leader lease.
+Elsewhere, and while a refresh is in progress, reports read the
+aggregates as they are.
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy import func
+
+from app import db
+from app.models.order import Order
+from app.models.order_aggregate import DailyOrderAggregate, DailyOrderStatusCount
+from app.models.settings import Setting
+from app.utils.background import PeriodicWorker
+from app.utils.lease import LeaderLease
+from app.utils.sql import upsert
+
+
+WATERMARK_KEY = 'analytics.orders.watermark'
+
+
+def _as_date(value) -> date:
+    # func.date() returns a string on SQLite and a date elsewhere
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _day_ranges(days: Iterable[date]) -> List[Tuple[date, date]]:
+    """Collapse days into contiguous [first, last] ranges."""
+    ranges = []
+    for day in sorted(set(days)):
+        if ranges and day - ranges[-1][1] == timedelta(days=1):
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+
+class OrderAnalytics:
+    """Maintains and queries the daily order aggregate tables."""
+
+    def __init__(self):
+        """Initialize with default refresh settings."""
+        self.overlap = timedelta(seconds=60)
+        self.refresh_interval = 300
+        self.logger = logging.getLogger(__name__)
+        self.lease = LeaderLease('order-aggregates', ttl=600)
+        self.worker = PeriodicWorker('order-aggregates', self.refresh, interval=self.refresh_interval)
+        self._last_refresh = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Configure the refresh worker from app config.
+
+        Args:
+            app: Flask application instance
+        """
+        self.refresh_interval = app.config.get('ORDER_ANALYTICS_REFRESH_INTERVAL', self.refresh_interval)
+        self.lease.ttl = max(30, 2 * self.refresh_interval)
+        self.worker.init_app(app, interval=self.refresh_interval, autostart=True)
+
+    # Refresh ------------------------------------------------------------------
+
+    def refresh(self) -> int:
+        """Recompute the aggregate rows for days with orders changed since the watermark.
+
+        The watermark is re-read with a small overlap so transactions that
+        committed late with an older ``updated_at`` are not skipped;
+        recomputing a day twice is harmless. Does nothing unless this
+        process holds the lease and is not already refreshing.
+
+        Returns:
+            int: Number of days recomputed
+        """
+        if not self._lock.acquire(blocking=False):
+            return 0
+        try:
+            if not self.lease.hold():
+                return 0
+            return self._refresh()
+        finally:
+            self._lock.release()
+
+    def _refresh(self) -> int:
+        stored = Setting.get_value(WATERMARK_KEY)
+        since = datetime.fromisoformat(stored) - self.overlap if stored else None
+
+        day_column = func.date(Order.created_at)
+        query = db.session.query(day_column, func.max(Order.updated_at)).filter(Order.created_at.isnot(None))
+        if since is not None:
+            query = query.filter(Order.updated_at > since)
+        touched = query.group_by(day_column).all()
+
+        self._last_refresh = datetime.utcnow()
+        if not touched:
+            return 0
+        days = {_as_date(day) for day, _ in touched}
+        updates = [updated for _, updated in touched if updated is not None]
+        newest = max(updates) if updates else None
+
+        self._recompute(days)
+        if newest is not None and (not stored or newest > datetime.fromisoformat(stored)):
+            Setting.set_value(WATERMARK_KEY, newest.isoformat())
+        else:
+            db.session.commit()
+        return len(days)
+
+    def rebuild(self) -> int:
+        """Drop all aggregates and recompute every day from scratch.
+
+        Raises:
+            RuntimeError: If another process holds the lease
+        """
+        with self._lock:
+            if not self.lease.try_acquire():
+                raise RuntimeError('Order aggregates are being refreshed by another process')
+            db.session.query(DailyOrderStatusCount).delete()
+            db.session.query(DailyOrderAggregate).delete()
+            Setting.set_value(WATERMARK_KEY, None)
+            return self._refresh()
+
+    def refresh_if_stale(self):
+        """Refresh unless this process tried within the last interval.
+
+        Runs on the request path: if another process holds the lease or the
+        refresh fails, the current aggregates are served as they are.
+        """
+        if self._last_refresh is not None and datetime.utcnow() - self._last_refresh <= timedelta(
+                seconds=self.refresh_interval):
+            return
+        self._last_refresh = datetime.utcnow()
+        try:
+            self.refresh()
+        except Exception as e:
+            db.session.rollback()
+            self.logger.warning(f"Order aggregate refresh failed; serving stale aggregates: {str(e)}")
+
+    def _recompute(self, days: Set[date]):
+        """Replace aggregate rows for ``days``; one grouped scan per contiguous range."""
+        totals = {day: {'order_count': 0, 'paid_count': 0, 'refunded_count': 0,
+                        'gross_revenue': Decimal('0'), 'refunded_amount': Decimal('0'),
+                        'net_revenue': Decimal('0')} for day in days}
+        funnel = defaultdict(int)
+
+        day_column = func.date(Order.created_at)
+        for first, last in _day_ranges(days):
+            start = datetime.combine(first, datetime.min.time())
+            end = datetime.combine(last + timedelta(days=1), datetime.min.time())
+            rows = (db.session.query(day_column, Order.status, Order.payment_status,
+                                     func.count(Order.id), func.sum(Order.total_amount))
+                    .filter(Order.created_at >= start, Order.created_at < end)
+                    .group_by(day_column, Order.status, Order.payment_status)
+                    .all())
+            for day, status, payment_status, count, amount in rows:
+                day = _as_date(day)
+                amount = Decimal(str(amount or 0))
+                bucket = totals[day]
+                bucket['order_count'] += count
+                funnel[(day, status or 'unknown')] += count
+                if payment_status == 'paid':
+                    bucket['paid_count'] += count
+                    bucket['gross_revenue'] += amount
+                    bucket['net_revenue'] += amount
+                elif payment_status == 'refunded':
+                    bucket['refunded_count'] += count
+                    bucket['gross_revenue'] += amount
+                    bucket['refunded_amount'] += amount
+
+        now = datetime.utcnow()
+        upsert(DailyOrderAggregate, [dict(values, day=day, refreshed_at=now) for day, values in totals.items()],
+               conflict_columns=['day'],
+               update_columns=['order_count', 'paid_count', 'refunded_count', 'gross_revenue',
+                               'refunded_amount', 'net_revenue', 'refreshed_at'])
+        # Statuses can disappear from a day, so its funnel rows are replaced wholesale
+        db.session.query(DailyOrderStatusCount).filter(
+            DailyOrderStatusCount.day.in_(list(days))).delete(synchronize_session=False)
+        if funnel:
+            db.session.execute(DailyOrderStatusCount.__table__.insert(), [
+                {'day': day, 'status': status, 'order_count': count}
+                for (day, status), count in sorted(funnel.items())
+            ])
+
+    # Queries ------------------------------------------------------------------
+
+    def summary(self, start_date: date, end_date: date) -> Dict[str, Any]:
+        """Revenue, AOV, refund rate and status funnel for an inclusive date range.
+
+        Args:
+            start_date: First day (datetimes are truncated to their date)
+            end_date: Last day, inclusive
+
+        Returns:
+            dict: Totals plus ``funnel`` (status -> orders) and ``daily`` rows
+        """
+        if isinstance(start_date, datetime):
+            start_date = start_date.date()
+        if isinstance(end_date, datetime):
+            end_date = end_date.date()
+        self.refresh_if_stale()
+
+        rows = (DailyOrderAggregate.query
+                .filter(DailyOrderAggregate.day >= start_date, DailyOrderAggregate.day <= end_date)
+                .order_by(DailyOrderAggregate.day).all())
+        funnel = dict(db.session.query(DailyOrderStatusCount.status, func.sum(DailyOrderStatusCount.order_count))
+                      .filter(DailyOrderStatusCount.day >= start_date, DailyOrderStatusCount.day <= end_date)
+                      .group_by(DailyOrderStatusCount.status).all())
+
+        orders = sum(row.order_count for row in rows)
+        paid = sum(row.paid_count for row in rows)
+        refunded = sum(row.refunded_count for row in rows)
+        gross = sum((row.gross_revenue for row in rows), Decimal('0'))
+        refunded_amount = sum((row.refunded_amount for row in rows), Decimal('0'))
+        net = sum((row.net_revenue for row in rows), Decimal('0'))
+        ever_paid = paid + refunded
+
+        return {
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'orders': orders,
+            'paid_orders': paid,
+            'refunded_orders': refunded,
+            'gross_revenue': float(gross),
+            'refunded_amount': float(refunded_amount),
+            'net_revenue': float(net),
+            'average_order_value': float(gross / ever_paid) if ever_paid else 0.0,
+            'refund_rate': refunded / ever_paid if ever_paid else 0.0,
+            'payment_conversion_rate': ever_paid / orders if orders else 0.0,
+            'funnel': {status: int(count) for status, count in funnel.items()},
+            'daily': [{
+                'day': row.day.isoformat(),
+                'orders': row.order_count,
+                'paid_orders': row.paid_count,
+                'refunded_orders': row.refunded_count,
+                'net_revenue': float(row.net_revenue),
+            } for row in rows],
+        }
+
+
+# Shared instance, configured in create_app()
+order_analytics = OrderAnalytics()
@@ -21,6 +21,12 @@ from decimal import Decimal
 from datetime import datetime
 import logging
 
+from app.services.webhooks import WebhookValidationError, parse_event, verify_stripe_signature, webhook_inbox
+
+
+class RefundError(Exception):
+    """Raised when a payment provider rejects or fails a refund."""
+
 
 class PaymentService:
     """
@@ -203,14 +209,18 @@ class PaymentService:
             WebhookValidationError: If webhook signature validation fails
             WebhookProcessingError: If webhook event processing fails
         """
-        # TODO: Implement Stripe webhook handling
-        # - Verify webhook signature using webhook secret
-        # - Parse and validate webhook payload
-        # - Route events to appropriate handlers (payment_intent.succeeded, etc.)
-        # - Update internal payment/subscription status
-        # - Log webhook processing results
-        # - Return acknowledgment response
-        pass
+        if not self.validate_webhook_signature(payload, signature, provider='stripe'):
+            raise WebhookValidationError("Invalid Stripe signature")
+        event = parse_event(payload)
+        queued = webhook_inbox.enqueue('stripe', event, payload)
+        self.logger.info(f"Stripe webhook {event['id']} ({event['type']}) "
+                         f"{'queued' if queued else 'ignored as duplicate'}")
+        return {
+            "event_id": event["id"],
+            "event_type": event["type"],
+            "queued": queued,
+            "duplicate": not queued
+        }
     
     def handle_paypal_webhook(self, payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
         """
@@ -240,38 +250,48 @@ class PaymentService:
     def get_transaction_history(self, 
                               customer_id: str,
                               provider: str = 'stripe',
-                              limit: int = 10) -> List[Dict[str, Any]]:
+                              limit: int = 10,
+                              cursor: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Retrieve transaction history for a customer.
         
+        Served from the local transactions ledger (kept current by webhooks
+        and the reconciliation job) rather than the provider API.
+        
         Args:
             customer_id (str): Customer identifier
             provider (str): Payment provider ('stripe' or 'paypal')
             limit (int): Maximum number of transactions to return
+            cursor (str, optional): ``cursor`` of the last record of the previous page
             
         Returns:
-            List[Dict[str, Any]]: List of transaction records
+            List[Dict[str, Any]]: List of transaction records, newest first
         """
-        # TODO: Implement transaction history retrieval
-        # - Query payment provider APIs for customer transactions
-        # - Format and normalize transaction data
-        # - Apply pagination and filtering
-        # - Return structured transaction history
-        pass
+        from app.services.ledger import encode_cursor, ledger
+        
+        transactions, _ = ledger.history(customer_id, provider=provider, limit=limit, cursor=cursor)
+        return [dict(transaction.to_dict(), cursor=encode_cursor(transaction.created_at, transaction.id))
+                for transaction in transactions]
     
     def refund_payment(self,
                       payment_id: str,
                       amount: Optional[Union[int, Decimal]] = None,
                       reason: Optional[str] = None,
-                      provider: str = 'stripe') -> Dict[str, Any]:
+                      provider: str = 'stripe',
+                      idempotency_key: Optional[str] = None) -> Dict[str, Any]:
         """
         Process a refund for a completed payment.
         
+        For many payments at once use ``refund_processor.create_batch``
+        (app/services/refunds.py), which runs refunds in the background.
+        
         Args:
-            payment_id (str): Original payment identifier
-            amount (Union[int, Decimal], optional): Refund amount (full refund if None)
+            payment_id (str): Original payment identifier (Stripe payment intent or PayPal sale)
+            amount (Union[int, Decimal], optional): Refund amount in smallest currency
+                unit (full refund if None)
             reason (str, optional): Reason for refund
             provider (str): Payment provider ('stripe' or 'paypal')
+            idempotency_key (str, optional): Key that makes retrying this call safe
             
         Returns:
             Dict[str, Any]: Refund confirmation details
@@ -279,14 +299,52 @@ class PaymentService:
         Raises:
             RefundError: If refund processing fails
         """
-        # TODO: Implement payment refund processing
-        # - Validate refund eligibility and amount
-        # - Process refund through appropriate provider API
-        # - Update payment status and create refund record
-        # - Send refund confirmation to customer
-        # - Log refund transaction
-        # - Return refund confirmation
-        pass
+        if amount is not None and amount <= 0:
+            raise RefundError("Refund amount must be positive")
+        
+        if provider == 'stripe':
+            params = {"payment_intent": payment_id}
+            if amount is not None:
+                params["amount"] = int(amount)
+            if reason:
+                params["reason"] = reason
+            if idempotency_key:
+                params["idempotency_key"] = idempotency_key
+            try:
+                refund = stripe.Refund.create(**params).to_dict()
+            except stripe.StripeError as e:
+                self.logger.error(f"Stripe refund of {payment_id} failed: {str(e)}")
+                raise RefundError(str(e)) from e
+            self.logger.info(f"Refunded {refund.get('amount')} of Stripe payment {payment_id} ({refund['id']})")
+            return {
+                "refund_id": refund["id"],
+                "payment_id": payment_id,
+                "amount": refund.get("amount"),
+                "currency": refund.get("currency"),
+                "status": refund.get("status"),
+                "provider": provider
+            }
+        
+        if provider == 'paypal':
+            sale = paypalrestsdk.Sale.find(payment_id)
+            refund_request = {}
+            if amount is not None:
+                refund_request["amount"] = {"total": f"{Decimal(amount) / 100:.2f}",
+                                     "currency": sale.amount.currency}
+            refund = sale.refund(refund_request)
+            if not refund.success():
+                self.logger.error(f"PayPal refund of {payment_id} failed: {refund.error}")
+                raise RefundError(str(refund.error))
+            return {
+                "refund_id": refund.id,
+                "payment_id": payment_id,
+                "amount": amount,
+                "currency": sale.amount.currency,
+                "status": refund.state,
+                "provider": provider
+            }
+        
+        raise RefundError(f"Unsupported payment provider: {provider}")
     
     def validate_webhook_signature(self, 
                                  payload: str,
@@ -295,16 +353,19 @@ class PaymentService:
         """
         Validate webhook signature for security.
         
+        Only Stripe signatures are supported. Any other provider (including
+        PayPal, whose webhooks can only be verified through its
+        verify-webhook-signature API) is rejected.
+        
         Args:
             payload (str): Raw webhook payload
             signature (str): Webhook signature from headers
-            provider (str): Payment provider ('stripe' or 'paypal')
+            provider (str): Payment provider; only 'stripe' can be validated
             
         Returns:
             bool: True if signature is valid, False otherwise
         """
-        # TODO: Implement webhook signature validation
-        # - Use provider-specific signature validation methods
-        # - Compare computed signature with received signature
-        # - Return validation result
-        pass
+        if provider == 'stripe':
+            return verify_stripe_signature(payload, signature, self.webhook_secret)
+        self.logger.warning(f"Webhook signature validation not supported for provider {provider}")
+        return False
@@ -13,10 +13,14 @@ Functions:
 """
 
 import stripe
-from typing import Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 from decimal import Decimal
 from datetime import datetime
 
+from flask import has_app_context
+
+from app.services.webhooks import WebhookValidationError, parse_event, verify_stripe_signature, webhook_inbox
+
 
 class PaymentService:
     """
@@ -30,7 +34,8 @@ class PaymentService:
     - Invoice and receipt generation
     """
     
-    def __init__(self, api_key: Optional[str] = None, webhook_secret: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, webhook_secret: Optional[str] = None,
+                 webhook_tolerance: int = 300, api_base: Optional[str] = None):
         """
         Initialize the Payment Service.
         
@@ -38,14 +43,23 @@ class PaymentService:
             api_key (str, optional): Stripe API key. If not provided,
                                    will attempt to read from environment.
             webhook_secret (str, optional): Stripe webhook secret for event verification.
+            webhook_tolerance (int): Maximum age in seconds of a signed webhook timestamp.
+            api_base (str, optional): Override for the Stripe API URL, e.g. the local
+                                    stand-in server from tools/fake_payments.py.
         """
         self.api_key = api_key
         self.webhook_secret = webhook_secret
+        self.webhook_tolerance = webhook_tolerance
         if api_key:
             stripe.api_key = api_key
+        if api_base:
+            stripe.api_base = api_base
     
     def create_payment_intent(self, amount: Union[int, Decimal], currency: str = 'usd',
-                            customer_id: Optional[str] = None) -> Dict:
+                            customer_id: Optional[str] = None,
+                            payment_method: Optional[str] = None,
+                            confirm: bool = False,
+                            metadata: Optional[Dict[str, Any]] = None) -> Dict:
         """
         Create a payment intent for processing payments.
         
@@ -53,17 +67,37 @@ class PaymentService:
             amount (Union[int, Decimal]): Payment amount in cents
             currency (str): Currency code (default: 'usd')
             customer_id (str, optional): Stripe customer ID
+            payment_method (str, optional): Payment method to charge
+            confirm (bool): Confirm the intent immediately
+            metadata (dict, optional): Stripe metadata; ``content_id`` marks
+                the purchase of that content and entitles the order's buyer
+                to download it once paid
             
         Returns:
             Dict: Payment intent object from Stripe
         """
-        # Placeholder implementation
-        return {
-            "id": "pi_placeholder",
-            "amount": int(amount) if isinstance(amount, int) else int(amount * 100),
-            "currency": currency,
-            "status": "requires_payment_method"
-        }
+        amount_cents = int(amount) if isinstance(amount, int) else int(amount * 100)
+        if not self.api_key:
+            # Placeholder implementation (no Stripe credentials configured)
+            return {
+                "id": "pi_placeholder",
+                "amount": amount_cents,
+                "currency": currency,
+                "status": "requires_payment_method"
+            }
+        
+        params = {"amount": amount_cents, "currency": currency}
+        if customer_id:
+            params["customer"] = customer_id
+        if payment_method:
+            params["payment_method"] = payment_method
+        if confirm:
+            params["confirm"] = True
+        if metadata:
+            params["metadata"] = {key: str(value) for key, value in metadata.items()}
+        intent = stripe.PaymentIntent.create(**params).to_dict()
+        self._record(intent)
+        return intent
     
     def create_subscription(self, customer_id: str, price_id: str) -> Dict:
         """
@@ -76,6 +110,9 @@ class PaymentService:
         Returns:
             Dict: Subscription object from Stripe
         """
+        if self.api_key:
+            return stripe.Subscription.create(customer=customer_id, items=[{"price": price_id}]).to_dict()
+        
         # Placeholder implementation
         return {
             "id": "sub_placeholder",
@@ -84,44 +121,100 @@ class PaymentService:
             "current_period_start": datetime.now().timestamp()
         }
     
-    def process_webhook(self, payload: str, signature: str) -> Dict:
+    def process_webhook(self, payload: Union[str, bytes], signature: str) -> Dict:
         """
-        Process Stripe webhook events.
+        Verify a Stripe webhook event and queue it for processing.
+        
+        Only the signature check and one idempotent inbox insert happen here;
+        the event is applied later by the webhook inbox worker, so this call
+        stays fast even during retry storms.
         
         Args:
-            payload (str): Raw request body from Stripe
+            payload (Union[str, bytes]): Raw request body from Stripe
             signature (str): Stripe signature header
             
         Returns:
-            Dict: Processed event data
+            Dict: Event id/type and whether it was queued or a duplicate
+            
+        Raises:
+            WebhookValidationError: If the signature or payload is invalid
         """
-        # Placeholder implementation
+        if not verify_stripe_signature(payload, signature, self.webhook_secret,
+                                       tolerance=self.webhook_tolerance):
+            raise WebhookValidationError("Invalid Stripe signature")
+        event = parse_event(payload)
+        queued = webhook_inbox.enqueue('stripe', event, payload)
         return {
-            "event_type": "placeholder",
-            "processed": True,
+            "event_id": event["id"],
+            "event_type": event["type"],
+            "queued": queued,
+            "duplicate": not queued,
+            "processed": False,
             "timestamp": datetime.now().isoformat()
         }
     
-    def retrieve_customer_payments(self, customer_id: str) -> List[Dict]:
+    def create_refund(self, payment_intent_id: str, amount: Optional[int] = None,
+                      reason: Optional[str] = None, idempotency_key: Optional[str] = None) -> Dict:
         """
-        Retrieve payment history for a customer.
+        Refund a payment intent, fully or partially.
         
         Args:
-            customer_id (str): Stripe customer ID
+            payment_intent_id (str): Stripe payment intent ID
+            amount (int, optional): Amount in cents (full refund if None)
+            reason (str, optional): Stripe refund reason
+            idempotency_key (str, optional): Key making retries of this call safe;
+                                             Stripe replays the original result
             
         Returns:
-            List[Dict]: List of payment records
+            Dict: Refund object from Stripe
         """
-        # Placeholder implementation
-        return [
-            {
-                "id": "pi_example",
-                "amount": 1000,
-                "currency": "usd",
-                "status": "succeeded",
-                "created": datetime.now().timestamp()
+        if not self.api_key:
+            # Placeholder implementation
+            return {
+                "id": "re_placeholder",
+                "payment_intent": payment_intent_id,
+                "amount": amount,
+                "status": "succeeded"
             }
-        ]
+        
+        params = {"payment_intent": payment_intent_id}
+        if amount is not None:
+            params["amount"] = amount
+        if reason:
+            params["reason"] = reason
+        if idempotency_key:
+            params["idempotency_key"] = idempotency_key
+        refund = stripe.Refund.create(**params).to_dict()
+        self._record(refund)
+        return refund
+    
+    def retrieve_customer_payments(self, customer_id: str, limit: int = 20,
+                                   cursor: Optional[str] = None) -> List[Dict]:
+        """
+        Retrieve payment history for a customer from the local ledger.
+        
+        Args:
+            customer_id (str): Stripe customer ID
+            limit (int): Maximum number of payments to return
+            cursor (str, optional): Cursor from the previous page's last record
+            
+        Returns:
+            List[Dict]: Payment records, newest first; each carries a
+                        ``cursor`` for fetching the page after it
+        """
+        from app.services.ledger import encode_cursor, ledger
+        
+        payments, _ = ledger.history(customer_id, provider='stripe', kind='payment',
+                                     limit=limit, cursor=cursor)
+        return [dict(payment.to_dict(), cursor=encode_cursor(payment.created_at, payment.id))
+                for payment in payments]
+    
+    def _record(self, obj: Dict):
+        """Record an API response in the ledger when running inside the app."""
+        if not has_app_context():
+            return
+        from app.services.ledger import ledger
+        ledger.record_stripe_objects([obj])
     
     def cancel_subscription(self, subscription_id: str) -> Dict:
         """
@@ -133,6 +226,9 @@ class PaymentService:
         Returns:
             Dict: Updated subscription object
         """
+        if self.api_key:
+            return stripe.Subscription.cancel(subscription_id).to_dict()
+        
         # Placeholder implementation
         return {
             "id": subscription_id,
@@ -0,0 +1,271 @@
+"""Bulk refund batches.
+
+``create_batch`` only writes the batch and its items and returns; a
+background worker claims items in chunks, sends them to Stripe from a
+rate-limited thread pool, and records each outcome together with the
+batch's aggregate counters in one transaction per chunk.
+
+Every item has a stored idempotency key, so an item whose outcome was lost
+(worker crash, deploy) is simply claimed again after ``claim_timeout`` and
+Stripe replays the original refund instead of creating a second one.
+"""
+
+import logging
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+import stripe
+from sqlalchemy import and_, bindparam, func, or_
+
+from app import db
+from app.models.refund_batch import RefundBatch, RefundBatchItem
+from app.utils.background import PeriodicWorker
+from app.utils.rate_limit import TokenBucket
+from app.utils.sql import claim_batch
+
+
+# Errors worth retrying later; anything else fails the item for good
+RETRYABLE_ERRORS = (stripe.RateLimitError, stripe.APIConnectionError, stripe.APIError)
+
+
+class RefundBatchProcessor:
+    """Creates refund batches and works them off in the background."""
+
+    def __init__(self):
+        """Initialize the processor with default limits."""
+        self.concurrency = 8
+        self.rate_limit = 20.0
+        self.chunk_size = 200
+        self.max_attempts = 5
+        self.max_items = 10000
+        self.claim_timeout = 300
+        self.api_key = None
+        self.api_base = None
+        self.bucket = TokenBucket(self.rate_limit)
+        self.logger = logging.getLogger(__name__)
+        self.worker = PeriodicWorker('refund-batches', self.process_pending, interval=5)
+
+    def init_app(self, app):
+        """Configure credentials, concurrency and rate limits from app config.
+
+        Args:
+            app: Flask application instance
+        """
+        self.api_key = app.config.get('STRIPE_SECRET_KEY')
+        self.api_base = app.config.get('STRIPE_API_BASE')
+        self.concurrency = app.config.get('REFUND_BATCH_CONCURRENCY', self.concurrency)
+        self.rate_limit = app.config.get('REFUND_RATE_LIMIT', self.rate_limit)
+        self.chunk_size = app.config.get('REFUND_BATCH_CHUNK_SIZE', self.chunk_size)
+        self.max_attempts = app.config.get('REFUND_MAX_ATTEMPTS', self.max_attempts)
+        self.max_items = app.config.get('REFUND_BATCH_MAX_ITEMS', self.max_items)
+        self.bucket = TokenBucket(self.rate_limit)
+        # Autostart so batches interrupted by a restart resume without new traffic
+        self.worker.init_app(app, interval=app.config.get('REFUND_POLL_INTERVAL', 5), autostart=True)
+
+    def create_batch(self, payment_intent_ids: Sequence[str], amount: Optional[int] = None,
+                     reason: Optional[str] = None, user_id: Optional[int] = None) -> RefundBatch:
+        """Persist a refund batch and hand it to the worker.
+
+        Args:
+            payment_intent_ids: Payments to refund; duplicates are dropped
+            amount: Amount in cents to refund from each payment (full if None)
+            reason: Stripe refund reason
+            user_id: User who requested the batch
+
+        Returns:
+            RefundBatch: The new batch, status ``pending``
+
+        Raises:
+            ValueError: If the id list is empty or too large
+        """
+        ids = list(dict.fromkeys(str(pid).strip() for pid in payment_intent_ids if pid and str(pid).strip()))
+        if not ids:
+            raise ValueError('No payment ids given')
+        if len(ids) > self.max_items:
+            raise ValueError(f'A batch may contain at most {self.max_items} payments')
+        if amount is not None and amount <= 0:
+            raise ValueError('Refund amount must be positive')
+
+        batch = RefundBatch(user_id=user_id, amount=amount, reason=reason, total_items=len(ids))
+        db.session.add(batch)
+        db.session.flush()
+        db.session.execute(RefundBatchItem.__table__.insert(), [{
+            'batch_id': batch.id,
+            'payment_intent_id': pid,
+            'idempotency_key': uuid.uuid4().hex,
+            'status': 'pending',
+            'attempts': 0,
+        } for pid in ids])
+        db.session.commit()
+
+        self.worker.ensure_started()
+        self.worker.wake()
+        return batch
+
+    def progress(self, batch: RefundBatch) -> Dict[str, Any]:
+        """Aggregate progress of a batch, including its most common errors."""
+        result = batch.to_dict()
+        errors = (db.session.query(RefundBatchItem.last_error, func.count(RefundBatchItem.id))
+                  .filter(RefundBatchItem.batch_id == batch.id, RefundBatchItem.status == 'failed')
+                  .group_by(RefundBatchItem.last_error)
+                  .order_by(func.count(RefundBatchItem.id).desc())
+                  .limit(10).all())
+        result['errors'] = [{'error': error, 'count': count} for error, count in errors]
+        return result
+
+    # Worker -------------------------------------------------------------------
+
+    def process_pending(self) -> int:
+        """Claim and refund pending items chunk by chunk.
+
+        Returns:
+            int: Number of items that reached a final status
+        """
+        if not self.api_key:
+            return 0
+        finished = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='refunds') as pool:
+            while True:
+                items = self._claim()
+                if not items:
+                    break
+                batches = {batch.id: batch for batch in
+                           RefundBatch.query.filter(RefundBatch.id.in_({item.batch_id for item in items}))}
+                # Plain dicts: pool threads have no app context to load expired attributes
+                jobs = [{
+                    'id': item.id,
+                    'batch_id': item.batch_id,
+                    'claim_token': item.claim_token,
+                    'payment_intent_id': item.payment_intent_id,
+                    'idempotency_key': item.idempotency_key,
+                    'attempts': item.attempts,
+                    'amount': batches[item.batch_id].amount,
+                    'reason': batches[item.batch_id].reason,
+                } for item in items]
+                self._mark_running(list(batches))
+                outcomes = list(pool.map(self._refund, jobs))
+                finished += self._record(outcomes)
+                if len(items) < self.chunk_size or any(o['status'] == 'pending' for o in outcomes):
+                    # Retries wait for the next tick instead of spinning on a failing API
+                    break
+        self._complete_batches()
+        return finished
+
+    def _claim(self) -> List[RefundBatchItem]:
+        stale_before = datetime.utcnow() - timedelta(seconds=self.claim_timeout)
+        claimable = or_(
+            RefundBatchItem.status == 'pending',
+            and_(RefundBatchItem.status == 'processing', RefundBatchItem.claimed_at < stale_before)
+        )
+        return claim_batch(RefundBatchItem, claimable, RefundBatchItem.id, self.chunk_size,
+                           {'status': 'processing'})
+
+    def _mark_running(self, batch_ids: List[int]):
+        table = RefundBatch.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.id.in_(batch_ids), table.c.status == 'pending')
+            .values(status='running', started_at=datetime.utcnow())
+        )
+        db.session.commit()
+
+    def _refund(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Refund one item; runs on a pool thread and must not touch the session."""
+        from app.services.payment_service import PaymentService
+
+        outcome = {'id': job['id'], 'batch_id': job['batch_id'], 'claim_token': job['claim_token'],
+                   'refund': None, 'error': None}
+        self.bucket.acquire()
+        try:
+            service = PaymentService(api_key=self.api_key, api_base=self.api_base)
+            refund = service.create_refund(job['payment_intent_id'], amount=job['amount'],
+                                           reason=job['reason'], idempotency_key=job['idempotency_key'])
+            outcome.update(status='succeeded', refund=refund)
+        except RETRYABLE_ERRORS as e:
+            final = job['attempts'] + 1 >= self.max_attempts
+            outcome.update(status='failed' if final else 'pending', error=str(e)[:1000])
+        except stripe.StripeError as e:
+            outcome.update(status='failed', error=str(e)[:1000])
+        except Exception as e:
+            self.logger.error(f"Refund of {job['payment_intent_id']} failed unexpectedly: {str(e)}")
+            outcome.update(status='failed', error=str(e)[:1000])
+        return outcome
+
+    def _record(self, outcomes: List[Dict[str, Any]]) -> int:
+        """Write item outcomes and batch counters in one transaction.
+
+        Items whose claim expired and was taken over by another worker are
+        left alone and not counted; that worker records them.
+        """
+        from app.services.ledger import ledger
+
+        items = RefundBatchItem.__table__
+        now = datetime.utcnow()
+        held = {
+            (item_id, token) for item_id, token in db.session.query(RefundBatchItem.id, RefundBatchItem.claim_token)
+            .filter(RefundBatchItem.id.in_([o['id'] for o in outcomes]),
+                    RefundBatchItem.claim_token.in_({o['claim_token'] for o in outcomes}))
+            .with_for_update()
+        }
+        owned = [o for o in outcomes if (o['id'], o['claim_token']) in held]
+        if owned:
+            db.session.execute(
+                items.update().where(items.c.id == bindparam('b_id'), items.c.claim_token == bindparam('b_token')).values(
+                    status=bindparam('b_status'),
+                    attempts=items.c.attempts + 1,
+                    refund_id=bindparam('b_refund_id'),
+                    refunded_amount=bindparam('b_amount'),
+                    last_error=bindparam('b_error'),
+                    claim_token=None,
+                    updated_at=now
+                ),
+                [{
+                    'b_id': o['id'],
+                    'b_token': o['claim_token'],
+                    'b_status': o['status'],
+                    'b_refund_id': o['refund']['id'] if o['refund'] else None,
+                    'b_amount': o['refund'].get('amount') if o['refund'] else None,
+                    'b_error': o['error'],
+                } for o in owned]
+            )
+
+        totals = defaultdict(lambda: {'succeeded': 0, 'failed': 0, 'amount': 0})
+        for o in owned:
+            if o['status'] == 'succeeded':
+                totals[o['batch_id']]['succeeded'] += 1
+                totals[o['batch_id']]['amount'] += int(o['refund'].get('amount') or 0)
+            elif o['status'] == 'failed':
+                totals[o['batch_id']]['failed'] += 1
+        if totals:
+            batches = RefundBatch.__table__
+            db.session.execute(
+                batches.update().where(batches.c.id == bindparam('b_id')).values(
+                    succeeded_count=batches.c.succeeded_count + bindparam('b_succeeded'),
+                    failed_count=batches.c.failed_count + bindparam('b_failed'),
+                    refunded_amount=batches.c.refunded_amount + bindparam('b_amount')
+                ),
+                [{'b_id': batch_id, 'b_succeeded': t['succeeded'], 'b_failed': t['failed'],
+                  'b_amount': t['amount']} for batch_id, t in sorted(totals.items())]
+            )
+
+        # Refunds share an idempotency key across claims, so recording them twice is harmless
+        ledger.record_stripe_objects([o['refund'] for o in outcomes if o['refund']], commit=False)
+        db.session.commit()
+        return sum(1 for o in owned if o['status'] != 'pending')
+
+    def _complete_batches(self):
+        table = RefundBatch.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.status.in_(['pending', 'running']),
+                   table.c.succeeded_count + table.c.failed_count >= table.c.total_items)
+            .values(status='completed', completed_at=datetime.utcnow())
+        )
+        db.session.commit()
+
+
+# Shared instance, configured in create_app()
+refund_processor = RefundBatchProcessor()
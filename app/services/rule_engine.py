@@ -0,0 +1,384 @@
+"""Event-triggered automation rules.
+
+A rule names the event type that triggers it, a condition over the event's
+fields and the actions to run when it matches::
+
+    {
+        'id': 'boost-viral',
+        'event': 'engagement',
+        'conditions': {'all': [
+            {'field': 'platform', 'op': 'eq', 'value': 'twitter'},
+            {'field': 'metrics.shares', 'op': 'gte', 'value': 50},
+        ]},
+        'actions': [{'type': 'publish', 'content': 'Thanks for sharing {post_id}!',
+                     'platforms': ['twitter']}],
+    }
+
+Conditions nest with ``all``, ``any`` and ``not``; a leaf compares the
+field at a dotted path with ``op`` (see ``OPERATORS``). A field missing
+from the event fails every comparison except ``exists``. ``event: '*'``
+matches every event type.
+
+Rule sets are compiled once into nested predicate closures, and indexed by
+event type and, within a type, by the value of the equality test most of
+its rules share (typically the platform). An event is only tested against
+the rules in its type's bucket for that value and the rules without one.
+"""
+
+import heapq
+import logging
+import operator
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+Event = Dict[str, Any]
+Predicate = Callable[[Event], bool]
+
+_MISSING = object()
+
+WILDCARD = '*'
+
+
+class RuleError(ValueError):
+    """Raised when a rule or condition is malformed."""
+
+
+def _contains(container, item) -> bool:
+    return item in container
+
+
+def _in(item, container) -> bool:
+    return item in container
+
+
+def _not_in(item, container) -> bool:
+    return item not in container
+
+
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    'eq': operator.eq,
+    'ne': operator.ne,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+    'in': _in,
+    'not_in': _not_in,
+    'contains': _contains,
+    'startswith': lambda value, prefix: str(value).startswith(prefix),
+    'matches': None,  # Compiled per condition
+    'exists': None,
+}
+
+
+def field_getter(path: str) -> Callable[[Event], Any]:
+    """Compile a dotted path into a lookup that returns ``_MISSING`` when absent."""
+    keys = tuple(path.split('.'))
+    if not path or not all(keys):
+        raise RuleError(f"Invalid field path: {path!r}")
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda event: event.get(key, _MISSING)
+
+    def get(event):
+        value = event
+        for key in keys:
+            if not isinstance(value, dict):
+                return _MISSING
+            value = value.get(key, _MISSING)
+            if value is _MISSING:
+                return _MISSING
+        return value
+    return get
+
+
+def compile_condition(condition: Optional[Dict[str, Any]]) -> Predicate:
+    """Compile a condition into a predicate over event dicts.
+
+    ``None`` or ``{}`` compiles to a predicate that is always true.
+
+    Raises:
+        RuleError: If the condition is malformed
+    """
+    if not condition:
+        return lambda event: True
+    if not isinstance(condition, dict):
+        raise RuleError(f"Condition must be a dict, got {type(condition).__name__}")
+
+    if 'all' in condition or 'any' in condition:
+        combinator = 'all' if 'all' in condition else 'any'
+        parts = condition[combinator]
+        if not isinstance(parts, (list, tuple)):
+            raise RuleError(f"'{combinator}' takes a list of conditions")
+        predicates = tuple(compile_condition(part) for part in parts)
+        if len(predicates) == 1:
+            return predicates[0]
+        if combinator == 'all':
+            def all_of(event):
+                for predicate in predicates:
+                    if not predicate(event):
+                        return False
+                return True
+            return all_of
+
+        def any_of(event):
+            for predicate in predicates:
+                if predicate(event):
+                    return True
+            return False
+        return any_of
+
+    if 'not' in condition:
+        inner = compile_condition(condition['not'])
+        return lambda event: not inner(event)
+
+    return _compile_leaf(condition)
+
+
+def _compile_leaf(condition: Dict[str, Any]) -> Predicate:
+    if 'field' not in condition:
+        raise RuleError(f"Condition needs 'field' or one of all/any/not: {condition!r}")
+    get = field_getter(condition['field'])
+    op = condition.get('op', 'eq')
+    if op not in OPERATORS:
+        raise RuleError(f"Unknown operator {op!r}")
+    value = condition.get('value')
+
+    if op == 'exists':
+        wanted = value is None or bool(value)
+        return lambda event: (get(event) is not _MISSING) is wanted
+    if op == 'matches':
+        try:
+            pattern = re.compile(value)
+        except (re.error, TypeError) as e:
+            raise RuleError(f"Invalid pattern {value!r}: {e}")
+
+        def matches(event):
+            found = get(event)
+            return found is not _MISSING and pattern.search(str(found)) is not None
+        return matches
+    if op in ('in', 'not_in'):
+        if not isinstance(value, (list, tuple, set, frozenset)):
+            raise RuleError(f"'{op}' takes a list of values")
+        try:
+            value = frozenset(value)
+        except TypeError:
+            value = tuple(value)
+    if op == 'eq':
+        # The hot path for index keys and most leaves: no type guard needed
+        return lambda event: get(event) == value
+
+    compare = OPERATORS[op]
+
+    def leaf(event):
+        found = get(event)
+        if found is _MISSING:
+            return False
+        try:
+            return bool(compare(found, value))
+        except TypeError:
+            return False
+    return leaf
+
+
+class Rule:
+    """A compiled rule.
+
+    Attributes:
+        rule_id (str): Identifier, from the rule dict or its position
+        event (str): Triggering event type, or ``'*'``
+        actions (list): Action dicts run in order when the rule matches
+        priority (int): Lower runs first; ties keep definition order
+        order (int): Position in the rule set
+        predicate (Callable): Compiled condition
+    """
+
+    __slots__ = ('rule_id', 'event', 'actions', 'priority', 'order', 'definition', 'predicate')
+
+    def __init__(self, definition: Dict[str, Any], order: int):
+        """Compile a rule dict.
+
+        Raises:
+            RuleError: If the rule is malformed
+        """
+        if not isinstance(definition, dict):
+            raise RuleError(f"Rule must be a dict, got {type(definition).__name__}")
+        self.definition = definition
+        self.order = order
+        self.rule_id = str(definition.get('id') or definition.get('name') or f'rule-{order}')
+        self.event = definition.get('event')
+        if not self.event or not isinstance(self.event, str):
+            raise RuleError(f"Rule {self.rule_id} needs an 'event' type")
+        actions = definition.get('actions') or []
+        if isinstance(actions, dict):
+            actions = [actions]
+        if not actions or not all(isinstance(action, dict) and action.get('type') for action in actions):
+            raise RuleError(f"Rule {self.rule_id} needs a list of actions, each with a 'type'")
+        self.actions = list(actions)
+        self.priority = int(definition.get('priority', 0))
+        self.predicate = compile_condition(definition.get('conditions'))
+
+    @property
+    def sort_key(self) -> Tuple[int, int]:
+        return self.priority, self.order
+
+    def index_candidates(self) -> List[Tuple[str, Any]]:
+        """``(field, value)`` of the top-level equality tests, usable as index keys."""
+        conditions = self.definition.get('conditions') or {}
+        leaves = conditions.get('all') if isinstance(conditions, dict) and 'all' in conditions else [conditions]
+        candidates = []
+        for leaf in leaves or []:
+            if (isinstance(leaf, dict) and 'field' in leaf and leaf.get('op', 'eq') == 'eq'
+                    and isinstance(leaf.get('value'), (str, int, float, bool))):
+                candidates.append((leaf['field'], leaf['value']))
+        return candidates
+
+    def __repr__(self):
+        return f'<Rule {self.rule_id} on {self.event}>'
+
+
+class _EventIndex:
+    """Rules of one event type, bucketed by the value of one equality field.
+
+    Each bucket is precomputed in priority order together with the rules
+    that test no value of the field, and a bucketed rule's predicate skips
+    the equality test the bucket already guarantees.
+    """
+
+    __slots__ = ('get', 'buckets', 'rest')
+
+    def __init__(self, rules: Sequence[Rule]):
+        counts = Counter(field for rule in rules for field, _ in set(rule.index_candidates()))
+        field = counts.most_common(1)[0][0] if counts else None
+        self.get = field_getter(field) if field else None
+        keyed: Dict[Any, List[Tuple[Rule, Predicate]]] = defaultdict(list)
+        self.rest: List[Tuple[Rule, Predicate]] = []
+        for rule in rules:
+            value = next((value for name, value in rule.index_candidates() if name == field), _MISSING)
+            if value is _MISSING:
+                self.rest.append((rule, rule.predicate))
+            else:
+                keyed[value].append((rule, self._residual(rule, field, value)))
+        self.buckets = {
+            value: list(heapq.merge(entries, self.rest, key=lambda entry: entry[0].sort_key))
+            for value, entries in keyed.items()
+        }
+
+    @staticmethod
+    def _residual(rule: Rule, field: str, value: Any) -> Predicate:
+        conditions = rule.definition['conditions']
+        if 'all' not in conditions:
+            return lambda event: True
+        rest = list(conditions['all'])
+        rest.remove(next(leaf for leaf in rest if isinstance(leaf, dict) and leaf.get('field') == field
+                         and leaf.get('op', 'eq') == 'eq' and leaf.get('value') == value))
+        return compile_condition({'all': rest}) if rest else (lambda event: True)
+
+    def candidates(self, event: Event) -> List[Tuple[Rule, Predicate]]:
+        if self.get is None:
+            return self.rest
+        try:
+            return self.buckets.get(self.get(event), self.rest)
+        except TypeError:  # Unhashable field value
+            return self.rest
+
+
+class RuleEngine:
+    """Holds a compiled rule set and runs it against events."""
+
+    def __init__(self):
+        """Initialize an engine with no rules and no actions."""
+        self.logger = logging.getLogger(__name__)
+        self._actions: Dict[str, Callable[[Event, Dict[str, Any]], Any]] = {}
+        self._lock = threading.Lock()
+        self._rules: List[Rule] = []
+        self._index: Dict[str, _EventIndex] = {}
+
+    def register_action(self, name: str, handler: Callable[[Event, Dict[str, Any]], Any]):
+        """Register the handler for actions of type ``name``.
+
+        Handlers receive the event and the action dict.
+        """
+        self._actions[name] = handler
+
+    def compile(self, rules: Sequence[Dict[str, Any]]) -> List[Rule]:
+        """Compile rule dicts, collecting every problem before failing.
+
+        Raises:
+            RuleError: Listing every invalid rule
+        """
+        compiled, errors = [], []
+        for order, definition in enumerate(rules):
+            try:
+                rule = Rule(definition, order)
+            except RuleError as e:
+                errors.append(f"rule {order}: {e}")
+                continue
+            unknown = [action['type'] for action in rule.actions if action['type'] not in self._actions]
+            if unknown:
+                errors.append(f"rule {order}: unknown action type(s) {', '.join(unknown)}")
+                continue
+            compiled.append(rule)
+        if errors:
+            raise RuleError("Invalid automation rules: " + "; ".join(errors))
+        return compiled
+
+    def load(self, rules: Sequence[Dict[str, Any]]) -> int:
+        """Replace the active rule set; the old one stays active if any rule is invalid.
+
+        Returns:
+            int: Number of rules loaded
+        """
+        compiled = self.compile(rules)
+        by_event: Dict[str, List[Rule]] = defaultdict(list)
+        for rule in compiled:
+            by_event[rule.event].append(rule)
+        wildcard = sorted(by_event.pop(WILDCARD, []), key=lambda rule: rule.sort_key)
+        index = {
+            event: _EventIndex(sorted(rules + wildcard, key=lambda rule: rule.sort_key))
+            for event, rules in by_event.items()
+        }
+        index[WILDCARD] = _EventIndex(wildcard)
+        with self._lock:
+            self._rules, self._index = compiled, index
+        return len(compiled)
+
+    @property
+    def rules(self) -> List[Dict[str, Any]]:
+        """The active rule dicts, in definition order."""
+        return [rule.definition for rule in self._rules]
+
+    def match(self, event: Event) -> List[Rule]:
+        """Rules whose condition holds for ``event``, in priority order.
+
+        Args:
+            event: Event dict; its ``type`` selects the candidate rules
+        """
+        index = self._index
+        bucket = index.get(event.get('type')) or index.get(WILDCARD)
+        if bucket is None:
+            return []
+        return [rule for rule, predicate in bucket.candidates(event) if predicate(event)]
+
+    def dispatch(self, event: Event) -> List[Dict[str, Any]]:
+        """Run the actions of every matching rule.
+
+        A failing action is logged and reported; it does not stop the
+        remaining actions or rules.
+
+        Returns:
+            list: ``{'rule_id', 'action', 'result' | 'error'}`` per action run
+        """
+        outcomes = []
+        for rule in self.match(event):
+            for action in rule.actions:
+                outcome = {'rule_id': rule.rule_id, 'action': action['type']}
+                try:
+                    outcome['result'] = self._actions[action['type']](event, action)
+                except Exception as e:
+                    self.logger.error(f"Rule {rule.rule_id} action {action['type']} failed: {e}")
+                    outcome['error'] = str(e)
+                outcomes.append(outcome)
+        return outcomes
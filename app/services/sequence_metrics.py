@@ -0,0 +1,422 @@
+"""Drip sequence metrics: incremental per-step counters and revenue attribution.
+
+A background refresh folds new data into one ``sequence_step_metrics`` row
+per sequence step, so reading a sequence's metrics costs O(steps) however
+many events it produced:
+
+* delivery events older than a short settle delay are consumed in id
+  order past a watermark, mapped to their step through the queue row's
+  campaign (``<sequence>:step<n>``), and added to the step's counters;
+  opens and clicks also go into HyperLogLog sketches of the recipients
+  for approximate unique counts;
+* orders paid since the last watermark are attributed to the buyer's
+  last open or click of a sequence email within the attribution window.
+  Orders and touches are both sorted by (email, time) and matched in one
+  merge pass. Each order is attributed at most once.
+
+Sends come from the step campaigns' own counters. Attribution credits the
+order amount at payment; later refunds are not deducted.
+
+The worker runs in every process, so a refresh only runs in the holder of
+a leader lease. Counters are added with ``col = col + :n`` UPDATEs, and
+the events watermark is advanced with a compare-and-set in the same
+transaction, so a batch is never folded in twice even if a lease lapses
+mid-refresh.
+"""
+
+import json
+import logging
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam
+
+from app import db
+from app.models.drip import DripSequence
+from app.models.email_campaign import EmailCampaign, EmailQueueItem
+from app.models.email_event import EmailDeliveryEvent
+from app.models.order import Order
+from app.models.sequence_metrics import SequenceAttribution, SequenceStepMetric
+from app.models.settings import Setting
+from app.models.user import User
+from app.services.drip_scheduler import parse_step_campaign_key, step_campaign_key
+from app.utils.background import PeriodicWorker
+from app.utils.hll import HyperLogLog
+from app.utils.lease import LeaderLease
+from app.utils.sql import insert_ignore
+
+
+EVENTS_WATERMARK_KEY = 'metrics.sequences.events_watermark'
+ORDERS_WATERMARK_KEY = 'metrics.sequences.orders_watermark'
+
+# Event type -> SequenceStepMetric counter
+EVENT_COUNTERS = {
+    'delivered': 'delivered',
+    'bounce': 'bounced',
+    'complaint': 'complaints',
+    'unsubscribe': 'unsubscribes',
+    'open': 'opens',
+    'click': 'clicks',
+}
+
+# Additive SequenceStepMetric columns
+COUNTER_COLUMNS = ('delivered', 'bounced', 'complaints', 'unsubscribes', 'opens', 'clicks', 'conversions',
+                   'revenue')
+
+StepKey = Tuple[int, int]  # (sequence id, step index)
+
+
+def attribute_orders(orders: Sequence[tuple], touches: Sequence[tuple], window: timedelta) -> List[tuple]:
+    """Match each order to the buyer's last touch before it, within ``window``.
+
+    Both inputs must be sorted by (email, time); the match is a single
+    merge pass over the two lists.
+
+    Args:
+        orders: ``(email, ordered_at, ...)`` tuples
+        touches: ``(email, touched_at, ...)`` tuples
+        window: Maximum time between touch and order
+
+    Returns:
+        list: ``(order, touch)`` pairs for the orders that matched
+    """
+    matches = []
+    position, last = 0, None
+    for order in orders:
+        email, ordered_at = order[0], order[1]
+        while position < len(touches) and touches[position][0] < email:
+            position += 1
+        while (position < len(touches) and touches[position][0] == email
+               and touches[position][1] <= ordered_at):
+            last = touches[position]
+            position += 1
+        if last is not None and last[0] == email and ordered_at - last[1] <= window:
+            matches.append((order, last))
+    return matches
+
+
+def _advance_watermark(key: str, expected: Optional[str], value: str) -> bool:
+    """Compare-and-set a watermark setting in the caller's transaction.
+
+    Returns:
+        bool: False if another process moved the watermark since it was read
+    """
+    insert_ignore(Setting, [{'key': key, 'value': None}], ['key'])
+    table = Setting.__table__
+    current = table.c.value.is_(None) if expected is None else table.c.value == expected
+    return db.session.execute(table.update().where(table.c.key == key, current).values(value=value)).rowcount == 1
+
+
+def _rate(numerator, denominator) -> float:
+    return round(numerator / denominator, 4) if denominator else 0.0
+
+
+class SequenceMetrics:
+    """Maintains and reads the per-step sequence metric rows."""
+
+    def __init__(self):
+        """Initialize with default batch and attribution settings."""
+        self.batch_size = 5000
+        self.attribution_window = timedelta(days=7)
+        self.overlap = timedelta(seconds=60)
+        self.settle_delay = timedelta(seconds=30)
+        self.logger = logging.getLogger(__name__)
+        self.lease = LeaderLease('sequence-metrics', ttl=120)
+        self.worker = PeriodicWorker('sequence-metrics', self.refresh, interval=60)
+        self._steps: Dict[int, Optional[StepKey]] = {}  # Campaign id -> step, or None if not a sequence step
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Configure batch size, attribution window and refresh interval.
+
+        Args:
+            app: Flask application instance
+        """
+        self.batch_size = app.config.get('SEQUENCE_METRICS_BATCH_SIZE', self.batch_size)
+        self.attribution_window = timedelta(
+            hours=app.config.get('SEQUENCE_ATTRIBUTION_WINDOW_HOURS', 168))
+        self.settle_delay = timedelta(seconds=app.config.get('SEQUENCE_METRICS_SETTLE_SECONDS', 30))
+        interval = app.config.get('SEQUENCE_METRICS_INTERVAL', 60)
+        self.lease.ttl = max(30, 2 * interval)
+        self.worker.init_app(app, interval=interval, autostart=True)
+
+    # Refresh ------------------------------------------------------------------
+
+    def refresh(self) -> Dict[str, int]:
+        """Consume all new events, then attribute newly paid orders.
+
+        Does nothing unless this process holds the metrics lease.
+
+        Returns:
+            dict: Events consumed and orders attributed
+        """
+        with self._lock:
+            if not self.lease.hold():
+                return {'events': 0, 'attributed': 0}
+            events = 0
+            while True:
+                consumed = self._consume_events()
+                events += consumed
+                if consumed < self.batch_size or not self.lease.hold():
+                    break
+            if not self.lease.is_held():
+                return {'events': events, 'attributed': 0}
+            return {'events': events, 'attributed': self._attribute_paid_orders()}
+
+    def rebuild(self) -> Dict[str, int]:
+        """Drop all counters and attributions and recompute from scratch.
+
+        Raises:
+            RuntimeError: If another process holds the metrics lease
+        """
+        with self._lock:
+            if not self.lease.try_acquire():
+                raise RuntimeError('Sequence metrics are being refreshed by another process')
+            db.session.query(SequenceAttribution).delete()
+            db.session.query(SequenceStepMetric).delete()
+            Setting.set_value(EVENTS_WATERMARK_KEY, None)
+            Setting.set_value(ORDERS_WATERMARK_KEY, None)
+            self._steps.clear()
+        return self.refresh()
+
+    def _campaign_steps(self, campaign_ids: Iterable[int]) -> Dict[int, Optional[StepKey]]:
+        """Map campaign ids to sequence steps; non-sequence campaigns map to None."""
+        missing = {campaign_id for campaign_id in campaign_ids if campaign_id not in self._steps}
+        if missing:
+            parsed = {}
+            for campaign_id, campaign_key in db.session.query(EmailCampaign.id, EmailCampaign.campaign_key) \
+                    .filter(EmailCampaign.id.in_(missing)):
+                parsed[campaign_id] = parse_step_campaign_key(campaign_key)
+            keys = {value[0] for value in parsed.values() if value}
+            sequence_ids = dict(db.session.query(DripSequence.sequence_key, DripSequence.id)
+                                .filter(DripSequence.sequence_key.in_(keys))) if keys else {}
+            for campaign_id in missing:
+                value = parsed.get(campaign_id)
+                sequence_id = sequence_ids.get(value[0]) if value else None
+                self._steps[campaign_id] = (sequence_id, value[1]) if sequence_id else None
+        return self._steps
+
+    def _consume_events(self) -> int:
+        """Fold the next batch of delivery events into the step counters.
+
+        Ids are assigned before commit, so an event with a lower id can
+        become visible after a higher one. The batch stops at the first
+        event younger than ``settle_delay``; the watermark never passes an
+        id whose transaction may still be open.
+        """
+        stored = Setting.get_value(EVENTS_WATERMARK_KEY)
+        watermark = int(stored or 0)
+        rows = (db.session.query(EmailDeliveryEvent.id, EmailDeliveryEvent.event_type,
+                                 EmailDeliveryEvent.recipient, EmailDeliveryEvent.created_at,
+                                 EmailQueueItem.campaign_id)
+                .outerjoin(EmailQueueItem, EmailQueueItem.message_id == EmailDeliveryEvent.message_id)
+                .filter(EmailDeliveryEvent.id > watermark)
+                .order_by(EmailDeliveryEvent.id)
+                .limit(self.batch_size).all())
+        settled_before = datetime.utcnow() - self.settle_delay
+        young = next((index for index, row in enumerate(rows) if row.created_at >= settled_before), None)
+        if young is not None:
+            rows = rows[:young]
+        if not rows:
+            return 0
+
+        steps = self._campaign_steps({row.campaign_id for row in rows if row.campaign_id})
+        deltas: Dict[StepKey, Counter] = defaultdict(Counter)
+        recipients: Dict[StepKey, Dict[str, List[str]]] = defaultdict(lambda: defaultdict(list))
+        for row in rows:
+            key = steps.get(row.campaign_id)
+            counter = EVENT_COUNTERS.get(row.event_type)
+            if key is None or counter is None:
+                continue
+            deltas[key][counter] += 1
+            if row.event_type in ('open', 'click') and row.recipient:
+                recipients[key][row.event_type].append(row.recipient.lower())
+
+        if not _advance_watermark(EVENTS_WATERMARK_KEY, stored, str(rows[-1].id)):
+            db.session.rollback()
+            self.logger.warning('Events watermark moved by another process; skipping batch')
+            return 0
+        self._apply(deltas, recipients)
+        db.session.commit()
+        return len(rows)
+
+    def _attribute_paid_orders(self) -> int:
+        """Attribute orders paid since the watermark to sequence steps."""
+        stored = Setting.get_value(ORDERS_WATERMARK_KEY)
+        query = (db.session.query(Order.id, Order.total_amount, Order.created_at, Order.updated_at, User.email)
+                 .join(User, User.id == Order.user_id)
+                 .filter(Order.payment_status == 'paid', Order.created_at.isnot(None)))
+        if stored:
+            query = query.filter(Order.updated_at > datetime.fromisoformat(stored) - self.overlap)
+        rows = query.all()
+        if not rows:
+            return 0
+
+        attributed = 0
+        for start in range(0, len(rows), self.batch_size):
+            attributed += self._attribute_chunk(rows[start:start + self.batch_size])
+            db.session.commit()
+
+        updates = [row.updated_at for row in rows if row.updated_at is not None]
+        newest = max(updates) if updates else None
+        if newest is not None and (not stored or newest > datetime.fromisoformat(stored)):
+            Setting.set_value(ORDERS_WATERMARK_KEY, newest.isoformat())
+        return attributed
+
+    def _attribute_chunk(self, rows) -> int:
+        done = {order_id for (order_id,) in db.session.query(SequenceAttribution.order_id)
+                .filter(SequenceAttribution.order_id.in_([row.id for row in rows]))}
+        orders = sorted((row.email.lower(), row.created_at, row.id, row.total_amount)
+                        for row in rows if row.id not in done and row.email)
+        if not orders:
+            return 0
+
+        emails = {row.email for row in rows} | {order[0] for order in orders}
+        touch_rows = (db.session.query(EmailDeliveryEvent.recipient, EmailDeliveryEvent.occurred_at,
+                                       EmailDeliveryEvent.event_type, EmailQueueItem.campaign_id)
+                      .join(EmailQueueItem, EmailQueueItem.message_id == EmailDeliveryEvent.message_id)
+                      .filter(EmailDeliveryEvent.recipient.in_(emails),
+                              EmailDeliveryEvent.event_type.in_(('open', 'click')),
+                              EmailDeliveryEvent.occurred_at >= min(order[1] for order in orders)
+                              - self.attribution_window,
+                              EmailDeliveryEvent.occurred_at <= max(order[1] for order in orders))
+                      .all())
+        steps = self._campaign_steps({row.campaign_id for row in touch_rows})
+        touches = sorted((row.recipient.lower(), row.occurred_at) + steps[row.campaign_id] + (row.event_type,)
+                         for row in touch_rows if steps.get(row.campaign_id))
+
+        deltas: Dict[StepKey, Counter] = defaultdict(Counter)
+        attributions = []
+        for (_, ordered_at, order_id, amount), (_, touched_at, sequence_id, step_index, touch_type) in \
+                attribute_orders(orders, touches, self.attribution_window):
+            amount = Decimal(str(amount or 0))
+            attributions.append({
+                'order_id': order_id,
+                'sequence_id': sequence_id,
+                'step_index': step_index,
+                'touch_type': touch_type,
+                'touched_at': touched_at,
+                'ordered_at': ordered_at,
+                'amount': amount,
+                'created_at': datetime.utcnow(),
+            })
+            deltas[(sequence_id, step_index)]['conversions'] += 1
+            deltas[(sequence_id, step_index)]['revenue'] += amount
+        if attributions:
+            insert_ignore(SequenceAttribution, attributions, ['order_id'])
+            self._apply(deltas, {})
+        return len(attributions)
+
+    def _apply(self, deltas: Dict[StepKey, Counter], recipients: Dict[StepKey, Dict[str, List[str]]]):
+        """Add counter deltas and sketch values to the step rows (no commit)."""
+        keys = sorted(set(deltas) | set(recipients))
+        if not keys:
+            return
+        now = datetime.utcnow()
+        insert_ignore(SequenceStepMetric, [
+            dict({column: 0 for column in COUNTER_COLUMNS}, sequence_id=key[0], step_index=key[1], updated_at=now)
+            for key in keys
+        ], ['sequence_id', 'step_index'])
+        table = SequenceStepMetric.__table__
+        if deltas:
+            db.session.execute(
+                table.update()
+                .where(table.c.sequence_id == bindparam('b_sequence_id'),
+                       table.c.step_index == bindparam('b_step_index'))
+                .values(dict({column: table.c[column] + bindparam(f'b_{column}') for column in COUNTER_COLUMNS},
+                             updated_at=now)),
+                [dict({f'b_{column}': deltas[key].get(column, 0) for column in COUNTER_COLUMNS},
+                      b_sequence_id=key[0], b_step_index=key[1]) for key in sorted(deltas)]
+            )
+        # Sketch unions are idempotent; only the lease holder writes them
+        for key in sorted(recipients):
+            row = db.session.get(SequenceStepMetric, key, populate_existing=True)
+            for event_type, values in recipients[key].items():
+                column = f'{event_type}_sketch'
+                sketch = HyperLogLog.from_bytes(getattr(row, column))
+                sketch.update(values)
+                setattr(row, column, sketch.to_bytes())
+
+    # Queries ------------------------------------------------------------------
+
+    def metrics(self, sequence_key: str) -> Optional[Dict[str, Any]]:
+        """Per-step and overall metrics of a sequence, read from its step rows.
+
+        Open, click and engagement rates use each step's unique recipients
+        over delivered messages (sent messages when the provider reports no
+        deliveries); conversion rate is attributed orders over sent. The
+        totals also count distinct openers, clickers and engaged recipients
+        across the whole sequence.
+        """
+        sequence = DripSequence.query.filter_by(sequence_key=sequence_key).first()
+        if sequence is None:
+            return None
+        step_count = len(json.loads(sequence.steps))
+        campaigns = {campaign.campaign_key: campaign for campaign in EmailCampaign.query.filter(
+            EmailCampaign.campaign_key.in_([step_campaign_key(sequence_key, index) for index in range(step_count)]))}
+        rows = {row.step_index: row for row in
+                SequenceStepMetric.query.filter_by(sequence_id=sequence.id)}
+
+        steps = []
+        sketches = {'open': HyperLogLog(), 'click': HyperLogLog(), 'engaged': HyperLogLog()}
+        for index in range(step_count):
+            campaign = campaigns.get(step_campaign_key(sequence_key, index))
+            row = rows.get(index)
+            open_sketch = HyperLogLog.from_bytes(row.open_sketch if row else None)
+            click_sketch = HyperLogLog.from_bytes(row.click_sketch if row else None)
+            sketches['open'].merge(open_sketch)
+            sketches['click'].merge(click_sketch)
+            engaged = HyperLogLog.from_bytes(open_sketch.to_bytes())
+            engaged.merge(click_sketch)
+            sketches['engaged'].merge(engaged)
+            entry = {
+                'step': index,
+                'sent': campaign.sent_count if campaign else 0,
+                'failed': campaign.failed_count if campaign else 0,
+                'delivered': row.delivered if row else 0,
+                'bounced': row.bounced if row else 0,
+                'complaints': row.complaints if row else 0,
+                'unsubscribes': row.unsubscribes if row else 0,
+                'opens': row.opens if row else 0,
+                'clicks': row.clicks if row else 0,
+                'conversions': row.conversions if row else 0,
+                'revenue': row.revenue if row else Decimal('0'),
+            }
+            entry['unique_opens'] = min(open_sketch.count(), entry['opens'])
+            entry['unique_clicks'] = min(click_sketch.count(), entry['clicks'])
+            entry['unique_engaged'] = min(engaged.count(), entry['opens'] + entry['clicks'])
+            steps.append(entry)
+
+        totals = {column: sum((step[column] for step in steps), Decimal('0') if column == 'revenue' else 0)
+                  for column in ('sent', 'failed', 'delivered', 'bounced', 'complaints', 'unsubscribes',
+                                 'opens', 'clicks', 'unique_opens', 'unique_clicks', 'unique_engaged',
+                                 'conversions', 'revenue')}
+        # Distinct recipients across all steps, from the merged sketches
+        totals['openers'] = min(sketches['open'].count(), totals['unique_opens'])
+        totals['clickers'] = min(sketches['click'].count(), totals['unique_clicks'])
+        totals['engaged_recipients'] = min(sketches['engaged'].count(), totals['unique_engaged'])
+        for entry in steps + [totals]:
+            base = entry['delivered'] or entry['sent']
+            entry['open_rate'] = _rate(entry['unique_opens'], base)
+            entry['click_rate'] = _rate(entry['unique_clicks'], base)
+            entry['click_to_open_rate'] = _rate(entry['unique_clicks'], entry['unique_opens'])
+            entry['engagement_rate'] = _rate(entry['unique_engaged'], base)
+            entry['conversion_rate'] = _rate(entry['conversions'], entry['sent'])
+            entry['revenue_per_send'] = float(entry['revenue'] / entry['sent']) if entry['sent'] else 0.0
+            entry['revenue'] = float(entry['revenue'])
+
+        return {
+            'sequence_id': sequence.sequence_key,
+            'kind': sequence.kind,
+            'status': sequence.status,
+            'attribution_window_hours': self.attribution_window.total_seconds() / 3600,
+            'steps': steps,
+            'totals': totals,
+        }
+
+
+# Shared instance, configured in create_app()
+sequence_metrics = SequenceMetrics()
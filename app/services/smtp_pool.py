@@ -0,0 +1,134 @@
+"""Pool of persistent SMTP connections.
+
+Flask-Mail opens, authenticates and closes a connection for every message.
+For bulk sends the pool keeps connections open and hands them out to sender
+threads, so the TCP/TLS/AUTH handshake is paid once per connection instead
+of once per message.
+"""
+
+import logging
+import queue
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+
+class SMTPConnectionPool:
+    """Thread-safe pool of logged-in ``smtplib.SMTP`` connections.
+
+    Attributes:
+        size (int): Maximum number of open connections
+        max_messages (int): Messages sent on a connection before it is recycled
+        idle_check (float): Idle seconds after which a connection is NOOP-checked
+    """
+
+    def __init__(self, host: str, port: int, use_tls: bool = False, use_ssl: bool = False,
+                 username: Optional[str] = None, password: Optional[str] = None,
+                 size: int = 8, timeout: float = 30.0, max_messages: int = 1000,
+                 idle_check: float = 30.0):
+        """Initialize an empty pool; connections are opened on demand.
+
+        Args:
+            host: SMTP server host (MAIL_SERVER)
+            port: SMTP server port (MAIL_PORT)
+            use_tls: Upgrade with STARTTLS after connecting
+            use_ssl: Connect with implicit TLS (SMTPS)
+            username: Login user, if the server requires AUTH
+            password: Login password
+            size: Maximum open connections
+            timeout: Socket timeout in seconds
+            max_messages: Recycle a connection after this many messages
+            idle_check: NOOP connections idle longer than this before reuse
+        """
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self.username = username
+        self.password = password
+        self.size = size
+        self.timeout = timeout
+        self.max_messages = max_messages
+        self.idle_check = idle_check
+        self.logger = logging.getLogger(__name__)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            conn = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        conn.ehlo()
+        if self.use_tls and not self.use_ssl:
+            conn.starttls()
+            conn.ehlo()
+        if self.username and self.password:
+            conn.login(self.username, self.password)
+        conn.sent_messages = 0
+        return conn
+
+    @staticmethod
+    def _discard(conn: smtplib.SMTP):
+        try:
+            conn.quit()
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _checkout(self) -> smtplib.SMTP:
+        while True:
+            try:
+                conn, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - idle_since < self.idle_check:
+                return conn
+            try:
+                if conn.noop()[0] == 250:
+                    return conn
+            except smtplib.SMTPException:
+                pass
+            except OSError:
+                pass
+            self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; it is returned to the pool unless the block raised
+        a connection-level error, in which case it is closed.
+
+        Blocks while all ``size`` connections are in use.
+        """
+        self._slots.acquire()
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except (smtplib.SMTPServerDisconnected, OSError):
+            if conn is not None:
+                self._discard(conn)
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                if self._closed or getattr(conn, 'sent_messages', 0) >= self.max_messages:
+                    self._discard(conn)
+                else:
+                    self._idle.put((conn, time.monotonic()))
+            self._slots.release()
+
+    def close(self):
+        """Close all idle connections and stop pooling returned ones."""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
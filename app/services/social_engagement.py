@@ -0,0 +1,91 @@
+"""Engagement counts reported for published social posts.
+
+Platform analytics (polled or pushed) report cumulative counts per post and
+platform. Each report replaces the post's latest counts for that platform
+in ``social_posts.engagement`` and refreshes its weighted
+``engagement_score``; ``engagement_updated_at`` lets in-memory indexes pick
+up changes incrementally. The change since the previous report is also
+appended to the post's time series (``app.services.engagement_series``).
+"""
+
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable
+
+from sqlalchemy import bindparam
+
+from app import db
+from app.models.social_post import SocialPost
+from app.services.engagement_series import METRICS, engagement_series
+
+# Interactions weighted by the effort they take; impressions measure reach, not engagement
+ENGAGEMENT_WEIGHTS = {'likes': 1.0, 'comments': 2.0, 'shares': 3.0, 'clicks': 1.0, 'saves': 2.0}
+
+
+def engagement_score(counts: Dict[str, Any]) -> float:
+    """Weighted interaction total of one platform's counts."""
+    return float(sum(weight * (counts.get(metric) or 0) for metric, weight in ENGAGEMENT_WEIGHTS.items()))
+
+
+class SocialEngagement:
+    """Records engagement reports against stored posts."""
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    def record_many(self, reports: Iterable[Dict[str, Any]]) -> int:
+        """Apply engagement reports (commits).
+
+        Args:
+            reports: Dicts with ``post_id``, ``platform`` and the cumulative
+                counts in ``METRICS``
+
+        Returns:
+            int: Number of reports applied (unknown posts are skipped)
+        """
+        latest: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for report in reports:
+            post_key, platform = report.get('post_id'), report.get('platform')
+            if not post_key or not platform:
+                continue
+            latest.setdefault(post_key, {})[platform] = {
+                metric: int(report.get(metric) or 0) for metric in METRICS}
+        if not latest:
+            return 0
+
+        rows = db.session.query(SocialPost.post_key, SocialPost.engagement) \
+            .filter(SocialPost.post_key.in_(list(latest))).all()
+        now = datetime.utcnow()
+        updates, points = [], []
+        for post_key, stored in rows:
+            engagement = json.loads(stored) if stored else {}
+            for platform, counts in latest[post_key].items():
+                points.append((post_key, platform, now, engagement.get(platform, {}), counts))
+            engagement.update(latest[post_key])
+            updates.append({
+                'b_key': post_key,
+                'b_engagement': json.dumps(engagement),
+                'b_score': sum(engagement_score(counts) for counts in engagement.values()),
+                'b_updated': now,
+            })
+        if updates:
+            table = SocialPost.__table__
+            db.session.execute(
+                table.update().where(table.c.post_key == bindparam('b_key'))
+                .values(engagement=bindparam('b_engagement'), engagement_score=bindparam('b_score'),
+                        engagement_updated_at=bindparam('b_updated')),
+                updates
+            )
+            engagement_series.append(points)
+        db.session.commit()
+        applied = {row.post_key for row in rows}
+        return sum(len(platforms) for post_key, platforms in latest.items() if post_key in applied)
+
+    def record(self, post_key: str, platform: str, counts: Dict[str, Any]) -> bool:
+        """Apply one report; returns False for an unknown post."""
+        return bool(self.record_many([dict(counts, post_id=post_key, platform=platform)]))
+
+
+# Shared instance
+social_engagement = SocialEngagement()
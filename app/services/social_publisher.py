@@ -0,0 +1,363 @@
+"""Concurrent multi-platform publishing.
+
+A post goes out to all of its platforms at once on an asyncio event loop
+owned by the publisher (one background thread per process). Each platform
+has its own channel: a token bucket for the platform's rate limit, a
+concurrency cap sized to its connection pool, and a retry policy with
+jittered exponential backoff that honours ``Retry-After``. Channels share
+nothing, so a slow or throttled platform only delays its own results.
+
+Creating a post is not idempotent, so only failures where the platform
+certainly did not create it are retried: 429, 5xx and errors while
+connecting. A timeout or a connection dropped after the request was sent
+may have published the post and is reported as failed, not retried.
+
+Platforms are reached through adapters:
+
+* ``HTTPPlatformAdapter`` posts JSON to a configured API endpoint over a
+  keep-alive ``requests`` session. The project has no async HTTP client,
+  so blocking calls run on a per-platform thread pool sized like the
+  session's connection pool.
+* ``FakePlatformAdapter`` is an in-process stand-in with configurable
+  latency and failure rates, for tests, benchmarks and local runs.
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from app.utils.rate_limit import TokenBucket, parse_rates
+
+
+PLATFORMS = ('twitter', 'facebook', 'instagram', 'linkedin', 'tiktok')
+
+# Default publish calls per second per platform; override with SOCIAL_PLATFORM_RATES
+DEFAULT_RATES = {
+    'twitter': 1.0,
+    'facebook': 3.0,
+    'instagram': 0.5,
+    'linkedin': 1.0,
+    'tiktok': 0.5,
+}
+
+
+class PublishError(Exception):
+    """A platform rejected or failed a publish call.
+
+    Attributes:
+        retryable (bool): Whether trying again may succeed (timeouts, 429, 5xx)
+        retry_after (float): Seconds the platform asked us to wait, if any
+    """
+
+    def __init__(self, message: str, retryable: bool = True, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class RetryPolicy:
+    """Attempts, per-attempt timeout and jittered exponential backoff for one platform."""
+
+    def __init__(self, attempts: int = 3, base_delay: float = 0.5, max_delay: float = 30.0,
+                 timeout: float = 15.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Seconds to wait before attempt ``attempt + 1`` (full jitter)."""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class PlatformAdapter(ABC):
+    """Publishes a post to one platform.
+
+    Subclasses implement :meth:`publish`, returning the platform's id and
+    URL for the new post, and raise :class:`PublishError` on failure. Only
+    mark an error retryable if the platform certainly did not create the post.
+    """
+
+    def __init__(self, name: str, pool_size: int = 4):
+        self.name = name
+        self.pool_size = pool_size
+
+    @abstractmethod
+    async def publish(self, post: Dict[str, Any]) -> Dict[str, Any]:
+        """Create the post on the platform."""
+
+    def close(self):
+        """Release connections and threads."""
+
+
+def _before_send(error: requests.RequestException) -> bool:
+    """Whether a request failed while connecting, before anything was sent."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError):
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+class HTTPPlatformAdapter(PlatformAdapter):
+    """Posts to a platform API (or a relay in front of it) over pooled keep-alive connections.
+
+    The JSON body is ``{"text", "media", "link", ...}`` built from the post;
+    override :meth:`payload` for APIs that expect another shape. Requests
+    carry an ``Idempotency-Key`` of post id and platform for APIs that
+    deduplicate on it.
+    """
+
+    def __init__(self, name: str, endpoint: str, access_token: Optional[str] = None,
+                 pool_size: int = 4, timeout: float = 15.0):
+        super().__init__(name, pool_size)
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount(endpoint, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        if access_token:
+            self.session.headers['Authorization'] = f'Bearer {access_token}'
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix=f'social-{name}')
+
+    def payload(self, post: Dict[str, Any]) -> Dict[str, Any]:
+        options = post.get('options') or {}
+        text = post['content']
+        hashtags = options.get('hashtags') or []
+        if hashtags:
+            text = f"{text} {' '.join(tag if tag.startswith('#') else f'#{tag}' for tag in hashtags)}"
+        return dict({key: value for key, value in options.items() if key != 'hashtags'}, text=text)
+
+    def _send(self, post: Dict[str, Any]) -> Dict[str, Any]:
+        headers = {'Idempotency-Key': f"{post['post_id']}:{self.name}"} if post.get('post_id') else None
+        try:
+            response = self.session.post(self.endpoint, json=self.payload(post), headers=headers,
+                                         timeout=self.timeout)
+        except requests.RequestException as e:
+            # Retry only if the request never reached the platform
+            raise PublishError(f'{type(e).__name__}: {e}', retryable=_before_send(e))
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get('Retry-After')
+            raise PublishError(f'HTTP {response.status_code}', retryable=True,
+                               retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+        if response.status_code >= 400:
+            raise PublishError(f'HTTP {response.status_code}: {response.text[:200]}', retryable=False)
+        data = response.json() if response.content else {}
+        return {'id': data.get('id'), 'url': data.get('url')}
+
+    async def publish(self, post: Dict[str, Any]) -> Dict[str, Any]:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._send, post)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+class FakePlatformAdapter(PlatformAdapter):
+    """In-process platform stand-in.
+
+    Args:
+        name: Platform name
+        latency: Seconds each call takes
+        failure_rate: Share of calls failing with a retryable error
+        reject_rate: Share of calls failing permanently
+        seed: Seed for reproducible failures
+    """
+
+    def __init__(self, name: str, latency: float = 0.05, failure_rate: float = 0.0,
+                 reject_rate: float = 0.0, seed: Optional[int] = None):
+        super().__init__(name)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.reject_rate = reject_rate
+        self.published: List[Dict[str, Any]] = []
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+
+    async def publish(self, post: Dict[str, Any]) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency)
+        roll = self._random.random()
+        if roll < self.reject_rate:
+            raise PublishError('rejected by fake platform', retryable=False)
+        if roll < self.reject_rate + self.failure_rate:
+            raise PublishError('temporary failure on fake platform', retryable=True)
+        post_id = f'{self.name}-{next(self._ids)}'
+        self.published.append(dict(post, platform_post_id=post_id))
+        return {'id': post_id, 'url': f'https://{self.name}.invalid/{post_id}'}
+
+
+class PlatformChannel:
+    """One platform's adapter with its rate limit, concurrency cap and retry policy."""
+
+    def __init__(self, adapter: PlatformAdapter, rate: float, retry: Optional[RetryPolicy] = None,
+                 concurrency: Optional[int] = None):
+        self.adapter = adapter
+        self.bucket = TokenBucket(rate)
+        self.retry = retry or RetryPolicy()
+        self.concurrency = concurrency or adapter.pool_size
+        self._semaphore = None
+        self._semaphore_loop = None
+
+    def _slots(self) -> asyncio.Semaphore:
+        # asyncio primitives belong to one loop; the publisher's loop is recreated after a fork
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def _throttle(self):
+        wait = self.bucket.try_acquire()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self.bucket.try_acquire()
+
+    async def publish(self, post: Dict[str, Any]) -> Dict[str, Any]:
+        """Publish with retries; never raises.
+
+        Returns:
+            dict: status (published or failed), attempts, elapsed_ms, and
+            id/url on success or error on failure
+        """
+        started = time.monotonic()
+        error = None
+        for attempt in range(1, self.retry.attempts + 1):
+            await self._throttle()
+            try:
+                async with self._slots():
+                    result = await asyncio.wait_for(self.adapter.publish(post), self.retry.timeout)
+                return dict(result, status='published', attempts=attempt,
+                            elapsed_ms=round((time.monotonic() - started) * 1000, 1))
+            except asyncio.TimeoutError:
+                # The call keeps running on its thread and may still create the post
+                error = PublishError(f'timed out after {self.retry.timeout}s; outcome unknown', retryable=False)
+            except PublishError as e:
+                error = e
+            except Exception as e:
+                error = PublishError(f'{type(e).__name__}: {e}', retryable=False)
+            if not error.retryable or attempt == self.retry.attempts:
+                break
+            await asyncio.sleep(self.retry.delay(attempt, error.retry_after))
+        return {'status': 'failed', 'attempts': attempt, 'error': str(error),
+                'elapsed_ms': round((time.monotonic() - started) * 1000, 1)}
+
+
+class SocialPublisher:
+    """Fans posts out to their platforms concurrently from a private event loop."""
+
+    def __init__(self):
+        """Initialize with no channels; ``init_app`` builds them from config."""
+        self.channels: Dict[str, PlatformChannel] = {}
+        self.logger = logging.getLogger(__name__)
+        self._loop = None
+        self._loop_pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Build a channel per platform and become the post scheduler's publisher.
+
+        ``SOCIAL_PUBLISHER_ADAPTER`` selects ``http`` adapters (endpoint and
+        token from ``SOCIAL_<PLATFORM>_API_URL`` / ``_ACCESS_TOKEN``) or
+        ``fake`` ones.
+
+        Args:
+            app: Flask application instance
+        """
+        from app.services.social_scheduler import social_scheduler
+
+        config = app.config
+        rates = dict(DEFAULT_RATES, **parse_rates(config.get('SOCIAL_PLATFORM_RATES')))
+        pool_size = config.get('SOCIAL_PLATFORM_POOL_SIZE', 4)
+        timeout = config.get('SOCIAL_PUBLISH_TIMEOUT', 15)
+        retry = dict(attempts=config.get('SOCIAL_PUBLISH_ATTEMPTS', 3), timeout=timeout)
+        kind = (config.get('SOCIAL_PUBLISHER_ADAPTER') or 'http').lower()
+        for name in PLATFORMS:
+            if kind == 'fake':
+                adapter = FakePlatformAdapter(name)
+            else:
+                endpoint = config.get(f'SOCIAL_{name.upper()}_API_URL') or os.environ.get(f'SOCIAL_{name.upper()}_API_URL')
+                if not endpoint:
+                    continue
+                token = (config.get(f'SOCIAL_{name.upper()}_ACCESS_TOKEN')
+                         or os.environ.get(f'SOCIAL_{name.upper()}_ACCESS_TOKEN'))
+                adapter = HTTPPlatformAdapter(name, endpoint, token, pool_size=pool_size, timeout=timeout)
+            self.register(adapter, rate=rates.get(name, 1.0), retry=RetryPolicy(**retry))
+        social_scheduler.set_publisher(self.publish_many)
+
+    def register(self, adapter: PlatformAdapter, rate: float = 1.0, retry: Optional[RetryPolicy] = None,
+                 concurrency: Optional[int] = None) -> PlatformChannel:
+        """Add or replace the channel for ``adapter.name``."""
+        previous = self.channels.get(adapter.name)
+        if previous is not None and previous.adapter is not adapter:
+            previous.adapter.close()
+        channel = PlatformChannel(adapter, rate, retry, concurrency)
+        self.channels[adapter.name] = channel
+        return channel
+
+    # Event loop ---------------------------------------------------------------
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None and self._loop_pid == os.getpid() and self._loop.is_running():
+            return self._loop
+        with self._lock:
+            if self._loop is None or self._loop_pid != os.getpid() or not self._loop.is_running():
+                loop = asyncio.new_event_loop()
+                started = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(started.set)
+                    loop.run_forever()
+
+                threading.Thread(target=run, name='social-publisher', daemon=True).start()
+                started.wait()
+                self._loop, self._loop_pid = loop, os.getpid()
+        return self._loop
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._ensure_loop()).result()
+
+    # Publishing ---------------------------------------------------------------
+
+    async def _publish(self, post: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        platforms = post['platforms']
+        missing = {name: {'status': 'failed', 'attempts': 0, 'error': 'platform not configured'}
+                   for name in platforms if name not in self.channels}
+        configured = [name for name in platforms if name in self.channels]
+        results = await asyncio.gather(*(self.channels[name].publish(post) for name in configured))
+        return dict(missing, **dict(zip(configured, results)))
+
+    async def _publish_many(self, posts: List[Dict[str, Any]]) -> List[Dict[str, Dict[str, Any]]]:
+        return list(await asyncio.gather(*(self._publish(post) for post in posts)))
+
+    def publish(self, post: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Publish one post to all of its platforms concurrently.
+
+        Args:
+            post: Dict with ``content``, ``platforms`` (names) and ``options``
+
+        Returns:
+            dict: Platform name -> result (see :meth:`PlatformChannel.publish`)
+        """
+        return self._run(self._publish(post))
+
+    def publish_many(self, posts: List[Dict[str, Any]]) -> List[Dict[str, Dict[str, Any]]]:
+        """Publish several posts concurrently; results are in input order."""
+        return self._run(self._publish_many(posts)) if posts else []
+
+
+# Shared instance, configured in create_app()
+social_publisher = SocialPublisher()
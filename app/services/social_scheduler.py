@@ -0,0 +1,396 @@
+"""Durable social post scheduler.
+
+Posts live in ``social_posts`` and are dispatched from the
+``(status, scheduled_time)`` index, so schedules survive restarts and
+deploys. One process at a time is the dispatcher, elected through a
+database lease; it keeps the posts due within the next hour in a
+hierarchical timer wheel and fires them on one-second ticks. The wheel is
+refilled incrementally (newly created posts by id, the look-ahead window
+as it advances) and rebuilt from the table periodically, which also picks
+up anything written by other processes.
+
+Cancelling is a conditional update by post id; a post cancelled in
+another process while sitting in the leader's wheel is skipped when its
+claim finds it no longer scheduled.
+
+After each dispatched batch is stored, listeners (see ``add_listener``)
+receive a ``post_published`` or ``post_failed`` event per post.
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, func
+
+from app import db
+from app.models.social_post import SocialPost
+from app.utils.background import PeriodicWorker
+from app.utils.lease import LeaderLease
+from app.utils.timer_wheel import TimerWheel
+
+
+# Publishes a batch of posts; returns one {platform: {'status': 'published' | 'failed', ...}} per post
+Publisher = Callable[[List[Dict[str, Any]]], List[Dict[str, Dict[str, Any]]]]
+
+# Receives (event type, **fields) for every dispatched post
+Listener = Callable[..., Any]
+
+
+UTC_OFFSET = re.compile(r'(?:Z|[+-]\d{2}:?\d{2})$')
+
+
+def normalize_times(values: Sequence[Any], timezones: Optional[Sequence[Optional[str]]] = None) -> np.ndarray:
+    """Convert datetimes or ISO strings to naive UTC ``datetime64[us]`` in one pass.
+
+    Aware values are converted to UTC. Naive values are read as wall time
+    in the matching entry of ``timezones`` (an IANA name), or as UTC when
+    none is given. Unparseable values and unknown zones become NaT.
+    """
+    parsed = pd.to_datetime(pd.Series(list(values), dtype=object), utc=True, format='ISO8601', errors='coerce')
+    if timezones is not None:
+        zones = pd.Series(list(timezones), dtype=object)
+        naive = pd.Series([getattr(value, 'tzinfo', None) is None
+                           and not (isinstance(value, str) and UTC_OFFSET.search(value.strip()))
+                           for value in values], dtype=bool)
+        local = zones.notna() & naive & parsed.notna()
+        for zone in zones[local].unique():
+            mask = local & (zones == zone)
+            try:
+                parsed[mask] = parsed[mask].dt.tz_convert(None).dt.tz_localize(
+                    zone, ambiguous='NaT', nonexistent='shift_forward').dt.tz_convert('UTC')
+            except Exception:
+                parsed[mask] = pd.NaT
+    return parsed.dt.tz_convert(None).to_numpy(dtype='datetime64[us]')
+
+
+class SocialPostScheduler:
+    """Stores scheduled posts and dispatches them when due from the elected leader."""
+
+    def __init__(self):
+        """Initialize an empty wheel with default limits."""
+        self.horizon = 3600
+        self.resync_interval = 60
+        self.claim_timeout = 600
+        self.batch_size = 100
+        self.min_post_gap = 60
+        self.publisher: Optional[Publisher] = None
+        self._listeners: List[Listener] = []
+        self.logger = logging.getLogger(__name__)
+        self.lease = LeaderLease('social-scheduler', ttl=30)
+        self.worker = PeriodicWorker('social-scheduler', self.run_due, interval=1)
+        self._wheel = TimerWheel(tick=1.0)
+        self._synced_until: Optional[datetime] = None  # End of the window loaded into the wheel
+        self._max_id = 0  # Highest post id seen; newer rows are picked up incrementally
+        self._last_resync = 0.0
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        """Configure look-ahead, lease and polling from app config.
+
+        Args:
+            app: Flask application instance
+        """
+        self.horizon = app.config.get('SOCIAL_SCHEDULER_HORIZON_SECONDS', self.horizon)
+        self.batch_size = app.config.get('SOCIAL_PUBLISH_BATCH_SIZE', self.batch_size)
+        self.min_post_gap = app.config.get('SOCIAL_MIN_POST_GAP_SECONDS', self.min_post_gap)
+        self.lease.ttl = app.config.get('SOCIAL_LEADER_LEASE_SECONDS', self.lease.ttl)
+        self.worker.init_app(app, interval=app.config.get('SOCIAL_SCHEDULER_POLL_INTERVAL', 1), autostart=True)
+
+    def set_publisher(self, publisher: Optional[Publisher]):
+        """Set the callable that publishes due posts; nothing is dispatched without one."""
+        self.publisher = publisher
+
+    def add_listener(self, listener: Listener):
+        """Call ``listener(event_type, post_id=..., content=..., platforms=..., results=...)``
+        after each dispatched post is stored.
+
+        Only the process holding the scheduler lease dispatches, so register
+        process-wide listeners once at app setup; adding one twice is a no-op.
+        """
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def _emit(self, event_type: str, **fields):
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(event_type, **fields)
+            except Exception as e:
+                self.logger.error(f"Listener for {event_type} failed: {str(e)}")
+
+    # Posts --------------------------------------------------------------------
+
+    def schedule(self, content: str, platforms: List[str], scheduled_time: datetime,
+                 options: Optional[Dict[str, Any]] = None, status: str = 'scheduled') -> SocialPost:
+        """Store a post (commits).
+
+        Args:
+            content: Post text
+            platforms: Platform names
+            scheduled_time: Naive UTC publish time
+            options: Media, hashtags and other publish options
+            status: scheduled, or draft to store without dispatching
+        """
+        post = SocialPost(post_key=uuid.uuid4().hex, content=content, platforms=json.dumps(platforms),
+                          options=json.dumps(options, default=str) if options else None,
+                          scheduled_time=scheduled_time, status=status)
+        db.session.add(post)
+        db.session.commit()
+        if status == 'scheduled':
+            with self._lock:
+                if self.lease.is_held() and self._synced_until is not None and scheduled_time <= self._synced_until:
+                    self._wheel.add(post.post_key, scheduled_time)
+        return post
+
+    def schedule_many(self, contents: Sequence[str], platforms: Sequence[List[str]], times: np.ndarray,
+                      options: Sequence[Optional[Dict[str, Any]]]) -> List[str]:
+        """Store many already-validated posts with one batched INSERT (commits).
+
+        Args:
+            contents: Post texts
+            platforms: Platform names of each post
+            times: Naive UTC ``datetime64`` publish times
+            options: Publish options of each post (or None)
+
+        Returns:
+            list: Post ids, in input order
+        """
+        if not len(contents):
+            return []
+        keys = [uuid.uuid4().hex for _ in contents]
+        scheduled = pd.DatetimeIndex(times).to_pydatetime()
+        now = datetime.utcnow()
+        db.session.execute(SocialPost.__table__.insert(), [{
+            'post_key': key,
+            'content': content,
+            'platforms': json.dumps(names),
+            'options': json.dumps(extra, default=str) if extra else None,
+            'scheduled_time': when,
+            'status': 'scheduled',
+            'attempts': 0,
+            'created_at': now,
+            'updated_at': now,
+        } for key, content, names, when, extra in zip(keys, contents, platforms, scheduled, options)])
+        db.session.commit()
+        with self._lock:
+            if self.lease.is_held() and self._synced_until is not None:
+                for key, when in zip(keys, scheduled):
+                    if when <= self._synced_until:
+                        self._wheel.add(key, when)
+        return keys
+
+    def find_conflicts(self, platforms: Sequence[List[str]], times: np.ndarray,
+                       min_gap: Optional[float] = None) -> np.ndarray:
+        """Flag posts scheduled within ``min_gap`` seconds of another post on a shared platform.
+
+        Existing draft and scheduled posts are read with one range scan of
+        the ``(status, scheduled_time)`` index; within the new posts, the
+        earliest of a clashing group is kept and the rest are flagged.
+        ``min_gap`` defaults to ``min_post_gap``.
+
+        Returns:
+            numpy.ndarray: Boolean mask over the new posts
+        """
+        min_gap = self.min_post_gap if min_gap is None else min_gap
+        conflicts = np.zeros(len(times), dtype=bool)
+        if not len(times) or min_gap <= 0:
+            return conflicts
+        gap = np.timedelta64(int(min_gap * 1e6), 'us')
+        low, high = pd.Timestamp(times.min() - gap).to_pydatetime(), pd.Timestamp(times.max() + gap).to_pydatetime()
+        existing: Dict[str, List[datetime]] = {}
+        for scheduled_time, names in db.session.query(SocialPost.scheduled_time, SocialPost.platforms).filter(
+                SocialPost.status.in_(('draft', 'scheduled')),
+                SocialPost.scheduled_time > low, SocialPost.scheduled_time < high):
+            for name in json.loads(names):
+                existing.setdefault(name, []).append(scheduled_time)
+
+        by_platform: Dict[str, List[int]] = {}
+        for index, names in enumerate(platforms):
+            for name in names:
+                by_platform.setdefault(name, []).append(index)
+        for name, indexes in by_platform.items():
+            indexes = np.array(indexes)
+            new = times[indexes]
+            taken = np.sort(np.array(existing.get(name, []), dtype='datetime64[us]'))
+            if len(taken):
+                position = np.searchsorted(taken, new)
+                after = taken[np.minimum(position, len(taken) - 1)]
+                before = taken[np.maximum(position - 1, 0)]
+                conflicts[indexes[(np.abs(after - new) < gap) | (np.abs(new - before) < gap)]] = True
+            order = np.argsort(new, kind='stable')
+            clash = np.diff(new[order]) < gap
+            conflicts[indexes[order[1:][clash]]] = True
+        return conflicts
+
+    def record(self, content: str, platforms: List[str], options: Optional[Dict[str, Any]],
+               results: Dict[str, Dict[str, Any]]) -> SocialPost:
+        """Store a post that was published right away, with its per-platform results (commits)."""
+        errors = [f"{platform}: {result.get('error') or result.get('status')}"
+                  for platform, result in results.items() if result.get('status') != 'published']
+        now = datetime.utcnow()
+        post = SocialPost(post_key=uuid.uuid4().hex, content=content, platforms=json.dumps(platforms),
+                          options=json.dumps(options, default=str) if options else None,
+                          scheduled_time=now, status='failed' if errors else 'published', attempts=1,
+                          results=json.dumps(results, default=str), last_error='; '.join(errors) or None,
+                          published_at=None if errors else now)
+        db.session.add(post)
+        db.session.commit()
+        return post
+
+    def cancel(self, post_key: str) -> bool:
+        """Cancel a draft or scheduled post (commits).
+
+        Returns:
+            bool: True if the post was cancelled, False if unknown or already dispatched
+        """
+        table = SocialPost.__table__
+        result = db.session.execute(
+            table.update()
+            .where(table.c.post_key == post_key, table.c.status.in_(('draft', 'scheduled')))
+            .values(status='cancelled', updated_at=datetime.utcnow())
+        )
+        db.session.commit()
+        with self._lock:
+            self._wheel.cancel(post_key)
+        return bool(result.rowcount)
+
+    def get(self, post_key: str) -> Optional[Dict[str, Any]]:
+        post = SocialPost.query.filter_by(post_key=post_key).first()
+        return post.to_dict() if post else None
+
+    def list_posts(self, platform: Optional[str] = None, status: str = 'scheduled',
+                   limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Posts with ``status``, soonest first, optionally only those targeting ``platform``."""
+        query = SocialPost.query.filter(SocialPost.status == status)
+        if platform:
+            query = query.filter(SocialPost.platforms.like(f'%{json.dumps(platform)}%'))
+        query = query.order_by(SocialPost.scheduled_time, SocialPost.id)
+        if limit:
+            query = query.limit(limit)
+        return [post.to_dict() for post in query]
+
+    # Wheel maintenance --------------------------------------------------------
+
+    def _load(self, *criteria):
+        for post_key, scheduled_time in db.session.query(SocialPost.post_key, SocialPost.scheduled_time) \
+                .filter(SocialPost.status == 'scheduled', *criteria).yield_per(1000):
+            self._wheel.add(post_key, scheduled_time)
+
+    def _refill(self, now: datetime):
+        """Bring the wheel up to date with the table for the window ending at ``now + horizon``."""
+        window_end = now + timedelta(seconds=self.horizon)
+        if self._synced_until is None or time.monotonic() - self._last_resync > self.resync_interval:
+            self._release_stale(now)
+            self._max_id = db.session.query(func.max(SocialPost.id)).scalar() or 0
+            self._wheel.clear()
+            self._load(SocialPost.scheduled_time <= window_end)
+            self._synced_until = window_end
+            self._last_resync = time.monotonic()
+            return
+        max_id = db.session.query(func.max(SocialPost.id)).scalar() or 0
+        if max_id > self._max_id:
+            self._load(SocialPost.id > self._max_id, SocialPost.id <= max_id,
+                       SocialPost.scheduled_time <= self._synced_until)
+            self._max_id = max_id
+        if window_end - self._synced_until > timedelta(seconds=self.horizon / 2):
+            self._load(SocialPost.scheduled_time > self._synced_until, SocialPost.scheduled_time <= window_end)
+            self._synced_until = window_end
+
+    def _release_stale(self, now: datetime):
+        table = SocialPost.__table__
+        db.session.execute(
+            table.update()
+            .where(table.c.status == 'publishing',
+                   table.c.claimed_at < now - timedelta(seconds=self.claim_timeout))
+            .values(status='scheduled', claim_token=None)
+        )
+        db.session.commit()
+
+    # Dispatch -----------------------------------------------------------------
+
+    def run_due(self) -> int:
+        """Publish every due post if this process is the leader.
+
+        Returns:
+            int: Number of posts dispatched
+        """
+        if self.publisher is None:
+            return 0
+        with self._lock:
+            if not self.lease.hold():
+                if self._synced_until is not None:
+                    self.logger.info('Lost social scheduler lease; clearing timer wheel')
+                    self._wheel.clear()
+                    self._synced_until = None
+                return 0
+            now = datetime.utcnow()
+            self._refill(now)
+            due = self._wheel.advance(now)
+        dispatched = 0
+        for start in range(0, len(due), self.batch_size):
+            dispatched += self._dispatch(due[start:start + self.batch_size], now)
+        return dispatched
+
+    def _dispatch(self, post_keys: List[str], now: datetime) -> int:
+        table = SocialPost.__table__
+        token = uuid.uuid4().hex
+        db.session.execute(
+            table.update()
+            .where(table.c.post_key.in_(post_keys), table.c.status == 'scheduled', table.c.scheduled_time <= now)
+            .values(status='publishing', claim_token=token, claimed_at=now, attempts=table.c.attempts + 1)
+        )
+        db.session.commit()
+        posts = [post.to_dict() for post in SocialPost.query.filter_by(claim_token=token)
+                 .order_by(SocialPost.scheduled_time)]
+        if not posts:
+            return 0
+
+        try:
+            batch_results = self.publisher(posts)
+        except Exception as e:
+            self.logger.error(f"Publishing {len(posts)} posts failed: {str(e)}")
+            batch_results = [e] * len(posts)
+
+        outcomes, events = [], []
+        for post, results in zip(posts, batch_results):
+            if isinstance(results, Exception):
+                results, errors = None, [str(results)]
+            else:
+                errors = [f"{platform}: {result.get('error') or result.get('status')}"
+                          for platform, result in results.items() if result.get('status') != 'published']
+            outcomes.append({
+                'b_key': post['post_id'],
+                'b_status': 'failed' if errors else 'published',
+                'b_results': json.dumps(results, default=str) if results is not None else None,
+                'b_error': '; '.join(errors) or None,
+                'b_published_at': None if errors else datetime.utcnow(),
+            })
+            events.append(('post_failed' if errors else 'post_published',
+                           dict(post_id=post['post_id'], content=post['content'], platforms=post['platforms'],
+                                results=results)))
+
+        db.session.execute(
+            table.update().where(table.c.post_key == bindparam('b_key'))
+            .values(status=bindparam('b_status'), results=bindparam('b_results'),
+                    last_error=bindparam('b_error'), published_at=bindparam('b_published_at'),
+                    claim_token=None, updated_at=datetime.utcnow()),
+            outcomes
+        )
+        db.session.commit()
+        for event_type, fields in events:
+            self._emit(event_type, **fields)
+        return len(outcomes)
+
+
+# Shared instance, configured in create_app()
+social_scheduler = SocialPostScheduler()
@@ -0,0 +1,265 @@
+"""Subscription revenue metrics (MRR/ARR) from the transactions ledger.
+
+Subscription rows in the ledger are an event-sourced timeline: one row per
+start, plan change, cancellation or status change, carrying the plan
+amount at that moment. The engine turns them into per-subscription MRR
+per day and classifies every change with vectorized pandas operations:
+
+- new: MRR goes from 0 to positive (also covers reactivations)
+- expansion / contraction: MRR rises / falls but stays positive
+- churned: MRR drops to 0 (cancelled, unpaid, ...)
+
+Closed days are cached in ``subscription_metric_snapshots``. A refresh only
+reads ledger rows after the last snapshot plus the prior state of the
+subscriptions they touch, and continues from the snapshot's closing MRR.
+Ledger rows that arrive late for an already-snapshotted day (e.g. from
+reconciliation) invalidate the snapshots from that day on.
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, func, select
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.settings import Setting
+from app.models.subscription_metrics import SubscriptionMetricSnapshot
+from app.models.transaction import PaymentTransaction
+
+
+# Subscription statuses that count towards MRR
+ACTIVE_STATUSES = ('active', 'past_due')
+
+# Multipliers turning a per-interval price into a monthly amount
+MONTHLY_FACTORS = {'day': 365.0 / 12, 'week': 52.0 / 12, 'month': 1.0, 'year': 1.0 / 12}
+
+FLOW_COLUMNS = ['new_mrr', 'expansion_mrr', 'contraction_mrr', 'churned_mrr']
+
+WATERMARK_KEY = 'metrics.subscriptions.ledger_watermark'
+
+
+def _subscription_frame(rows) -> pd.DataFrame:
+    frame = pd.DataFrame(rows, columns=['id', 'subscription_id', 'created_at', 'status', 'amount', 'billing_interval'])
+    if frame.empty:
+        frame['mrr'] = pd.Series(dtype=float)
+        return frame
+    frame['created_at'] = pd.to_datetime(frame['created_at'])
+    factor = frame['billing_interval'].map(MONTHLY_FACTORS).fillna(1.0)
+    active = frame['status'].isin(ACTIVE_STATUSES)
+    frame['mrr'] = np.where(active, frame['amount'].astype(float) * factor / 100.0, 0.0)
+    return frame
+
+
+def daily_movements(events: pd.DataFrame, prior_mrr: pd.Series, start: date, end: date,
+                    opening_mrr: float = 0.0, opening_active: int = 0) -> pd.DataFrame:
+    """Compute daily MRR movements for ``start``..``end`` (inclusive).
+
+    Args:
+        events: Subscription ledger rows in the window (see ``_subscription_frame``)
+        prior_mrr: MRR of each subscription just before ``start``, by subscription id
+        start: First day
+        end: Last day
+        opening_mrr: Total MRR at the start of ``start``
+        opening_active: Active subscriptions at the start of ``start``
+
+    Returns:
+        DataFrame indexed by day with flow columns, ``net_new_mrr``, ``mrr``,
+        ``arr`` and ``active_subscriptions``
+    """
+    days = pd.date_range(start, end, freq='D')
+    if events.empty:
+        daily = pd.DataFrame(0.0, index=days, columns=FLOW_COLUMNS + ['net_new_mrr'])
+        daily['mrr'] = opening_mrr
+        daily['arr'] = opening_mrr * 12
+        daily['active_subscriptions'] = opening_active
+        return daily
+
+    events = events.assign(day=events['created_at'].dt.floor('D'))
+    # Last state of each subscription on each day it changed
+    state = (events.sort_values(['subscription_id', 'created_at', 'id'])
+             .groupby(['subscription_id', 'day'], as_index=False).last())
+    previous = state.groupby('subscription_id')['mrr'].shift(1)
+    previous = previous.fillna(state['subscription_id'].map(prior_mrr)).fillna(0.0)
+    mrr = state['mrr']
+    delta = mrr - previous
+
+    was_active = previous > 0
+    is_active = mrr > 0
+    state['new_mrr'] = np.where(~was_active & is_active, mrr, 0.0)
+    state['expansion_mrr'] = np.where(was_active & is_active & (delta > 0), delta, 0.0)
+    state['contraction_mrr'] = np.where(was_active & is_active & (delta < 0), -delta, 0.0)
+    state['churned_mrr'] = np.where(was_active & ~is_active, previous, 0.0)
+    state['active_change'] = (~was_active & is_active).astype(int) - (was_active & ~is_active).astype(int)
+
+    daily = state.groupby('day')[FLOW_COLUMNS + ['active_change']].sum().reindex(days, fill_value=0)
+    daily['net_new_mrr'] = (daily['new_mrr'] + daily['expansion_mrr']
+                            - daily['contraction_mrr'] - daily['churned_mrr'])
+    daily['mrr'] = opening_mrr + daily['net_new_mrr'].cumsum()
+    daily['arr'] = daily['mrr'] * 12
+    daily['active_subscriptions'] = opening_active + daily.pop('active_change').cumsum()
+    return daily
+
+
+class SubscriptionMetricsEngine:
+    """Builds and caches daily MRR/ARR snapshots."""
+
+    def __init__(self):
+        """Initialize the engine."""
+        self.logger = logging.getLogger(__name__)
+
+    # Loading ------------------------------------------------------------------
+
+    def _load_window(self, start: Optional[date], end: date):
+        """Subscription rows in [start, end] and each touched subscription's prior MRR."""
+        t = PaymentTransaction
+        upper = datetime.combine(end + timedelta(days=1), datetime.min.time())
+        columns = [t.id, t.subscription_id, t.created_at, t.status, t.amount, t.billing_interval]
+        query = select(*columns).where(t.kind == 'subscription', t.created_at < upper)
+        if start is not None:
+            lower = datetime.combine(start, datetime.min.time())
+            query = query.where(t.created_at >= lower)
+        events = _subscription_frame(db.session.execute(query).all())
+
+        prior = pd.Series(dtype=float)
+        if start is not None and not events.empty:
+            touched = events['subscription_id'].unique().tolist()
+            frames = []
+            for offset in range(0, len(touched), 500):
+                chunk = touched[offset:offset + 500]
+                latest = (select(t.subscription_id, func.max(t.created_at).label('created_at'))
+                          .where(t.kind == 'subscription', t.subscription_id.in_(chunk), t.created_at < lower)
+                          .group_by(t.subscription_id).subquery())
+                rows = db.session.execute(select(*columns).join(latest, and_(
+                    t.subscription_id == latest.c.subscription_id, t.created_at == latest.c.created_at))).all()
+                frames.append(_subscription_frame(rows))
+            before = pd.concat(frames) if frames else _subscription_frame([])
+            if not before.empty:
+                prior = before.sort_values(['subscription_id', 'id']).groupby('subscription_id')['mrr'].last()
+        return events, prior
+
+    def _load_refunds(self, start: Optional[date], end: date) -> pd.Series:
+        t = PaymentTransaction
+        upper = datetime.combine(end + timedelta(days=1), datetime.min.time())
+        query = select(t.created_at, t.amount).where(t.kind == 'refund', t.status != 'failed', t.created_at < upper)
+        if start is not None:
+            query = query.where(t.created_at >= datetime.combine(start, datetime.min.time()))
+        refunds = pd.DataFrame(db.session.execute(query).all(), columns=['created_at', 'amount'])
+        if refunds.empty:
+            return pd.Series(dtype=float)
+        refunds['day'] = pd.to_datetime(refunds['created_at']).dt.floor('D')
+        return refunds.groupby('day')['amount'].sum() / 100.0
+
+    # Snapshots ----------------------------------------------------------------
+
+    def _invalidate_late_rows(self):
+        """Drop snapshots from the earliest day that received ledger rows since the last refresh."""
+        t = PaymentTransaction
+        watermark = int(Setting.get_value(WATERMARK_KEY) or 0)
+        newest_id, earliest = db.session.query(func.max(t.id), func.min(t.created_at)).filter(
+            t.id > watermark, t.kind.in_(['subscription', 'refund'])).one()
+        if newest_id is None:
+            return
+        if earliest is not None:
+            deleted = SubscriptionMetricSnapshot.query.filter(
+                SubscriptionMetricSnapshot.day >= earliest.date()).delete(synchronize_session=False)
+            if deleted:
+                self.logger.info(f"Recomputing {deleted} subscription snapshots after late ledger rows")
+        Setting.set_value(WATERMARK_KEY, str(newest_id))
+
+    def refresh(self, through: Optional[date] = None) -> int:
+        """Snapshot every closed day up to ``through`` (default: yesterday).
+
+        Returns:
+            int: Number of days snapshotted
+        """
+        through = through or (datetime.utcnow().date() - timedelta(days=1))
+        self._invalidate_late_rows()
+
+        last = SubscriptionMetricSnapshot.query.order_by(SubscriptionMetricSnapshot.day.desc()).first()
+        if last is not None:
+            start, opening_mrr, opening_active = last.day + timedelta(days=1), last.mrr, last.active_subscriptions
+        else:
+            first_event = db.session.query(func.min(PaymentTransaction.created_at)).filter(
+                PaymentTransaction.kind.in_(['subscription', 'refund'])).scalar()
+            if first_event is None:
+                return 0
+            start, opening_mrr, opening_active = first_event.date(), 0.0, 0
+        if start > through:
+            return 0
+
+        daily = self._daily(start, through, opening_mrr, opening_active)
+        now = datetime.utcnow()
+        try:
+            db.session.execute(SubscriptionMetricSnapshot.__table__.insert(), [
+                dict(day=day.date(), computed_at=now, **{key: (int(value) if key == 'active_subscriptions'
+                                                               else float(value)) for key, value in row.items()})
+                for day, row in daily.iterrows()
+            ])
+            db.session.commit()
+        except IntegrityError:
+            # Another worker snapshotted the same days first
+            db.session.rollback()
+            return 0
+        return len(daily)
+
+    def _daily(self, start: date, end: date, opening_mrr: float, opening_active: int) -> pd.DataFrame:
+        events, prior = self._load_window(start, end)
+        daily = daily_movements(events, prior, start, end, opening_mrr, opening_active)
+        daily['refunded'] = self._load_refunds(start, end).reindex(daily.index, fill_value=0.0)
+        return daily
+
+    # Queries ------------------------------------------------------------------
+
+    def daily(self, start_date: date, end_date: date) -> pd.DataFrame:
+        """Daily metrics for an inclusive range; closed days come from snapshots.
+
+        Today, if requested, is computed live on top of yesterday's snapshot
+        and not cached.
+        """
+        if isinstance(start_date, datetime):
+            start_date = start_date.date()
+        if isinstance(end_date, datetime):
+            end_date = end_date.date()
+        today = datetime.utcnow().date()
+        self.refresh(through=min(end_date, today - timedelta(days=1)))
+
+        rows = (SubscriptionMetricSnapshot.query
+                .filter(SubscriptionMetricSnapshot.day >= start_date, SubscriptionMetricSnapshot.day <= end_date)
+                .order_by(SubscriptionMetricSnapshot.day).all())
+        columns = ['mrr', 'arr'] + FLOW_COLUMNS + ['net_new_mrr', 'active_subscriptions', 'refunded']
+        frame = pd.DataFrame([{column: getattr(row, column) for column in columns} for row in rows],
+                             index=pd.DatetimeIndex([row.day for row in rows]), columns=columns)
+
+        if end_date >= today >= start_date:
+            yesterday = SubscriptionMetricSnapshot.query.filter(
+                SubscriptionMetricSnapshot.day == today - timedelta(days=1)).first()
+            live = self._daily(today, today, yesterday.mrr if yesterday else 0.0,
+                               yesterday.active_subscriptions if yesterday else 0)
+            frame = pd.concat([frame, live[columns]]) if not frame.empty else live[columns]
+        return frame
+
+    def summary(self, start_date: date, end_date: date) -> Dict[str, Any]:
+        """MRR/ARR at the end of the range and MRR movements summed over it."""
+        frame = self.daily(start_date, end_date)
+        if frame.empty:
+            return {'mrr': 0.0, 'arr': 0.0, 'active_subscriptions': 0, 'new_mrr': 0.0,
+                    'expansion_mrr': 0.0, 'contraction_mrr': 0.0, 'churned_mrr': 0.0,
+                    'net_new_mrr': 0.0, 'refunded': 0.0, 'mrr_churn_rate': 0.0}
+        flows = frame[FLOW_COLUMNS + ['net_new_mrr', 'refunded']].sum()
+        opening_mrr = float(frame['mrr'].iloc[0] - frame['net_new_mrr'].iloc[0])
+        result = {key: round(float(value), 2) for key, value in flows.items()}
+        result.update({
+            'mrr': round(float(frame['mrr'].iloc[-1]), 2),
+            'arr': round(float(frame['arr'].iloc[-1]), 2),
+            'active_subscriptions': int(frame['active_subscriptions'].iloc[-1]),
+            'mrr_churn_rate': float(flows['churned_mrr'] / opening_mrr) if opening_mrr else 0.0,
+        })
+        return result
+
+
+# Shared instance
+subscription_metrics = SubscriptionMetricsEngine()
@@ -0,0 +1,311 @@
+"""Webhook verification and inbox processing for payment providers.
+
+The request path only verifies the signature and inserts the raw event into
+the ``webhook_events`` inbox, keyed by provider event id so redeliveries are
+dropped. A background worker claims pending events in batches and applies
+them (e.g. updating ``Order.payment_status``) with set-based UPDATEs.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import and_, bindparam, case, or_
+
+from app import db
+from app.models.webhook_event import WebhookEvent
+from app.utils.background import PeriodicWorker
+from app.utils.sql import claim_batch, insert_ignore
+
+
+class WebhookValidationError(Exception):
+    """Raised when a webhook signature or payload fails validation."""
+
+
+# Order.payment_status implied by each Stripe event type
+PAYMENT_STATUS_BY_EVENT = {
+    'payment_intent.succeeded': 'paid',
+    'payment_intent.payment_failed': 'failed',
+    'payment_intent.canceled': 'cancelled',
+    'charge.refunded': 'refunded',
+}
+
+
+def sign_stripe_payload(payload: Union[str, bytes], secret: str, timestamp: Optional[int] = None) -> str:
+    """Build a Stripe-Signature header value for a payload.
+
+    Args:
+        payload: Raw request body
+        secret: Webhook signing secret
+        timestamp: Unix timestamp to sign (defaults to now)
+
+    Returns:
+        str: Header value in Stripe's ``t=...,v1=...`` format
+    """
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    timestamp = int(timestamp if timestamp is not None else time.time())
+    signed = str(timestamp).encode('ascii') + b'.' + payload
+    digest = hmac.new(secret.encode('utf-8'), signed, hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={digest}'
+
+
+def verify_stripe_signature(payload: Union[str, bytes], header: str, secret: str,
+                            tolerance: int = 300, now: Optional[float] = None) -> bool:
+    """Verify a Stripe-Signature header in constant time.
+
+    Args:
+        payload: Raw request body exactly as received
+        header: Stripe-Signature header value
+        secret: Webhook signing secret
+        tolerance: Maximum age of the signed timestamp in seconds (0 disables)
+        now: Current unix time, for testing
+
+    Returns:
+        bool: True if any v1 signature matches and the timestamp is fresh
+    """
+    if not secret or not header:
+        return False
+
+    timestamp = None
+    signatures = []
+    for item in header.split(','):
+        key, _, value = item.strip().partition('=')
+        if key == 't':
+            timestamp = value
+        elif key == 'v1':
+            signatures.append(value)
+    if timestamp is None or not signatures:
+        return False
+    try:
+        signed_at = int(timestamp)
+    except ValueError:
+        return False
+    if tolerance and abs((now if now is not None else time.time()) - signed_at) > tolerance:
+        return False
+
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    expected = hmac.new(secret.encode('utf-8'), timestamp.encode('ascii') + b'.' + payload,
+                        hashlib.sha256).hexdigest()
+    # Compare against every candidate so timing does not reveal which one matched
+    valid = False
+    for signature in signatures:
+        valid |= hmac.compare_digest(expected, signature)
+    return valid
+
+
+def parse_event(payload: Union[str, bytes]) -> Dict[str, Any]:
+    """Parse a webhook body and check it carries an id and type.
+
+    Raises:
+        WebhookValidationError: If the payload is not a valid event
+    """
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        raise WebhookValidationError('Malformed JSON payload')
+    if not isinstance(event, dict) or not event.get('id') or not event.get('type'):
+        raise WebhookValidationError('Event is missing id or type')
+    return event
+
+
+def apply_order_payment_status(events: List[Tuple[WebhookEvent, Dict[str, Any]]]):
+    """Batch handler mapping payment intent events onto Order.payment_status.
+
+    Events are reduced to the final status per payment intent and written
+    with one UPDATE per status. A refunded order is never moved back to
+    paid or failed by a late, out-of-order event. A ``content_id`` in the
+    payment metadata (set at checkout, see
+    ``PaymentService.create_payment_intent``) is copied onto orders that
+    have none, which is what entitles the buyer to download it.
+    """
+    from app.models.order import Order
+
+    final_status = {}
+    content_ids = {}
+    for _, event in sorted(events, key=lambda item: item[1].get('created') or 0):
+        status = PAYMENT_STATUS_BY_EVENT.get(event['type'])
+        if status is None:
+            continue
+        obj = (event.get('data') or {}).get('object') or {}
+        intent_id = obj.get('id') if obj.get('object') == 'payment_intent' else obj.get('payment_intent')
+        if intent_id:
+            final_status[intent_id] = status
+            content_id = str((obj.get('metadata') or {}).get('content_id') or '')
+            if content_id.isdigit():
+                content_ids[intent_id] = int(content_id)
+
+    intents_by_status = defaultdict(list)
+    for intent_id, status in final_status.items():
+        intents_by_status[status].append(intent_id)
+
+    table = Order.__table__
+    now = datetime.utcnow()
+    for status, intent_ids in intents_by_status.items():
+        stmt = table.update().where(table.c.stripe_payment_intent_id.in_(intent_ids))
+        if status != 'refunded':
+            stmt = stmt.where(or_(table.c.payment_status.is_(None), table.c.payment_status != 'refunded'))
+        db.session.execute(stmt.values(payment_status=status, updated_at=now))
+    if content_ids:
+        db.session.execute(
+            table.update().where(table.c.stripe_payment_intent_id == bindparam('b_intent'),
+                                 table.c.content_id.is_(None))
+            .values(content_id=bindparam('b_content'), updated_at=now),
+            [{'b_intent': intent_id, 'b_content': content_id} for intent_id, content_id in content_ids.items()]
+        )
+
+
+class WebhookInbox:
+    """Durable inbox of webhook events with a batch-processing worker.
+
+    Batch handlers receive a list of ``(WebhookEvent, parsed_event)`` pairs
+    and run in the same transaction that marks the events processed.
+    """
+
+    def __init__(self):
+        """Initialize the inbox with default settings and handlers."""
+        self.batch_size = 100
+        self.max_attempts = 5
+        self.claim_timeout = 300
+        self.batch_handlers: List[Callable] = [apply_order_payment_status]
+        self.logger = logging.getLogger(__name__)
+        self.worker = PeriodicWorker('webhook-inbox', self.process_pending, interval=5)
+
+    def init_app(self, app):
+        """Configure batch size, retries and polling from app config.
+
+        Args:
+            app: Flask application instance
+        """
+        self.batch_size = app.config.get('WEBHOOK_BATCH_SIZE', self.batch_size)
+        self.max_attempts = app.config.get('WEBHOOK_MAX_ATTEMPTS', self.max_attempts)
+        self.worker.init_app(app, interval=app.config.get('WEBHOOK_POLL_INTERVAL', 5), autostart=True)
+
+    def register_batch_handler(self, handler: Callable):
+        """Add a handler called with every processed batch."""
+        self.batch_handlers.append(handler)
+
+    def enqueue_many(self, provider: str, events: List[Dict[str, Any]]) -> int:
+        """Persist already-trusted events (e.g. fetched from the provider API).
+
+        Args:
+            provider: Payment provider name
+            events: Parsed events; each is stored re-serialized as its payload
+
+        Returns:
+            int: Number of events that were new
+        """
+        if not events:
+            return 0
+        now = datetime.utcnow()
+        inserted = insert_ignore(WebhookEvent, [{
+            'provider': provider,
+            'event_id': event['id'],
+            'event_type': event['type'],
+            'payload': json.dumps(event),
+            'status': 'pending',
+            'attempts': 0,
+            'received_at': now,
+        } for event in events], conflict_columns=['provider', 'event_id'])
+        db.session.commit()
+        if inserted:
+            self.worker.ensure_started()
+            self.worker.wake()
+        return inserted
+
+    def enqueue(self, provider: str, event: Dict[str, Any], payload: Union[str, bytes]) -> bool:
+        """Persist a verified event; duplicates are ignored.
+
+        Args:
+            provider: Payment provider name
+            event: Parsed event (must contain id and type)
+            payload: Raw body to store
+
+        Returns:
+            bool: True if the event was new, False if it was a duplicate
+        """
+        if isinstance(payload, bytes):
+            payload = payload.decode('utf-8')
+        inserted = insert_ignore(WebhookEvent, [{
+            'provider': provider,
+            'event_id': event['id'],
+            'event_type': event['type'],
+            'payload': payload,
+            'status': 'pending',
+            'attempts': 0,
+            'received_at': datetime.utcnow(),
+        }], conflict_columns=['provider', 'event_id'])
+        db.session.commit()
+        if inserted:
+            self.worker.ensure_started()
+            self.worker.wake()
+        return bool(inserted)
+
+    def process_pending(self) -> int:
+        """Claim and process pending events until the inbox is drained.
+
+        Returns:
+            int: Number of events processed successfully
+        """
+        processed = 0
+        while True:
+            events = self._claim()
+            if not events:
+                break
+            processed += self._process_batch(events)
+            if len(events) < self.batch_size:
+                break
+        return processed
+
+    def _claim(self) -> List[WebhookEvent]:
+        stale_before = datetime.utcnow() - timedelta(seconds=self.claim_timeout)
+        claimable = or_(
+            WebhookEvent.status == 'pending',
+            and_(WebhookEvent.status == 'processing', WebhookEvent.claimed_at < stale_before)
+        )
+        return claim_batch(WebhookEvent, claimable, WebhookEvent.id, self.batch_size,
+                           {'status': 'processing'})
+
+    def _process_batch(self, events: List[WebhookEvent]) -> int:
+        ids = [event.id for event in events]
+        table = WebhookEvent.__table__
+        try:
+            parsed = [(event, json.loads(event.payload)) for event in events]
+            for handler in self.batch_handlers:
+                handler(parsed)
+            db.session.execute(
+                table.update().where(table.c.id.in_(ids)).values(
+                    status='processed',
+                    attempts=table.c.attempts + 1,
+                    processed_at=datetime.utcnow(),
+                    last_error=None
+                )
+            )
+            db.session.commit()
+            return len(ids)
+        except Exception as e:
+            db.session.rollback()
+            if len(events) > 1:
+                # Isolate the poison event instead of failing the whole batch
+                self.logger.warning(f"Webhook batch of {len(ids)} events failed, retrying one by one: {str(e)}")
+                return sum(self._process_batch([event]) for event in events)
+            self.logger.error(f"Webhook event {events[0].event_id} failed: {str(e)}")
+            db.session.execute(
+                table.update().where(table.c.id.in_(ids)).values(
+                    status=case((table.c.attempts + 1 >= self.max_attempts, 'failed'), else_='pending'),
+                    attempts=table.c.attempts + 1,
+                    last_error=str(e)[:1000]
+                )
+            )
+            db.session.commit()
+            return 0
+
+
+# Shared instance, configured in create_app()
+webhook_inbox = WebhookInbox()
@@ -0,0 +1,145 @@
+"""Background worker helpers.
+
+Provides a small thread-based periodic worker used by services that need to
+run housekeeping jobs (counter flushes, queue draining, expiry sweeps) off the
+request path. Threads are started lazily in the process that first needs them
+so gunicorn workers never inherit a dead thread from the pre-fork master.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from typing import Any, Callable, Optional
+
+
+class PeriodicWorker:
+    """Run a callable on a fixed interval inside a Flask application context.
+
+    Attributes:
+        name (str): Thread name, also used in log messages
+        target (Callable): Zero-argument callable executed on every tick
+        interval (float): Seconds to wait between runs
+    """
+
+    def __init__(self, name: str, target: Callable[[], Any], interval: float = 10.0):
+        """Initialize the worker.
+
+        Args:
+            name: Thread name used for logging
+            target: Callable executed on every tick
+            interval: Seconds between runs
+        """
+        self.name = name
+        self.target = target
+        self.interval = interval
+        self.logger = logging.getLogger(__name__)
+        self._app = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._exit_hook_registered = False
+
+    def init_app(self, app, interval: Optional[float] = None, autostart: bool = False):
+        """Bind the worker to an application.
+
+        Args:
+            app: Flask application whose context the target runs in
+            interval: Optional override for the tick interval
+            autostart: Start the thread on the first request served by each
+                process, for workers that must drain work left over from a
+                previous run rather than only react to new work
+        """
+        self._app = app
+        if interval is not None:
+            self.interval = interval
+        if autostart:
+            app.before_request(self._autostart)
+        if not self._exit_hook_registered:
+            atexit.register(self._on_exit)
+            self._exit_hook_registered = True
+
+    @property
+    def enabled(self) -> bool:
+        """Whether background threads may be started for the bound app."""
+        return self._app is not None and self._app.config.get('BACKGROUND_WORKERS_ENABLED', True)
+
+    def is_running(self) -> bool:
+        """Check if the worker thread is alive in the current process."""
+        return (self._thread is not None and self._thread.is_alive()
+                and self._pid == os.getpid())
+
+    def ensure_started(self) -> bool:
+        """Start the worker thread for this process if it is not running.
+
+        Returns:
+            bool: True if a worker thread is running after the call
+        """
+        if not self.enabled:
+            return False
+        if self.is_running():
+            return True
+        with self._lock:
+            if self.is_running():
+                return True
+            self._stop_event.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            self.logger.info(f"Started background worker {self.name} (pid {self._pid})")
+        return True
+
+    def _autostart(self):
+        """before_request hook; must return None so the request proceeds."""
+        self.ensure_started()
+
+    def wake(self):
+        """Ask the worker to run its next tick immediately."""
+        self._wake_event.set()
+
+    def stop(self, run_final: bool = True, timeout: float = 5.0):
+        """Stop the worker thread.
+
+        Args:
+            run_final: Run the target one last time after the thread exits
+            timeout: Seconds to wait for the thread to finish
+        """
+        self._stop_event.set()
+        self._wake_event.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._thread = None
+        if run_final:
+            self.run_once()
+
+    def run_once(self) -> Any:
+        """Execute the target once inside an application context.
+
+        Returns:
+            The target's return value, or None if it raised
+        """
+        if self._app is None:
+            return None
+        with self._app.app_context():
+            try:
+                return self.target()
+            except Exception as e:
+                self.logger.error(f"Background worker {self.name} failed: {str(e)}")
+                return None
+
+    def _run(self):
+        """Thread main loop."""
+        while not self._stop_event.is_set():
+            self._wake_event.wait(self.interval)
+            self._wake_event.clear()
+            if self._stop_event.is_set():
+                break
+            self.run_once()
+
+    def _on_exit(self):
+        """Flush outstanding work when the interpreter shuts down."""
+        if self.is_running():
+            self.stop(run_final=True)
@@ -0,0 +1,79 @@
+"""HyperLogLog distinct-count sketch.
+
+A fixed-size, mergeable estimate of how many distinct values were added:
+with the default precision (2**12 one-byte registers, 4 KB) the standard
+error is about 1.6%, whether a thousand or a hundred million values went
+in. Sketches serialize to bytes so they can be stored next to plain
+counters and merged (register-wise max) when rolling several up.
+"""
+
+import hashlib
+from typing import Iterable, Optional
+
+import numpy as np
+
+
+class HyperLogLog:
+    """Approximate distinct counter.
+
+    Args:
+        precision: Number of index bits; uses ``2 ** precision`` registers
+        registers: Serialized registers to start from (see ``to_bytes``)
+    """
+
+    def __init__(self, precision: int = 12, registers: Optional[bytes] = None):
+        if not 4 <= precision <= 16:
+            raise ValueError('precision must be between 4 and 16')
+        self.precision = precision
+        self.size = 1 << precision
+        if registers:
+            if len(registers) != self.size:
+                raise ValueError(f'Expected {self.size} registers, got {len(registers)}')
+            self.registers = bytearray(registers)
+        else:
+            self.registers = bytearray(self.size)
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> 'HyperLogLog':
+        """Rebuild a sketch from ``to_bytes`` output (empty sketch for None)."""
+        if not data:
+            return cls()
+        return cls(precision=(len(data) - 1).bit_length(), registers=data)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+    def add(self, value: str):
+        """Add one value (hashed as UTF-8)."""
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'big')
+        index = hashed >> (64 - self.precision)
+        rest_bits = 64 - self.precision
+        rest = hashed & ((1 << rest_bits) - 1)
+        rank = rest_bits - rest.bit_length() + 1  # Position of the leftmost 1-bit
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable[str]):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: 'HyperLogLog'):
+        """Fold another sketch of the same precision into this one."""
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge sketches of different precision')
+        merged = np.maximum(np.frombuffer(self.registers, dtype=np.uint8),
+                            np.frombuffer(other.registers, dtype=np.uint8))
+        self.registers = bytearray(merged.tobytes())
+
+    def count(self) -> int:
+        """Estimated number of distinct values added."""
+        registers = np.frombuffer(self.registers, dtype=np.uint8)
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction: linear counting is more accurate here
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
@@ -0,0 +1,95 @@
+"""Database-backed leader election.
+
+A lease is one row in ``worker_leases``. Acquiring or renewing it is a
+single conditional UPDATE that succeeds only for the current holder or
+once the lease has expired, so exactly one process holds it at a time
+across gunicorn workers and hosts. A process that dies simply stops
+renewing and another takes over after ``ttl`` seconds.
+"""
+
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from app import db
+from app.models.worker_lease import WorkerLease
+from app.utils.sql import insert_ignore
+
+
+class LeaderLease:
+    """Named lease for electing a single leader among processes.
+
+    Attributes:
+        name (str): Lease name, one per elected job
+        ttl (float): Seconds a lease stays valid without renewal
+    """
+
+    def __init__(self, name: str, ttl: float = 30.0):
+        self.name = name
+        self.ttl = ttl
+        self._holder = None
+        self._pid = None
+        self._valid_until = None
+        self._renewed_at = None
+
+    @property
+    def holder(self) -> str:
+        """Identity of this process; regenerated after a fork."""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._holder = f'{socket.gethostname()[:60]}:{self._pid}:{uuid.uuid4().hex[:8]}'
+            self._valid_until = None
+        return self._holder
+
+    def is_held(self) -> bool:
+        """Whether this process held the lease at its last renewal and it has not lapsed."""
+        return self._valid_until is not None and self._pid == os.getpid() and datetime.utcnow() < self._valid_until
+
+    def try_acquire(self) -> bool:
+        """Acquire or renew the lease (commits).
+
+        Returns:
+            bool: True if this process holds the lease for the next ``ttl`` seconds
+        """
+        holder = self.holder
+        now = datetime.utcnow()
+        expires = now + timedelta(seconds=self.ttl)
+        table = WorkerLease.__table__
+        renewed = db.session.execute(
+            table.update()
+            .where(table.c.name == self.name,
+                   (table.c.holder == holder) | (table.c.expires_at < now))
+            .values(holder=holder, expires_at=expires,
+                    acquired_at=db.case((table.c.holder == holder, table.c.acquired_at), else_=now))
+        ).rowcount
+        if not renewed:
+            renewed = insert_ignore(WorkerLease, [{
+                'name': self.name, 'holder': holder, 'acquired_at': now, 'expires_at': expires,
+            }], ['name'])
+        db.session.commit()
+        # Leave a margin so a stalled renewal never overlaps a new leader
+        self._valid_until = now + timedelta(seconds=self.ttl * 0.8) if renewed else None
+        self._renewed_at = now
+        return bool(renewed)
+
+    def hold(self) -> bool:
+        """Cheap per-tick check: renews (or retries) at most every third of ``ttl``.
+
+        Returns:
+            bool: True if this process is the leader
+        """
+        if (self._renewed_at is not None and self._pid == os.getpid()
+                and datetime.utcnow() - self._renewed_at < timedelta(seconds=self.ttl / 3)):
+            return self.is_held()
+        return self.try_acquire()
+
+    def release(self):
+        """Give the lease up so another process can take over immediately (commits)."""
+        table = WorkerLease.__table__
+        db.session.execute(
+            table.update().where(table.c.name == self.name, table.c.holder == self.holder)
+            .values(expires_at=datetime.utcnow())
+        )
+        db.session.commit()
+        self._valid_until = None
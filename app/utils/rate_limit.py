@@ -0,0 +1,87 @@
+"""Client-side rate limiting for calls to external APIs.
+
+Flask-Limiter protects our own endpoints; these helpers keep outbound
+traffic (payment provider, SMTP, social platforms) under the limits the
+other side enforces, so workers slow down instead of collecting 429s.
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+
+def parse_rates(value: Optional[str]) -> Dict[str, float]:
+    """Parse ``"gmail.com=50,yahoo.com=20"`` style overrides into a key -> rate map."""
+    rates = {}
+    for item in (value or '').split(','):
+        key, _, rate = item.strip().partition('=')
+        if key and rate:
+            rates[key.strip().lower()] = float(rate)
+    return rates
+
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    Tokens refill continuously at ``rate`` per second up to ``capacity``;
+    each call consumes tokens or waits until enough have accumulated.
+
+    Attributes:
+        rate (float): Tokens added per second
+        capacity (float): Maximum burst size
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """Initialize a full bucket.
+
+        Args:
+            rate: Sustained operations per second
+            capacity: Burst size (defaults to one second's worth of tokens)
+        """
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1.0))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens if available without blocking.
+
+        Returns:
+            float: 0.0 if the tokens were taken, otherwise seconds until
+            enough tokens will be available
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """Block until tokens are available.
+
+        Args:
+            tokens: Number of tokens to take
+            timeout: Maximum seconds to wait (None waits indefinitely)
+
+        Returns:
+            bool: True if the tokens were taken, False on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
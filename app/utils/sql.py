@@ -0,0 +1,161 @@
+"""SQL helpers shared by models and services.
+
+Dialect-aware statements that plain SQLAlchemy Core does not express
+portably, such as INSERT ... ON CONFLICT DO NOTHING and batch claiming of
+queue rows.
+"""
+
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import func, literal, select
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+
+
+def dialect_name() -> str:
+    """Name of the SQL dialect bound to the session (e.g. 'sqlite', 'postgresql')."""
+    return db.session.get_bind().dialect.name
+
+
+def insert_ignore(model, rows: Sequence[Dict[str, Any]], conflict_columns: Sequence[str]) -> int:
+    """Insert rows, silently skipping ones that violate a unique constraint.
+
+    Uses ON CONFLICT DO NOTHING on PostgreSQL and SQLite. Other dialects fall
+    back to row-by-row inserts inside savepoints.
+
+    Args:
+        model: Model class or Table to insert into
+        rows: Column-value dictionaries
+        conflict_columns: Columns of the unique constraint to ignore
+
+    Returns:
+        int: Number of rows actually inserted
+    """
+    if not rows:
+        return 0
+    table = getattr(model, '__table__', model)
+    name = dialect_name()
+
+    if name in ('postgresql', 'sqlite'):
+        if name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).on_conflict_do_nothing(index_elements=list(conflict_columns))
+        if len(rows) == 1:
+            return db.session.execute(stmt.values(**rows[0])).rowcount
+        result = db.session.execute(stmt, list(rows))
+        return result.rowcount if result.rowcount >= 0 else len(rows)
+
+    inserted = 0
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert().values(**row))
+            inserted += 1
+        except IntegrityError:
+            continue
+    return inserted
+
+
+def upsert(model, rows: Sequence[Dict[str, Any]], conflict_columns: Sequence[str],
+           update_columns: Sequence[str], keep_existing: Sequence[str] = (),
+           only_if: Optional[Callable[[Any, Any], Any]] = None) -> int:
+    """Insert rows or update ``update_columns`` where the unique key exists.
+
+    Uses ON CONFLICT DO UPDATE on PostgreSQL and SQLite, and a select-then-
+    write fallback elsewhere.
+
+    Args:
+        model: Model class or Table to write to
+        rows: Column-value dictionaries, all with the same keys
+        conflict_columns: Columns of the unique constraint
+        update_columns: Columns overwritten on conflict
+        keep_existing: Columns among ``update_columns`` that a NULL in the
+            incoming row does not overwrite (``COALESCE(excluded, current)``)
+        only_if: ``only_if(incoming, current)`` builds the condition an
+            existing row must meet to be updated; both arguments index
+            columns by name (the incoming row's values, the stored columns)
+
+    Returns:
+        int: Number of rows written
+    """
+    if not rows:
+        return 0
+    table = getattr(model, '__table__', model)
+    name = dialect_name()
+
+    if name in ('postgresql', 'sqlite'):
+        if name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(conflict_columns),
+            set_={column: func.coalesce(stmt.excluded[column], table.c[column]) if column in keep_existing
+                  else stmt.excluded[column] for column in update_columns},
+            where=only_if(stmt.excluded, table.c) if only_if is not None else None
+        )
+        db.session.execute(stmt, list(rows))
+        return len(rows)
+
+    for row in rows:
+        key = [table.c[column] == row[column] for column in conflict_columns]
+        exists = db.session.execute(select(table.c[conflict_columns[0]]).where(*key)).first()
+        if exists:
+            if only_if is not None:
+                key.append(only_if({column: literal(value) for column, value in row.items()}, table.c))
+            db.session.execute(table.update().where(*key).values(
+                **{column: row[column] for column in update_columns
+                   if column not in keep_existing or row[column] is not None}))
+        else:
+            db.session.execute(table.insert().values(**row))
+    return len(rows)
+
+
+def claim_batch(model, pending_filter, order_by, limit: int, values: Dict[str, Any]) -> List[Any]:
+    """Atomically claim up to ``limit`` rows of a queue table.
+
+    PostgreSQL and MySQL use SELECT ... FOR UPDATE SKIP LOCKED so concurrent
+    workers never wait on each other. SQLite has no row locks; there the
+    claim is a single UPDATE whose WHERE clause re-checks ``pending_filter``,
+    and SQLite's database-level write lock makes it atomic.
+
+    Args:
+        model: Mapped model class with a ``claim_token`` column
+        pending_filter: SQL expression selecting claimable rows
+        order_by: Ordering for which rows to claim first
+        limit: Maximum number of rows to claim
+        values: Extra column values to set on claimed rows (e.g. status)
+
+    Returns:
+        list: Claimed model instances
+    """
+    token = uuid.uuid4().hex
+    values = dict(values, claim_token=token, claimed_at=datetime.utcnow())
+
+    if dialect_name() in ('postgresql', 'mysql'):
+        ids = db.session.execute(
+            select(model.id).where(pending_filter).order_by(order_by)
+            .limit(limit).with_for_update(skip_locked=True)
+        ).scalars().all()
+        if not ids:
+            db.session.commit()
+            return []
+        db.session.execute(
+            model.__table__.update().where(model.__table__.c.id.in_(ids)).values(**values)
+        )
+    else:
+        subquery = select(model.id).where(pending_filter).order_by(order_by).limit(limit)
+        db.session.execute(
+            model.__table__.update()
+            .where(model.__table__.c.id.in_(subquery.scalar_subquery()))
+            .where(pending_filter)
+            .values(**values)
+        )
+    db.session.commit()
+    return model.query.filter_by(claim_token=token).order_by(order_by).all()
@@ -0,0 +1,123 @@
+"""Hierarchical timer wheel.
+
+Timers are hashed into fixed-size slot rings by their due tick: the first
+ring covers the next ``slots`` ticks one slot per tick, each following ring
+covers ``slots`` times the span of the previous one. Advancing the clock
+fires the current slot of the first ring and, whenever a ring wraps, moves
+the timers of the next ring's current slot down a level. Adding,
+cancelling and firing a timer are O(1); advancing costs one step per tick
+elapsed, not per timer held.
+"""
+
+from datetime import datetime
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class TimerWheel:
+    """Hierarchical timer wheel keyed by caller ids.
+
+    Not thread-safe; callers serialize access.
+
+    Args:
+        tick: Resolution in seconds
+        slots: Slots per ring
+        levels: Number of rings; timers further out than ``slots ** levels``
+            ticks wait in an overflow set until they come into range
+        start: Current time (defaults to now, UTC)
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 64, levels: int = 3, start: Optional[datetime] = None):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self._rings: List[List[Set[Hashable]]] = [[set() for _ in range(slots)] for _ in range(levels)]
+        self._overflow: Set[Hashable] = set()
+        self._ready: Set[Hashable] = set()  # Already due when added; fire on the next advance
+        self._timers: Dict[Hashable, Tuple[int, Set[Hashable]]] = {}  # key -> (due tick, container)
+        self._current = self._to_tick(start or datetime.utcnow())
+
+    def _to_tick(self, when: datetime) -> int:
+        return int((when - EPOCH).total_seconds() // self.tick)
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._timers
+
+    def _place(self, key: Hashable, due: int):
+        delta = due - self._current
+        if delta <= 0:
+            container = self._ready
+        else:
+            container = self._overflow
+            span = 1
+            for level in range(self.levels):
+                if delta < span * self.slots:
+                    container = self._rings[level][(due // span) % self.slots]
+                    break
+                span *= self.slots
+        container.add(key)
+        self._timers[key] = (due, container)
+
+    def add(self, key: Hashable, when: datetime):
+        """Schedule (or reschedule) ``key`` to fire at ``when``."""
+        self.cancel(key)
+        self._place(key, self._to_tick(when))
+
+    def cancel(self, key: Hashable) -> bool:
+        """Remove a timer; returns False if it was not held."""
+        entry = self._timers.pop(key, None)
+        if entry is None:
+            return False
+        entry[1].discard(key)
+        return True
+
+    def clear(self):
+        for ring in self._rings:
+            for slot in ring:
+                slot.clear()
+        self._overflow.clear()
+        self._ready.clear()
+        self._timers.clear()
+
+    def _cascade(self, container: Set[Hashable]):
+        keys = list(container)
+        container.clear()
+        for key in keys:
+            self._place(key, self._timers[key][0])
+
+    def advance(self, now: Optional[datetime] = None) -> List[Hashable]:
+        """Move the clock to ``now`` and return the keys that came due, in due order."""
+        target = self._to_tick(now or datetime.utcnow())
+        if target - self._current > self.slots ** self.levels:
+            # Clock jumped further than the wheel spans: re-place everything at once
+            self._current = target
+            held = [(key, due) for key, (due, _) in self._timers.items()]
+            self.clear()
+            for key, due in held:
+                self._place(key, due)
+        fired = list(self._ready)
+        self._ready.clear()
+        while self._current < target:
+            self._current += 1
+            tick = self._current
+            span = self.slots ** self.levels
+            if tick % span == 0 and self._overflow:
+                self._cascade(self._overflow)
+            for level in range(self.levels - 1, 0, -1):
+                span = self.slots ** level
+                if tick % span == 0:
+                    self._cascade(self._rings[level][(tick // span) % self.slots])
+            slot = self._rings[0][tick % self.slots]
+            if slot:
+                fired.extend(slot)
+                slot.clear()
+            if self._ready:
+                fired.extend(self._ready)
+                self._ready.clear()
+        due = {key: self._timers.pop(key)[0] for key in fired}
+        return sorted(due, key=due.get)
@@ -20,6 +20,32 @@ class Config:
     STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
     STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+    STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE')  # e.g. local stand-in from tools/fake_payments.py
+    STRIPE_WEBHOOK_TOLERANCE = int(os.environ.get('STRIPE_WEBHOOK_TOLERANCE') or 300)  # seconds
+    
+    # Webhook Inbox Processing
+    WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE') or 100)
+    WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS') or 5)
+    WEBHOOK_POLL_INTERVAL = int(os.environ.get('WEBHOOK_POLL_INTERVAL') or 5)  # seconds
+    
+    # Transaction Ledger
+    LEDGER_RECONCILE_INTERVAL = int(os.environ.get('LEDGER_RECONCILE_INTERVAL') or 900)  # seconds
+    LEDGER_RECONCILE_LOOKBACK_DAYS = int(os.environ.get('LEDGER_RECONCILE_LOOKBACK_DAYS') or 30)  # first sync
+    
+    # Bulk Refunds
+    REFUND_BATCH_CONCURRENCY = int(os.environ.get('REFUND_BATCH_CONCURRENCY') or 8)
+    REFUND_RATE_LIMIT = float(os.environ.get('REFUND_RATE_LIMIT') or 20)  # provider calls per second
+    REFUND_BATCH_CHUNK_SIZE = int(os.environ.get('REFUND_BATCH_CHUNK_SIZE') or 200)
+    REFUND_BATCH_MAX_ITEMS = int(os.environ.get('REFUND_BATCH_MAX_ITEMS') or 10000)
+    REFUND_MAX_ATTEMPTS = int(os.environ.get('REFUND_MAX_ATTEMPTS') or 5)
+    REFUND_POLL_INTERVAL = int(os.environ.get('REFUND_POLL_INTERVAL') or 5)  # seconds
+    
+    # Order Analytics
+    ORDER_ANALYTICS_REFRESH_INTERVAL = int(os.environ.get('ORDER_ANALYTICS_REFRESH_INTERVAL') or 300)  # seconds
+    
+    # Inventory Reservations
+    INVENTORY_RESERVATION_TTL = int(os.environ.get('INVENTORY_RESERVATION_TTL') or 900)  # seconds a cart hold lasts
+    INVENTORY_SWEEP_INTERVAL = int(os.environ.get('INVENTORY_SWEEP_INTERVAL') or 30)  # seconds
     
     # Mail Configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'smtp.gmail.com'
@@ -29,12 +55,91 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or MAIL_USERNAME
+
+    # Campaign Email Delivery
+    EMAIL_SMTP_POOL_SIZE = int(os.environ.get('EMAIL_SMTP_POOL_SIZE') or 8)  # persistent SMTP connections
+    EMAIL_DOMAIN_RATE = float(os.environ.get('EMAIL_DOMAIN_RATE') or 50)  # messages per second per recipient domain
+    EMAIL_DOMAIN_RATES = os.environ.get('EMAIL_DOMAIN_RATES')  # overrides, e.g. "gmail.com=100,yahoo.com=20"
+    EMAIL_SEND_BATCH_SIZE = int(os.environ.get('EMAIL_SEND_BATCH_SIZE') or 500)
+    EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS') or 5)
+    EMAIL_RETRY_BASE_SECONDS = int(os.environ.get('EMAIL_RETRY_BASE_SECONDS') or 60)  # doubled per attempt
+    EMAIL_SENDER_POLL_INTERVAL = int(os.environ.get('EMAIL_SENDER_POLL_INTERVAL') or 2)  # seconds
+    EMAIL_WEBHOOK_PROVIDER = os.environ.get('EMAIL_WEBHOOK_PROVIDER') or 'relay'  # relay, mailgun, sendgrid, postmark, ses
+    EMAIL_WEBHOOK_SECRET = os.environ.get('EMAIL_WEBHOOK_SECRET')  # provider's key/credentials for /webhooks/email
+    EMAIL_WEBHOOK_TOLERANCE = int(os.environ.get('EMAIL_WEBHOOK_TOLERANCE') or 300)  # max signature age in seconds
+    EMAIL_DSN_MAILDIR = os.environ.get('EMAIL_DSN_MAILDIR')  # bounce mailbox to parse DSNs from
+    EMAIL_DSN_POLL_INTERVAL = int(os.environ.get('EMAIL_DSN_POLL_INTERVAL') or 60)  # seconds
+
+    # Drip Sequences
+    DRIP_BATCH_SIZE = int(os.environ.get('DRIP_BATCH_SIZE') or 1000)  # due steps processed per batch
+    DRIP_HORIZON_SECONDS = int(os.environ.get('DRIP_HORIZON_SECONDS') or 300)  # look-ahead kept in the in-memory heap
+    DRIP_MAX_LOADED = int(os.environ.get('DRIP_MAX_LOADED') or 50000)  # max steps held in memory
+    DRIP_POLL_INTERVAL = int(os.environ.get('DRIP_POLL_INTERVAL') or 5)  # seconds
+
+    # Sequence Metrics
+    SEQUENCE_METRICS_BATCH_SIZE = int(os.environ.get('SEQUENCE_METRICS_BATCH_SIZE') or 5000)  # events folded per batch
+    SEQUENCE_ATTRIBUTION_WINDOW_HOURS = int(os.environ.get('SEQUENCE_ATTRIBUTION_WINDOW_HOURS') or 168)  # last touch to order
+    SEQUENCE_METRICS_INTERVAL = int(os.environ.get('SEQUENCE_METRICS_INTERVAL') or 60)  # seconds
+    SEQUENCE_METRICS_SETTLE_SECONDS = int(os.environ.get('SEQUENCE_METRICS_SETTLE_SECONDS') or 30)  # events younger than this wait for the next refresh
+
+    # Social Post Scheduling
+    SOCIAL_SCHEDULER_HORIZON_SECONDS = int(os.environ.get('SOCIAL_SCHEDULER_HORIZON_SECONDS') or 3600)  # look-ahead kept in the timer wheel
+    SOCIAL_SCHEDULER_POLL_INTERVAL = int(os.environ.get('SOCIAL_SCHEDULER_POLL_INTERVAL') or 1)  # seconds
+    SOCIAL_LEADER_LEASE_SECONDS = int(os.environ.get('SOCIAL_LEADER_LEASE_SECONDS') or 30)  # dispatcher failover time
+    SOCIAL_PUBLISH_BATCH_SIZE = int(os.environ.get('SOCIAL_PUBLISH_BATCH_SIZE') or 100)  # due posts claimed per batch
+    SOCIAL_MIN_POST_GAP_SECONDS = int(os.environ.get('SOCIAL_MIN_POST_GAP_SECONDS') or 60)  # bulk posts closer than this on a platform conflict
+
+    # Social Publishing
+    SOCIAL_PUBLISHER_ADAPTER = os.environ.get('SOCIAL_PUBLISHER_ADAPTER') or 'http'  # http, fake
+    SOCIAL_PLATFORM_RATES = os.environ.get('SOCIAL_PLATFORM_RATES')  # e.g. "twitter=1,facebook=3" (calls/second)
+    SOCIAL_PLATFORM_POOL_SIZE = int(os.environ.get('SOCIAL_PLATFORM_POOL_SIZE') or 4)  # connections per platform
+    SOCIAL_PUBLISH_ATTEMPTS = int(os.environ.get('SOCIAL_PUBLISH_ATTEMPTS') or 3)  # per platform
+    SOCIAL_PUBLISH_TIMEOUT = int(os.environ.get('SOCIAL_PUBLISH_TIMEOUT') or 15)  # seconds per attempt
+
+    # Hashtag Index
+    SOCIAL_HASHTAG_SYNC_SECONDS = int(os.environ.get('SOCIAL_HASHTAG_SYNC_SECONDS') or 5)  # min seconds between index syncs
+    SOCIAL_TRENDING_HALF_LIFE_HOURS = int(os.environ.get('SOCIAL_TRENDING_HALF_LIFE_HOURS') or 24)  # engagement decay
+
+    # Social Engagement History
+    SOCIAL_ENGAGEMENT_RAW_DAYS = int(os.environ.get('SOCIAL_ENGAGEMENT_RAW_DAYS') or 7)  # keep every snapshot this long
+    SOCIAL_ENGAGEMENT_HOURLY_DAYS = int(os.environ.get('SOCIAL_ENGAGEMENT_HOURLY_DAYS') or 90)  # then hourly, then daily
+    SOCIAL_ENGAGEMENT_COMPACT_INTERVAL = int(os.environ.get('SOCIAL_ENGAGEMENT_COMPACT_INTERVAL') or 3600)  # seconds
+
+    # Product Distribution
+    DISTRIBUTION_WORKERS = os.environ.get('DISTRIBUTION_WORKERS')  # e.g. "email=8,webhook=32" (concurrent deliveries per process)
+    DISTRIBUTION_DEFAULT_WORKERS = int(os.environ.get('DISTRIBUTION_DEFAULT_WORKERS') or 4)  # for channels not listed above
+    DISTRIBUTION_BATCH_SIZE = int(os.environ.get('DISTRIBUTION_BATCH_SIZE') or 200)  # deliveries claimed per batch
+    DISTRIBUTION_POLL_INTERVAL = int(os.environ.get('DISTRIBUTION_POLL_INTERVAL') or 2)  # seconds
+    DISTRIBUTION_VISIBILITY_TIMEOUT = int(os.environ.get('DISTRIBUTION_VISIBILITY_TIMEOUT') or 300)  # seconds before a claim expires
+    DISTRIBUTION_RETRY_DELAY = int(os.environ.get('DISTRIBUTION_RETRY_DELAY') or 60)  # seconds, doubled per attempt (jittered)
+    DISTRIBUTION_RETRY_MAX_DELAY = int(os.environ.get('DISTRIBUTION_RETRY_MAX_DELAY') or 3600)  # backoff cap in seconds
+    DISTRIBUTION_MAX_ATTEMPTS = int(os.environ.get('DISTRIBUTION_MAX_ATTEMPTS') or 5)  # then dead-lettered
+    DISTRIBUTION_HISTORY_SIZE = int(os.environ.get('DISTRIBUTION_HISTORY_SIZE') or 1000)  # recent outcomes kept in memory
+    DISTRIBUTION_WEBHOOK_TIMEOUT = int(os.environ.get('DISTRIBUTION_WEBHOOK_TIMEOUT') or 10)  # seconds
+    DISTRIBUTION_WEBHOOK_BATCH = int(os.environ.get('DISTRIBUTION_WEBHOOK_BATCH') or 1)  # deliveries per POST to one URL; above 1 every POST is a batch envelope
+    DISTRIBUTION_EMAIL_RECIPIENTS = int(os.environ.get('DISTRIBUTION_EMAIL_RECIPIENTS') or 50)  # RCPT TOs per message
+    DISTRIBUTION_CDN_BASE_URL = os.environ.get('DISTRIBUTION_CDN_BASE_URL')  # enables signed download links
+    DISTRIBUTION_SIGNING_KEY = os.environ.get('DISTRIBUTION_SIGNING_KEY')  # defaults to SECRET_KEY
+    DISTRIBUTION_LINK_TTL = int(os.environ.get('DISTRIBUTION_LINK_TTL') or 86400)  # signed link lifetime in seconds
+
+    # Email Validation
+    EMAIL_VALIDATION_RESOLVER = os.environ.get('EMAIL_VALIDATION_RESOLVER') or 'auto'  # auto, socket, off
+    EMAIL_VALIDATION_CONCURRENCY = int(os.environ.get('EMAIL_VALIDATION_CONCURRENCY') or 32)  # parallel DNS lookups
+    EMAIL_DOMAIN_CACHE_TTL = int(os.environ.get('EMAIL_DOMAIN_CACHE_TTL') or 86400)  # seconds
+    EMAIL_DOMAIN_NEGATIVE_TTL = int(os.environ.get('EMAIL_DOMAIN_NEGATIVE_TTL') or 3600)  # seconds for domains without MX
+    EMAIL_DISPOSABLE_DOMAINS = os.environ.get('EMAIL_DISPOSABLE_DOMAINS')  # extra comma-separated domains
     
     # Application Settings
     PAGINATION_PER_PAGE = int(os.environ.get('PAGINATION_PER_PAGE') or 20)
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'uploads'
+    SOCIAL_EXPORT_FOLDER = os.environ.get('SOCIAL_EXPORT_FOLDER') or os.path.join(UPLOAD_FOLDER, 'exports')  # analytics exports
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH') or 16 * 1024 * 1024)  # 16MB
     
+    # Asset Store (content-addressed downloads)
+    ASSET_STORE_FOLDER = os.environ.get('ASSET_STORE_FOLDER') or os.path.join(UPLOAD_FOLDER, 'assets')
+    ASSET_CACHE_MAX_AGE = int(os.environ.get('ASSET_CACHE_MAX_AGE') or 86400)  # seconds
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'False').lower() in ['true', '1', 'yes']  # let the proxy serve files
+    
     # Session Configuration
     PERMANENT_SESSION_LIFETIME = timedelta(days=int(os.environ.get('SESSION_LIFETIME_DAYS') or 31))
     SESSION_COOKIE_SECURE = os.environ.get('SESSION_COOKIE_SECURE', 'False').lower() in ['true', '1', 'yes']
@@ -55,7 +160,20 @@ class Config:
     LOG_FILE = os.environ.get('LOG_FILE') or 'app.log'
     
     # Rate Limiting
-    RATELIMIT_STORAGE_URL = os.environ.get('REDIS_URL') or 'memory://'
+    REDIS_URL = os.environ.get('REDIS_URL')
+    RATELIMIT_STORAGE_URL = REDIS_URL or 'memory://'
+    
+    # Background Workers
+    BACKGROUND_WORKERS_ENABLED = os.environ.get('BACKGROUND_WORKERS_ENABLED', 'True').lower() in ['true', '1', 'yes']
+    
+    # Content Counters (views/downloads are buffered and flushed in aggregate)
+    COUNTER_BACKEND = os.environ.get('COUNTER_BACKEND') or (
+        'redis' if (REDIS_URL or '').startswith(('redis://', 'rediss://')) else 'memory')
+    COUNTER_FLUSH_INTERVAL = int(os.environ.get('COUNTER_FLUSH_INTERVAL') or 10)  # seconds
+    COUNTER_HOT_DECAY = float(os.environ.get('COUNTER_HOT_DECAY') or 0.9)  # applied per flush
+    
+    # Content Catalog
+    CATALOG_FEATURED_CACHE_TTL = int(os.environ.get('CATALOG_FEATURED_CACHE_TTL') or 300)  # seconds
     
     # Analytics and Tracking
     GOOGLE_ANALYTICS_ID = os.environ.get('GOOGLE_ANALYTICS_ID')
@@ -95,6 +213,9 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    BACKGROUND_WORKERS_ENABLED = False
+    EMAIL_VALIDATION_RESOLVER = 'off'
+    SOCIAL_PUBLISHER_ADAPTER = 'fake'
     
 # Configuration mapping
 config = {
@@ -0,0 +1 @@
+"""Developer tools: local service stand-ins, load tests and benchmarks."""
@@ -0,0 +1,127 @@
+"""Throughput benchmark for campaign email delivery.
+
+Starts the local SMTP sink, queues a campaign for ``--recipients``
+addresses spread over ``--domains`` domains, and drains the queue with
+the campaign sender. Reports enqueue and delivery rates and checks that
+every message was either sent or (for ``--reject-rate``) failed, with the
+sink's count matching the queue.
+
+Usage:
+    python -m tools.bench_email --recipients 100000 --pool-size 16 --domain-rate 2000
+    python -m tools.bench_email --recipients 20000 --tempfail-rate 0.02 --latency-ms 2
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from config import TestingConfig
+from tools.smtp_sink import serve_in_thread
+
+
+def build_app(database_url: str, port: int, args):
+    from app import create_app
+
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = database_url
+        MAIL_SERVER = '127.0.0.1'
+        MAIL_PORT = port
+        MAIL_USE_TLS = False
+        MAIL_USE_SSL = False
+        MAIL_USERNAME = None
+        MAIL_PASSWORD = None
+        MAIL_DEFAULT_SENDER = 'news@bench.example'
+        EMAIL_SMTP_POOL_SIZE = args.pool_size
+        EMAIL_DOMAIN_RATE = args.domain_rate
+        EMAIL_SEND_BATCH_SIZE = args.batch_size
+        EMAIL_RETRY_BASE_SECONDS = 0
+
+    return create_app(BenchConfig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Campaign email delivery benchmark')
+    parser.add_argument('--database-url', default=None, help='defaults to a temporary SQLite file')
+    parser.add_argument('--recipients', type=int, default=100000)
+    parser.add_argument('--domains', type=int, default=20)
+    parser.add_argument('--pool-size', type=int, default=16)
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--domain-rate', type=float, default=2000, help='messages per second per domain')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='sink latency per message')
+    parser.add_argument('--tempfail-rate', type=float, default=0.0, help='sink 451 probability')
+    parser.add_argument('--reject-rate', type=float, default=0.0, help='share of domains answered with 550')
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='bench_email_'), 'bench.db')
+
+    domains = [f'd{i}.example' for i in range(args.domains)]
+    rejected = domains[:int(len(domains) * args.reject_rate)]
+    sink, port = serve_in_thread(port=0, latency_ms=args.latency_ms, tempfail_rate=args.tempfail_rate,
+                                 reject_domains=rejected)
+
+    app = build_app(database_url, port, args)
+    from app import db
+    from app.models.email_campaign import EmailCampaign, EmailQueueItem
+    from app.services.email import EmailService
+    from app.services.email_delivery import campaign_sender
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        recipients = ({'email': f'user{i}@{domains[i % len(domains)]}', 'name': f'User {i}'}
+                      for i in range(args.recipients))
+        template_data = {
+            'html_template': '<p>Hi {{ name }},</p><p>{{ headline }}</p>',
+            'text_template': 'Hi {{ name }},\n\n{{ headline }}\n',
+            'headline': 'Our spring sale starts today',
+        }
+        started = time.perf_counter()
+        summary = EmailService().send_campaign_email(recipients, 'bench-campaign', 'News for {{ name }}',
+                                                     template_data)
+        enqueue_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        while True:
+            campaign_sender.process_pending()
+            remaining = EmailQueueItem.query.filter(EmailQueueItem.status.in_(['pending', 'sending'])).count()
+            if not remaining:
+                break
+            time.sleep(0.05)
+        send_elapsed = time.perf_counter() - started
+
+        campaign = EmailCampaign.query.filter_by(campaign_key='bench-campaign').one()
+        counts = dict(db.session.query(EmailQueueItem.status, db.func.count()).group_by(EmailQueueItem.status))
+        retried = EmailQueueItem.query.filter(EmailQueueItem.attempts > 1).count()
+        campaign_sender.pool.close()
+
+    sink.shutdown()
+    stats = sink.stats.to_dict()
+    checks = {
+        'all_queued': summary['queued'] == args.recipients,
+        'all_settled': counts.get('sent', 0) + counts.get('failed', 0) == args.recipients,
+        'sink_matches_sent': stats['messages'] == counts.get('sent', 0),
+        'campaign_completed': campaign.status == 'completed',
+    }
+    print(json.dumps({
+        'recipients': args.recipients,
+        'pool_size': args.pool_size,
+        'enqueue_s': round(enqueue_elapsed, 3),
+        'send_s': round(send_elapsed, 3),
+        'messages_per_s': round(counts.get('sent', 0) / send_elapsed, 1),
+        'sent': counts.get('sent', 0),
+        'failed': counts.get('failed', 0),
+        'retried': retried,
+        'smtp_connections': stats['connections'],
+        'checks': checks,
+    }))
+    if not all(checks.values()):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Concurrency benchmark for inventory reservations.
+
+Many threads race to buy a few products with limited stock. Every thread
+runs its own app context and database session. At the end the benchmark
+checks the invariants that matter:
+
+- no product went below zero,
+- units sold + units left == initial stock,
+- every unit sold belongs to a committed reservation.
+
+``--mode naive`` runs the old read-check-write decrement instead, to show
+the lost updates and overselling it allows (it fails the checks even on
+SQLite).
+
+Usage:
+    python -m tools.bench_inventory --threads 32 --carts 4000 --stock 500
+    python -m tools.bench_inventory --database-url postgresql://localhost/bench --threads 64
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import TestingConfig
+
+
+def build_app(database_url: str):
+    from app import create_app
+
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SQLALCHEMY_ENGINE_OPTIONS = (
+            {'connect_args': {'timeout': 30, 'check_same_thread': False}}
+            if database_url.startswith('sqlite') else {'pool_size': 64, 'max_overflow': 0}
+        )
+
+    return create_app(BenchConfig)
+
+
+def naive_checkout(db, Product, cart):
+    """The pre-reservation behaviour: read, check in Python, write back."""
+    for product_id, quantity in sorted(cart.items()):
+        product = db.session.get(Product, product_id)
+        if product.stock_quantity < quantity:
+            db.session.rollback()
+            return False
+        product.stock_quantity = product.stock_quantity - quantity
+    db.session.commit()
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inventory reservation concurrency benchmark')
+    parser.add_argument('--database-url', default=None, help='defaults to a temporary SQLite file')
+    parser.add_argument('--mode', choices=['reserve', 'naive'], default='reserve')
+    parser.add_argument('--products', type=int, default=5)
+    parser.add_argument('--stock', type=int, default=500, help='initial stock per product')
+    parser.add_argument('--carts', type=int, default=4000, help='checkout attempts')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--max-lines', type=int, default=3, help='products per cart')
+    parser.add_argument('--abandon-rate', type=float, default=0.1, help='share of carts released instead of paid')
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='bench_inventory_'), 'bench.db')
+
+    app = build_app(database_url)
+    from app import db
+    from app.models.product import Product
+    from app.models.stock_reservation import StockReservation
+    from app.services.inventory import InsufficientStockError, inventory
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(Product.__table__.insert(), [
+            {'name': f'Bench product {i}', 'price': 10, 'sku': f'BENCH-{i}', 'stock_quantity': args.stock}
+            for i in range(args.products)
+        ])
+        db.session.commit()
+        product_ids = [row[0] for row in db.session.query(Product.id).all()]
+
+    counters = {'sold': 0, 'units_sold': 0, 'rejected': 0, 'abandoned': 0, 'errors': 0}
+    counter_lock = threading.Lock()
+
+    def bump(key, units=0):
+        with counter_lock:
+            counters[key] += 1
+            if key == 'sold':
+                counters['units_sold'] += units
+
+    def checkout(i):
+        rng = random.Random(i)
+        cart = {pid: rng.randint(1, 3) for pid in rng.sample(product_ids, rng.randint(1, args.max_lines))}
+        with app.app_context():
+            try:
+                if args.mode == 'naive':
+                    if naive_checkout(db, Product, cart):
+                        bump('sold', sum(cart.values()))
+                    else:
+                        bump('rejected')
+                    return
+                token = inventory.reserve(cart)
+                if rng.random() < args.abandon_rate:
+                    inventory.release(token)
+                    bump('abandoned')
+                else:
+                    inventory.commit(token)
+                    bump('sold', sum(cart.values()))
+            except InsufficientStockError:
+                bump('rejected')
+            except Exception:
+                db.session.rollback()
+                bump('errors')
+            finally:
+                db.session.remove()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(checkout, range(args.carts)))
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        stock = dict(db.session.query(Product.id, Product.stock_quantity).all())
+        committed = dict(db.session.query(StockReservation.product_id, db.func.sum(StockReservation.quantity))
+                         .filter(StockReservation.status == 'committed')
+                         .group_by(StockReservation.product_id).all())
+        held = db.session.query(StockReservation).filter(StockReservation.status == 'held').count()
+
+    # Units sold as seen by the buyers must match what left the shelves
+    checks = {
+        'no_negative_stock': all(value >= 0 for value in stock.values()),
+        'no_overselling': counters['units_sold'] + sum(stock.values()) == args.stock * len(product_ids),
+    }
+    if args.mode == 'reserve':
+        checks['sales_match_reservations'] = counters['units_sold'] == sum(int(v or 0) for v in committed.values())
+    print(json.dumps({
+        'mode': args.mode,
+        'database': database_url.split(':', 1)[0],
+        'threads': args.threads,
+        'carts': args.carts,
+        'elapsed_s': round(elapsed, 3),
+        'carts_per_s': round(args.carts / elapsed, 1),
+        **counters,
+        'units_left': sum(stock.values()),
+        'units_committed': sum(int(v or 0) for v in committed.values()),
+        'still_held': held,
+        'checks': checks,
+    }))
+    if not all(checks.values()):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""Throughput benchmark for the automation rule engine.
+
+Generates ``--rules`` random rules over ``--event-types`` event types and
+``--events`` random events, then matches every event with the compiled,
+indexed engine and with a reference interpreter that walks every rule's
+condition dict for every event. Reports events per second for both and
+checks that they select exactly the same rules.
+
+Usage:
+    python -m tools.bench_rules --rules 500 --events 50000
+    python -m tools.bench_rules --rules 2000 --event-types 4 --platforms 2
+"""
+
+import argparse
+import json
+import operator
+import random
+import re
+import time
+
+from app.services.rule_engine import RuleEngine, WILDCARD
+
+PLATFORMS = ['twitter', 'facebook', 'instagram', 'linkedin', 'tiktok']
+METRICS = ['likes', 'comments', 'shares', 'clicks', 'impressions']
+WORDS = ['launch', 'sale', 'python', 'webinar', 'thanks', 'new', 'update']
+
+_MISSING = object()
+
+
+def lookup(event, path):
+    value = event
+    for key in path.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return _MISSING
+        value = value[key]
+    return value
+
+
+def interpret(condition, event) -> bool:
+    """Reference semantics: evaluate a condition dict directly."""
+    if not condition:
+        return True
+    if 'all' in condition:
+        return all(interpret(part, event) for part in condition['all'])
+    if 'any' in condition:
+        return any(interpret(part, event) for part in condition['any'])
+    if 'not' in condition:
+        return not interpret(condition['not'], event)
+    found = lookup(event, condition['field'])
+    op, value = condition.get('op', 'eq'), condition.get('value')
+    if op == 'exists':
+        return (found is not _MISSING) == (value is None or bool(value))
+    if op == 'eq':
+        return found is not _MISSING and found == value
+    if found is _MISSING:
+        return False
+    if op == 'matches':
+        return re.search(value, str(found)) is not None
+    compare = {
+        'ne': operator.ne, 'gt': operator.gt, 'gte': operator.ge, 'lt': operator.lt, 'lte': operator.le,
+        'in': lambda item, values: item in values, 'not_in': lambda item, values: item not in values,
+        'contains': lambda container, item: item in container,
+        'startswith': lambda item, prefix: str(item).startswith(prefix),
+    }[op]
+    try:
+        return bool(compare(found, value))
+    except TypeError:
+        return False
+
+
+def random_leaf(rng, platforms):
+    kind = rng.random()
+    if kind < 0.4:
+        return {'field': f'metrics.{rng.choice(METRICS)}', 'op': rng.choice(['gt', 'gte', 'lt', 'lte']),
+                'value': rng.randint(0, 200)}
+    if kind < 0.55:
+        return {'field': 'platform', 'op': 'in', 'value': rng.sample(platforms, min(2, len(platforms)))}
+    if kind < 0.7:
+        return {'field': 'content', 'op': 'matches', 'value': rf'\b{rng.choice(WORDS)}\b'}
+    if kind < 0.8:
+        return {'field': 'tags', 'op': 'contains', 'value': rng.choice(WORDS)}
+    if kind < 0.9:
+        return {'field': 'campaign', 'op': 'exists'}
+    return {'not': {'field': 'metrics.shares', 'op': 'lt', 'value': rng.randint(0, 50)}}
+
+
+def random_rule(rng, index, event_types, platforms):
+    leaves = [random_leaf(rng, platforms) for _ in range(rng.randint(1, 4))]
+    if rng.random() < 0.8:
+        leaves.insert(0, {'field': 'platform', 'op': 'eq', 'value': rng.choice(platforms)})
+    conditions = {'all': leaves} if rng.random() < 0.8 else {'any': leaves}
+    return {
+        'id': f'rule-{index}',
+        'event': WILDCARD if rng.random() < 0.02 else rng.choice(event_types),
+        'priority': rng.randint(0, 3),
+        'conditions': conditions,
+        'actions': [{'type': 'noop'}],
+    }
+
+
+def random_event(rng, event_types, platforms):
+    event = {
+        'type': rng.choice(event_types),
+        'platform': rng.choice(platforms),
+        'post_id': f'post-{rng.randint(0, 10000)}',
+        'content': ' '.join(rng.sample(WORDS, 3)),
+        'tags': rng.sample(WORDS, 2),
+        'metrics': {metric: rng.randint(0, 250) for metric in METRICS},
+    }
+    if rng.random() < 0.3:
+        event['campaign'] = 'autumn'
+    return event
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Automation rule engine benchmark')
+    parser.add_argument('--rules', type=int, default=500)
+    parser.add_argument('--events', type=int, default=50000)
+    parser.add_argument('--event-types', type=int, default=8)
+    parser.add_argument('--platforms', type=int, default=5, help='distinct platform values (index selectivity)')
+    parser.add_argument('--naive-events', type=int, default=5000, help='events run through the interpreter')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    event_types = [f'event_{i}' for i in range(args.event_types)]
+    platforms = PLATFORMS[:args.platforms]
+    rules = [random_rule(rng, i, event_types, platforms) for i in range(args.rules)]
+    events = [random_event(rng, event_types, platforms) for _ in range(args.events)]
+
+    engine = RuleEngine()
+    engine.register_action('noop', lambda event, action: None)
+    started = time.perf_counter()
+    engine.load(rules)
+    compile_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    matched = [[rule.rule_id for rule in engine.match(event)] for event in events]
+    compiled_s = time.perf_counter() - started
+
+    ordered = sorted(enumerate(rules), key=lambda item: (item[1]['priority'], item[0]))
+    sample = events[:args.naive_events]
+    started = time.perf_counter()
+    expected = [[rule['id'] for _, rule in ordered
+                 if rule['event'] in (event['type'], WILDCARD) and interpret(rule['conditions'], event)]
+                for event in sample]
+    naive_s = time.perf_counter() - started
+
+    checks = {'same_matches': matched[:len(sample)] == expected}
+    print(json.dumps({
+        'rules': args.rules,
+        'event_types': args.event_types,
+        'events': args.events,
+        'compile_ms': round(compile_s * 1000, 2),
+        'compiled_events_per_s': round(len(events) / compiled_s),
+        'naive_events_per_s': round(len(sample) / naive_s),
+        'speedup': round((len(events) / compiled_s) / (len(sample) / naive_s), 1),
+        'avg_matches': round(sum(map(len, matched)) / len(matched), 2),
+        'checks': checks,
+    }))
+    if not all(checks.values()):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
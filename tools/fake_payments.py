@@ -0,0 +1,395 @@
+"""Local Stripe/PayPal stand-in server for development and load testing.
+
+Implements the subset of the Stripe and PayPal REST APIs the payment
+services use, keeps all state in memory, and sends signed Stripe webhooks
+back to the app. Latency, API errors, card declines and duplicate webhook
+deliveries can be injected to exercise retry and idempotency paths.
+
+Usage:
+    python -m tools.fake_payments --port 12111 --latency-ms 40 \\
+        --error-rate 0.01 --decline-rate 0.05 \\
+        --webhook-url http://127.0.0.1:5000/webhooks/stripe \\
+        --webhook-secret whsec_test
+
+Point the app at it with STRIPE_API_BASE=http://127.0.0.1:12111 and any
+STRIPE_SECRET_KEY (the key is not checked).
+"""
+
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import requests
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+from app.services.webhooks import sign_stripe_payload
+
+
+logger = logging.getLogger(__name__)
+
+
+def _new_id(prefix: str) -> str:
+    return f'{prefix}_{uuid.uuid4().hex[:24]}'
+
+
+def _form_to_dict(form) -> Dict[str, Any]:
+    """Expand Stripe's bracketed form encoding (items[0][price]=x) into nested dicts."""
+    result: Dict[str, Any] = {}
+    for key, value in form.items():
+        parts = re.findall(r'[^\[\]]+', key)
+        node = result
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return result
+
+
+class FakePaymentsState:
+    """In-memory objects and webhook dispatch for the fake server."""
+
+    def __init__(self, webhook_url: Optional[str] = None, webhook_secret: str = 'whsec_test',
+                 duplicate_rate: float = 0.0):
+        """Initialize empty state.
+
+        Args:
+            webhook_url: Where to POST signed Stripe events (None disables webhooks)
+            webhook_secret: Secret used to sign webhook payloads
+            duplicate_rate: Probability of delivering an event twice
+        """
+        self.lock = threading.Lock()
+        self.objects: Dict[str, Dict[str, Any]] = {}
+        self.events: List[Dict[str, Any]] = []
+        self.idempotent: Dict[str, Any] = {}  # Idempotency-Key -> (body, status)
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.duplicate_rate = duplicate_rate
+        self.session = requests.Session()
+        self.dispatcher = ThreadPoolExecutor(max_workers=8, thread_name_prefix='fake-webhooks')
+        self.webhooks_sent = 0
+        self.webhooks_failed = 0
+
+    def save(self, obj: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            self.objects[obj['id']] = obj
+        return obj
+
+    def get(self, object_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            return self.objects.get(object_id)
+
+    def emit(self, event_type: str, obj: Dict[str, Any]):
+        """Record an event for /v1/events and queue its signed webhook delivery."""
+        event = {
+            'id': _new_id('evt'),
+            'object': 'event',
+            'type': event_type,
+            'created': int(time.time()),
+            'data': {'object': dict(obj)},  # snapshot; objects keep changing
+        }
+        with self.lock:
+            self.events.append(event)
+        if not self.webhook_url:
+            return
+        deliveries = 2 if random.random() < self.duplicate_rate else 1
+        for _ in range(deliveries):
+            self.dispatcher.submit(self._deliver, event)
+
+    def _deliver(self, event: Dict[str, Any]):
+        payload = json.dumps(event)
+        headers = {
+            'Content-Type': 'application/json',
+            'Stripe-Signature': sign_stripe_payload(payload, self.webhook_secret),
+        }
+        try:
+            response = self.session.post(self.webhook_url, data=payload, headers=headers, timeout=10)
+            if response.status_code >= 400:
+                raise RuntimeError(f'HTTP {response.status_code}')
+            self.webhooks_sent += 1
+        except Exception as e:
+            self.webhooks_failed += 1
+            logger.warning(f"Webhook {event['id']} delivery failed: {e}")
+
+
+def create_fake_app(latency_ms: float = 0.0, error_rate: float = 0.0, decline_rate: float = 0.0,
+                    state: Optional[FakePaymentsState] = None) -> Flask:
+    """Build the fake payments Flask app.
+
+    Args:
+        latency_ms: Mean added latency per request (uniform +/-50%)
+        error_rate: Probability of answering with a 500 api_error
+        decline_rate: Probability that confirming a payment intent is declined
+        state: Shared state; a fresh one is created if omitted
+
+    Returns:
+        Flask: WSGI app serving /v1/... endpoints
+    """
+    app = Flask('fake_payments')
+    state = state or FakePaymentsState()
+    app.config['FAKE_STATE'] = state
+
+    @app.before_request
+    def inject_latency_and_errors():
+        if latency_ms:
+            time.sleep(random.uniform(0.5, 1.5) * latency_ms / 1000.0)
+        if request.path != '/health' and random.random() < error_rate:
+            return jsonify({'error': {'type': 'api_error', 'message': 'Injected failure'}}), 500
+
+    @app.before_request
+    def replay_idempotent_request():
+        key = request.headers.get('Idempotency-Key')
+        if request.method == 'POST' and key:
+            with state.lock:
+                cached = state.idempotent.get(key)
+            if cached is not None:
+                return app.response_class(cached[0], status=cached[1], mimetype='application/json')
+
+    @app.after_request
+    def store_idempotent_response(response):
+        key = request.headers.get('Idempotency-Key')
+        if request.method == 'POST' and key and response.status_code < 500:
+            with state.lock:
+                state.idempotent.setdefault(key, (response.get_data(), response.status_code))
+        return response
+
+    @app.route('/health')
+    def health():
+        return jsonify({'ok': True, 'objects': len(state.objects),
+                        'webhooks_sent': state.webhooks_sent, 'webhooks_failed': state.webhooks_failed})
+
+    # Stripe: payment intents --------------------------------------------------
+
+    def _confirm(intent):
+        if random.random() < decline_rate:
+            intent['status'] = 'requires_payment_method'
+            intent['last_payment_error'] = {'code': 'card_declined', 'message': 'Your card was declined.'}
+            state.emit('payment_intent.payment_failed', intent)
+            return jsonify({'error': {'type': 'card_error', 'code': 'card_declined',
+                                      'message': 'Your card was declined.',
+                                      'payment_intent': intent}}), 402
+        intent['status'] = 'succeeded'
+        intent['latest_charge'] = _new_id('ch')
+        state.emit('payment_intent.succeeded', intent)
+        return jsonify(intent)
+
+    @app.route('/v1/payment_intents', methods=['POST'])
+    def create_payment_intent():
+        params = _form_to_dict(request.form)
+        intent = state.save({
+            'id': _new_id('pi'),
+            'object': 'payment_intent',
+            'amount': int(params.get('amount', 0)),
+            'currency': params.get('currency', 'usd'),
+            'customer': params.get('customer'),
+            'payment_method': params.get('payment_method'),
+            'metadata': params.get('metadata', {}),
+            'status': 'requires_payment_method',
+            'created': int(time.time()),
+        })
+        state.emit('payment_intent.created', intent)
+        if params.get('confirm') == 'true':
+            return _confirm(intent)
+        return jsonify(intent)
+
+    @app.route('/v1/payment_intents/<intent_id>', methods=['GET'])
+    def retrieve_payment_intent(intent_id):
+        intent = state.get(intent_id)
+        if intent is None:
+            return jsonify({'error': {'type': 'invalid_request_error', 'code': 'resource_missing'}}), 404
+        return jsonify(intent)
+
+    @app.route('/v1/payment_intents/<intent_id>/confirm', methods=['POST'])
+    def confirm_payment_intent(intent_id):
+        intent = state.get(intent_id)
+        if intent is None:
+            return jsonify({'error': {'type': 'invalid_request_error', 'code': 'resource_missing'}}), 404
+        return _confirm(intent)
+
+    @app.route('/v1/payment_intents/<intent_id>/cancel', methods=['POST'])
+    def cancel_payment_intent(intent_id):
+        intent = state.get(intent_id)
+        if intent is None:
+            return jsonify({'error': {'type': 'invalid_request_error', 'code': 'resource_missing'}}), 404
+        intent['status'] = 'canceled'
+        state.emit('payment_intent.canceled', intent)
+        return jsonify(intent)
+
+    # Stripe: events -----------------------------------------------------------
+
+    @app.route('/v1/events', methods=['GET'])
+    def list_events():
+        params = _form_to_dict(request.args)
+        created = params.get('created') or {}
+        since = int(created.get('gte', 0)) if isinstance(created, dict) else int(created)
+        types = params.get('types') or {}
+        types = set(types.values()) if isinstance(types, dict) else {types}
+        limit = min(int(params.get('limit', 10)), 100)
+        with state.lock:
+            # Newest first, like Stripe list endpoints
+            matches = [event for event in reversed(state.events)
+                       if event['created'] >= since and (not types or event['type'] in types)]
+        starting_after = params.get('starting_after')
+        if starting_after:
+            ids = [event['id'] for event in matches]
+            matches = matches[ids.index(starting_after) + 1:] if starting_after in ids else []
+        return jsonify({'object': 'list', 'url': '/v1/events', 'data': matches[:limit],
+                        'has_more': len(matches) > limit})
+
+    # Stripe: subscriptions ----------------------------------------------------
+
+    def _price(price_id):
+        """Fake price object; ids like price_pro_month_1900 encode interval and amount."""
+        match = re.search(r'(\d+)$', price_id or '')
+        return {'id': price_id, 'object': 'price', 'currency': 'usd',
+                'unit_amount': int(match.group(1)) if match else 1000,
+                'recurring': {'interval': 'year' if 'year' in (price_id or '') else 'month'}}
+
+    @app.route('/v1/subscriptions', methods=['POST'])
+    def create_subscription():
+        params = _form_to_dict(request.form)
+        now = int(time.time())
+        items = params.get('items', {})
+        price = (items.get('0') or {}).get('price') if isinstance(items, dict) else None
+        subscription = state.save({
+            'id': _new_id('sub'),
+            'object': 'subscription',
+            'customer': params.get('customer'),
+            'status': 'active',
+            'items': {'object': 'list', 'data': [{'price': _price(price), 'quantity': 1}]},
+            'current_period_start': now,
+            'current_period_end': now + 30 * 86400,
+            'created': now,
+        })
+        state.emit('customer.subscription.created', subscription)
+        return jsonify(subscription)
+
+    @app.route('/v1/subscriptions/<subscription_id>', methods=['GET', 'POST', 'DELETE'])
+    def subscription_detail(subscription_id):
+        subscription = state.get(subscription_id)
+        if subscription is None:
+            return jsonify({'error': {'type': 'invalid_request_error', 'code': 'resource_missing'}}), 404
+        if request.method == 'POST':
+            params = _form_to_dict(request.form)
+            items = params.pop('items', None)
+            if isinstance(items, dict) and (items.get('0') or {}).get('price'):
+                subscription['items'] = {'object': 'list',
+                                         'data': [{'price': _price(items['0']['price']), 'quantity': 1}]}
+            subscription.update(params)
+            state.emit('customer.subscription.updated', subscription)
+        elif request.method == 'DELETE':
+            subscription['status'] = 'canceled'
+            subscription['canceled_at'] = int(time.time())
+            state.emit('customer.subscription.deleted', subscription)
+        return jsonify(subscription)
+
+    # Stripe: refunds ----------------------------------------------------------
+
+    @app.route('/v1/refunds', methods=['POST'])
+    def create_refund():
+        params = _form_to_dict(request.form)
+        intent = state.get(params.get('payment_intent', ''))
+        if intent is None or intent.get('status') != 'succeeded':
+            return jsonify({'error': {'type': 'invalid_request_error',
+                                      'message': 'No succeeded payment to refund'}}), 400
+        amount = int(params.get('amount', intent['amount']))
+        refund = state.save({
+            'id': _new_id('re'),
+            'object': 'refund',
+            'amount': amount,
+            'currency': intent['currency'],
+            'payment_intent': intent['id'],
+            'reason': params.get('reason'),
+            'status': 'succeeded',
+            'created': int(time.time()),
+        })
+        state.emit('refund.created', refund)
+        state.emit('charge.refunded', {
+            'id': intent.get('latest_charge') or _new_id('ch'),
+            'object': 'charge',
+            'payment_intent': intent['id'],
+            'customer': intent.get('customer'),
+            'amount': intent['amount'],
+            'amount_refunded': amount,
+            'currency': intent['currency'],
+            'refunded': amount >= intent['amount'],
+            'refunds': {'object': 'list', 'data': [dict(refund)]},
+        })
+        return jsonify(refund)
+
+    # PayPal -------------------------------------------------------------------
+
+    @app.route('/v1/oauth2/token', methods=['POST'])
+    def paypal_token():
+        return jsonify({'access_token': uuid.uuid4().hex, 'token_type': 'Bearer', 'expires_in': 32400})
+
+    @app.route('/v1/payments/payment', methods=['POST'])
+    def paypal_create_payment():
+        body = request.get_json(silent=True) or {}
+        payment_id = 'PAYID-' + uuid.uuid4().hex[:20].upper()
+        payment = state.save({
+            'id': payment_id,
+            'intent': body.get('intent', 'sale'),
+            'state': 'created',
+            'transactions': body.get('transactions', []),
+            'links': [
+                {'href': f'{request.host_url}approve/{payment_id}', 'rel': 'approval_url', 'method': 'REDIRECT'},
+                {'href': f'{request.host_url}v1/payments/payment/{payment_id}/execute', 'rel': 'execute',
+                 'method': 'POST'},
+            ],
+        })
+        return jsonify(payment), 201
+
+    @app.route('/v1/payments/payment/<payment_id>/execute', methods=['POST'])
+    def paypal_execute_payment(payment_id):
+        payment = state.get(payment_id)
+        if payment is None:
+            return jsonify({'name': 'INVALID_RESOURCE_ID'}), 404
+        body = request.get_json(silent=True) or {}
+        payment['state'] = 'approved'
+        payment['payer'] = {'payer_info': {'payer_id': body.get('payer_id')}}
+        return jsonify(payment)
+
+    return app
+
+
+def serve_in_thread(host: str = '127.0.0.1', port: int = 12111, **kwargs):
+    """Start the fake server on a background thread.
+
+    Returns:
+        tuple: (server, base_url); call ``server.shutdown()`` to stop
+    """
+    app = create_fake_app(**kwargs)
+    server = make_server(host, port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='fake-payments', daemon=True)
+    thread.start()
+    return server, f'http://{host}:{server.server_port}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Stripe/PayPal stand-in server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=12111)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='mean added latency per request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='probability of a 500 api_error')
+    parser.add_argument('--decline-rate', type=float, default=0.0, help='probability a confirm is declined')
+    parser.add_argument('--duplicate-rate', type=float, default=0.0, help='probability a webhook is sent twice')
+    parser.add_argument('--webhook-url', default=None, help='app endpoint receiving Stripe events')
+    parser.add_argument('--webhook-secret', default='whsec_test')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    state = FakePaymentsState(args.webhook_url, args.webhook_secret, args.duplicate_rate)
+    app = create_fake_app(args.latency_ms, args.error_rate, args.decline_rate, state)
+    logger.info(f'Fake payments server on http://{args.host}:{args.port}')
+    make_server(args.host, args.port, app, threaded=True).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""Load test for the checkout and webhook payment paths.
+
+Drives PaymentService checkouts (create + confirm payment intent through the
+Stripe SDK) against the local stand-in server, and/or POSTs signed Stripe
+events at the app's webhook endpoint. Reports throughput and p50/p90/p99
+latency for each scenario.
+
+Usage:
+    # Self-contained: start the fake server in-process, checkout path only
+    python -m tools.loadtest_payments --start-fake-server --requests 2000 --concurrency 32
+
+    # Full pipeline against a running app (gunicorn run:app)
+    python -m tools.fake_payments --webhook-url http://127.0.0.1:8000/webhooks/stripe &
+    python -m tools.loadtest_payments --stripe-base http://127.0.0.1:12111 \\
+        --app-url http://127.0.0.1:8000 --webhook-secret whsec_test --duplicate-ratio 0.3
+"""
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import numpy as np
+import requests
+
+from app.services.payment_service import PaymentService
+from app.services.webhooks import sign_stripe_payload
+
+
+class LatencyRecorder:
+    """Thread-safe collection of request latencies and errors."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.started = None
+        self.finished = None
+
+    def record(self, seconds: float, error: str = None):
+        with self.lock:
+            if error:
+                self.errors[error] = self.errors.get(error, 0) + 1
+            else:
+                self.latencies.append(seconds)
+
+    def report(self) -> Dict[str, float]:
+        """Summarize throughput and latency percentiles (milliseconds)."""
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        samples = np.array(self.latencies) * 1000.0
+        total = len(self.latencies) + sum(self.errors.values())
+        summary = {
+            'scenario': self.name,
+            'requests': total,
+            'errors': sum(self.errors.values()),
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(total / elapsed, 1) if elapsed else 0.0,
+        }
+        if samples.size:
+            p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+            summary.update({
+                'p50_ms': round(float(p50), 2),
+                'p90_ms': round(float(p90), 2),
+                'p99_ms': round(float(p99), 2),
+                'max_ms': round(float(samples.max()), 2),
+            })
+        if self.errors:
+            summary['error_breakdown'] = dict(self.errors)
+        return summary
+
+
+def run_scenario(name: str, operation: Callable[[int], None], total: int, concurrency: int) -> Dict[str, float]:
+    """Run ``operation(i)`` ``total`` times on a thread pool and time each call."""
+    recorder = LatencyRecorder(name)
+
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            operation(i)
+        except Exception as e:
+            recorder.record(time.perf_counter() - start, error=type(e).__name__)
+            return
+        recorder.record(time.perf_counter() - start)
+
+    recorder.started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, range(total)))
+    recorder.finished = time.perf_counter()
+    return recorder.report()
+
+
+def checkout_operation(stripe_base: str) -> Callable[[int], None]:
+    """One checkout: create and confirm a payment intent through PaymentService."""
+    service = PaymentService(api_key='sk_test_loadtest', api_base=stripe_base)
+
+    def checkout(i):
+        service.create_payment_intent(
+            random.choice([900, 1900, 4900, 9900]),
+            customer_id=f'cus_load_{i % 500}',
+            payment_method='pm_card_visa',
+            confirm=True
+        )
+    return checkout
+
+
+def webhook_operation(app_url: str, secret: str, duplicate_ratio: float) -> Callable[[int], None]:
+    """One webhook delivery; a share of events reuse an earlier id to mimic retry storms."""
+    url = app_url.rstrip('/') + '/webhooks/stripe'
+    local = threading.local()
+    sent_ids: List[str] = []
+
+    def deliver(i):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        if sent_ids and random.random() < duplicate_ratio:
+            event_id = random.choice(sent_ids)
+        else:
+            event_id = f'evt_load_{uuid.uuid4().hex[:20]}'
+            sent_ids.append(event_id)
+        payload = json.dumps({
+            'id': event_id,
+            'object': 'event',
+            'type': 'payment_intent.succeeded',
+            'created': int(time.time()),
+            'data': {'object': {'id': f'pi_load_{i}', 'object': 'payment_intent', 'status': 'succeeded'}},
+        })
+        response = session.post(url, data=payload, timeout=10, headers={
+            'Content-Type': 'application/json',
+            'Stripe-Signature': sign_stripe_payload(payload, secret),
+        })
+        if response.status_code != 200:
+            raise RuntimeError(f'HTTP {response.status_code}')
+    return deliver
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Payment path load test')
+    parser.add_argument('--stripe-base', default=None, help='URL of the fake payments server')
+    parser.add_argument('--start-fake-server', action='store_true', help='run the fake server in-process')
+    parser.add_argument('--fake-latency-ms', type=float, default=20.0)
+    parser.add_argument('--fake-error-rate', type=float, default=0.0)
+    parser.add_argument('--app-url', default=None, help='base URL of a running app for the webhook scenario')
+    parser.add_argument('--webhook-secret', default='whsec_test')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.2)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    server = None
+    stripe_base = args.stripe_base
+    if args.start_fake_server:
+        from tools.fake_payments import serve_in_thread
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        server, stripe_base = serve_in_thread(port=0, latency_ms=args.fake_latency_ms,
+                                              error_rate=args.fake_error_rate)
+
+    results = []
+    try:
+        if stripe_base:
+            results.append(run_scenario('checkout', checkout_operation(stripe_base),
+                                        args.requests, args.concurrency))
+        if args.app_url:
+            results.append(run_scenario('webhook', webhook_operation(args.app_url, args.webhook_secret,
+                                                                     args.duplicate_ratio),
+                                        args.requests, args.concurrency))
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    if not results:
+        parser.error('nothing to run: pass --stripe-base/--start-fake-server and/or --app-url')
+    for summary in results:
+        print(json.dumps(summary))
+
+
+if __name__ == '__main__':
+    main()
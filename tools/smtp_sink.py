@@ -0,0 +1,180 @@
+"""Local debugging SMTP server for exercising the campaign sender.
+
+A small threaded SMTP server (stdlib only; ``smtpd`` is gone from newer
+Pythons) that accepts every message, counts it, and optionally writes it
+to a maildir. Latency, temporary failures (451) and permanently rejected
+domains (550) can be injected to exercise the sender's retry paths.
+
+Usage:
+    python -m tools.smtp_sink --port 8025 --maildir /tmp/sink --latency-ms 5 \\
+        --tempfail-rate 0.01 --reject-domain bounce.example
+
+Point the app at it with MAIL_SERVER=127.0.0.1 MAIL_PORT=8025 MAIL_USE_TLS=false.
+"""
+
+import argparse
+import logging
+import mailbox
+import random
+import socketserver
+import threading
+import time
+from typing import Iterable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class SinkStats:
+    """Counters shared by all sink connections."""
+
+    def __init__(self):
+        self.connections = 0
+        self.messages = 0
+        self.recipients = 0
+        self.tempfailed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def bump(self, name: str, amount: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def to_dict(self):
+        return {name: getattr(self, name)
+                for name in ('connections', 'messages', 'recipients', 'tempfailed', 'rejected')}
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """One SMTP session; supports the commands smtplib uses for plain sends."""
+
+    def reply(self, line: str):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        server.stats.bump('connections')
+        self.reply('220 smtp-sink ESMTP ready')
+        sender, recipients = None, []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode('utf-8', 'replace').rstrip('\r\n')
+            verb, _, arg = line.partition(' ')
+            verb = verb.upper()
+            if verb == 'EHLO':
+                self.reply('250-smtp-sink')
+                self.reply('250-8BITMIME')
+                self.reply('250 SIZE 52428800')
+            elif verb == 'HELO':
+                self.reply('250 smtp-sink')
+            elif verb == 'MAIL':
+                sender, recipients = arg.partition(':')[2].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                address = arg.partition(':')[2].strip().strip('<>')
+                domain = address.rpartition('@')[2].lower()
+                if domain in server.reject_domains:
+                    server.stats.bump('rejected')
+                    self.reply('550 5.1.1 Mailbox unavailable')
+                elif random.random() < server.tempfail_rate:
+                    server.stats.bump('tempfailed')
+                    self.reply('451 4.3.0 Try again later')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                if not recipients:
+                    self.reply('503 No valid recipients')
+                    continue
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(data[1:] if data.startswith(b'..') else data)
+                if server.latency:
+                    time.sleep(server.latency)
+                server.deliver(b''.join(lines), recipients)
+                sender, recipients = None, []
+                self.reply('250 OK queued')
+            elif verb == 'RSET':
+                sender, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Threaded SMTP server that accepts and counts messages."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, maildir: Optional[str] = None, latency_ms: float = 0.0,
+                 tempfail_rate: float = 0.0, reject_domains: Iterable[str] = ()):
+        """Bind the server; call ``serve_forever`` to start accepting.
+
+        Args:
+            address: (host, port) to listen on; port 0 picks a free port
+            maildir: Write accepted messages to this maildir (None discards them)
+            latency_ms: Added latency per message, in milliseconds
+            tempfail_rate: Probability a recipient gets a 451
+            reject_domains: Recipient domains answered with 550
+        """
+        super().__init__(address, SMTPSinkHandler)
+        self.stats = SinkStats()
+        self.latency = latency_ms / 1000.0
+        self.tempfail_rate = tempfail_rate
+        self.reject_domains = {domain.lower() for domain in reject_domains}
+        self.maildir = mailbox.Maildir(maildir, create=True) if maildir else None
+        self._maildir_lock = threading.Lock()
+
+    def deliver(self, message: bytes, recipients):
+        self.stats.bump('messages')
+        self.stats.bump('recipients', len(recipients))
+        if self.maildir is not None:
+            with self._maildir_lock:
+                self.maildir.add(message)
+
+
+def serve_in_thread(host: str = '127.0.0.1', port: int = 8025, **kwargs):
+    """Start the sink on a background thread.
+
+    Returns:
+        tuple: (server, port); call ``server.shutdown()`` to stop
+    """
+    server = SMTPSink((host, port), **kwargs)
+    thread = threading.Thread(target=server.serve_forever, name='smtp-sink', daemon=True)
+    thread.start()
+    return server, server.server_address[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local debugging SMTP server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--maildir', default=None, help='store accepted messages in this maildir')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='added latency per message')
+    parser.add_argument('--tempfail-rate', type=float, default=0.0, help='probability of a 451 per recipient')
+    parser.add_argument('--reject-domain', action='append', default=[], help='answer RCPT with 550 for this domain')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = SMTPSink((args.host, args.port), args.maildir, args.latency_ms, args.tempfail_rate, args.reject_domain)
+    logger.info(f'SMTP sink on {args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info(f'Sink stats: {server.stats.to_dict()}')
+
+
+if __name__ == '__main__':
+    main()